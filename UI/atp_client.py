@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# atp_client.py
+"""
+Thin Qt client for the ATP daemon (services/daemon.py).
+
+Same window as main_atp.py, but no hardware in this process: buttons are
+daemon calls, the log view and slot widgets are fed from the daemon's event
+stream. Closing / restarting this window does not touch the fixture.
+
+    python3 -m services.daemon &      # once (boot / atp.sh daemon)
+    python3 atp_client.py             # any number of times
+"""
+
+import sys
+
+from PyQt5.QtCore import QEvent, QTimer, Qt
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
+
+from ui_atp import Ui_MainWindow
+from services import scanner
+from services.daemon_client import DaemonClient, DaemonError, int_keys
+
+SLOTS = (1, 2, 3, 4)
+RECONNECT_MS = 2000
+
+
+class AtpClientWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.ui = Ui_MainWindow()
+        self.ui.setupUi(self)
+        self.setWindowTitle("RUP ATP Test Platform (daemon client)")
+
+        self.client = DaemonClient()
+        self.connected = False
+        self.running = False
+        self.has_session = False
+
+        # Start ATP: keyboard-wedge scans (or typed ID + Enter), one per slot
+        self.wedge = scanner.KeyWedge()
+        self.setup_ids = {}
+        self.setup_router = None
+        QApplication.instance().installEventFilter(self)
+
+        self.ui.btn_start.clicked.connect(self.on_start_setup_clicked)
+        self.ui.btn_quick.clicked.connect(lambda: self._run("quick"))
+        self.ui.btn_full.clicked.connect(lambda: self._run("full"))
+        self.ui.btn_stop.clicked.connect(self.on_stop_clicked)
+        # The daemon runs batches only: no continuous flow / retest here (use main_atp.py)
+        self.ui.btn_flow.setVisible(False)
+        self.ui.btn_retest.setVisible(False)
+
+        # Reconnect until the daemon is there; button states follow the daemon
+        self.timer = QTimer(self)
+        self.timer.setInterval(RECONNECT_MS)
+        self.timer.timeout.connect(self._poll)
+        self.timer.start()
+        self._poll()
+
+    # =========================================================
+    # CONNECTION
+    # =========================================================
+    def _local(self, msg: str):
+        self.ui.log_box.append(msg)
+
+    def _poll(self):
+        if not self.connected:
+            try:
+                self.client.close()
+                self.client = DaemonClient()
+                st = self.client.call("status")
+                self.client.subscribe(self._on_event, on_close=self._on_disconnect)
+            except DaemonError:
+                self._set_buttons(False)
+                self.ui.title.setText("RUP Acceptance Test Platform — daemon offline")
+                return
+            self.connected = True
+            self._local(f"[CLIENT] Attached to ATP daemon pid {st.get('pid')} "
+                        f"({st.get('backend')}, profile {st.get('profile')}, {st.get('state')})")
+            self.ui.title.setText("RUP Acceptance Test Platform")
+            for s, rid in int_keys(st.get("slot_ids")).items():
+                if rid:
+                    self.ui.slot_store.post(s, rup_id=rid)
+            self.running = st.get("state") == "running"
+            self.has_session = bool(st.get("session"))
+        self._set_buttons(True)
+
+    def _on_disconnect(self):
+        # reader thread: only flags + thread-safe posts
+        self.connected = False
+        self.ui.log_box.post([("[CLIENT][WARN] Daemon connection lost", None, "warn")])
+
+    def _set_buttons(self, online: bool):
+        idle = online and not self.running
+        self.ui.btn_start.setEnabled(idle)
+        self.ui.btn_quick.setEnabled(idle and self.has_session)
+        self.ui.btn_full.setEnabled(idle and self.has_session)
+        self.ui.btn_stop.setEnabled(idle)
+
+    # =========================================================
+    # EVENTS (reader thread -> LogView / SlotStateStore, both thread-safe)
+    # =========================================================
+    def _on_event(self, ev: dict):
+        t = ev.get("type")
+        if t == "log":
+            self.ui.log_box.post([(ev.get("text", ""), ev.get("slot"), ev.get("level", "info"))])
+        elif t == "update":
+            s = ev.get("slot")
+            g = ev.get("gate")
+            self.ui.slot_store.post(s, gate=g if g else 0, status=ev.get("status"), led=ev.get("led"))
+        elif t == "done":
+            self.running = False
+            if ev.get("phase") != "quick":
+                self.has_session = False
+
+    # =========================================================
+    # BUTTONS
+    # =========================================================
+    def on_start_setup_clicked(self):
+        """Scan (or type + Enter) one RUP ID per slot; the 4th scan sends setup to the daemon."""
+        self.setup_ids = {s: None for s in SLOTS}
+        for s in SLOTS:
+            self.ui.slot_store.post(s, rup_id="", status="Scan RUP ID", led="gray")
+        self.setup_router = scanner.ScanRouter(
+            SLOTS,
+            is_free=lambda s: self.setup_ids[s] is None,
+            serial_in_use=lambda sn: sn in self.setup_ids.values(),
+            on_serial=self._on_setup_scan,
+            log=self._local,
+        )
+        self._local("[SETUP] Scan the RUP ID of each slot (scan a slot label first to pick the slot)")
+
+    def _on_setup_scan(self, s: int, rid: str):
+        self.setup_ids[s] = rid
+        self.ui.slot_store.post(s, rup_id=rid, status="Ready", led="yellow")
+        if any(v is None for v in self.setup_ids.values()):
+            return
+        self.setup_router = None
+        ids = {str(slot): sn for slot, sn in self.setup_ids.items()}
+        if self._call("setup", slot_ids=ids) is not None:
+            self.has_session = True
+            self._set_buttons(True)
+
+    def eventFilter(self, obj, event):
+        # Keyboard-wedge scanner, same rules as main_atp: first delivery only, no shortcuts
+        if self.setup_router is None or event.type() != QEvent.KeyPress \
+                or QApplication.activeModalWidget() is not None:
+            return False
+        if obj is not (QApplication.focusWidget() or self):
+            return False
+        if event.modifiers() & (Qt.ControlModifier | Qt.AltModifier):
+            return False
+        ch = "\n" if event.key() in (Qt.Key_Return, Qt.Key_Enter) else event.text()
+        if not ch:
+            return False
+        text = self.wedge.feed(ch)
+        if text:
+            self.setup_router.feed(text)
+        return True
+
+    def _run(self, phase: str):
+        if self._call("run", phase=phase) is not None:
+            self.running = True
+            self._set_buttons(True)
+
+    def on_stop_clicked(self):
+        if self._call("relays_off") is not None:
+            QMessageBox.information(self, "ATP", "Relays OFF.")
+
+    def _call(self, method: str, **params):
+        try:
+            return self.client.call(method, **params)
+        except DaemonError as e:
+            QMessageBox.warning(self, "ATP daemon", str(e))
+            return None
+
+    def closeEvent(self, event):
+        self.client.close()   # the daemon (and the fixture) keep running
+        event.accept()
+
+
+def main():
+    app = QApplication(sys.argv)
+    w = AtpClientWindow()
+    w.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# atp_headless.py
+"""
+Run the ATP sequence without the Qt UI.
+
+    python3 atp_headless.py --sim               # simulated fixture (anywhere)
+    python3 atp_headless.py --sim --quick-only
+    python3 atp_headless.py --sim --virtual-time  # full cycle in < 1 s (virtual clock)
+    python3 atp_headless.py --sim --virtual-time --trace  # + ATP_logs/<session>.trace.json
+    python3 atp_headless.py --sim --fixture-profile fast  # preset or .toml/.json profile
+    python3 atp_headless.py --ids A1,B2,C3,D4   # real fixture (ATP_HAL=real)
+    python3 atp_headless.py --sim --virtual-time --flow --units 12 --swap-s 20
+                                                # continuous flow, simulated operator
+    scan_serials | python3 atp_headless.py --sim --flow --scanner stdin
+                                                # continuous flow, units loaded by scans
+    python3 atp_headless.py --ids A1,B2,C3,D4 --retest  # only what failed last time
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict
+
+import hal
+
+
+def _run_flow(engine, units: int, swap_s: float) -> Dict[str, list]:
+    """
+    Simulated operator: 4 units loaded at start; swap_s (fixture time) after
+    a slot is DONE it is unloaded and the next serial goes in, until `units`
+    units are finished (a lone unit at Gate3 is not stuck: FlowRunner blocks
+    its Gate3 after KEEPER_WAIT_S). Returns {rup_id: [slot, pass]}.
+    """
+    from hal import clock
+    from runners.flow_runner import DONE, EMPTY
+
+    flow = engine.flow
+    serials = iter(f"U{i:04d}" for i in range(1, units + 1))
+    loaded = 0
+    out: Dict[str, list] = {}
+    t0 = clock.monotonic()
+
+    for s in flow.slots:
+        if loaded < units:
+            flow.load(s, next(serials))
+            loaded += 1
+
+    while flow.units_done < units:
+        now = clock.monotonic()
+        for lane in flow.lanes.values():
+            if lane.state == DONE and now - lane.done_at >= swap_s and not lane.unload_requested:
+                out[lane.rup_id] = [lane.slot, lane.passed]
+                flow.unload(lane.slot)
+        for lane in flow.lanes.values():
+            if lane.state == EMPTY and loaded < units:
+                flow.load(lane.slot, next(serials))
+                loaded += 1
+        if not flow.step():
+            if loaded >= units and not flow.busy():
+                break                              # nothing left to test or load
+            clock.sleep(0.5)
+
+    for lane in flow.lanes.values():
+        if lane.state == DONE:
+            out[lane.rup_id] = [lane.slot, lane.passed]
+    elapsed = clock.monotonic() - t0
+    engine.log(f"[FLOW] {units} units in {elapsed:.1f}s fixture time "
+               f"({units * 3600.0 / elapsed:.1f} units/h, operator swap {swap_s:.0f}s)")
+    return out
+
+
+def _run_flow_scanned(engine, spec: str, swap_s: float) -> Dict[str, list]:
+    """
+    Units come from the scanner(s) in `spec` (services/scanner.py): a scan is
+    taken when a slot is empty and loads it (tests start at once). A DONE slot
+    is unloaded swap_s after it finished. Ends when the scanner hits EOF and
+    every slot is empty again. Returns {rup_id: [slot, pass]}.
+    """
+    from hal import clock
+    from runners.flow_runner import DONE, EMPTY
+    from services import scanner
+
+    flow = engine.flow
+    scans = scanner.ScanInput(engine.log).open(spec)
+    if not scans.sources:
+        raise RuntimeError(f"--scanner {spec}: no usable source")
+    router = scanner.flow_router(flow, engine.log)
+    out: Dict[str, list] = {}
+    t0 = clock.monotonic()
+
+    while True:
+        now = clock.monotonic()
+        for lane in flow.lanes.values():
+            if lane.state == DONE and now - lane.done_at >= swap_s and not lane.unload_requested:
+                out[lane.rup_id] = [lane.slot, lane.passed]
+                flow.unload(lane.slot)
+        # the operator scans a unit when putting it in: one scan per empty slot
+        while (flow.state(router.indicated) == EMPTY if router.indicated
+               else any(flow.state(s) == EMPTY for s in flow.slots)):
+            batch = scans.poll(limit=1)
+            if not batch:
+                break
+            router.feed(batch[0])
+        if flow.step():
+            continue
+        if scans.exhausted() and all(l.state == EMPTY for l in flow.lanes.values()):
+            break
+        clock.sleep(0.5)
+
+    elapsed = clock.monotonic() - t0
+    if out:
+        engine.log(f"[FLOW] {len(out)} scanned units in {elapsed:.1f}s fixture time "
+                   f"({len(out) * 3600.0 / elapsed:.1f} units/h)")
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Headless ATP run (Quick + Full)")
+    ap.add_argument("--sim", action="store_true", help="simulated fixture backend (same as ATP_HAL=sim)")
+    ap.add_argument("--virtual-time", action="store_true",
+                    help="with --sim: virtual clock, every wait is skipped (same as ATP_HAL=vsim)")
+    ap.add_argument("--profile", action="store_true",
+                    help="print sleep / I/O / compute breakdown per gate and slot (same as ATP_PROFILE=1)")
+    ap.add_argument("--trace", action="store_true",
+                    help="write a Chrome / Perfetto trace next to the session log (same as ATP_TRACE=1)")
+    ap.add_argument("--fixture-profile", default=None, metavar="NAME|PATH",
+                    help="fixture timing profile: safe / fast / characterize or a .toml/.json file "
+                         "(same as ATP_FIXTURE_PROFILE)")
+    ap.add_argument("--seed", type=int, default=0, help="simulated fixture RNG seed")
+    ap.add_argument("--ids", default="", help="RUP IDs for slot 1..4, comma separated")
+    ap.add_argument("--quick-only", action="store_true", help="Gate1 + Gate2 only")
+    ap.add_argument("--logs-dir", default="ATP_logs")
+    ap.add_argument("--no-excel", action="store_true")
+    ap.add_argument("--flow", action="store_true",
+                    help="continuous flow (per-slot lifecycle) with a simulated operator")
+    ap.add_argument("--units", type=int, default=8, help="--flow: units to test")
+    ap.add_argument("--swap-s", type=float, default=20.0, help="--flow: operator unload + load time")
+    ap.add_argument("--scanner", default=None, metavar="SPEC",
+                    help="--flow: serials from barcode scanner(s) instead of the simulated operator: "
+                         "stdin, /dev/input/eventN, grab:/dev/input/..., /dev/ttyACM0 "
+                         "(same as ATP_SCANNER)")
+    ap.add_argument("--retest", action="store_true",
+                    help="retest failures: a serial with cached results only re-runs its failed gates")
+    ap.add_argument("--http", default=None, metavar="[HOST]:PORT",
+                    help="status dashboard / WebSocket (same as ATP_STATUS_HTTP)")
+    args = ap.parse_args(argv)
+
+    if args.virtual_time and not args.sim:
+        ap.error("--virtual-time needs --sim")
+    if args.sim:
+        hal.select_backend("sim", virtual_time=args.virtual_time, seed=args.seed)
+
+    # Gates / services resolve the backend on first hardware access
+    from services import fixture_profile, outbox, profiler, scanner, status_api, tracing, watchdog
+    from services.engine import ATPEngine, SLOTS
+
+    watchdog.enable_from_env()
+    if args.profile:
+        profiler.enable()
+    else:
+        profiler.enable_from_env()
+    if args.trace:
+        tracing.enable()
+    else:
+        tracing.enable_from_env()
+    if args.fixture_profile:
+        try:
+            fixture_profile.load(args.fixture_profile)
+        except Exception as e:
+            ap.error(f"--fixture-profile: {e}")
+    else:
+        fixture_profile.load_from_env()
+    if args.http:
+        try:
+            status_api.start(args.http)
+        except OSError as e:
+            ap.error(f"--http {args.http}: {e}")
+    else:
+        status_api.start_from_env()
+    outbox.start_from_env(args.logs_dir)
+
+    ids = [x.strip() for x in args.ids.split(",")] if args.ids else []
+    engine = ATPEngine(logs_dir=args.logs_dir, retest=args.retest)
+    if args.flow:
+        try:
+            engine.start_flow(report=not args.no_excel)
+            spec = args.scanner or os.environ.get(scanner.SCANNER_ENV, "")
+            if spec:
+                units = _run_flow_scanned(engine, spec, args.swap_s)
+            else:
+                units = _run_flow(engine, args.units, args.swap_s)
+            engine.stop_flow()
+        finally:
+            engine.shutdown()
+            hal.shutdown()
+            status_api.stop()
+            outbox.stop()
+        print("\n================ FLOW RESULTS ================")
+        for rid, (slot, ok) in sorted(units.items()):
+            print(f"{rid} S{slot} {'PASS' if ok else 'FAIL'}")
+        return 0 if all(ok for _, ok in units.values()) else 1
+
+    try:
+        engine.setup({s: (ids[s - 1] if s - 1 < len(ids) else None) for s in SLOTS})
+        results = engine.run_all(full=not args.quick_only)
+        if not args.no_excel:
+            engine.write_report()
+    finally:
+        engine.shutdown()
+        hal.shutdown()
+        status_api.stop()
+        outbox.stop()
+
+    print("\n================ ATP RESULTS ================")
+    ok_all = True
+    for g, per_slot in results.items():
+        row = " ".join(
+            f"S{s}={'--' if v is None else ('PASS' if v else 'FAIL')}" for s, v in per_slot.items()
+        )
+        print(f"Gate{g}: {row}")
+        ok_all = ok_all and all(v is not False for v in per_slot.values())
+    return 0 if ok_all else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# hal/__init__.py
+"""
+Hardware abstraction layer.
+
+    from hal import get_backend
+    gpio = get_backend().gpio()
+
+Backend is picked ONCE, at first use:
+    ATP_HAL=real   (default) Raspberry Pi fixture: lgpio / spidev / socketcan / pyserial / brainstem
+    ATP_HAL=sim    in-process simulated fixture (hal/sim.py), runs anywhere
+    ATP_HAL=vsim   same, on a virtual clock (hal/clock.py): all waits are free
+
+or explicitly, before any gate touches hardware:
+    hal.select_backend("sim")
+"""
+
+import os
+import threading
+from typing import Optional
+
+from . import clock
+from .base import Gpio, HalBackend, SpiDevice, UsbcMux
+
+HAL_ENV = "ATP_HAL"
+
+_backend: Optional[HalBackend] = None
+_lock = threading.Lock()
+
+
+def _create(name: str, **kw) -> HalBackend:
+    name = (name or "real").strip().lower()
+    if name == "real":
+        from .real import RealBackend
+        return RealBackend(**kw)
+    if name in ("sim", "vsim"):
+        from .sim import SimBackend
+        if name == "vsim":
+            kw.setdefault("virtual_time", True)
+        return SimBackend(**kw)
+    raise ValueError(f"Unknown HAL backend '{name}' (expected real|sim|vsim)")
+
+
+def select_backend(name_or_backend, shutdown_previous: bool = True, **kw) -> HalBackend:
+    """
+    Install the backend (name "real"/"sim"/"vsim" or a HalBackend instance).
+    Replaces (and shuts down, unless shutdown_previous=False, e.g. when the
+    new backend wraps the old one) any previous one.
+    """
+    global _backend
+    with _lock:
+        old = _backend
+        if isinstance(name_or_backend, HalBackend):
+            _backend = name_or_backend
+        else:
+            _backend = _create(name_or_backend, **kw)
+    if shutdown_previous and old is not None and old is not _backend:
+        try:
+            old.shutdown()
+        except Exception:
+            pass
+    print(f"[HAL] Backend: {_backend.name}")
+    return _backend
+
+
+def get_backend() -> HalBackend:
+    if _backend is None:
+        select_backend(os.environ.get(HAL_ENV, "real"))
+    return _backend
+
+
+def is_sim() -> bool:
+    return get_backend().name == "sim"
+
+
+def shutdown() -> None:
+    global _backend
+    with _lock:
+        b, _backend = _backend, None
+    if b is not None:
+        b.shutdown()
+
+
+__all__ = [
+    "clock", "Gpio", "SpiDevice", "UsbcMux", "HalBackend",
+    "select_backend", "get_backend", "is_sim", "shutdown",
+]
@@ -0,0 +1,83 @@
+# hal/base.py
+"""
+HAL interfaces. Gates / services only talk to these, never to spidev, lgpio,
+RPi.GPIO, gpiozero, can, serial or brainstem directly.
+"""
+
+from typing import List, Optional
+
+
+class Gpio:
+    """BCM-numbered GPIO lines (one shared chip handle)."""
+
+    def setup_input(self, pin: int) -> None:
+        raise NotImplementedError
+
+    def setup_output(self, pin: int, level: int = 0) -> None:
+        raise NotImplementedError
+
+    def read(self, pin: int) -> int:
+        raise NotImplementedError
+
+    def write(self, pin: int, level: int) -> None:
+        raise NotImplementedError
+
+    def free(self, pin: int) -> None:
+        """Release one line (it goes back to input)."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release every line (call once when the app exits)."""
+        raise NotImplementedError
+
+
+class SpiDevice:
+    """Same surface as spidev.SpiDev (what the gates use of it)."""
+
+    max_speed_hz: int = 0
+    mode: int = 0
+    no_cs: bool = False
+
+    def xfer2(self, data: List[int]) -> List[int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class UsbcMux:
+    """Acroname USB-C switch: route COMMON (PM125) to one RUP port 0..3."""
+
+    def select(self, port: int) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class HalBackend:
+    name = "base"
+
+    def gpio(self) -> Gpio:
+        raise NotImplementedError
+
+    def spi_open(self, bus: int, dev: int, speed_hz: int, mode: int = 0, no_cs: bool = False) -> SpiDevice:
+        raise NotImplementedError
+
+    def open_can(self, channel: str, interface: str, can_filters: Optional[list] = None):
+        """Returns a python-can BusABC. can_filters=[]: TX-only, no frame is received."""
+        raise NotImplementedError
+
+    def open_serial(self, port: str, baudrate: int = 115200, timeout: float = 1.0):
+        """Returns a pyserial-like object (read/write/reset_input_buffer/close/is_open)."""
+        raise NotImplementedError
+
+    def usbc_mux(self) -> UsbcMux:
+        raise NotImplementedError
+
+    def close_gpio(self) -> None:
+        """Release every GPIO line; the next gpio() call opens a fresh handle."""
+        self.gpio().close()
+
+    def shutdown(self) -> None:
+        pass
@@ -0,0 +1,177 @@
+# hal/clock.py
+"""
+Pluggable clock for gates, runners and simulators.
+
+    from hal import clock
+    clock.sleep(SETTLE_S)
+    deadline = clock.time() + TIMEOUT_S
+    t0 = clock.monotonic()
+
+Default: RealClock (time.time / time.monotonic / time.sleep).
+
+VirtualClock (sim backend, virtual_time=True): time only moves when the test
+code waits. sleep(dt) jumps straight to now+dt, running every simulated event
+(RUP replies, BCM periodic frames, ...) that falls due on the way, in order.
+A full 4-slot Quick + Full ATP then replays in well under a second, and runs
+are bit-for-bit deterministic for a given seed.
+
+VirtualClock is single-driver: one thread (the one running the gates) moves
+time. Simulated devices never sleep; they schedule callbacks with call_at().
+"""
+
+import heapq
+import itertools
+import threading
+import time as _time
+from typing import Callable, List, Optional, Tuple
+
+
+class RealClock:
+    name = "real"
+
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            _time.sleep(seconds)
+
+
+class _Timer:
+    __slots__ = ("due", "fn", "cancelled")
+
+    def __init__(self, due: float, fn: Callable[[], None]):
+        self.due = due
+        self.fn = fn
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class VirtualClock(RealClock):
+    name = "virtual"
+
+    def __init__(self, epoch: Optional[float] = None):
+        # time() = epoch + monotonic(); monotonic() starts at 0
+        self.epoch = _time.time() if epoch is None else float(epoch)
+        self._now = 0.0
+        self._events: List[Tuple[float, int, _Timer]] = []
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+
+        # Stats (what a real run would have spent waiting)
+        self.slept_s = 0.0
+        self.events_run = 0
+
+    # -------------------------
+    # READ
+    # -------------------------
+    def time(self) -> float:
+        return self.epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    # -------------------------
+    # SCHEDULE
+    # -------------------------
+    def call_at(self, when: float, fn: Callable[[], None]) -> _Timer:
+        """Run fn when monotonic() reaches `when` (never in the past)."""
+        with self._lock:
+            t = _Timer(max(float(when), self._now), fn)
+            heapq.heappush(self._events, (t.due, next(self._seq), t))
+            return t
+
+    def call_later(self, delay: float, fn: Callable[[], None]) -> _Timer:
+        return self.call_at(self._now + max(0.0, delay), fn)
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            while self._events and self._events[0][2].cancelled:
+                heapq.heappop(self._events)
+            return self._events[0][0] if self._events else None
+
+    # -------------------------
+    # ADVANCE
+    # -------------------------
+    def step(self, limit: float) -> bool:
+        """
+        Run the next event if it is due at or before `limit` (monotonic).
+        Returns True if one ran; otherwise moves time to `limit` and returns False.
+        """
+        with self._lock:
+            due = self.next_due()
+            if due is None or due > limit:
+                if self._now < limit != float("inf"):
+                    self._now = limit
+                return False
+            _, _, t = heapq.heappop(self._events)
+            self._now = max(self._now, t.due)
+        self.events_run += 1
+        t.fn()
+        return True
+
+    def advance_to(self, when: float) -> None:
+        while self.step(when):
+            pass
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            # still let anything due "now" happen (like a real yield)
+            self.advance_to(self._now)
+            return
+        self.slept_s += seconds
+        self.advance_to(self._now + seconds)
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: Optional[float]) -> bool:
+        """
+        Advance event by event until predicate() is true or timeout expires.
+        timeout=None with nothing scheduled would block forever -> RuntimeError.
+        """
+        limit = float("inf") if timeout is None else self._now + max(0.0, timeout)
+        while True:
+            if predicate():
+                return True
+            if self._now >= limit:
+                return False
+            if not self.step(limit) and limit == float("inf"):
+                raise RuntimeError("VirtualClock: blocking wait with no pending events")
+
+
+# =========================================================
+# GLOBAL CLOCK
+# =========================================================
+_clock = RealClock()
+
+
+def get_clock() -> RealClock:
+    return _clock
+
+
+def set_clock(c: RealClock) -> RealClock:
+    global _clock
+    _clock = c
+    return c
+
+
+def is_virtual() -> bool:
+    # by name: wrappers (services.profiler) keep the wrapped clock's name
+    return getattr(_clock, "name", "") == VirtualClock.name
+
+
+# Module-level shortcuts (look the clock up on every call, so set_clock()
+# also affects modules that imported these names)
+def time() -> float:
+    return _clock.time()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def sleep(seconds: float) -> None:
+    _clock.sleep(seconds)
@@ -0,0 +1,213 @@
+# hal/real.py
+"""
+Real Raspberry Pi backend.
+
+Every vendor library is imported lazily, on first use, so the HAL package
+itself imports fine on a dev machine / CI runner.
+
+GPIO: one lgpio chip handle shared by relays (active-low outputs), power
+detect, IUL inputs and the MCP3008 manual CS. gpiozero / RPi.GPIO are no
+longer used by the app (they were different front-ends for the same chip).
+"""
+
+import threading
+from typing import Optional
+
+from . import clock as hal_clock
+from .base import Gpio, HalBackend, SpiDevice, UsbcMux
+
+GPIO_CHIP = 0
+
+
+# =========================================================
+# GPIO (lgpio)
+# =========================================================
+class LgpioGpio(Gpio):
+    def __init__(self, chip: int = GPIO_CHIP):
+        import lgpio
+        self._lg = lgpio
+        self._h = lgpio.gpiochip_open(chip)
+        self._claimed = set()
+        self._lock = threading.Lock()
+
+    def _release(self, pin: int) -> None:
+        if pin in self._claimed:
+            try:
+                self._lg.gpio_free(self._h, pin)
+            except Exception:
+                pass
+            self._claimed.discard(pin)
+
+    def setup_input(self, pin: int) -> None:
+        with self._lock:
+            self._release(pin)
+            self._lg.gpio_claim_input(self._h, pin)
+            self._claimed.add(pin)
+
+    def setup_output(self, pin: int, level: int = 0) -> None:
+        with self._lock:
+            self._release(pin)
+            self._lg.gpio_claim_output(self._h, pin, int(level))
+            self._claimed.add(pin)
+
+    def read(self, pin: int) -> int:
+        return int(self._lg.gpio_read(self._h, pin))
+
+    def write(self, pin: int, level: int) -> None:
+        self._lg.gpio_write(self._h, pin, int(level))
+
+    def free(self, pin: int) -> None:
+        with self._lock:
+            self._release(pin)
+
+    def close(self) -> None:
+        with self._lock:
+            for pin in list(self._claimed):
+                self._release(pin)
+            try:
+                self._lg.gpiochip_close(self._h)
+            except Exception:
+                pass
+
+
+# =========================================================
+# SPI (spidev)
+# =========================================================
+class SpidevDevice(SpiDevice):
+    def __init__(self, bus: int, dev: int, speed_hz: int, mode: int = 0, no_cs: bool = False):
+        import spidev
+        self._spi = spidev.SpiDev()
+        self._spi.open(bus, dev)
+        self._spi.max_speed_hz = speed_hz
+        self._spi.mode = mode
+        if no_cs:
+            self._spi.no_cs = True
+        self.max_speed_hz = speed_hz
+        self.mode = mode
+        self.no_cs = no_cs
+
+    def xfer2(self, data):
+        return self._spi.xfer2(list(data))
+
+    def close(self) -> None:
+        self._spi.close()
+
+
+# =========================================================
+# USB-C MUX (Acroname USBCSwitch via brainstem)
+# =========================================================
+COMMON = 0  # common side index
+
+
+class AcronameMux(UsbcMux):
+    def __init__(self):
+        import brainstem
+        from brainstem.stem import USBCSwitch
+
+        self._sw = USBCSwitch()
+        err = self._sw.discoverAndConnect(brainstem.link.Spec.USB)
+        if err:
+            raise RuntimeError(f"Acroname USBCSwitch connect failed (err={err})")
+
+    def select(self, port: int) -> None:
+        """
+        Safely switch Acroname COMMON to a RUP port (0–3)
+        and enable CC routing for PD.
+        """
+        sw = self._sw
+
+        # 1. Disable VBUS + port on COMMON before switching
+        sw.usb.setPowerDisable(COMMON)
+        sw.usb.setPortDisable(COMMON)
+        hal_clock.sleep(0.05)
+
+        # 2. Disable mux before selecting channel
+        sw.mux.setEnable(False)
+        hal_clock.sleep(0.05)
+
+        # 3. Select the channel (0,1,2,3)
+        sw.mux.setChannel(port)
+        hal_clock.sleep(0.05)
+
+        # 4. Re-enable mux
+        sw.mux.setEnable(True)
+        hal_clock.sleep(0.05)
+
+        # 5. Enable CC routing + passive mode for selected RUP port
+        sw.usb.setPortMode(port, sw.usb.PORT_MODE_PASSIVE)
+        sw.usb.setPortMode(port, sw.usb.PORT_MODE_CC1_ENABLE)
+        sw.usb.setPortMode(port, sw.usb.PORT_MODE_CC2_ENABLE)
+        hal_clock.sleep(0.05)
+
+        # 6. Re-enable VBUS on COMMON
+        sw.usb.setPortEnable(COMMON)
+        sw.usb.setPowerEnable(COMMON)
+        hal_clock.sleep(0.1)
+
+    def close(self) -> None:
+        try:
+            self._sw.disconnect()
+        except Exception:
+            pass
+
+
+# =========================================================
+# BACKEND
+# =========================================================
+class RealBackend(HalBackend):
+    name = "real"
+
+    def __init__(self):
+        self._gpio: Optional[LgpioGpio] = None
+        self._mux: Optional[AcronameMux] = None
+        self._lock = threading.Lock()
+
+    def gpio(self) -> Gpio:
+        with self._lock:
+            if self._gpio is None:
+                self._gpio = LgpioGpio()
+            return self._gpio
+
+    def spi_open(self, bus: int, dev: int, speed_hz: int, mode: int = 0, no_cs: bool = False) -> SpiDevice:
+        return SpidevDevice(bus, dev, speed_hz, mode=mode, no_cs=no_cs)
+
+    def open_can(self, channel: str, interface: str, can_filters=None):
+        import can
+        bus = can.interface.Bus(channel=channel, bustype=interface, can_filters=can_filters)
+        if can_filters is not None and not can_filters and hasattr(bus, "socket"):
+            # python-can reads [] as "accept all": install an empty kernel filter list instead
+            import socket
+            bus.socket.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, b"")
+        return bus
+
+    def open_serial(self, port: str, baudrate: int = 115200, timeout: float = 1.0):
+        import serial
+        return serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            timeout=timeout,
+            bytesize=8,
+            parity=serial.PARITY_NONE,
+            stopbits=1,
+        )
+
+    def usbc_mux(self) -> UsbcMux:
+        with self._lock:
+            if self._mux is None:
+                self._mux = AcronameMux()
+            return self._mux
+
+    def close_gpio(self) -> None:
+        with self._lock:
+            g, self._gpio = self._gpio, None
+        if g is not None:
+            g.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._gpio is not None:
+                self._gpio.close()
+                self._gpio = None
+            if self._mux is not None:
+                self._mux.close()
+                self._mux = None
@@ -0,0 +1,313 @@
+# hal/sim.py
+"""
+In-process simulated fixture (no Pi, no RUPs, no PM125, no Acroname).
+
+Wiring model (same pin numbers as the real fixture):
+- Relays (active-low outputs 22/27/6/13) power the simulated RUPs:
+    relay ON  -> power detect input (21/20/16/12) HIGH, RUP answers on CAN
+    relay OFF -> power detect LOW, RUP dead, ATP mode lost
+- IUL inputs (18/23/24/25) are LOW while the RUP has IUL_ON
+- SPI 0.0 with kernel CS          -> MCP23S17 register model; OLATA/OLATB
+                                     writes become the RUP's idconfig
+- SPI 0.0 no_cs + GPIO5 LOW (CS)  -> MCP3008; CH0 follows the number of
+                                     terminations ON (Gate3 LOW/HIGH windows)
+- CAN  -> python-can virtual bus + sim.rup_sim.RupSimulator
+- Serial -> sim.pm125_emu.PM125Emulator on a pty; the PM125 load is fed to
+            the RUP currently selected on the USB-C mux (POWER_REPORT)
+
+virtual_time=True (ATP_HAL=vsim): installs hal.clock.VirtualClock. CAN moves
+to sim.vcan (no threads, recv advances the clock), the PM125 is wired
+in-process (PM125SerialLoopback) and every sleep in the gates is free.
+"""
+
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+from . import clock as hal_clock
+from .base import Gpio, HalBackend, SpiDevice, UsbcMux
+
+SIM_CAN_CHANNEL = "atp_sim"
+
+# Same wiring as tests/power_PT/*_1_4.py and tests/gate4_iul_check.py
+RELAY_GPIO = {1: 22, 2: 27, 3: 6, 4: 13}
+POWER_GPIO = {1: 21, 2: 20, 3: 16, 4: 12}
+IUL_GPIO = {1: 18, 2: 23, 3: 24, 4: 25}
+ADC_CS_GPIO = 5
+
+# MCP23S17 (tests/ID/id_pins_init.py)
+OPCODE_WRITE = 0x40
+OPCODE_READ = 0x41
+GPIOA, GPIOB, OLATA, OLATB = 0x12, 0x13, 0x14, 0x15
+ID_SLOT_PINS = {
+    1: (OLATA, (0, 1, 2)),
+    2: (OLATA, (3, 4, 5)),
+    3: (OLATB, (0, 1, 2)),
+    4: (OLATB, (3, 4, 5)),
+}
+
+# MCP3008 CH0 (bus termination sense), volts
+ADC_VREF = 5.0
+ADC_V_BY_TERMINATIONS = {0: 4.40, 1: 3.90, 2: 3.60}
+ADC_V_MANY = 3.20
+ADC_NOISE_V = 0.01
+
+
+# =========================================================
+# GPIO
+# =========================================================
+class SimGpio(Gpio):
+    """
+    Output levels are stored; input levels come from providers
+    (pin -> callable returning 0/1), else the last written level, else 1.
+    """
+
+    def __init__(self):
+        self.levels: Dict[int, int] = {}
+        self.inputs: Dict[int, Callable[[], int]] = {}
+        self.on_write: Optional[Callable[[int, int], None]] = None
+        self._lock = threading.Lock()
+
+    def setup_input(self, pin: int) -> None:
+        pass
+
+    def setup_output(self, pin: int, level: int = 0) -> None:
+        self.write(pin, level)
+
+    def read(self, pin: int) -> int:
+        fn = self.inputs.get(pin)
+        if fn is not None:
+            return 1 if fn() else 0
+        return self.levels.get(pin, 1)
+
+    def write(self, pin: int, level: int) -> None:
+        with self._lock:
+            self.levels[pin] = 1 if level else 0
+        if self.on_write:
+            self.on_write(pin, self.levels[pin])
+
+    def free(self, pin: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# =========================================================
+# SPI
+# =========================================================
+class SimMcp23s17:
+    def __init__(self, on_olat: Callable[[int, int], None]):
+        self.regs = bytearray(0x16)
+        self.regs[0x00] = 0xFF  # IODIRA reset: all inputs
+        self.regs[0x01] = 0xFF
+        self._on_olat = on_olat
+
+    def xfer(self, data):
+        if len(data) < 3:
+            return [0] * len(data)
+        op, reg, val = data[0], data[1] % len(self.regs), data[2]
+        if op == OPCODE_WRITE:
+            self.regs[reg] = val & 0xFF
+            if reg in (OLATA, OLATB):
+                self._on_olat(reg, val & 0xFF)
+            return [0, 0, 0]
+        if op == OPCODE_READ:
+            if reg in (GPIOA, GPIOB):
+                return [0, 0, self.regs[reg + 2]]  # outputs read back their latch
+            return [0, 0, self.regs[reg]]
+        return [0, 0, 0]
+
+
+class SimMcp3008:
+    def __init__(self, volts_fn: Callable[[int], float], seed: int = 0):
+        self._volts = volts_fn
+        self._rng = random.Random(seed)
+
+    def xfer(self, data):
+        if len(data) < 3 or data[0] != 1:
+            return [0] * len(data)
+        ch = (data[1] >> 4) & 0x07
+        v = self._volts(ch) + self._rng.gauss(0.0, ADC_NOISE_V)
+        raw = max(0, min(1023, int(round(v * 1023 / ADC_VREF))))
+        return [0, (raw >> 8) & 0x03, raw & 0xFF]
+
+
+class SimSpi(SpiDevice):
+    """SPI 0.0: kernel CS -> MCP23S17, manual CS (GPIO5 LOW) -> MCP3008."""
+
+    def __init__(self, backend: "SimBackend", speed_hz: int, mode: int, no_cs: bool):
+        self._b = backend
+        self.max_speed_hz = speed_hz
+        self.mode = mode
+        self.no_cs = no_cs
+
+    def xfer2(self, data):
+        data = list(data)
+        if not self.no_cs:
+            return self._b.mcp23s17.xfer(data)
+        if self._b.gpio_sim.levels.get(ADC_CS_GPIO, 1) == 0:
+            return self._b.mcp3008.xfer(data)
+        return [0] * len(data)  # nothing selected
+
+    def close(self) -> None:
+        pass
+
+
+# =========================================================
+# USB-C MUX
+# =========================================================
+class SimMux(UsbcMux):
+    def __init__(self):
+        self.port: Optional[int] = None
+        self.switch_count = 0
+
+    def select(self, port: int) -> None:
+        if port not in (0, 1, 2, 3):
+            raise ValueError(f"Invalid mux port: {port}")
+        self.port = port
+        self.switch_count += 1
+
+
+# =========================================================
+# BACKEND
+# =========================================================
+class SimBackend(HalBackend):
+    name = "sim"
+
+    def __init__(self, latency_s: float = 0.002, jitter_s: float = 0.0, seed: int = 0,
+                 pm125_kw: Optional[dict] = None, virtual_time: bool = False):
+        from sim.rup_sim import RupSimulator
+
+        self.gpio_sim = SimGpio()
+        self.gpio_sim.on_write = self._on_gpio_write
+        for slot, pin in POWER_GPIO.items():
+            self.gpio_sim.inputs[pin] = (lambda s=slot: 1 if self.powered(s) else 0)
+        for slot, pin in IUL_GPIO.items():
+            self.gpio_sim.inputs[pin] = (lambda s=slot: 0 if self.rups.rup(s).iul else 1)
+
+        self.mcp23s17 = SimMcp23s17(self._on_olat)
+        self.mcp3008 = SimMcp3008(self._adc_volts, seed=seed)
+        self.mux = SimMux()
+
+        self.virtual_time = virtual_time
+        self.clock = None
+        self.can_net = None
+        sim_kw = {}
+        if virtual_time:
+            from sim.vcan import VirtualCanNetwork
+
+            self.clock = hal_clock.set_clock(hal_clock.VirtualClock())
+            self.can_net = VirtualCanNetwork(self.clock)
+            sim_kw = dict(bus=self.can_net.bus(), clock=self.clock.monotonic, call_at=self.clock.call_at)
+
+        # RUPs start unpowered (relays OFF)
+        self.rups = RupSimulator.default_fixture(
+            latency_s=latency_s, jitter_s=jitter_s,
+            interface="virtual", channel=SIM_CAN_CHANNEL, seed=seed, **sim_kw,
+        )
+        if self.can_net is not None:
+            self.can_net.add_listener(self.rups.on_frame)
+        for r in self.rups.rups.values():
+            r.alive = False
+
+        self._pm125_kw = dict(pm125_kw or {})
+        self._pm125 = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # fixture state
+    # -------------------------
+    def powered(self, slot: int) -> bool:
+        # Relays are active-low; unclaimed pin reads as HIGH (OFF)
+        return self.gpio_sim.levels.get(RELAY_GPIO[slot], 1) == 0
+
+    def _on_gpio_write(self, pin: int, level: int) -> None:
+        for slot, relay_pin in RELAY_GPIO.items():
+            if pin == relay_pin:
+                rup = self.rups.rup(slot)
+                on = (level == 0)
+                if rup.alive and not on:
+                    rup.atp_mode = False
+                rup.alive = on
+
+    def _on_olat(self, reg: int, val: int) -> None:
+        for slot, (olat, pins) in ID_SLOT_PINS.items():
+            if olat != reg:
+                continue
+            p1, p2, p3 = pins  # (ID1, ID2, ID3)
+            self.rups.rup(slot).idconfig = (
+                (((val >> p1) & 1) << 2) | (((val >> p2) & 1) << 1) | ((val >> p3) & 1)
+            )
+
+    def _adc_volts(self, ch: int) -> float:
+        if ch != 0:
+            return 0.0
+        n = sum(1 for r in self.rups.rups.values() if r.alive and r.termination)
+        return ADC_V_BY_TERMINATIONS.get(n, ADC_V_MANY)
+
+    def _on_pm125_load(self, watts: float) -> None:
+        if self.mux.port is None:
+            return
+        slot = self.mux.port + 1
+        for r in self.rups.rups.values():
+            r.load_w = watts if r.slot == slot else 0.0
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if not self._started:
+                self.rups.start()
+                self._started = True
+
+    # -------------------------
+    # HAL API
+    # -------------------------
+    def gpio(self) -> Gpio:
+        return self.gpio_sim
+
+    def spi_open(self, bus: int, dev: int, speed_hz: int, mode: int = 0, no_cs: bool = False) -> SpiDevice:
+        if (bus, dev) != (0, 0):
+            raise FileNotFoundError(f"No simulated SPI device {bus}.{dev}")
+        return SimSpi(self, speed_hz, mode, no_cs)
+
+    def open_can(self, channel: str, interface: str, can_filters=None):
+        import can
+        self._ensure_started()
+        if self.can_net is not None:
+            return self.can_net.bus(can_filters=can_filters)
+        # channel / interface of the real fixture are ignored: everything
+        # lives on the in-process virtual channel with the RUP simulator
+        return can.interface.Bus(channel=SIM_CAN_CHANNEL, interface="virtual", can_filters=can_filters)
+
+    def open_serial(self, port: str, baudrate: int = 115200, timeout: float = 1.0):
+        from sim.pm125_emu import PM125Emulator, PM125Link, PM125Model, PM125SerialLoopback
+
+        with self._lock:
+            if self._pm125 is None:
+                kw = dict(self._pm125_kw)
+                if self.clock is not None:
+                    kw.setdefault("clock", self.clock.monotonic)
+                model = PM125Model(on_load=self._on_pm125_load, **kw)
+                self._pm125 = PM125Link(model) if self.virtual_time else PM125Emulator(model).start()
+
+        if self.virtual_time:
+            return PM125SerialLoopback(self._pm125, timeout=timeout, on_timeout=self.clock.sleep)
+
+        import serial
+        return serial.Serial(port=self._pm125.port, baudrate=baudrate, timeout=timeout)
+
+    def usbc_mux(self) -> UsbcMux:
+        return self.mux
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._started:
+                self.rups.stop()
+                self._started = False
+            if self._pm125 is not None:
+                if hasattr(self._pm125, "stop"):
+                    self._pm125.stop()
+                self._pm125 = None
+            if self.clock is not None and hal_clock.get_clock() is self.clock:
+                hal_clock.set_clock(hal_clock.RealClock())
@@ -3,26 +3,19 @@
 
 import sys
 import os
-import datetime
+import threading
 import traceback
 
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QInputDialog
+from PyQt5.QtCore import QEvent, QTimer, Qt
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
 
 from ui_atp import Ui_MainWindow
 
-from services.hardware import HardwareController
-from services.reporting import Reporter
+from services import eventlog, fixture_profile, outbox, profiler, scanner, status_api, tracing, watchdog
+from services.engine import ATPEngine
+from tests.CAN.can_recorder import CanRecorder
 
-from runners.quick_runner import QuickRunner
-from runners.full_runner import FullRunner
-
-from tests.gate1_power_passthrough import run_gate1_power_test as run_gate1_power_detect_check
-from tests.gate2_CAN_check import gate2_can_check as run_gate2_id_pins_can_check
-from tests.gate3_TR import run_gate3_all_ordered as run_gate3_all_slots
-from tests.gate4_iul_check import run_gate4_iul_check
-from tests.gate5_ID_check import gate5_id_check as run_gate5_id_config_check
-from tests.gate6_pdo import run_gate6
+from runners.flow_runner import EMPTY, TESTING
 
 SLOTS = (1, 2, 3, 4)
 LOG_DIR = "ATP_logs"
@@ -38,50 +31,70 @@ class MainATP(QMainWindow):
 
         os.makedirs(LOG_DIR, exist_ok=True)
 
-        # ---------- STATE ----------
+        # ---------- STATE (scanned IDs; results live in the engine) ----------
         self.slot_ids = {s: None for s in SLOTS}
         self.slot_inserted = {s: False for s in SLOTS}
-        self.relays_are_on = False
 
-        # gate_results[gate][slot] = True / False / None
-        self.gate_results = {g: {s: None for s in SLOTS} for g in (1, 2, 3, 4, 5, 6)}
+        # ---------- LOG (eventlog writer thread -> log_box; the engine adds the console) ----------
+        eventlog.subscribe(self._on_log_events)
 
-        # ---------- HARDWARE ----------
-        self.hw = HardwareController(log_cb=self.log)
+        # ---------- WATCHDOG / PROFILER / TRACE (ATP_WATCHDOG, ATP_PROFILE=1 / ATP_TRACE=1, must wrap the HAL first) ----------
+        watchdog.enable_from_env()
+        profiler.enable_from_env()
+        tracing.enable_from_env()
 
-        # ---------- REPORTER ----------
-        self.reporter = self._make_reporter()
+        # ---------- FIXTURE PROFILE (ATP_FIXTURE_PROFILE=safe/fast/characterize/<file>) ----------
+        fixture_profile.load_from_env(self.log)
 
-        # ---------- RUNNERS (exact signatures) ----------
-        self.quick = QuickRunner(
-            hw=self.hw,
-            log_cb=self.log,
-            gate1_fn=run_gate1_power_detect_check,
-            gate2_fn=run_gate2_id_pins_can_check,
-            on_update=self.on_quick_update,
-        )
+        # ---------- STATUS API (ATP_STATUS_HTTP=0.0.0.0:8765, line dashboard) ----------
+        status_api.start_from_env(self.log)
 
-        self.full = FullRunner(
-            log_cb=self.log,
-            on_update=self.on_full_update,
-            run_gate3_all_fn=run_gate3_all_slots,
-            run_gate4_bool_fn=run_gate4_iul_check,
-            run_gate5_bool_fn=run_gate5_id_config_check,
-            run_gate6_bool_fn=run_gate6,
-            slots=list(SLOTS),
-        )
+        # ---------- OUTBOX (ATP_COLLECTOR_URL=http://collector:8780, sessions -> central store) ----------
+        outbox.start_from_env(LOG_DIR, self.log)
+
+        # ---------- ENGINE (hardware, reporter, runners, results, history, report) ----------
+        self.engine = ATPEngine(logs_dir=LOG_DIR, on_update=self.on_engine_update)
+        self.hw = self.engine.hw
+        self.reporter = self.engine.reporter
+
+        # ---------- CAN RECORDER (always-on, TX + RX) ----------
+        self.can_rec = CanRecorder(LOG_DIR, log_cb=self.log)
+        try:
+            self.can_rec.start()
+        except Exception as e:
+            self.log(f"[CANREC][WARN] Recorder not started: {e}")
+
+        # Continuous flow: engine.flow (per-slot lifecycle) on a worker thread
+        self.flow = self.engine.flow
+        self.flow_stop = threading.Event()
+        self.flow_thread = None
+
+        # Quick Test / Full ATP: engine.run_quick / run_full on a worker thread, finished from tick()
+        self.batch_thread = None
+        self.batch_phase = None
+        self.stop_requested = False              # STOP while the worker runs: no report, relays OFF at its end
+
+        # ---------- SCANNER (ATP_SCANNER=/dev/input/eventN|stdin|..., + keyboard wedge into this window) ----------
+        self.scans = scanner.open_from_env(self.log)
+        self.wedge = scanner.KeyWedge()
+        self.flow_router = scanner.flow_router(self.flow, self.log)
+        self.setup_router = None                 # batch: set while Start ATP waits for scans
+        QApplication.instance().installEventFilter(self)
 
         # ---------- UI CONNECTIONS (MATCH ui_atp.py NAMES) ----------
         self.ui.btn_start.clicked.connect(self.on_start_setup_clicked)
         self.ui.btn_quick.clicked.connect(self.on_quick_clicked)
         self.ui.btn_full.clicked.connect(self.on_full_clicked)
         self.ui.btn_stop.clicked.connect(self.on_stop_clicked)
+        self.ui.btn_flow.toggled.connect(self.on_flow_toggled)
+        for s, w in zip(SLOTS, self.ui.slots):
+            w.btn_load.clicked.connect(lambda _=False, s=s: self.on_slot_load_clicked(s))
 
         # Optional: disable until setup
         self.ui.btn_quick.setEnabled(False)
         self.ui.btn_full.setEnabled(False)
 
-        # ---------- TIMER for QuickRunner stepping ----------
+        # ---------- TIMER: scans, flow buttons, batch worker end ----------
         self.timer = QTimer(self)
         self.timer.setInterval(60)  # ms
         self.timer.timeout.connect(self.tick)
@@ -90,232 +103,307 @@ class MainATP(QMainWindow):
         # ---------- STARTUP ----------
         self.log("=== ATP START ===")
 
-        try:
-            if hasattr(self.hw, "init_id_pins_startup_all_slots"):
-                self.hw.init_id_pins_startup_all_slots()
-            elif hasattr(self.hw, "init_id_pins_all_slots"):
-                self.hw.init_id_pins_all_slots()
-        except Exception as e:
-            self.log(f"[HW][WARN] ID pin init failed: {e}")
-
-        try:
-            self.hw.select_slot(1)
-        except Exception:
-            pass
-
-    # =========================================================
-    # REPORTER
-    # =========================================================
-    def _make_reporter(self):
-        try:
-            return Reporter(LOG_DIR, log_cb=self.log)
-        except TypeError:
-            pass
-        try:
-            return Reporter(LOG_DIR)
-        except TypeError:
-            pass
-        try:
-            return Reporter(log_cb=self.log)
-        except TypeError:
-            pass
-        return Reporter()
-
     # =========================================================
     # LOG
     # =========================================================
     def log(self, msg: str):
-        ts = datetime.datetime.now().strftime("[%H:%M:%S]")
-        line = f"{ts} {msg}"
-        print(line)
-        try:
-            self.ui.log_box.append(line)  # ✅ matches ui_atp.py
-        except Exception:
-            pass
+        eventlog.log(msg)   # console + session files + log_box, off this thread
+
+    def _on_log_events(self, events):
+        # eventlog writer thread: LogView.post() only queues, its own timer renders
+        self.ui.log_box.post((e.text, e.slot, e.level) for e in events)
 
     # =========================================================
     # SETUP
     # =========================================================
     def on_start_setup_clicked(self):
+        """Scan (or type + Enter) one RUP ID per slot; the 4th scan starts the Quick Test."""
         self.log("[UI] Guided Setup START")
 
         for s in SLOTS:
-            rid, ok = QInputDialog.getText(self, "RUP ID", f"Enter RUP ID for Slot {s}:")
-            if not ok or not rid.strip():
-                QMessageBox.warning(self, "Setup", f"Missing ID for Slot {s}")
-                return
+            self.slot_ids[s] = None
+            self.slot_inserted[s] = False
+            self.ui.slot_store.post(s, rup_id="", status="Scan RUP ID", led="gray")
+
+        self.setup_router = scanner.ScanRouter(
+            SLOTS,
+            is_free=lambda s: self.slot_ids[s] is None,
+            serial_in_use=lambda sn: sn in self.slot_ids.values(),
+            on_serial=self._on_setup_scan,
+            log=self.log,
+        )
+        self.ui.btn_quick.setEnabled(False)
+        self.ui.btn_full.setEnabled(False)
+        self.log("[SETUP] Scan the RUP ID of each slot (scan a slot label first to pick the slot)")
 
-            self.slot_ids[s] = rid.strip()
-            self.slot_inserted[s] = True  # your UI asks insertion confirm before; you can re-add if you want
+    def _on_setup_scan(self, s: int, rid: str):
+        self.slot_ids[s] = rid
+        self.slot_inserted[s] = True
 
-            # Update slot widget title
-            try:
-                self.ui.slots[s - 1].set_rup_id(rid.strip())
-                self.ui.slots[s - 1].set_status("Ready")
-                self.ui.slots[s - 1].set_led("yellow")
-            except Exception:
-                pass
+        # Update slot widget title (applied on the next UI frame)
+        self.ui.slot_store.post(s, rup_id=rid, status="Ready", led="yellow")
+        self.log(f"[SETUP] Slot{s} ID = {rid}")
 
-            self.log(f"[SETUP] Slot{s} ID = {rid.strip()}")
+        if any(v is None for v in self.slot_ids.values()):
+            return
+        self.setup_router = None
+
+        self._open_session()
 
         self.ui.btn_quick.setEnabled(True)
         self.ui.btn_full.setEnabled(True)
 
         self.log("[UI] Setup COMPLETE")
+        self.on_quick_clicked()
 
-    # =========================================================
-    # QUICK TEST
-    # =========================================================
-    def on_quick_clicked(self):
-        if not all(self.slot_inserted.values()):
-            QMessageBox.warning(self, "Quick Test", "Run Start ATP first.")
+    def _open_session(self):
+        """Engine session (results, retest plan, trace, history); the CAN capture shares its ATP_<ids>_<ts> name."""
+        self.engine.set_retest(self.ui.btn_retest.isChecked())
+        self.engine.setup(self.slot_ids)
+        if not self.reporter.session_basename():
             return
 
-        self.log("[UI] Quick Test START")
         try:
-            self.quick.start()
+            path = self.can_rec.new_capture(self.reporter.session_basename())
+            self.reporter.link_can_capture(path)
         except Exception as e:
-            self.log(f"[QUICK][ERROR] {e}")
-            self.log(traceback.format_exc())
+            self.log(f"[CANREC][WARN] Capture not linked: {e}")
 
     # =========================================================
-    # FULL TEST
+    # QUICK TEST / FULL TEST (engine on a worker thread, finished from tick)
     # =========================================================
+    def on_quick_clicked(self):
+        if not all(self.slot_inserted.values()):
+            QMessageBox.warning(self, "Quick Test", "Run Start ATP first.")
+            return
+        self._start_batch("quick")
+
     def on_full_clicked(self):
         if not all(self.slot_inserted.values()):
             QMessageBox.warning(self, "Full ATP", "Run Start ATP first.")
             return
+        self._start_batch("full")
+
+    def _start_batch(self, phase: str):
+        if self.batch_thread is not None or self.flow_thread is not None:
+            return
 
-        self.log("[UI] Full ATP START")
+        self.log(f"[UI] {'Quick Test' if phase == 'quick' else 'Full ATP'} START")
+        for b in (self.ui.btn_start, self.ui.btn_quick, self.ui.btn_full, self.ui.btn_flow):
+            b.setEnabled(False)
 
-        # Power ON only if needed
+        # The runners are synchronous: run them off the GUI thread so the log
+        # view and slot widgets keep rendering; tick() picks up the end
+        self.batch_phase = phase
+        self.stop_requested = False
+        self.batch_thread = threading.Thread(target=self._batch_worker, args=(phase,),
+                                             name=f"atp-{phase}", daemon=True)
+        self.batch_thread.start()
+
+    def _batch_worker(self, phase: str):
         try:
-            if not self.relays_are_on:
-                self.log("[FULL] Powering ON relays once")
-                if hasattr(self.hw, "power_on_all_relays_and_check"):
-                    self.relays_are_on = bool(self.hw.power_on_all_relays_and_check())
-                elif hasattr(self.hw, "power_on_all_rups"):
-                    self.relays_are_on = bool(self.hw.power_on_all_rups())
+            if phase == "quick":
+                self.engine.run_quick()
+            else:
+                self.engine.run_full()
         except Exception as e:
-            self.log(f"[FULL][WARN] Relay ON failed: {e}")
+            self.log(f"[{phase.upper()}][ERROR] {e}")
+            self.log(traceback.format_exc())
 
-        # FullRunner is synchronous
+    def _finish_batch(self):
+        """GUI thread (tick): the Quick Test / Full ATP worker has ended."""
+        phase = self.batch_phase
+        self.batch_thread = None
+        self.batch_phase = None
+        for b in (self.ui.btn_start, self.ui.btn_quick, self.ui.btn_full, self.ui.btn_flow):
+            b.setEnabled(True)
+        if self.stop_requested:
+            self.stop_requested = False
+            self.shutdown("User stopped")
+            QMessageBox.information(self, "ATP", "Stopped.")
+            return
+        if phase != "full":
+            return
         try:
-            results = self.full.run()
-            for gate in (3, 4, 5, 6):
-                for s in SLOTS:
-                    self.gate_results[gate][s] = bool(results.get(gate, {}).get(s, False))
-
-            self.log("[UI] Full ATP COMPLETE")
             self.on_atp_complete()
         except Exception as e:
             self.log(f"[FULL][ERROR] {e}")
             self.log(traceback.format_exc())
 
+    # =========================================================
+    # CONTINUOUS FLOW (per-slot load -> test -> report -> unload)
+    # =========================================================
+    def on_flow_toggled(self, on: bool):
+        if on:
+            if self.flow_thread is not None or self.batch_thread is not None:
+                self.ui.btn_flow.setChecked(False)
+                return
+            self.log("[UI] Continuous flow START")
+            self.setup_router = None             # scans now load flow slots
+            self.flow_router.indicate(None)
+            self.engine.set_retest(self.ui.btn_retest.isChecked())
+            self.engine.start_flow()
+            try:
+                path = self.can_rec.new_capture(self.reporter.session_basename())
+                self.reporter.link_can_capture(path)
+            except Exception as e:
+                self.log(f"[CANREC][WARN] Capture not linked: {e}")
+            self.flow_stop.clear()
+            self.flow_thread = threading.Thread(target=self._flow_worker, name="atp-flow", daemon=True)
+            self.flow_thread.start()
+        else:
+            self.log("[UI] Continuous flow STOP (after the running step)")
+            self.flow_stop.set()
+        for w in self.ui.slots:
+            w.btn_load.setVisible(True)
+        for b in (self.ui.btn_start, self.ui.btn_quick, self.ui.btn_full):
+            b.setEnabled(False)
+
+    def _flow_worker(self):
+        # each finished unit: engine._unit_done (results cache, history, .xlsx, outbox)
+        try:
+            self.engine.run_flow(self.flow_stop)
+        except Exception as e:
+            self.log(f"[FLOW][ERROR] {e}")
+            self.log(traceback.format_exc())
+        finally:
+            self.engine.stop_flow()
+
+    def on_slot_load_clicked(self, s: int):
+        state = self.flow.state(s)
+        if state == EMPTY:
+            # the next scan goes to this slot (same as scanning its slot label)
+            self.flow_router.indicate(s)
+            self.ui.slot_store.post(s, status="Scan RUP ID", led="yellow")
+            return
+        if state == TESTING:
+            if QMessageBox.question(self, "Abort", f"Abort Slot {s}? The unit is not recorded.") \
+                    != QMessageBox.Yes:
+                return
+        self.flow.unload(s)
+
+    # =========================================================
+    # SCANNER (scans are routed on the UI thread, from tick)
+    # =========================================================
+    def eventFilter(self, obj, event):
+        # Keyboard-wedge scanner / typed ID + Enter. Only the first delivery
+        # (focus widget, or this window) counts, not the propagation to parents.
+        if event.type() != QEvent.KeyPress or QApplication.activeModalWidget() is not None:
+            return False
+        if obj is not (QApplication.focusWidget() or self):
+            return False
+        if self.setup_router is None and self.flow_thread is None:
+            return False
+        if event.modifiers() & (Qt.ControlModifier | Qt.AltModifier):
+            return False
+        ch = "\n" if event.key() in (Qt.Key_Return, Qt.Key_Enter) else event.text()
+        if not ch:
+            return False
+        text = self.wedge.feed(ch)
+        if text:
+            self.scans.push(text)
+        return True
+
+    def _drain_scans(self):
+        for text in self.scans.poll():
+            if self.flow_thread is not None:
+                hit = self.flow_router.feed(text)
+                if hit:
+                    self.ui.slot_store.post(hit[0], rup_id=hit[1])
+            elif self.setup_router is not None:
+                self.setup_router.feed(text)
+            else:
+                self.log(f"[SCAN][WARN] '{text}' ignored: press Start ATP or Continuous Flow first")
+
+    def _refresh_flow_buttons(self):
+        labels = {EMPTY: "Load", TESTING: "Abort"}
+        for s, w in zip(SLOTS, self.ui.slots):
+            text = labels.get(self.flow.state(s), "Unload")
+            if w.btn_load.text() != text:
+                w.btn_load.setText(text)
+        if self.flow_thread is not None and not self.flow_thread.is_alive():
+            self.flow_thread = None
+            for w in self.ui.slots:
+                w.btn_load.setVisible(False)
+            self.ui.btn_start.setEnabled(True)
+            self.log("[UI] Continuous flow ended (run Start ATP for a batch)")
+
     # =========================================================
     # STOP
     # =========================================================
     def on_stop_clicked(self):
         self.log("[UI] STOP clicked")
+        if self.flow_thread is not None:
+            self.ui.btn_flow.setChecked(False)   # flow worker relays OFF after its running step
+            return
+        if self.batch_thread is not None:
+            self.stop_requested = True
+            self.log("[UI] Test is running: relays go OFF when it ends, no report")
+            return
         self.shutdown("User stopped")
         QMessageBox.information(self, "ATP", "Stopped.")
 
     # =========================================================
-    # TICK: advance QuickRunner
+    # TICK: scans, flow buttons, batch worker end
     # =========================================================
     def tick(self):
-        try:
-            if getattr(self.quick, "active", False) and not getattr(self.quick, "done", False):
-                done = bool(self.quick.step())
-                if done:
-                    for s in SLOTS:
-                        self.gate_results[1][s] = bool(self.quick.results[1].get(s, False))
-                        self.gate_results[2][s] = bool(self.quick.results[2].get(s, False))
-                    self.relays_are_on = True
-                    self.log("[UI] Quick Test COMPLETE")
-        except Exception as e:
-            self.log(f"[QUICK][ERROR] {e}")
-            self.log(traceback.format_exc())
+        self._drain_scans()
+        if self.flow_thread is not None:
+            self._refresh_flow_buttons()
+        if self.batch_thread is not None and not self.batch_thread.is_alive():
+            self._finish_batch()
 
     # =========================================================
-    # RUNNER CALLBACKS -> update UI SlotWidgets
+    # ENGINE CALLBACK -> update UI SlotWidgets
     # =========================================================
-    def on_quick_update(self, upd):
-        # upd: slot, gate, status, led
-        s = getattr(upd, "slot", None)
-        g = getattr(upd, "gate", None)
-        st = getattr(upd, "status", "")
-        led = getattr(upd, "led", None)
-
-        if s in SLOTS:
-            try:
-                w = self.ui.slots[s - 1]
-                w.set_gate(g if g else 0)
-                w.set_status(st)
-                if led:
-                    w.set_led(led)
-            except Exception:
-                pass
-
-        if g in (1, 2) and s in SLOTS and st in ("PASS", "FAIL"):
-            self.gate_results[g][s] = (st == "PASS")
-
-    def on_full_update(self, upd):
-        # upd: gate, slot, status, led
+    def on_engine_update(self, upd):
+        # worker thread; the engine already took the result + published it.
+        # Coalesced: only the latest state per slot is drawn, once per frame
         s = getattr(upd, "slot", None)
         g = getattr(upd, "gate", None)
-        st = getattr(upd, "status", "")
-        led = getattr(upd, "led", None)
-
         if s in SLOTS:
-            try:
-                w = self.ui.slots[s - 1]
-                w.set_gate(g if g else 0)
-                w.set_status(st)
-                if led:
-                    w.set_led(led)
-            except Exception:
-                pass
-
-        if g in (3, 4, 5, 6) and s in SLOTS and st in ("PASS", "FAIL"):
-            self.gate_results[g][s] = (st == "PASS")
+            self.ui.slot_store.post(s, gate=g if g else 0, status=getattr(upd, "status", ""),
+                                    led=getattr(upd, "led", None))
 
     # =========================================================
     # END ATP
     # =========================================================
     def on_atp_complete(self):
-        try:
-            if hasattr(self.reporter, "write_excel"):
-                path = self.reporter.write_excel(slot_ids=self.slot_ids, gate_results=self.gate_results)
-                self.log(f"[FILE] Excel written: {path}")
-        except Exception as e:
-            self.log(f"[FILE][ERROR] {e}")
-
+        # cycle time, profiler, results cache, history, trace -> .xlsx -> relays OFF, session -> outbox
+        self.engine.finish()
+        self.engine.write_report()
         self.shutdown("ATP complete")
 
     def shutdown(self, reason=""):
         self.log(f"[HW] Shutdown ({reason})")
-
         try:
-            if hasattr(self.hw, "power_off_all_relays"):
-                self.hw.power_off_all_relays()
-        except Exception:
-            pass
-
+            self.engine.end_run()
+        except Exception as e:
+            self.log(f"[HW][WARN] {e}")
         try:
-            if hasattr(self.hw, "send_end_atp"):
-                self.hw.send_end_atp()
+            self.hw.close_can_bus_cleanly()
         except Exception:
             pass
 
+    def closeEvent(self, event):
+        if self.batch_thread is not None:
+            # the gate owns the relays / CAN / SPI until it returns: never close hardware under it
+            QMessageBox.warning(self, "ATP", "A test is running. Press STOP and wait for it to end, then close.")
+            event.ignore()
+            return
+        if self.flow_thread is not None:
+            self.flow_stop.set()
+            self.flow_thread.join(timeout=5.0)
+        self.log("[HW] Shutdown (Window closed)")
+        self.engine.shutdown()
         try:
-            if hasattr(self.hw, "close_can_bus_cleanly"):
-                self.hw.close_can_bus_cleanly()
+            self.can_rec.stop()
         except Exception:
             pass
-
-    def closeEvent(self, event):
-        self.shutdown("Window closed")
+        eventlog.unsubscribe(self._on_log_events)
+        status_api.stop()
+        outbox.stop()
+        eventlog.stop()
         event.accept()
 
 
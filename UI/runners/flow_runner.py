@@ -0,0 +1,356 @@
+# runners/flow_runner.py
+"""
+FlowRunner — continuous flow: every slot has its own lifecycle
+
+    EMPTY --load--> TESTING (power, Gate1..Gate6) --> report --> DONE --unload--> EMPTY
+
+Key behavior:
+- load(slot, rup_id) / unload(slot) come from the operator (any thread); the
+  relays are switched by step(), between gates, never under a running gate
+- The fixture (CAN target, PM125 + USB-C mux, ADC, ID pins) is ONE resource:
+  step() runs exactly one step of one slot. A unit waits for the step that
+  is on the fixture right now, never for the rest of a batch
+- Next step: the oldest loaded unit that can run (first in, first out), so
+  units finish, and can be swapped, in the order they were loaded
+- Gate3 is per slot here and needs a keeper: another powered RUP that passed
+  Gate2 (ATP mode) provides the second termination. Without one the slot
+  waits ("Waiting keeper") and the other slots go on. When no other unit
+  can become a keeper (nothing else loaded before Gate2), the wait is
+  bounded: after KEEPER_WAIT_S (fixture time) Gate3 is BLOCKED ("no
+  keeper") and the unit goes on to Gate4 (lone unit, last unit of a shift)
+- A DONE unit stays powered until it is unloaded (it can be a keeper)
+- Unload while TESTING aborts the unit after the current step (not recorded)
+- If a slot fails a gate => it fails for itself only; gates that depend on
+  it (runners/gate_graph.py) are BLOCKED, not run, and the fixture goes
+  to the next unit (ATP_FAIL_FAST=0: every gate runs)
+- Retest: with retest_fn set, load() asks it which gates of this serial
+  have a valid cached PASS (services/results_cache.py); those are not run
+- Watchdog (services/watchdog.py): a gate over its budget is cancelled and
+  recorded TIMEOUT for that unit; the fixture goes on with the next step
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+
+from hal import clock
+from services import history, profiler, tracing, watchdog
+from services.hardware import HardwareController
+from runners import gate_graph
+from runners.gate_graph import KEEPER_PREFERENCE
+from runners.quick_runner import SlotUpdate
+
+EMPTY = "EMPTY"
+TESTING = "TESTING"
+DONE = "DONE"
+
+POWER = 0                       # step before Gate1
+STEPS = (POWER, 1, 2, 3, 4, 5, 6)
+
+IDLE_SLEEP_S = 0.2
+KEEPER_WAIT_S = 60.0            # lone unit at Gate3: time for the operator to load a keeper
+NO_KEEPER = "no keeper"
+
+
+@dataclass
+class SlotLane:
+    slot: int
+    state: str = EMPTY
+    rup_id: Optional[str] = None
+    pos: int = 0                                  # index into STEPS
+    results: Dict[int, Optional[bool]] = field(default_factory=dict)
+    started: float = 0.0                          # clock.time() at load
+    t0: float = 0.0                               # clock.monotonic() at load
+    done_at: float = 0.0                          # clock.monotonic() when DONE
+    units: int = 0                                # units finished in this slot
+    unload_requested: bool = False
+    waiting: str = ""
+    wait_since: float = 0.0                       # clock.monotonic() when the keeper wait started
+    power: Optional[bool] = None                  # relay ON + power detect
+    cached: Dict[int, bool] = field(default_factory=dict)  # retest: gates taken from the cache
+    blocked: Set[int] = field(default_factory=set)  # gates not run (prerequisite failed)
+    timed_out: Set[int] = field(default_factory=set)  # gates cancelled by the watchdog
+
+    @property
+    def gate(self) -> int:
+        return STEPS[self.pos] if self.pos < len(STEPS) else 6
+
+    def blocker(self, gate: int) -> Optional[int]:
+        return gate_graph.blocker(gate, {**self.results, gate_graph.POWER: self.power})
+
+    @property
+    def passed(self) -> bool:
+        return all(v is not False for v in self.results.values())
+
+
+class FlowRunner:
+    def __init__(
+        self,
+        hw: HardwareController,
+        log_cb: Callable[[str], None],
+        on_update: Callable[[SlotUpdate], None],
+
+        # Gate runners (per slot):
+        gate1_fn: Callable[[int], bool],
+        gate2_fn: Callable[[int], bool],
+        gate3_slot_fn: Callable[[int, int, Optional[Callable[[str], None]]], bool],   # (slot, keeper, log)
+        gate4_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
+        gate5_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
+        gate6_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
+
+        # Unit finished (history / report / outbox), called from step()
+        on_unit_done: Optional[Callable[[SlotLane], None]] = None,
+
+        slots: List[int] = None,
+
+        # Retest: rup_id -> {gate: True} to skip, or None (full test); called from load()
+        retest_fn: Optional[Callable[[str], Optional[Dict[int, bool]]]] = None,
+    ):
+        self.hw = hw
+        self.log = log_cb
+        self.on_update = on_update
+        self.gate_fns = {1: gate1_fn, 2: gate2_fn, 4: gate4_fn, 5: gate5_fn, 6: gate6_fn}
+        self.gate3_slot_fn = gate3_slot_fn
+        self.on_unit_done = on_unit_done
+        self.retest_fn = retest_fn
+
+        self.slots = slots or [1, 2, 3, 4]
+        self.lanes: Dict[int, SlotLane] = {s: SlotLane(s) for s in self.slots}
+        self._lock = threading.Lock()
+        self.units_done = 0
+
+    def _set_ui(self, slot: int, gate: int, status: str, led: Optional[str] = None):
+        self.on_update(SlotUpdate(slot=slot, gate=gate, status=status, led=led))
+
+    # =========================================================
+    # OPERATOR (any thread)
+    # =========================================================
+    def load(self, slot: int, rup_id: str) -> None:
+        cached = None
+        if self.retest_fn is not None:
+            try:
+                cached = self.retest_fn(rup_id)
+            except Exception as e:
+                self.log(f"[FLOW][WARN] Slot{slot} retest plan: {e}, full test")
+        with self._lock:
+            lane = self.lanes[slot]
+            if lane.state != EMPTY:
+                raise RuntimeError(f"Slot{slot} is {lane.state}, unload it first")
+            lane.state = TESTING
+            lane.rup_id = rup_id
+            lane.pos = 0
+            lane.results = {g: None for g in STEPS if g}
+            lane.started = clock.time()
+            lane.t0 = clock.monotonic()
+            lane.unload_requested = False
+            lane.waiting = ""
+            lane.power = None
+            lane.blocked = set()
+            lane.timed_out = set()
+            lane.cached = dict(cached or {})
+        self.log(f"[FLOW] Slot{slot} loaded: {rup_id}")
+        self._set_ui(slot, 0, "Loaded (queued)", led="yellow")
+
+    def unload(self, slot: int) -> None:
+        with self._lock:
+            lane = self.lanes[slot]
+            if lane.state != EMPTY:
+                lane.unload_requested = True
+
+    def state(self, slot: int) -> str:
+        with self._lock:
+            return self.lanes[slot].state
+
+    def busy(self) -> bool:
+        with self._lock:
+            return any(l.state == TESTING for l in self.lanes.values())
+
+    # =========================================================
+    # SCHEDULER (one thread)
+    # =========================================================
+    def _keeper_for(self, slot: int) -> Optional[int]:
+        for k in KEEPER_PREFERENCE:
+            lane = self.lanes.get(k)
+            if (k != slot and lane is not None and lane.state in (TESTING, DONE)
+                    and not lane.unload_requested and lane.pos > STEPS.index(2)
+                    and lane.results.get(2) and 2 not in lane.cached):
+                return k
+        return None
+
+    def _keeper_pending(self, slot: int) -> bool:
+        """Another loaded unit that has not reached Gate2 yet and may still pass it."""
+        for lane in self.lanes.values():
+            if (lane.slot != slot and lane.state == TESTING and not lane.unload_requested
+                    and lane.pos <= STEPS.index(2) and lane.power is not False
+                    and lane.results.get(2) is not False and lane.blocker(2) is None):
+                return True
+        return False
+
+    def _needs_keeper(self, lane: SlotLane) -> bool:
+        return (STEPS[lane.pos] == 3 and lane.blocker(3) is None and not lane.cached.get(3)
+                and self._keeper_for(lane.slot) is None)
+
+    def _next(self) -> Optional[SlotLane]:
+        now = clock.monotonic()
+        for lane in sorted(self.lanes.values(), key=lambda l: l.t0):
+            if lane.state != TESTING or lane.unload_requested:
+                continue
+            if self._needs_keeper(lane):
+                if lane.waiting != "keeper":
+                    lane.waiting = "keeper"
+                    lane.wait_since = now
+                    self.log(f"[FLOW] Slot{lane.slot} Gate3 waits for a keeper (another RUP past Gate2)")
+                    self._set_ui(lane.slot, 3, "Waiting keeper", led="yellow")
+                if self._keeper_pending(lane.slot):
+                    lane.wait_since = now          # a keeper is on its way: no deadline yet
+                    continue
+                if now - lane.wait_since < KEEPER_WAIT_S:
+                    continue
+            return lane
+        return None
+
+    def step(self) -> bool:
+        """Run one step (relay switch, gate or report). False = nothing to do."""
+        with self._lock:
+            unloads = [l for l in self.lanes.values() if l.unload_requested]
+        for lane in unloads:
+            self._do_unload(lane)
+        if unloads:
+            return True
+
+        with self._lock:
+            lane = self._next()
+        if lane is None:
+            return False
+
+        lane.waiting = ""
+        g = STEPS[lane.pos]
+        if g == POWER:
+            self._power_on(lane)
+        elif lane.blocker(g) is not None:
+            self._block(lane, g, lane.blocker(g))
+        elif self._needs_keeper(lane):
+            self._no_keeper(lane)
+        elif lane.cached.get(g):
+            lane.results[g] = True
+            self.log(f"[FLOW] Slot{lane.slot} ({lane.rup_id}) Gate{g} PASS (cached)")
+            self._set_ui(lane.slot, g, "PASS (cached)", led="green")
+        else:
+            self._run_gate(lane, g)
+        lane.pos += 1
+        if lane.pos == len(STEPS):
+            self._finish_unit(lane)
+        return True
+
+    def run(self, stop: threading.Event, idle_s: float = IDLE_SLEEP_S) -> None:
+        """Worker loop: step until stop is set (idle: clock.sleep)."""
+        while not stop.is_set():
+            if not self.step():
+                clock.sleep(idle_s)
+
+    # =========================================================
+    # STEPS
+    # =========================================================
+    def _power_on(self, lane: SlotLane) -> None:
+        s = lane.slot
+        self._set_ui(s, 0, "Powering ON...", led="yellow")
+        with profiler.tag("PowerOn", s), tracing.span("PowerOn", cat="gate", slot=s):
+            try:
+                self.hw.relay_on(s)
+                pwr = bool(self.hw.power_present(s))
+            except Exception as e:
+                self.log(f"[HW][FAIL] RUP{s} power ON error: {e}")
+                pwr = False
+        lane.power = pwr
+        if not pwr:
+            self.log(f"[HW][FAIL] RUP{s}: power_detect=False")
+            lane.results[1] = lane.results[2] = False
+            self._set_ui(s, 0, "NO POWER (FAIL)", led="red")
+        else:
+            self.log(f"[HW] RUP{s}: relay ON")
+            self._set_ui(s, 0, "Powered (Ready)", led="yellow")
+
+    def _block(self, lane: SlotLane, g: int, by: int) -> None:
+        lane.results[g] = False
+        lane.blocked.add(g)
+        self.log(f"[FLOW] Slot{lane.slot} ({lane.rup_id}) Gate{g} BLOCKED ({gate_graph.reason(by)})")
+        self._set_ui(lane.slot, g, gate_graph.BLOCKED, led="gray")
+
+    def _no_keeper(self, lane: SlotLane) -> None:
+        lane.results[3] = False
+        lane.blocked.add(3)
+        self.log(f"[FLOW][WARN] Slot{lane.slot} ({lane.rup_id}) Gate3 BLOCKED ({NO_KEEPER}: "
+                 f"no other RUP past Gate2 within {KEEPER_WAIT_S:.0f}s)")
+        self._set_ui(lane.slot, 3, gate_graph.BLOCKED, led="gray")
+
+    def _run_gate(self, lane: SlotLane, g: int) -> None:
+        s = lane.slot
+        self._set_ui(s, g, "Running...", led="yellow")
+        self.log(f"[FLOW] Slot{s} ({lane.rup_id}) Gate{g}")
+        ok = False
+        try:
+            if g in (1, 2):
+                self.hw.select_slot(s)
+            with profiler.tag(g, s), tracing.span(f"Gate{g}", cat="gate", gate=g, slot=s), \
+                    history.gate_run(g, s), watchdog.guard(g, s, self.log):
+                if g == 1:
+                    ok = bool(self.gate_fns[1](s))
+                elif g == 2:
+                    ok = bool(self.gate_fns[2](s))
+                elif g == 3:
+                    ok = bool(self.gate3_slot_fn(s, self._keeper_for(s), self.log))
+                else:
+                    ok = bool(self.gate_fns[g](s, self.log))
+        except watchdog.GateTimeout as e:
+            self.log(f"[FLOW] Slot{s} ({lane.rup_id}) Gate{g} TIMEOUT: {e}")
+            lane.results[g] = False
+            lane.timed_out.add(g)
+            self._set_ui(s, g, watchdog.TIMEOUT, led="red")
+            return
+        except Exception as e:
+            self.log(f"[GATE{g}][ERROR] slot={s}: {e}")
+            ok = False
+
+        if lane.results.get(g) is not False:       # a power failure already failed Gate1/2
+            lane.results[g] = ok
+        ok = bool(lane.results[g])
+        self._set_ui(s, g, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
+
+    def _finish_unit(self, lane: SlotLane) -> None:
+        if self.on_unit_done:
+            try:
+                self.on_unit_done(lane)
+            except Exception as e:
+                self.log(f"[FLOW][ERROR] Slot{lane.slot} report: {e}")
+        with self._lock:
+            lane.state = DONE
+            lane.done_at = clock.monotonic()
+            lane.units += 1
+            self.units_done += 1
+        verdict = "PASS" if lane.passed else "FAIL"
+        self.log(f"[FLOW] Slot{lane.slot} {lane.rup_id} {verdict} in {lane.done_at - lane.t0:.1f}s — unload")
+        self._set_ui(lane.slot, 6, f"{verdict} — unload", led=("green" if lane.passed else "red"))
+
+    def _do_unload(self, lane: SlotLane) -> None:
+        s = lane.slot
+        if lane.state == TESTING:
+            history.drop_unit(s, lane.started)
+            self.log(f"[FLOW][WARN] Slot{s} {lane.rup_id} unloaded at Gate{lane.gate}, unit not recorded")
+        try:
+            self.hw.relay_off(s)
+        except Exception as e:
+            self.log(f"[HW][FAIL] RUP{s} relay OFF error: {e}")
+        with self._lock:
+            lane.state = EMPTY
+            lane.rup_id = None
+            lane.unload_requested = False
+            lane.waiting = ""
+        self.log(f"[FLOW] Slot{s} empty (relay OFF)")
+        self._set_ui(s, 0, "Empty — load next", led="gray")
+
+    def unload_all(self) -> None:
+        """Stop: every slot relay OFF, unfinished units dropped."""
+        for lane in self.lanes.values():
+            if lane.state != EMPTY:
+                lane.unload_requested = True
+                self._do_unload(lane)
@@ -8,11 +8,23 @@ Key behavior:
 - Gate4/5/6 run per-slot (slot1..slot4)
 - If a slot fails a gate => it fails for itself only; keep going for next slots
 - FullRunner does NOT power relays (main_atp decides power policy)
+- Fail-fast (runners/gate_graph.py): gates a slot cannot reach (it failed
+  Gate1 / Gate2) are not run and are recorded BLOCKED; the fixture goes
+  straight to the next slot. If only some slots reach Gate3, each is tested
+  against a live keeper (run_gate3_slot_fn) instead of the one-shot sequence
+- Retest: run(cached={slot: {gate: True}}) takes those gates from the
+  results cache (services/results_cache.py) instead of running them
+- Watchdog (services/watchdog.py): a gate run that overruns its budget is
+  cancelled (stuck serial / CAN handles closed) and recorded TIMEOUT for
+  its slot(s); the next slot / gate goes on
 """
 
 from dataclasses import dataclass
 from typing import Callable, Dict, Optional, Any, List
 
+from services import history, profiler, tracing, watchdog
+from runners import gate_graph
+
 
 @dataclass
 class FullUpdate:
@@ -29,13 +41,17 @@ class FullRunner:
         on_update: Callable[[FullUpdate], None],
 
         # Gate runners:
-        run_gate3_all_fn: Callable[[Optional[Callable[[str], None]]], Dict[int, bool]],
+        # (log, results): fills results {slot: bool} as each slot gets its verdict
+        run_gate3_all_fn: Callable[[Optional[Callable[[str], None]], Dict[int, bool]], Dict[int, bool]],
         run_gate4_bool_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
         run_gate5_bool_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
         run_gate6_bool_fn: Callable[[int, Optional[Callable[[str], None]]], bool],
 
         # Slots:
         slots: List[int] = None,
+
+        # Gate3 for one slot against a keeper (slot, keeper, log), used when some slots are BLOCKED
+        run_gate3_slot_fn: Optional[Callable[[int, int, Optional[Callable[[str], None]]], bool]] = None,
     ):
         self.log = log_cb
         self.on_update = on_update
@@ -44,89 +60,165 @@ class FullRunner:
         self.run_gate4_bool_fn = run_gate4_bool_fn
         self.run_gate5_bool_fn = run_gate5_bool_fn
         self.run_gate6_bool_fn = run_gate6_bool_fn
+        self.run_gate3_slot_fn = run_gate3_slot_fn
 
         self.slots = slots or [1, 2, 3, 4]
 
-        # results[gate][slot] = bool
+        # results[gate][slot] = bool (1 / 2 = Quick Test results, fail-fast input)
         self.results: Dict[int, Dict[int, bool]] = {3: {}, 4: {}, 5: {}, 6: {}}
+        # blocked[gate] = slots not run (prerequisite failed)
+        self.blocked: Dict[int, List[int]] = {3: [], 4: [], 5: [], 6: []}
+        # timed_out[gate] = slots cancelled by the watchdog
+        self.timed_out: Dict[int, List[int]] = {3: [], 4: [], 5: [], 6: []}
+        self.cached: Dict[int, Dict[int, bool]] = {}
 
     def _set_ui(self, gate: int, slot: int, status: str, led: Optional[str] = None):
         self.on_update(FullUpdate(gate=gate, slot=slot, status=status, led=led))
 
-    def run(self) -> Dict[int, Dict[int, bool]]:
+    def _block(self, gate: int, slot: int, why: str) -> None:
+        self.results[gate][slot] = False
+        self.blocked[gate].append(slot)
+        self.log(f"[GATE{gate}] slot={slot} BLOCKED ({why})")
+        self._set_ui(gate, slot, gate_graph.BLOCKED, led="gray")
+
+    def _timeout(self, gate: int, slots: List[int], err: Exception) -> None:
+        for s in slots:
+            self.results[gate][s] = False
+            self.timed_out[gate].append(s)
+            self._set_ui(gate, s, watchdog.TIMEOUT, led="red")
+        self.log(f"[GATE{gate}][TIMEOUT] slot={','.join(map(str, slots))}: {err}")
+
+    def _reachable(self, gate: int) -> List[int]:
         """
-        Runs Gate3..Gate6 gate-by-gate.
-        Returns dict results.
+        Slots that run `gate`; the others are recorded BLOCKED (fail-fast)
+        or PASS (cached, retest).
         """
-        self.log("[FULL] Start: GATE-BY-GATE (Gate3..Gate6) across RUP1..RUP4 (RUPs already powered ON)")
-
-        # --------------------------
-        # GATE 3 (ONE-SHOT, ALL SLOTS)
-        # --------------------------
-        self.log("[FULL] Gate3 START (one-shot sequence for all slots)")
+        out = []
         for s in self.slots:
+            by = gate_graph.blocker(gate, {g: self.results[g].get(s) for g in self.results})
+            if by is not None:
+                self._block(gate, s, gate_graph.reason(by))
+            elif self.cached.get(s, {}).get(gate):
+                self.results[gate][s] = True
+                self.log(f"[GATE{gate}] slot={s} PASS (cached)")
+                self._set_ui(gate, s, "PASS (cached)", led="green")
+            else:
+                out.append(s)
+        return out
+
+    def _keepers(self) -> List[int]:
+        """Slots that went through Gate2 (START_ATP) in this run and passed it."""
+        return [s for s in self.slots if self.results[2].get(s) and not self.cached.get(s, {}).get(2)]
+
+    def _run_gate3(self) -> None:
+        slots = self._reachable(3)
+        if not slots:
+            self.log("[FULL] Gate3 skipped: no slot to test")
+            return
+
+        if len(slots) == len(self.slots) or self.run_gate3_slot_fn is None:
+            self.log("[FULL] Gate3 START (one-shot sequence for all slots)")
+            skipped = [s for s in self.slots if s not in slots]
+            if skipped:
+                # no run_gate3_slot_fn: the sequence cannot leave them out, only their verdicts are dropped
+                self.log(f"[GATE3][WARN] One-shot sequence also drives blocked slots {skipped} "
+                         "(no per-slot Gate3 function); their verdicts are ignored")
+            for s in slots:
+                self._set_ui(3, s, "Running...", led="yellow")
+
+            g3: Dict[int, bool] = {}
+            try:
+                with profiler.tag(3), tracing.span("Gate3", cat="gate", gate=3), history.gate_run(3), \
+                        watchdog.guard(3, None, self.log):
+                    self.run_gate3_all_fn(self.log, g3)  # fills {1:bool,2:bool,3:bool,4:bool}
+            except watchdog.GateTimeout as e:
+                # verdicts already reached stand; only the slots still waiting timed out
+                late = [s for s in slots if s not in g3]
+                if late:
+                    self._timeout(3, late, e)
+                else:
+                    self.log(f"[GATE3][TIMEOUT] after the last verdict: {e}")
+                slots = [s for s in slots if s in g3]
+            except Exception as e:
+                self.log(f"[GATE3][ERROR] {e}")
+                # verdicts reached before the error stand; the rest fail
+                for s in slots:
+                    g3.setdefault(s, False)
+
+            for s in slots:
+                ok = bool(g3.get(s, False))
+                self.results[3][s] = ok
+                self._set_ui(3, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
+            return
+
+        # Blocked slots cannot be keepers (no CAN): each slot against a live one
+        keepers = self._keepers() if any(self.results[2].values()) else slots
+        self.log(f"[FULL] Gate3 START (per slot, keepers from slots {keepers})")
+        for s in slots:
+            keeper = gate_graph.pick_keeper(s, keepers)
+            if keeper is None:
+                self._block(3, s, "no second RUP past Gate2 for the keeper termination")
+                continue
             self._set_ui(3, s, "Running...", led="yellow")
-
-        try:
-            g3 = self.run_gate3_all_fn(self.log)  # expects {1:bool,2:bool,3:bool,4:bool}
-        except Exception as e:
-            self.log(f"[GATE3][ERROR] {e}")
-            g3 = {s: False for s in self.slots}
-
-        for s in self.slots:
-            ok = bool(g3.get(s, False))
+            try:
+                with profiler.tag(3, s), tracing.span("Gate3", cat="gate", gate=3, slot=s), \
+                        history.gate_run(3, s), watchdog.guard(3, s, self.log):
+                    ok = bool(self.run_gate3_slot_fn(s, keeper, self.log))
+            except watchdog.GateTimeout as e:
+                self._timeout(3, [s], e)
+                continue
+            except Exception as e:
+                self.log(f"[GATE3][ERROR] slot={s}: {e}")
+                ok = False
             self.results[3][s] = ok
             self._set_ui(3, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
 
-        self.log("[FULL] Gate3 COMPLETE for all slots ✅")
-
-        # --------------------------
-        # GATE 4 (PER SLOT)
-        # --------------------------
-        self.log("[FULL] Gate4 START (per slot)")
-        for s in self.slots:
-            self._set_ui(4, s, "Running...", led="yellow")
+    def _run_per_slot(self, gate: int, fn: Callable[[int, Optional[Callable[[str], None]]], bool]) -> None:
+        self.log(f"[FULL] Gate{gate} START (per slot)")
+        for s in self._reachable(gate):
+            self._set_ui(gate, s, "Running...", led="yellow")
             try:
-                ok = self.run_gate4_bool_fn(s, self.log)
+                with profiler.tag(gate, s), tracing.span(f"Gate{gate}", cat="gate", gate=gate, slot=s), \
+                        history.gate_run(gate, s), watchdog.guard(gate, s, self.log):
+                    ok = bool(fn(s, self.log))
+            except watchdog.GateTimeout as e:
+                self._timeout(gate, [s], e)
+                continue
             except Exception as e:
-                self.log(f"[GATE4][ERROR] slot={s}: {e}")
+                self.log(f"[GATE{gate}][ERROR] slot={s}: {e}")
                 ok = False
 
-            self.results[4][s] = ok
-            self._set_ui(4, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
-        self.log("[FULL] Gate4 COMPLETE for all slots ✅")
+            self.results[gate][s] = ok
+            self._set_ui(gate, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
+        self.log(f"[FULL] Gate{gate} COMPLETE for all slots ✅")
+
+    def run(self, prior: Optional[Dict[int, Dict[int, Optional[bool]]]] = None,
+            cached: Optional[Dict[int, Dict[int, bool]]] = None) -> Dict[int, Dict[int, bool]]:
+        """
+        Runs Gate3..Gate6 gate-by-gate.
+        prior = Quick Test results {1: {slot: bool}, 2: {slot: bool}} (fail-fast input).
+        cached = retest: {slot: {gate: True}} not run again.
+        Returns dict results.
+        """
+        self.cached = cached or {}
+        self.log("[FULL] Start: GATE-BY-GATE (Gate3..Gate6) across RUP1..RUP4 (RUPs already powered ON)")
+        self.results = {g: dict((prior or {}).get(g) or {}) for g in (1, 2)}
+        self.results.update({3: {}, 4: {}, 5: {}, 6: {}})
+        self.blocked = {g: [] for g in (3, 4, 5, 6)}
+        self.timed_out = {g: [] for g in (3, 4, 5, 6)}
 
         # --------------------------
-        # GATE 5 (PER SLOT)
+        # GATE 3 (ONE-SHOT, ALL SLOTS)
         # --------------------------
-        self.log("[FULL] Gate5 START (per slot)")
-        for s in self.slots:
-            self._set_ui(5, s, "Running...", led="yellow")
-            try:
-                ok = self.run_gate5_bool_fn(s, self.log)
-            except Exception as e:
-                self.log(f"[GATE5][ERROR] slot={s}: {e}")
-                ok = False
-
-            self.results[5][s] = ok
-            self._set_ui(5, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
-        self.log("[FULL] Gate5 COMPLETE for all slots ✅")
+        self._run_gate3()
+        self.log("[FULL] Gate3 COMPLETE for all slots ✅")
 
         # --------------------------
-        # GATE 6 (PER SLOT)
+        # GATE 4 / 5 / 6 (PER SLOT)
         # --------------------------
-        self.log("[FULL] Gate6 START (per slot)")
-        for s in self.slots:
-            self._set_ui(6, s, "Running...", led="yellow")
-            try:
-                ok = self.run_gate6_bool_fn(s, self.log)
-            except Exception as e:
-                self.log(f"[GATE6][ERROR] slot={s}: {e}")
-                ok = False
-
-            self.results[6][s] = ok
-            self._set_ui(6, s, "PASS" if ok else "FAIL", led=("green" if ok else "red"))
-        self.log("[FULL] Gate6 COMPLETE for all slots ✅")
+        self._run_per_slot(4, self.run_gate4_bool_fn)
+        self._run_per_slot(5, self.run_gate5_bool_fn)
+        self._run_per_slot(6, self.run_gate6_bool_fn)
 
         self.log("[FULL] Finished Gate3..Gate6 across all RUPs")
-        return self.results
+        return {g: self.results[g] for g in (3, 4, 5, 6)}
@@ -0,0 +1,97 @@
+# runners/gate_graph.py
+"""
+Gate dependency graph + fail-fast policy (per slot)
+
+    POWER -> Gate1 -> Gate2 -> Gate3 / Gate4 / Gate5 / Gate6
+
+REQUIRES[g] = gates that must PASS on the same slot before Gate g can say
+anything about the unit: Gate1 needs power, Gate2 (ID pins + CAN) needs the
+power passthrough, and Gates 3..6 all talk to the RUP over CAN in ATP mode.
+
+With fail-fast on (default), a gate whose prerequisite failed is not run:
+it is recorded as BLOCKED (counts as not passed, no gate_run row) and the
+runner moves the fixture straight on to the next slot. ATP_FAIL_FAST=0
+runs every gate on every slot (diagnosing a dead unit).
+
+Used by QuickRunner, FullRunner and FlowRunner; results per slot are
+{gate: True / False / None}, with POWER (0) for the relay + power detect.
+
+Retest (services/results_cache.py): plan(needed) = the gates to run again
+plus the SETUP_GATES they depend on. Power ON is done by every runner anyway;
+Gate2 is re-run because its START_ATP puts the RUP in ATP mode. Gate1 is
+only re-run when it failed.
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+POWER = 0
+BLOCKED = "BLOCKED"
+
+REQUIRES: Dict[int, Tuple[int, ...]] = {
+    1: (POWER,),
+    2: (1,),
+    3: (2,),
+    4: (2,),
+    5: (2,),
+    6: (2,),
+}
+
+# prerequisites that also leave the unit in the state later gates need (START_ATP)
+SETUP_GATES = (2,)
+
+# Gate3 needs a second powered RUP in ATP mode (the keeper termination);
+# the batch sequence uses Slot4 then Slot2
+KEEPER_PREFERENCE = (4, 2, 3, 1)
+
+FAIL_FAST_ENV = "ATP_FAIL_FAST"
+
+_fail_fast = os.environ.get(FAIL_FAST_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def set_fail_fast(on: bool) -> None:
+    global _fail_fast
+    _fail_fast = bool(on)
+
+
+def is_fail_fast() -> bool:
+    return _fail_fast
+
+
+def blocker(gate: int, results: Dict[int, Optional[bool]]) -> Optional[int]:
+    """First prerequisite of `gate` (direct or transitive) that did not pass; None = gate may run."""
+    if not _fail_fast:
+        return None
+    for req in REQUIRES.get(gate, ()):
+        if results.get(req) is False:
+            return req
+        up = blocker(req, results)
+        if up is not None:
+            return up
+    return None
+
+
+def plan(needed: Iterable[int]) -> Set[int]:
+    """Gates to run for a retest: `needed` + the SETUP_GATES they depend on."""
+    out: Set[int] = set()
+    todo = list(needed)
+    while todo:
+        g = todo.pop()
+        if g in out or g == POWER:
+            continue
+        out.add(g)
+        todo.extend(r for r in REQUIRES.get(g, ()) if r in SETUP_GATES)
+    return out
+
+
+def reason(by: int) -> str:
+    return "no power" if by == POWER else f"Gate{by} FAIL"
+
+
+def pick_keeper(slot: int, candidates: Iterable[int]) -> Optional[int]:
+    """Gate3 keeper for `slot` among `candidates` (other slots past Gate2)."""
+    cand = set(candidates)
+    for k in KEEPER_PREFERENCE:
+        if k != slot and k in cand:
+            return k
+    return None
@@ -1,8 +1,10 @@
 # runners/quick_runner.py
 from dataclasses import dataclass
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Iterable
 
+from services import history, profiler, tracing, watchdog
 from services.hardware import HardwareController
+from runners import gate_graph
 
 
 @dataclass
@@ -19,9 +21,19 @@ class QuickRunner:
       1) Power ON ALL RUPs (1..4) once and keep them ON
       2) Gate1: test slot 1..4 sequentially
       3) Gate2: test slot 1..4 sequentially
+         (or all 4 at once when gate2_all_fn is given: one shared START_ATP holdoff)
 
     Switching between RUPs happens HERE via hw.select_slot(slot),
     which sets the MCP23S17 ID configuration per slot.
+
+    Fail-fast (runners/gate_graph.py): Gate1 is not run on a slot without
+    power, Gate2 not on a slot that failed Gate1; they are BLOCKED.
+
+    Watchdog (services/watchdog.py): a gate that overruns its budget is
+    cancelled and recorded TIMEOUT (not passed); the next slot goes on.
+
+    Retest: start(cached={slot: {gate: True}}) skips those gates on those
+    slots (services/results_cache.py); the RUPs are still powered ON.
     """
 
     def __init__(
@@ -31,11 +43,14 @@ class QuickRunner:
         gate1_fn: Callable[[int], bool],     # Gate1 needs slot
         gate2_fn: Callable[[int], bool],     # ✅ Gate2 needs slot now
         on_update: Callable[[SlotUpdate], None],
+        # (slots, results): fills results {slot: bool} as each slot gets its verdict
+        gate2_all_fn: Optional[Callable[[Iterable[int], Dict[int, bool]], Dict[int, bool]]] = None,
     ):
         self.hw = hw
         self.log = log_cb
         self.gate1_fn = gate1_fn
         self.gate2_fn = gate2_fn
+        self.gate2_all_fn = gate2_all_fn
         self.on_update = on_update
         self.reset()
 
@@ -50,9 +65,14 @@ class QuickRunner:
             2: {1: True, 2: True, 3: True, 4: True},
         }
         self.failed_slots: List[int] = []
+        self.power: Dict[int, Optional[bool]] = {s: None for s in (1, 2, 3, 4)}
+        self.blocked: Dict[int, List[int]] = {1: [], 2: []}
+        self.timed_out: Dict[int, List[int]] = {1: [], 2: []}
+        self.cached: Dict[int, Dict[int, bool]] = {}
 
-    def start(self) -> None:
+    def start(self, cached: Optional[Dict[int, Dict[int, bool]]] = None) -> None:
         self.reset()
+        self.cached = cached or {}
         self.active = True
         self.done = False
         self.log("[QUICK] Start: power ON all RUPs, Gate1(1..4), then Gate2(1..4)")
@@ -73,29 +93,8 @@ class QuickRunner:
 
             for s in (1, 2, 3, 4):
                 self.on_update(SlotUpdate(slot=s, gate=0, status="Powering ON...", led="yellow"))
-
-                try:
-                    self.hw.relay_on(s)
-                    self.log(f"[HW] RUP{s}: relay ON")
-                except Exception as e:
-                    self.log(f"[HW][FAIL] RUP{s} relay ON error: {e}")
-                    self._mark_fail_both(s)
-                    self.on_update(SlotUpdate(slot=s, gate=0, status="RELAY ON FAIL", led="red"))
-                    continue
-
-                # optional startup power detect
-                try:
-                    pwr = bool(self.hw.power_present(s))
-                except Exception as e:
-                    self.log(f"[HW][FAIL] RUP{s} power detect read error: {e}")
-                    pwr = False
-
-                if not pwr:
-                    self.log(f"[HW][FAIL] RUP{s}: power_detect=False")
-                    self._mark_fail_both(s)
-                    self.on_update(SlotUpdate(slot=s, gate=0, status="NO POWER (FAIL)", led="red"))
-                else:
-                    self.on_update(SlotUpdate(slot=s, gate=0, status="Powered (Ready)", led="yellow"))
+                with profiler.tag("PowerOn", s), tracing.span("PowerOn", cat="gate", slot=s):
+                    self._power_on_slot(s)
 
             self.phase = "gate1"
             self.current_slot = 1
@@ -112,6 +111,10 @@ class QuickRunner:
                 self.log("[QUICK] Gate1 complete. Moving to Gate2...")
                 return False
 
+            if self._blocked(1, s) or self._from_cache(1, s):
+                self.current_slot += 1
+                return False
+
             # Configure ID pins for this slot
             try:
                 self.hw.select_slot(s)
@@ -124,14 +127,22 @@ class QuickRunner:
 
             self.log(f"[GATE1] RUP{s} running...")
             ok = False
+            status = None
             try:
-                ok = bool(self.gate1_fn(s))
+                with profiler.tag(1, s), tracing.span("Gate1", cat="gate", gate=1, slot=s), \
+                        history.gate_run(1, s), watchdog.guard(1, s, self.log):
+                    ok = bool(self.gate1_fn(s))
+            except watchdog.GateTimeout as e:
+                self.log(f"[GATE1][TIMEOUT] RUP{s}: {e}")
+                self.timed_out[1].append(s)
+                ok, status = False, watchdog.TIMEOUT
             except Exception as e:
                 self.log(f"[GATE1][ERROR] RUP{s}: {e}")
                 ok = False
 
             self.results[1][s] = ok
-            self.on_update(SlotUpdate(slot=s, gate=1, status="PASS" if ok else "FAIL", led=None))
+            self.on_update(SlotUpdate(slot=s, gate=1, status=status or ("PASS" if ok else "FAIL"),
+                                      led="red" if status else None))
             if not ok and s not in self.failed_slots:
                 self.failed_slots.append(s)
 
@@ -141,12 +152,21 @@ class QuickRunner:
         # -------------------------
         # PHASE: GATE 2 (1..4)
         # -------------------------
+        if self.phase == "gate2" and self.gate2_all_fn is not None:
+            self._run_gate2_all()
+            self._finish()
+            return True
+
         if self.phase == "gate2":
             s = self.current_slot
             if s > 4:
                 self._finish()
                 return True
 
+            if self._blocked(2, s) or self._from_cache(2, s):
+                self.current_slot += 1
+                return False
+
             # Configure ID pins for this slot
             try:
                 self.hw.select_slot(s)
@@ -159,14 +179,22 @@ class QuickRunner:
 
             self.log(f"[GATE2] RUP{s} running...")
             ok = False
+            status = None
             try:
-                ok = bool(self.gate2_fn(s))   # ✅ pass slot
+                with profiler.tag(2, s), tracing.span("Gate2", cat="gate", gate=2, slot=s), \
+                        history.gate_run(2, s), watchdog.guard(2, s, self.log):
+                    ok = bool(self.gate2_fn(s))   # ✅ pass slot
+            except watchdog.GateTimeout as e:
+                self.log(f"[GATE2][TIMEOUT] RUP{s}: {e}")
+                self.timed_out[2].append(s)
+                ok, status = False, watchdog.TIMEOUT
             except Exception as e:
                 self.log(f"[GATE2][ERROR] RUP{s}: {e}")
                 ok = False
 
             self.results[2][s] = ok
-            self.on_update(SlotUpdate(slot=s, gate=2, status="PASS" if ok else "FAIL", led=None))
+            self.on_update(SlotUpdate(slot=s, gate=2, status=status or ("PASS" if ok else "FAIL"),
+                                      led="red" if status else None))
             if not ok and s not in self.failed_slots:
                 self.failed_slots.append(s)
 
@@ -177,6 +205,88 @@ class QuickRunner:
         self._finish()
         return True
 
+    def _power_on_slot(self, s: int) -> None:
+        self.power[s] = False
+        try:
+            self.hw.relay_on(s)
+            self.log(f"[HW] RUP{s}: relay ON")
+        except Exception as e:
+            self.log(f"[HW][FAIL] RUP{s} relay ON error: {e}")
+            self._mark_fail_both(s)
+            self.on_update(SlotUpdate(slot=s, gate=0, status="RELAY ON FAIL", led="red"))
+            return
+
+        # optional startup power detect
+        try:
+            pwr = bool(self.hw.power_present(s))
+        except Exception as e:
+            self.log(f"[HW][FAIL] RUP{s} power detect read error: {e}")
+            pwr = False
+
+        if not pwr:
+            self.log(f"[HW][FAIL] RUP{s}: power_detect=False")
+            self._mark_fail_both(s)
+            self.on_update(SlotUpdate(slot=s, gate=0, status="NO POWER (FAIL)", led="red"))
+        else:
+            self.power[s] = True
+            self.on_update(SlotUpdate(slot=s, gate=0, status="Powered (Ready)", led="yellow"))
+
+    def _blocked(self, gate: int, slot: int) -> bool:
+        """Fail-fast: prerequisite of `gate` failed on `slot` -> BLOCKED, not run."""
+        by = gate_graph.blocker(gate, {gate_graph.POWER: self.power.get(slot), 1: self.results[1][slot]})
+        if by is None:
+            return False
+        self.results[gate][slot] = False
+        self.blocked[gate].append(slot)
+        if slot not in self.failed_slots:
+            self.failed_slots.append(slot)
+        self.log(f"[GATE{gate}] RUP{slot} BLOCKED ({gate_graph.reason(by)})")
+        self.on_update(SlotUpdate(slot=slot, gate=gate, status=gate_graph.BLOCKED, led="gray"))
+        return True
+
+    def _from_cache(self, gate: int, slot: int) -> bool:
+        """Retest: valid cached PASS -> not run."""
+        if not self.cached.get(slot, {}).get(gate):
+            return False
+        self.results[gate][slot] = True
+        self.log(f"[GATE{gate}] RUP{slot} PASS (cached)")
+        self.on_update(SlotUpdate(slot=slot, gate=gate, status="PASS (cached)", led=None))
+        return True
+
+    def _run_gate2_all(self) -> None:
+        slots = tuple(s for s in (1, 2, 3, 4) if not (self._blocked(2, s) or self._from_cache(2, s)))
+        if not slots:
+            return
+        names = "RUP1..RUP4" if len(slots) == 4 else ",".join(f"RUP{s}" for s in slots)
+        self.log(f"[GATE2] {names} running (parallel handshake)...")
+        for s in slots:
+            self.on_update(SlotUpdate(slot=s, gate=2, status="Running...", led="yellow"))
+
+        res: Dict[int, bool] = {}
+        late: List[int] = []
+        try:
+            with profiler.tag(2), tracing.span("Gate2", cat="gate", gate=2), history.gate_run(2), \
+                    watchdog.guard(2, None, self.log):
+                self.gate2_all_fn(slots, res)
+        except watchdog.GateTimeout as e:
+            # verdicts already reached stand; only the slots still waiting timed out
+            late = [s for s in slots if s not in res]
+            self.log(f"[GATE2][TIMEOUT] parallel handshake, still waiting: "
+                     f"{','.join(f'RUP{s}' for s in late) or 'none'}: {e}")
+            self.timed_out[2].extend(late)
+        except Exception as e:
+            self.log(f"[GATE2][ERROR] parallel handshake: {e}")
+            res = {}
+
+        for s in slots:
+            ok = bool(res.get(s, False))
+            status = watchdog.TIMEOUT if s in late else None
+            self.results[2][s] = ok
+            self.on_update(SlotUpdate(slot=s, gate=2, status=status or ("PASS" if ok else "FAIL"),
+                                      led="red" if status else None))
+            if not ok and s not in self.failed_slots:
+                self.failed_slots.append(s)
+
     def _mark_fail_both(self, slot: int) -> None:
         self.results[1][slot] = False
         self.results[2][slot] = False
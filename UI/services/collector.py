@@ -0,0 +1,260 @@
+# services/collector.py
+"""
+Central results collector: every station's outbox (services/outbox.py)
+POSTs finished sessions here and they are merged into ONE history database.
+
+    <root>/atp_central.sqlite3     services.history schema (+ received)
+    <root>/files/<station>/<session>/   .log / .events.jsonl / .xlsx as sent
+
+The merged database has the history schema, so the existing report works
+across the whole line:
+
+    python -m services.history report --db ATP_collector/atp_central.sqlite3 [--station fixture-2]
+
+HTTP (stdlib ThreadingHTTPServer: one thread per station connection):
+    POST /api/v1/sessions          gzip'ed JSON lines -> {"accepted", "duplicate", "errors"}
+    GET  /api/v1/stations          per station: sessions, units, pass, last session / upload
+    GET  /api/v1/units?rup_id=X    every test of one RUP on any station
+    GET  /healthz
+
+Each POST is parsed and its files are written outside the database lock.
+Rows go in under one lock, one transaction per session.
+(station, name) is unique, so re-sent sessions are reported as "duplicate"
+and are not stored twice. With ATP_COLLECTOR_TOKEN set, POSTs need
+"Authorization: Bearer <token>".
+
+    python -m services.collector --bind :8780 --root ATP_collector
+"""
+
+import argparse
+import base64
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from services import history
+from services.outbox import INGEST_PATH, TOKEN_ENV
+
+DB_NAME = "atp_central.sqlite3"
+DEFAULT_PORT = 8780
+MAX_BODY_BYTES = 256 * 1024 * 1024
+MAX_RAW_BYTES = 1024 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS received (
+    station     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    session_id  INTEGER NOT NULL REFERENCES sessions (id),
+    received    REAL NOT NULL,
+    n_files     INTEGER NOT NULL,
+    PRIMARY KEY (station, name)
+);
+CREATE INDEX IF NOT EXISTS ix_received_time ON received (received);
+"""
+
+_SAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _safe(name: str) -> str:
+    """One path component (station / session / file names come from the network)."""
+    s = _SAFE.sub("_", os.path.basename(str(name))).strip(".")
+    return s or "_"
+
+
+class Collector:
+    def __init__(self, root: str, token: str = ""):
+        self.root = root
+        self.token = token
+        os.makedirs(os.path.join(root, "files"), exist_ok=True)
+        self.path = os.path.join(root, DB_NAME)
+        conn = history.connect(self.path)        # history schema + WAL
+        conn.executescript(SCHEMA)
+        conn.close()
+        # one writer connection (under self.lock); readers open their own
+        self.conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.stats = {"posts": 0, "accepted": 0, "duplicate": 0, "errors": 0}
+
+    def reader(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30.0)
+
+    # ---------- ingest ----------
+    def _store_files(self, station: str, name: str, files: Dict[str, Any]) -> int:
+        d = os.path.join(self.root, "files", _safe(station), _safe(name))
+        n = 0
+        for fname, a in (files or {}).items():
+            if not isinstance(a, dict) or "data" not in a:
+                continue
+            data = a["data"]
+            blob = base64.b64decode(data) if a.get("encoding") == "base64" else str(data).encode("utf-8")
+            os.makedirs(d, exist_ok=True)
+            tmp = os.path.join(d, "." + _safe(fname) + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, os.path.join(d, _safe(fname)))
+            n += 1
+        return n
+
+    def ingest(self, records: List[dict]) -> Dict[str, Any]:
+        accepted, duplicate, errors = [], [], {}
+        ready: List[Tuple[dict, int]] = []
+        for rec in records:
+            name = str(rec.get("name", ""))
+            try:
+                missing = [c for c in history.SESSION_COLS if c not in rec]
+                if missing:
+                    raise ValueError(f"missing {missing}")
+                ready.append((rec, self._store_files(rec["station"], name, rec.get("files"))))
+            except Exception as e:
+                errors[name] = str(e)
+
+        with self.lock:
+            for rec, n_files in ready:
+                key = (rec["station"], rec["name"])
+                try:
+                    with self.conn:
+                        if self.conn.execute("SELECT 1 FROM received WHERE station = ? AND name = ?",
+                                             key).fetchone():
+                            duplicate.append(rec["name"])
+                            continue
+                        sid = history.import_session(self.conn, rec)
+                        self.conn.execute(
+                            "INSERT INTO received (station, name, session_id, received, n_files) "
+                            "VALUES (?, ?, ?, ?, ?)", key + (sid, time.time(), n_files))
+                    accepted.append(rec["name"])
+                except Exception as e:
+                    errors[rec["name"]] = str(e)
+            self.stats["posts"] += 1
+            self.stats["accepted"] += len(accepted)
+            self.stats["duplicate"] += len(duplicate)
+            self.stats["errors"] += len(errors)
+        return {"accepted": accepted, "duplicate": duplicate, "errors": errors}
+
+    # ---------- queries ----------
+    def stations(self) -> List[dict]:
+        conn = self.reader()
+        try:
+            rows = conn.execute(
+                "SELECT s.station, COUNT(*), SUM(s.n_units), SUM(s.n_pass), MAX(s.started), MAX(r.received) "
+                "FROM sessions s JOIN received r ON r.session_id = s.id GROUP BY s.station ORDER BY s.station"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"station": st, "sessions": n, "units": u, "passed": p,
+                 "last_session": last, "last_upload": up} for st, n, u, p, last, up in rows]
+
+    def units(self, rup_id: str) -> List[dict]:
+        conn = self.reader()
+        try:
+            rows = conn.execute(
+                "SELECT s.station, s.name, s.started, u.slot, u.passed FROM units u "
+                "JOIN sessions s ON s.id = u.session_id WHERE u.rup_id = ? ORDER BY s.started",
+                (rup_id,)).fetchall()
+        finally:
+            conn.close()
+        return [{"station": st, "session": n, "started": t, "slot": sl, "passed": bool(p)}
+                for st, n, t, sl, p in rows]
+
+
+# =========================================================
+# HTTP
+# =========================================================
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ATPCollector/1"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, code: int, obj) -> None:
+        body = json.dumps(obj, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        col: Collector = self.server.collector
+        u = urlparse(self.path)
+        if u.path == "/healthz":
+            return self._json(200, dict(col.stats, ok=True))
+        if u.path == "/api/v1/stations":
+            return self._json(200, col.stations())
+        if u.path == "/api/v1/units":
+            rup = (parse_qs(u.query).get("rup_id") or [""])[0]
+            if not rup:
+                return self._json(400, {"error": "rup_id required"})
+            return self._json(200, col.units(rup))
+        return self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        col: Collector = self.server.collector
+        if urlparse(self.path).path != INGEST_PATH:
+            return self._json(404, {"error": "not found"})
+        if col.token and self.headers.get("Authorization", "") != f"Bearer {col.token}":
+            return self._json(401, {"error": "bad token"})
+        n = int(self.headers.get("Content-Length") or 0)
+        if n <= 0 or n > MAX_BODY_BYTES:
+            return self._json(413, {"error": f"body must be 1..{MAX_BODY_BYTES} bytes"})
+        body = self.rfile.read(n)
+        try:
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                d = gzip.GzipFile(fileobj=io.BytesIO(body))
+                body = d.read(MAX_RAW_BYTES + 1)
+                if len(body) > MAX_RAW_BYTES:
+                    return self._json(413, {"error": "decompressed body too large"})
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        except (OSError, ValueError, EOFError) as e:
+            return self._json(400, {"error": f"bad body: {e}"})
+        result = col.ingest(records)
+        if result["accepted"]:
+            station = records[0].get("station") or self.headers.get("X-ATP-Station")
+            print(f"[COLLECTOR] {station}: {len(result['accepted'])} session(s) stored"
+                  f"{', %d duplicate' % len(result['duplicate']) if result['duplicate'] else ''}", flush=True)
+        for name, err in result["errors"].items():
+            print(f"[COLLECTOR][ERROR] {name}: {err}", flush=True)
+        return self._json(200, result)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(bind: str, root: str, token: str = "") -> _Server:
+    host, _, port = bind.rpartition(":")
+    srv = _Server((host or "0.0.0.0", int(port or DEFAULT_PORT)), _Handler)
+    srv.collector = Collector(root, token)
+    return srv
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP central results collector")
+    ap.add_argument("--bind", default=f":{DEFAULT_PORT}", help="[HOST]:PORT")
+    ap.add_argument("--root", default="ATP_collector")
+    args = ap.parse_args(argv)
+
+    srv = serve(args.bind, args.root, os.environ.get(TOKEN_ENV, ""))
+    print(f"[COLLECTOR] Listening on {args.bind} -> {os.path.join(args.root, DB_NAME)}", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+# services/daemon.py
+"""
+ATP daemon: ONE long-lived process owns the hardware (HardwareController,
+CAN, relays, MCP23S17) and the ATPEngine; UIs and scripts attach over a
+local Unix socket (protocol: services/daemon_client.py).
+
+    python3 -m services.daemon                       # real fixture
+    python3 -m services.daemon --sim --virtual-time  # anywhere
+    ATP_DAEMON_SOCKET=/run/atp/atp.sock python3 -m services.daemon
+
+Clients:
+    python3 atp_client.py                            # Qt window (thin client)
+    python3 -m services.daemon_client run --ids A1,B2,C3,D4 --wait
+
+Methods:
+    ping / status / results
+    setup      {slot_ids}                  new session (IDs, session files, CAN capture)
+    run        {phase: all|quick|full, report: bool}
+               runs in the daemon's worker thread, ends with a "done" event;
+               "full" / "all" close the session (Excel, history, trace, relays off)
+    relays_off                             idle only
+    subscribe                              this connection receives events
+    shutdown                               stop the daemon
+
+New subscribers first get the last REPLAY_LINES log lines and the current
+slot states, so a restarted UI shows where the fixture is right away.
+One run at a time; calls that would touch the hardware while a run is in
+progress are refused.
+"""
+
+import argparse
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, Optional
+
+import hal
+
+from runners.quick_runner import SlotUpdate
+from services import daemon_client
+from services.daemon_client import DaemonError, default_socket_path, encode, int_keys
+
+REPLAY_LINES = 500
+CLIENT_QUEUE_MAX = 10000
+
+PHASES = ("all", "quick", "full")
+
+
+# =========================================================
+# CONNECTIONS
+# =========================================================
+class _Client:
+    """Outbound queue + sender thread: a slow client never stalls the engine."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.q: "queue.Queue" = queue.Queue(maxsize=CLIENT_QUEUE_MAX)
+        self.subscribed = False
+        self.dropped = 0
+        self.alive = True
+        self.thread = threading.Thread(target=self._send_loop, name="atp-daemon-send", daemon=True)
+        self.thread.start()
+
+    def send(self, obj: Dict[str, Any]) -> None:
+        if not self.alive:
+            return
+        try:
+            self.q.put_nowait(encode(obj))
+        except queue.Full:
+            self.dropped += 1
+
+    def _send_loop(self) -> None:
+        while self.alive:
+            data = self.q.get()
+            if data is None:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.alive = False
+
+    def close(self) -> None:
+        self.alive = False
+        try:
+            self.q.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        daemon: "AtpDaemon" = self.server.daemon
+        client = _Client(self.request)
+        daemon.attach(client)
+        try:
+            for line in self.rfile:
+                try:
+                    req = json.loads(line)
+                    req_id = req.get("id")
+                    method = str(req.get("method", ""))
+                    params = req.get("params") or {}
+                except Exception as e:
+                    client.send({"id": None, "error": {"message": f"bad request: {e}"}})
+                    continue
+                try:
+                    result = daemon.dispatch(client, method, params)
+                    client.send({"id": req_id, "result": result})
+                except DaemonError as e:
+                    client.send({"id": req_id, "error": {"message": str(e)}})
+                except Exception as e:
+                    daemon.log(f"[DAEMON][ERROR] {method}: {e}")
+                    client.send({"id": req_id, "error": {"message": f"{type(e).__name__}: {e}"}})
+                if method == "subscribe":
+                    daemon.replay(client)
+        finally:
+            daemon.detach(client)
+            client.close()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# =========================================================
+# DAEMON
+# =========================================================
+class AtpDaemon:
+    def __init__(self, logs_dir: str = "ATP_logs", report: bool = True):
+        # Gates / services resolve the backend on first hardware access
+        from services import eventlog
+        from services.engine import ATPEngine
+
+        self._eventlog = eventlog
+        self.report = report
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.phase: Optional[str] = None
+        self.session: Optional[str] = None
+        self.started = time.time()
+        self.runs = 0
+
+        self._replay = deque(maxlen=REPLAY_LINES)
+        self._slot_state: Dict[int, Dict[str, Any]] = {}
+
+        eventlog.subscribe(self._on_log_events)
+        self.engine = ATPEngine(logs_dir=logs_dir, on_update=self._on_update)
+
+        # Always-on CAN capture as in main_atp; not under the virtual clock, where
+        # its recv() timeouts would advance fixture time from a background thread
+        self.can_rec = None
+        try:
+            from hal import clock
+            if clock.is_virtual():
+                raise RuntimeError("virtual clock")
+            from tests.CAN.can_recorder import CanRecorder
+            self.can_rec = CanRecorder(logs_dir, log_cb=self.log)
+            self.can_rec.start()
+        except Exception as e:
+            self.can_rec = None
+            self.log(f"[CANREC][WARN] Recorder not started: {e}")
+
+        self.server: Optional[_Server] = None
+
+    def log(self, msg: str) -> None:
+        self._eventlog.log(msg)
+
+    # ---------- events ----------
+    # Replay state and broadcast share _clients_lock: a new subscriber gets
+    # every event exactly once (either replayed or live).
+    def _broadcast(self, params: Dict[str, Any]) -> None:
+        msg = {"method": "event", "params": params}
+        for c in self._clients:
+            if c.subscribed:
+                c.send(msg)
+
+    def _on_log_events(self, events) -> None:
+        with self._clients_lock:
+            for e in events:
+                ev = {"type": "log", "text": e.text, "slot": e.slot, "gate": e.gate, "level": e.level}
+                self._replay.append(ev)
+                self._broadcast(ev)
+
+    def _on_update(self, upd) -> None:
+        s = getattr(upd, "slot", None)
+        ev = {"type": "update", "slot": s, "gate": getattr(upd, "gate", None),
+              "status": getattr(upd, "status", ""), "led": getattr(upd, "led", None)}
+        with self._clients_lock:
+            if s is not None:
+                st = self._slot_state.setdefault(s, {})
+                st.update({k: v for k, v in ev.items() if v is not None})
+            self._broadcast(ev)
+
+    def attach(self, client: _Client) -> None:
+        with self._clients_lock:
+            self._clients.add(client)
+
+    def detach(self, client: _Client) -> None:
+        with self._clients_lock:
+            self._clients.discard(client)
+
+    def replay(self, client: _Client) -> None:
+        """Send the replay state, then switch the client to live events."""
+        with self._clients_lock:
+            for ev in self._replay:
+                client.send({"method": "event", "params": dict(ev, replay=True)})
+            for st in self._slot_state.values():
+                client.send({"method": "event", "params": dict(st, replay=True)})
+            client.subscribed = True
+
+    # ---------- methods ----------
+    def busy(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    def _require_idle(self, what: str) -> None:
+        if self.busy():
+            raise DaemonError(f"{what}: ATP run in progress (phase {self.phase})")
+
+    def dispatch(self, client: _Client, method: str, params: Dict[str, Any]) -> Any:
+        if method == "ping":
+            return "pong"
+        if method == "subscribe":
+            return {"replay": len(self._replay)}    # handler replays + subscribes after this reply
+        if method == "status":
+            return self.status()
+        if method == "results":
+            return self.engine.gate_results
+        if method == "setup":
+            return self.setup(params.get("slot_ids") or {})
+        if method == "run":
+            return self.run(str(params.get("phase", "all")), bool(params.get("report", self.report)))
+        if method == "relays_off":
+            self._require_idle("relays_off")
+            self.engine.hw.relay_off_all()
+            return "ok"
+        if method == "shutdown":
+            self._require_idle("shutdown")
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return "bye"
+        raise DaemonError(f"unknown method {method!r}")
+
+    def status(self) -> Dict[str, Any]:
+        from services import fixture_profile
+        return {
+            "state": "running" if self.busy() else "idle",
+            "phase": self.phase,
+            "session": self.session,
+            "slot_ids": self.engine.slot_ids,
+            "backend": hal.get_backend().name,
+            "profile": fixture_profile.FIXTURE.name,
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "runs": self.runs,
+            "results": self.engine.gate_results,
+        }
+
+    def setup(self, slot_ids: Dict) -> Dict[str, Any]:
+        with self._run_lock:
+            self._require_idle("setup")
+            if self.session:
+                self.engine.end_run()
+            ids = int_keys(slot_ids)
+            self._slot_state.clear()
+            self.engine.setup({s: ids.get(s) for s in (1, 2, 3, 4)})
+            self.session = self.engine.reporter.session_basename() or None
+            if self.can_rec is not None and self.session:
+                try:
+                    path = self.can_rec.new_capture(self.session)
+                    self.engine.reporter.link_can_capture(path)
+                except Exception as e:
+                    self.log(f"[CANREC][WARN] Capture not linked: {e}")
+            for s in (1, 2, 3, 4):
+                self._on_update(SlotUpdate(slot=s, gate=0, status="Ready", led="yellow"))
+            return {"session": self.session, "slot_ids": self.engine.slot_ids}
+
+    def run(self, phase: str, report: bool) -> Dict[str, Any]:
+        if phase not in PHASES:
+            raise DaemonError(f"phase must be one of {', '.join(PHASES)}")
+        with self._run_lock:
+            self._require_idle("run")
+            if not self.session:
+                raise DaemonError("run: call setup first (no open session)")
+            self.phase = phase
+            self._worker = threading.Thread(target=self._run_worker, args=(phase, report),
+                                            name="atp-daemon-run", daemon=True)
+            self._worker.start()
+        return {"started": True, "phase": phase, "session": self.session}
+
+    def _run_worker(self, phase: str, report: bool) -> None:
+        from services import tracing
+        eng = self.engine
+        try:
+            if phase == "all":
+                eng.run_all(full=True)
+            elif phase == "quick":
+                with tracing.span("Quick Test", cat="phase"):
+                    eng.run_quick()
+            else:
+                with tracing.span("Full ATP", cat="phase"):
+                    eng.run_full()
+                eng.finish()
+            if phase != "quick":
+                if report:
+                    eng.write_report()
+                eng.end_run()
+                self.session = None
+        except Exception as e:
+            self.log(f"[DAEMON][ERROR] {phase}: {e}")
+            self.log(traceback.format_exc())
+        finally:
+            self.runs += 1
+            gates = (1, 2) if phase == "quick" else tuple(eng.gate_results)
+            ok = all(eng.gate_results[g][s] is not False for g in gates for s in eng.gate_results[g])
+            self._eventlog.flush()
+            with self._clients_lock:
+                self._broadcast({"type": "done", "phase": phase, "ok": ok, "results": eng.gate_results})
+            self.phase = None
+
+    # ---------- lifecycle ----------
+    def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            try:
+                daemon_client.DaemonClient(path, timeout_s=1.0).call("ping")
+                raise DaemonError(f"another ATP daemon is already listening on {path}")
+            except DaemonError as e:
+                if "already" in str(e):
+                    raise
+                os.unlink(path)    # stale socket from a crashed daemon
+
+        self.server = _Server(path, _Handler)
+        self.server.daemon = self
+        os.chmod(path, 0o660)
+        self.log(f"[DAEMON] Listening on {path} (pid {os.getpid()})")
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            self.server.server_close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self.close()
+
+    def close(self) -> None:
+        self.log("[DAEMON] Shutting down")
+        if self.busy():
+            self._worker.join(timeout=5.0)
+        if self.can_rec is not None:
+            try:
+                self.can_rec.stop()
+            except Exception:
+                pass
+        self.engine.shutdown()
+        self._eventlog.unsubscribe(self._on_log_events)
+
+
+# =========================================================
+# CLI
+# =========================================================
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP daemon (owns the fixture, serves UI / CLI clients)")
+    ap.add_argument("--socket", default=None, help=f"default: {default_socket_path()} ({daemon_client.SOCKET_ENV})")
+    ap.add_argument("--sim", action="store_true", help="simulated fixture backend (same as ATP_HAL=sim)")
+    ap.add_argument("--virtual-time", action="store_true", help="with --sim: virtual clock")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--fixture-profile", default=None, metavar="NAME|PATH")
+    ap.add_argument("--logs-dir", default="ATP_logs")
+    ap.add_argument("--no-excel", action="store_true")
+    ap.add_argument("--http", default=None, metavar="[HOST]:PORT",
+                    help="status dashboard / WebSocket (same as ATP_STATUS_HTTP)")
+    args = ap.parse_args(argv)
+
+    if args.virtual_time and not args.sim:
+        ap.error("--virtual-time needs --sim")
+    if args.sim:
+        hal.select_backend("sim", virtual_time=args.virtual_time, seed=args.seed)
+
+    from services import eventlog, fixture_profile, outbox, profiler, status_api, tracing, watchdog
+
+    watchdog.enable_from_env()
+    profiler.enable_from_env()
+    tracing.enable_from_env()
+    try:
+        if args.fixture_profile:
+            fixture_profile.load(args.fixture_profile, eventlog.log)
+        else:
+            fixture_profile.load_from_env(eventlog.log)
+    except Exception as e:
+        ap.error(f"--fixture-profile: {e}")
+    if args.http:
+        try:
+            status_api.start(args.http, eventlog.log)
+        except OSError as e:
+            ap.error(f"--http {args.http}: {e}")
+    else:
+        status_api.start_from_env(eventlog.log)
+    outbox.start_from_env(args.logs_dir, eventlog.log)
+
+    d = AtpDaemon(logs_dir=args.logs_dir, report=not args.no_excel)
+
+    def _stop(signum, frame):
+        if d.server is not None:
+            threading.Thread(target=d.server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        d.serve(args.socket or default_socket_path())
+    except DaemonError as e:
+        print(f"[DAEMON][ERROR] {e}")
+        return 1
+    finally:
+        hal.shutdown()
+        status_api.stop()
+        outbox.stop()
+        eventlog.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
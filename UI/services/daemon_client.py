@@ -0,0 +1,245 @@
+# services/daemon_client.py
+"""
+Client side of the ATP daemon (services/daemon.py). Standard library only:
+the Qt client and the CLI never import the HAL or the gates.
+
+Protocol: one JSON object per line over a Unix stream socket.
+
+    -> {"id": 1, "method": "run", "params": {"phase": "full"}}
+    <- {"id": 1, "result": {...}}            or {"id": 1, "error": {"message": "..."}}
+    <- {"method": "event", "params": {...}}  (subscribed connections only)
+
+Event params:
+    {"type": "log",    "text", "slot", "gate", "level"}
+    {"type": "update", "slot", "gate", "status", "led"}
+    {"type": "done",   "phase", "ok", "results"}   results[gate][slot] (str keys)
+
+    client = DaemonClient()
+    client.call("status")
+    client.subscribe(on_event)          # reader thread, second connection
+    client.call("setup", slot_ids={"1": "A1", ...})
+    client.call("run", phase="quick")
+
+CLI:
+    python -m services.daemon_client status
+    python -m services.daemon_client run --ids A1,B2,C3,D4 [--phase all|quick|full] [--wait]
+    python -m services.daemon_client watch
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional
+
+SOCKET_ENV = "ATP_DAEMON_SOCKET"
+SOCKET_NAME = "atp_daemon.sock"
+
+CONNECT_TIMEOUT_S = 2.0
+CALL_TIMEOUT_S = 30.0
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def default_socket_path() -> str:
+    path = os.environ.get(SOCKET_ENV, "").strip()
+    if path:
+        return path
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp", SOCKET_NAME)
+
+
+def encode(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def int_keys(d) -> Dict:
+    """JSON turns {1: ...} into {"1": ...}; undo it (nested once)."""
+    out = {}
+    for k, v in (d or {}).items():
+        k = int(k) if str(k).isdigit() else k
+        out[k] = int_keys(v) if isinstance(v, dict) else v
+    return out
+
+
+class _Conn:
+    def __init__(self, path: str, timeout_s: Optional[float]):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(CONNECT_TIMEOUT_S)
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            self.sock.close()
+            raise DaemonError(f"ATP daemon not reachable at {path}: {e}")
+        self.sock.settimeout(timeout_s)
+        self.rfile = self.sock.makefile("rb")
+
+    def send(self, obj: Dict[str, Any]) -> None:
+        self.sock.sendall(encode(obj))
+
+    def recv(self) -> Optional[Dict[str, Any]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)   # wakes a reader blocked in recv()
+        except OSError:
+            pass
+        for c in (self.rfile, self.sock):
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
+class DaemonClient:
+    def __init__(self, path: Optional[str] = None, timeout_s: float = CALL_TIMEOUT_S):
+        self.path = path or default_socket_path()
+        self.timeout_s = timeout_s
+        self._rpc: Optional[_Conn] = None
+        self._rpc_lock = threading.Lock()
+        self._next_id = 0
+        self._events: Optional[_Conn] = None
+        self._events_thread: Optional[threading.Thread] = None
+
+    def call(self, method: str, **params) -> Any:
+        with self._rpc_lock:
+            if self._rpc is None:
+                self._rpc = _Conn(self.path, self.timeout_s)
+            self._next_id += 1
+            req_id = self._next_id
+            try:
+                self._rpc.send({"id": req_id, "method": method, "params": params})
+                while True:
+                    resp = self._rpc.recv()
+                    if resp is None:
+                        raise DaemonError("ATP daemon closed the connection")
+                    if resp.get("id") == req_id:
+                        break
+            except (OSError, ValueError) as e:
+                self._rpc.close()
+                self._rpc = None
+                raise DaemonError(f"{method}: {e}")
+        if "error" in resp:
+            raise DaemonError(resp["error"].get("message", "error"))
+        return resp.get("result")
+
+    def subscribe(self, on_event: Callable[[Dict[str, Any]], None],
+                  on_close: Optional[Callable[[], None]] = None) -> None:
+        """Stream daemon events to on_event(params) from a reader thread."""
+        conn = _Conn(self.path, None)
+        conn.send({"id": 0, "method": "subscribe", "params": {}})
+        self._events = conn
+
+        def _reader():
+            try:
+                while True:
+                    msg = conn.recv()
+                    if msg is None:
+                        break
+                    if msg.get("method") == "event":
+                        try:
+                            on_event(msg.get("params") or {})
+                        except Exception as e:
+                            print(f"[CLIENT][ERROR] event handler: {e}")
+            except (OSError, ValueError):
+                pass
+            finally:
+                if on_close:
+                    on_close()
+
+        self._events_thread = threading.Thread(target=_reader, name="atp-daemon-events", daemon=True)
+        self._events_thread.start()
+
+    def close(self) -> None:
+        for c in (self._rpc, self._events):
+            if c is not None:
+                c.close()
+        self._rpc = None
+        self._events = None
+
+
+# =========================================================
+# CLI
+# =========================================================
+def _print_results(results: Dict) -> None:
+    for g, per_slot in sorted(int_keys(results).items()):
+        row = " ".join(f"S{s}={'--' if v is None else ('PASS' if v else 'FAIL')}"
+                       for s, v in sorted(per_slot.items()))
+        print(f"Gate{g}: {row}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP daemon client")
+    ap.add_argument("--socket", default=None)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    sub.add_parser("watch", help="stream log lines and slot updates")
+    rp = sub.add_parser("run", help="new session + run")
+    rp.add_argument("--ids", default="", help="RUP IDs for slot 1..4, comma separated")
+    rp.add_argument("--phase", default="all", choices=("all", "quick", "full"))
+    rp.add_argument("--wait", action="store_true", help="stream the log until the run is done")
+    sub.add_parser("relays-off")
+    sub.add_parser("shutdown", help="stop the daemon")
+    args = ap.parse_args(argv)
+
+    client = DaemonClient(args.socket)
+    try:
+        if args.cmd == "status":
+            st = client.call("status")
+            results = st.pop("results", {})
+            for k, v in st.items():
+                print(f"{k:<12} {v}")
+            _print_results(results)
+            return 0
+
+        if args.cmd in ("relays-off", "shutdown"):
+            print(client.call(args.cmd.replace("-", "_")))
+            return 0
+
+        done = threading.Event()
+        outcome: Dict[str, Any] = {}
+
+        def on_event(ev):
+            if ev.get("type") == "log":
+                print(ev.get("text", ""), flush=True)
+            elif ev.get("type") == "done" and args.cmd == "run":
+                outcome.update(ev)
+                done.set()
+
+        if args.cmd == "watch" or args.wait:
+            client.subscribe(on_event, on_close=done.set)
+
+        if args.cmd == "run":
+            ids = [x.strip() for x in args.ids.split(",")] if args.ids else []
+            if args.phase != "full":
+                client.call("setup", slot_ids={str(s): (ids[s - 1] if s - 1 < len(ids) else None)
+                                               for s in (1, 2, 3, 4)})
+            client.call("run", phase=args.phase)
+            if not args.wait:
+                print("[CLIENT] Run started (python -m services.daemon_client watch)")
+                return 0
+
+        try:
+            done.wait()
+        except KeyboardInterrupt:
+            return 0
+        if outcome:
+            _print_results(outcome.get("results", {}))
+            return 0 if outcome.get("ok") else 1
+        return 0
+    except DaemonError as e:
+        print(f"[CLIENT][ERROR] {e}")
+        return 2
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
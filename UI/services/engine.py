@@ -0,0 +1,328 @@
+# services/engine.py
+"""
+ATPEngine — the ATP sequence without Qt.
+
+ONE owner of the session: HardwareController, Reporter, the runners, the
+results cache, history, trace and report. Used by atp_headless.py (sim
+backend: benchmarking, profiling, CI), the daemon (services/daemon.py) and
+the Qt window (main_atp.MainATP, which only adds the Qt glue: scans,
+buttons, worker threads, slot widgets).
+
+run_quick() / run_full() / run_flow() may run on a worker thread: that
+thread becomes the trace session thread.
+
+Continuous flow (runners/flow_runner.py): start_flow(), then flow.load() /
+flow.unload() per slot and flow.step() / flow.run() on one thread; every
+finished unit is written on its own (history, .xlsx, outbox).
+
+Retest (retest=True): every unit's gate results go to the per-serial
+results cache (services/results_cache.py); a serial seen before only
+re-runs its failed gates + their setup prerequisites.
+"""
+
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+from hal import clock
+from services import eventlog, history, outbox, profiler, results_cache, status_api, tracing, watchdog
+from services.hardware import HardwareController
+from services.reporting import Reporter
+
+from runners.quick_runner import QuickRunner
+from runners.full_runner import FullRunner
+from runners.flow_runner import FlowRunner, SlotLane
+from runners import gate_graph
+
+from tests.gate1_power_passthrough import run_gate1_power_test
+from tests.gate2_CAN_check import gate2_can_check, gate2_can_check_all
+from tests.gate3_TR import run_gate3_all_ordered, run_gate3_slot
+from tests.gate4_iul_check import run_gate4_iul_check
+from tests.gate5_ID_check import gate5_id_check
+from tests.gate6_pdo import run_gate6_bool
+
+SLOTS = (1, 2, 3, 4)
+LOG_DIR = "ATP_logs"
+
+QUICK_STEP_INTERVAL_S = 0.0   # no wait between QuickRunner steps
+
+
+class ATPEngine:
+    def __init__(self, logs_dir: str = LOG_DIR, log_cb: Optional[Callable[[str], None]] = None,
+                 on_update: Optional[Callable[[object], None]] = None, retest: bool = False):
+        self._log_cb = log_cb
+        self.retest = retest
+        # retest: cached[slot] = {gate: True} taken from the results cache, not run
+        self.cached: Dict[int, Dict[int, bool]] = {}
+        self._on_update = on_update
+        # Console / log_cb get the lines from the eventlog writer thread, in batches
+        eventlog.subscribe(self._log_sink)
+
+        self.slot_ids: Dict[int, Optional[str]] = {s: None for s in SLOTS}
+        # gate_results[gate][slot] = True / False / None
+        self.gate_results = {g: {s: None for s in SLOTS} for g in (1, 2, 3, 4, 5, 6)}
+        # gate_blocked[gate] = slots not run, prerequisite failed (runners/gate_graph.py)
+        self.gate_blocked = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+        # gate_timeout[gate] = slots cancelled by the watchdog (services/watchdog.py)
+        self.gate_timeout = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+
+        self._t0 = time.perf_counter()
+        self._c0 = clock.monotonic()
+        self._history_sid: Optional[int] = None
+
+        self.reporter = Reporter(logs_dir, log_cb=self.log)
+        self.hw = HardwareController(log_cb=self.log)
+
+        self.quick = QuickRunner(
+            hw=self.hw,
+            log_cb=self.log,
+            gate1_fn=run_gate1_power_test,
+            gate2_fn=gate2_can_check,
+            on_update=self._update,
+            gate2_all_fn=gate2_can_check_all,
+        )
+        self.full = FullRunner(
+            log_cb=self.log,
+            on_update=self._update,
+            run_gate3_all_fn=run_gate3_all_ordered,
+            run_gate4_bool_fn=run_gate4_iul_check,
+            run_gate5_bool_fn=gate5_id_check,
+            run_gate6_bool_fn=run_gate6_bool,
+            slots=list(SLOTS),
+            run_gate3_slot_fn=run_gate3_slot,
+        )
+        self.flow = FlowRunner(
+            hw=self.hw,
+            log_cb=self.log,
+            on_update=self._update,
+            gate1_fn=run_gate1_power_test,
+            gate2_fn=gate2_can_check,
+            gate3_slot_fn=run_gate3_slot,
+            gate4_fn=run_gate4_iul_check,
+            gate5_fn=gate5_id_check,
+            gate6_fn=run_gate6_bool,
+            on_unit_done=self._unit_done,
+            slots=list(SLOTS),
+            retest_fn=self._retest_plan if retest else None,
+        )
+        self._flow_report = True
+
+    # =========================================================
+    # LOG / UPDATES
+    # =========================================================
+    def log(self, msg: str) -> None:
+        eventlog.log(msg)
+
+    def _log_sink(self, events) -> None:
+        if self._log_cb:
+            for e in events:
+                self._log_cb(e.text)
+        else:
+            eventlog.console_sink(events)
+
+    def _update(self, upd) -> None:
+        g = getattr(upd, "gate", None)
+        s = getattr(upd, "slot", None)
+        st = getattr(upd, "status", "")
+        if g in self.gate_results and s in SLOTS and st in ("PASS", "FAIL", gate_graph.BLOCKED, watchdog.TIMEOUT):
+            self.gate_results[g][s] = (st == "PASS")
+            if st == gate_graph.BLOCKED:
+                self.gate_blocked[g].add(s)
+            elif st == watchdog.TIMEOUT:
+                self.gate_timeout[g].add(s)
+        status_api.publish("update", slot=s, gate=g, status=st, led=getattr(upd, "led", None))
+        if self._on_update:
+            self._on_update(upd)
+
+    # =========================================================
+    # SEQUENCE
+    # =========================================================
+    def setup(self, slot_ids: Dict[int, str]) -> None:
+        """New session (cycle time counts from here)."""
+        self.gate_results = {g: {s: None for s in SLOTS} for g in (1, 2, 3, 4, 5, 6)}
+        self.gate_blocked = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+        self.gate_timeout = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+        self._t0 = time.perf_counter()
+        self._c0 = clock.monotonic()
+        self._history_sid = None
+        for s in SLOTS:
+            self.slot_ids[s] = slot_ids.get(s) or f"SIM{s}"
+            self.log(f"[SETUP] Slot{s} ID = {self.slot_ids[s]}")
+        self.cached = {}
+        if self.retest:
+            for s in SLOTS:
+                plan = self._retest_plan(self.slot_ids[s])
+                if plan:
+                    self.cached[s] = plan
+        try:
+            self.reporter.open_session(self.slot_ids)
+        except Exception as e:
+            self.log(f"[FILE][ERROR] Session log: {e}")
+        profiler.reset()
+        tracing.begin_session(self.reporter.session_basename() or "ATP_headless")
+        history.begin_session(self.reporter.session_basename() or "ATP_headless", self.slot_ids)
+
+    def set_retest(self, on: bool) -> None:
+        """Retest failures only (next setup() / flow loads)."""
+        self.retest = bool(on)
+        self.flow.retest_fn = self._retest_plan if self.retest else None
+
+    def run_quick(self) -> Dict[int, Dict[int, bool]]:
+        tracing.adopt_thread()
+        self.quick.start(cached=self.cached)
+        while not self.quick.step():
+            if QUICK_STEP_INTERVAL_S:
+                time.sleep(QUICK_STEP_INTERVAL_S)
+        for s in SLOTS:
+            self.gate_results[1][s] = bool(self.quick.results[1].get(s, False))
+            self.gate_results[2][s] = bool(self.quick.results[2].get(s, False))
+        self.log("[ENGINE] Quick Test COMPLETE")
+        return {1: dict(self.gate_results[1]), 2: dict(self.gate_results[2])}
+
+    def run_full(self) -> Dict[int, Dict[int, bool]]:
+        tracing.adopt_thread()
+        results = self.full.run(prior=self.gate_results, cached=self.cached)
+        for gate in (3, 4, 5, 6):
+            for s in SLOTS:
+                self.gate_results[gate][s] = bool(results.get(gate, {}).get(s, False))
+        self.log("[ENGINE] Full ATP COMPLETE")
+        return {g: dict(self.gate_results[g]) for g in (3, 4, 5, 6)}
+
+    def run_all(self, full: bool = True) -> Dict[int, Dict[int, Optional[bool]]]:
+        try:
+            with tracing.span("Quick Test", cat="phase"):
+                self.run_quick()
+            if full:
+                with tracing.span("Full ATP", cat="phase"):
+                    self.run_full()
+        except Exception as e:
+            self.log(f"[ENGINE][ERROR] {e}")
+            self.log(traceback.format_exc())
+        return self.finish()
+
+    def finish(self) -> Dict[int, Dict[int, Optional[bool]]]:
+        """Cycle time, profiler report, history + trace of the session."""
+        wall = time.perf_counter() - self._t0
+        if clock.is_virtual():
+            self.log(f"[ENGINE] Cycle time {clock.monotonic() - self._c0:.2f}s fixture time "
+                     f"({wall:.3f}s wall, virtual clock)")
+        else:
+            self.log(f"[ENGINE] Cycle time {wall:.2f}s")
+        if profiler.is_enabled():
+            for line in profiler.report_lines():
+                self.log(line)
+        for s in SLOTS:
+            self._record(s, self.slot_ids[s], {g: self.gate_results[g][s] for g in self.gate_results},
+                         {g for g, slots in self.gate_blocked.items() if s in slots}, self.cached.get(s, {}),
+                         self.reporter.session_basename() or "ATP_headless")
+        try:
+            self._history_sid = history.end_session(self.gate_results, self.reporter.logs_dir)
+        except Exception as e:
+            self.log(f"[HISTORY][ERROR] {e}")
+        if tracing.is_enabled():
+            try:
+                path = tracing.end_session(self.reporter.logs_dir)
+                if path:
+                    self.log(f"[FILE] Trace written: {path}")
+            except Exception as e:
+                self.log(f"[FILE][ERROR] Trace: {e}")
+        return self.gate_results
+
+    def write_report(self) -> Optional[str]:
+        try:
+            path = self.reporter.write_excel_results(self.gate_results, self.slot_ids, self.gate_blocked,
+                                                     self.gate_timeout)
+            self.log(f"[FILE] Excel written: {path}")
+            return path
+        except Exception as e:
+            self.log(f"[FILE][ERROR] {e}")
+            return None
+
+    # =========================================================
+    # CONTINUOUS FLOW
+    # =========================================================
+    def start_flow(self, report: bool = True) -> None:
+        """One log / trace / history session for the whole flow run."""
+        self._flow_report = report
+        self.gate_results = {g: {s: None for s in SLOTS} for g in (1, 2, 3, 4, 5, 6)}
+        self.gate_blocked = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+        self.gate_timeout = {g: set() for g in (1, 2, 3, 4, 5, 6)}
+        try:
+            self.reporter.open_flow_session()
+        except Exception as e:
+            self.log(f"[FILE][ERROR] Session log: {e}")
+        profiler.reset()
+        tracing.begin_session(self.reporter.session_basename() or "ATP_flow")
+        history.begin_session(self.reporter.session_basename() or "ATP_flow", {})
+        self.log("[FLOW] Continuous flow started: load / unload slots at any time")
+
+    def run_flow(self, stop) -> None:
+        """FlowRunner worker loop until stop (threading.Event) is set."""
+        tracing.adopt_thread()
+        self.flow.run(stop)
+
+    def _retest_plan(self, rup_id: Optional[str]) -> Optional[Dict[int, bool]]:
+        return results_cache.retest_plan(self.reporter.logs_dir, rup_id, self.log)
+
+    def _record(self, slot: int, rup_id: Optional[str], results: Dict[int, Optional[bool]],
+                blocked, cached: Dict[int, bool], session: str, since: float = 0.0) -> None:
+        """Results cache (before history.end_session / end_unit take the gate runs)."""
+        try:
+            results_cache.record(self.reporter.logs_dir, rup_id, results, session,
+                                 history.unit_measurements(slot, since), blocked, cached)
+        except Exception as e:
+            self.log(f"[RETEST][ERROR] Results cache: {e}")
+
+    def _unit_done(self, lane: SlotLane) -> None:
+        """FlowRunner: one unit finished -> results cache, history, .xlsx, outbox."""
+        logs_dir = self.reporter.logs_dir
+        name = self.reporter.unit_basename(lane.slot, lane.rup_id)
+        self._record(lane.slot, lane.rup_id, lane.results, lane.blocked, lane.cached, name, lane.started)
+        sid = None
+        try:
+            sid = history.end_unit(lane.slot, lane.rup_id, name, lane.started, lane.t0,
+                                   lane.results, logs_dir)
+        except Exception as e:
+            self.log(f"[HISTORY][ERROR] {e}")
+        files = []
+        if self._flow_report:
+            try:
+                files.append(self.reporter.write_unit_excel(name, lane.slot, lane.rup_id, lane.results,
+                                                            lane.blocked, lane.timed_out))
+                self.log(f"[FILE] Excel written: {files[-1]}")
+            except Exception as e:
+                self.log(f"[FILE][ERROR] {e}")
+        if sid is not None and outbox.is_enabled():
+            outbox.enqueue_session(logs_dir, sid, files)
+
+    def stop_flow(self) -> None:
+        """Relays OFF, unfinished units dropped, flow session closed."""
+        self.flow.unload_all()
+        history.discard_session()
+        if tracing.is_enabled():
+            try:
+                path = tracing.end_session(self.reporter.logs_dir)
+                if path:
+                    self.log(f"[FILE] Trace written: {path}")
+            except Exception as e:
+                self.log(f"[FILE][ERROR] Trace: {e}")
+        if profiler.is_enabled():
+            for line in profiler.report_lines():
+                self.log(line)
+        self.log(f"[FLOW] Stopped after {self.flow.units_done} unit(s)")
+
+    def end_run(self) -> None:
+        """Relays off + close the session files (-> outbox); hardware handles stay open."""
+        self.hw.relay_off_all()
+        name = self.reporter.session_basename()
+        self.reporter.close_session()
+        eventlog.flush()
+        if self._history_sid is not None and outbox.is_enabled():
+            logs_dir = self.reporter.logs_dir
+            outbox.enqueue_session(logs_dir, self._history_sid, outbox.session_files(logs_dir, name))
+        self._history_sid = None
+
+    def shutdown(self) -> None:
+        self.end_run()
+        self.hw.cleanup()
+        eventlog.unsubscribe(self._log_sink)
@@ -0,0 +1,284 @@
+# services/eventlog.py
+"""
+Structured session log: JSON-lines events + the classic text .log, written by
+ONE background thread.
+
+    from services import eventlog
+    eventlog.subscribe(eventlog.console_sink)         # fn(List[Event]), writer thread
+    eventlog.begin_session("ATP_logs/ATP_A_B_C_D_<ts>.log")
+    eventlog.log("[GATE4] IUL_ON sent")                # never blocks, never touches disk
+    eventlog.end_session()                            # drain + close files
+
+Per session:
+    <name>.log           same text lines as before ("[HH:MM:SS] msg")
+    <name>.events.jsonl  {"ts", "session", "slot", "gate", "level", "msg", "fields"}
+
+log() only appends to a bounded queue (QUEUE_MAX). The writer drains up to
+BATCH_MAX events or BATCH_WINDOW_S, writes the whole batch, flushes once
+(group commit; os.fsync too with ATP_EVENTLOG_FSYNC=1) and then hands the
+batch to the subscribers (console, UI). A full queue drops the event and
+counts it; the count is logged as soon as there is room again.
+
+gate / slot default to the services.history gate run of the calling thread,
+level to the bracketed tags in the message ([ERROR], [FAIL], [WARN], ...).
+"""
+
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from hal import clock
+from services import history
+
+FSYNC_ENV = "ATP_EVENTLOG_FSYNC"
+
+QUEUE_MAX = 20000
+BATCH_MAX = 500
+BATCH_WINDOW_S = 0.05     # wall time; the writer never uses the (virtual) fixture clock
+IDLE_WAKE_S = 0.5
+
+DEBUG = "debug"
+INFO = "info"
+WARN = "warn"
+ERROR = "error"
+
+
+@dataclass
+class Event:
+    ts: float                       # hal.clock.time() (epoch, virtual clock -> fixture time)
+    msg: str
+    level: str = INFO
+    session: str = ""
+    slot: Optional[int] = None
+    gate: Optional[int] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def text(self) -> str:
+        return f"{datetime.datetime.fromtimestamp(self.ts).strftime('[%H:%M:%S]')} {self.msg}"
+
+    def to_json(self) -> str:
+        d = {"ts": round(self.ts, 6), "session": self.session, "slot": self.slot,
+             "gate": self.gate, "level": self.level, "msg": self.msg}
+        if self.fields:
+            d["fields"] = self.fields
+        return json.dumps(d, ensure_ascii=False, default=str)
+
+
+def level_of(msg: str) -> str:
+    if "[ERROR]" in msg or "[FAIL]" in msg or "❌" in msg:
+        return ERROR
+    if "[WARN]" in msg or "⚠" in msg:
+        return WARN
+    if "[DEBUG]" in msg:
+        return DEBUG
+    return INFO
+
+
+# =========================================================
+# WRITER
+# =========================================================
+class _Control:
+    """Ordered with the events: open / close files, flush barrier."""
+    def __init__(self, op: str, path: Optional[str] = None):
+        self.op = op
+        self.path = path
+        self.done = threading.Event()
+
+
+class _Writer:
+    def __init__(self):
+        self.q: "queue.Queue" = queue.Queue(maxsize=QUEUE_MAX)
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.stop_flag = threading.Event()
+        self.subscribers: List[Callable[[List[Event]], None]] = []
+        self.session = ""
+        self.text_file = None
+        self.json_file = None
+        self.fsync = os.environ.get(FSYNC_ENV, "").strip() not in ("", "0")
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.written = 0
+        self.batches = 0
+
+    # ---------- writer thread ----------
+    def run(self) -> None:
+        while True:
+            try:
+                first = self.q.get(timeout=IDLE_WAKE_S)
+            except queue.Empty:
+                if self.stop_flag.is_set():
+                    return
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + BATCH_WINDOW_S
+            while len(batch) < BATCH_MAX and not isinstance(batch[-1], _Control):
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.q.get(timeout=remaining) if remaining > 0 else self.q.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch: list) -> None:
+        events: List[Event] = []
+        for item in batch:
+            if isinstance(item, _Control):
+                self._write(events)
+                events = []
+                self._control(item)
+            else:
+                events.append(item)
+        self._write(events)
+
+        if self.dropped != self.reported_dropped:
+            n = self.dropped - self.reported_dropped
+            self.reported_dropped = self.dropped
+            self._write([Event(ts=clock.time(), level=WARN, session=self.session,
+                               msg=f"[EVENTLOG][WARN] {n} events dropped (queue full)")])
+
+    def _write(self, events: List[Event]) -> None:
+        if not events:
+            return
+        if self.text_file is not None:
+            try:
+                self.text_file.write("".join(e.text + "\n" for e in events))
+                self.json_file.write("".join(e.to_json() + "\n" for e in events))
+                self.text_file.flush()
+                self.json_file.flush()
+                if self.fsync:
+                    os.fsync(self.text_file.fileno())
+                    os.fsync(self.json_file.fileno())
+            except Exception as e:
+                print(f"[EVENTLOG][ERROR] write: {e}")  # writer thread: never touch the UI
+        self.written += len(events)
+        self.batches += 1
+
+        for fn in list(self.subscribers):
+            try:
+                fn(events)
+            except Exception as e:
+                print(f"[EVENTLOG][ERROR] subscriber {getattr(fn, '__name__', fn)}: {e}")
+
+    def _control(self, c: _Control) -> None:
+        try:
+            if c.op in ("open", "close"):
+                self._close_files()
+            if c.op == "open":
+                self.text_file = open(c.path, "w", encoding="utf-8")
+                self.json_file = open(os.path.splitext(c.path)[0] + ".events.jsonl", "w", encoding="utf-8")
+        except Exception as e:
+            print(f"[EVENTLOG][ERROR] {c.op} {c.path}: {e}")
+            self._close_files()
+        finally:
+            c.done.set()
+
+    def _close_files(self) -> None:
+        for f in (self.text_file, self.json_file):
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        self.text_file = None
+        self.json_file = None
+
+    # ---------- producers ----------
+    def ensure_started(self) -> None:
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.stop_flag.clear()
+                self.thread = threading.Thread(target=self.run, name="eventlog-writer", daemon=True)
+                self.thread.start()
+
+    def control(self, op: str, path: Optional[str] = None, wait_s: float = 5.0) -> bool:
+        self.ensure_started()
+        c = _Control(op, path)
+        self.q.put(c)                       # controls wait for room, events never do
+        return c.done.wait(wait_s)
+
+
+_w = _Writer()
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+def log(msg: str, level: Optional[str] = None, slot: Optional[int] = None,
+        gate: Optional[int] = None, **fields) -> None:
+    """Queue one event (never blocks; dropped + counted when the queue is full)."""
+    if gate is None or slot is None:
+        run = history.current_run()
+        if run is not None:
+            gate = run.gate if gate is None else gate
+            if slot is None and run.slot != history.ALL_SLOTS:
+                slot = run.slot
+    ev = Event(ts=clock.time(), msg=str(msg), level=level or level_of(str(msg)),
+               session=_w.session, slot=slot, gate=gate, fields=fields)
+    _w.ensure_started()
+    try:
+        _w.q.put_nowait(ev)
+    except queue.Full:
+        _w.dropped += 1
+
+
+def subscribe(fn: Callable[[List[Event]], None]) -> None:
+    """fn(events) is called from the writer thread after each batch is on disk."""
+    if fn not in _w.subscribers:
+        _w.subscribers.append(fn)
+
+
+def unsubscribe(fn: Callable[[List[Event]], None]) -> None:
+    try:
+        _w.subscribers.remove(fn)
+    except ValueError:
+        pass
+
+
+def console_sink(events: List[Event]) -> None:
+    print("\n".join(e.text for e in events), flush=True)
+
+
+def begin_session(log_path: str) -> None:
+    """Events from now on also go to log_path + <name>.events.jsonl."""
+    _w.session = os.path.splitext(os.path.basename(log_path))[0]
+    _w.control("open", log_path)
+
+
+def end_session() -> None:
+    """Write everything queued so far and close the session files."""
+    _w.control("close")
+    _w.session = ""
+
+
+def flush(timeout_s: float = 5.0) -> bool:
+    """Wait until everything queued so far is written and delivered."""
+    return _w.control("flush", wait_s=timeout_s)
+
+
+def stop() -> None:
+    if _w.thread is None:
+        return
+    flush()
+    _w.stop_flag.set()
+    _w.thread.join(timeout=2.0)
+    _w.thread = None
+    _w._close_files()
+
+
+def stats() -> dict:
+    return {"queued": _w.q.qsize(), "written": _w.written, "batches": _w.batches,
+            "dropped": _w.dropped, "session": _w.session}
+
+
+atexit.register(stop)
@@ -0,0 +1,306 @@
+# services/fixture_profile.py
+"""
+Fixture timing / tolerance profile: ONE typed object every gate reads.
+
+    from services.fixture_profile import FIXTURE
+    clock.sleep(FIXTURE.gate3.settle_s)
+
+Presets:
+    safe          today's hand-picked values (default)
+    fast          shorter settles / fewer re-reads for line throughput.
+                  UNVALIDATED: guessed, never measured (summary() and
+                  the startup log say so); for the line, generate a profile
+                  from `python -m services.settle propose` instead
+    characterize  waits cut to (almost) zero where the gate watches the
+                  signal anyway, longer observation windows -> feeds
+                  `python -m services.settle propose` (see services/settle.py)
+
+Profile files (.toml or .json) start from a preset and override fields:
+
+    name = "fixture-2 tuned"
+    base = "safe"
+    [gate3]
+    settle_s = 0.65
+    [gate6]
+    negotiate_settle_s = 0.9
+
+Selection (startup, main_atp / atp_headless):
+    ATP_FIXTURE_PROFILE=fast | /path/profile.toml | /path/profile.json
+    atp_headless.py --fixture-profile fast
+
+load() replaces the sections of FIXTURE in place, so `FIXTURE` imported at
+module level always sees the active profile. Unknown keys / wrong types are
+errors (ValueError), never silently ignored.
+"""
+
+import dataclasses
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PROFILE_ENV = "ATP_FIXTURE_PROFILE"
+DEFAULT_PRESET = "safe"
+
+# presets whose values nobody has measured (profiles based on them inherit this)
+UNVALIDATED_PRESETS = ("fast",)
+
+
+# =========================================================
+# SECTIONS (one per gate)
+# =========================================================
+@dataclass
+class Gate2Timing:
+    timeout_s: float = 2.0           # total budget for the ID-pins answer (per attempt)
+    start_holdoff_s: float = 0.30    # max wait for START_ATP ack before sending READ_ID anyway
+    req_interval_s: float = 0.25     # re-send READ_ID_PINS_REQ if the RUP stays silent
+    retry_delay_s: float = 0.5
+    max_attempts: int = 3
+
+
+@dataclass
+class Gate3Timing:
+    cmd_quiet_s: float = 0.20        # pause right after a TR CAN command
+    settle_s: float = 1.20           # settle BEFORE sampling
+    window_s: float = 3.00           # total sampling window
+    fs_hz: int = 500
+    transient_discard_s: float = 0.50  # ignore the first part of the window
+    peak_thresh_v: float = 3.0
+    low_expect: Tuple[float, float] = (2.45, 3.75)    # ~3.6V
+    high_expect: Tuple[float, float] = (3.75, 4.05)   # ~3.8-3.9V
+
+
+@dataclass
+class Gate4Timing:
+    iul_settle_s: float = 4.0
+    read_retries: int = 4
+    read_delay_s: float = 4.0
+
+
+@dataclass
+class Gate5Timing:
+    timeout_s: float = 2.0
+    settle_delay_s: float = 0.5
+
+
+@dataclass
+class Gate6Timing:
+    mux_settle_s: float = 2.0            # after Acroname select_rup
+    pm_reset_settle_s: float = 2.0       # after PM125 5V / 0 mA (clean start, end of step)
+    power_60w_settle_s: float = 2.0      # after POWER_TO_60W
+    power_15w_settle_s: float = 1.5      # after POWER_TO_15W
+    negotiate_settle_s: float = 2.0      # PM125 set_voltage -> CONSTAT check
+    negotiate_poll_s: float = 2.0        # < negotiate_settle_s: CONSTAT polled while waiting (characterize)
+    ramp_step_ma: int = 250
+    ramp_delay_s: float = 1.0
+    pm_window_timeout_s: float = 20.0
+    pm_window_poll_s: float = 1.0
+    power_tol_pm: float = 0.3
+    power_tol_rup: float = 0.3
+    power_report_period_s: float = 0.1
+    power_report_samples: int = 5
+    power_report_timeout_s: float = 2.0
+
+
+SECTIONS = {
+    "gate2": Gate2Timing,
+    "gate3": Gate3Timing,
+    "gate4": Gate4Timing,
+    "gate5": Gate5Timing,
+    "gate6": Gate6Timing,
+}
+
+
+@dataclass
+class FixtureProfile:
+    name: str = DEFAULT_PRESET
+    source: str = "preset"
+    validated: bool = True           # False: built on an UNVALIDATED_PRESETS preset
+    gate2: Gate2Timing = field(default_factory=Gate2Timing)
+    gate3: Gate3Timing = field(default_factory=Gate3Timing)
+    gate4: Gate4Timing = field(default_factory=Gate4Timing)
+    gate5: Gate5Timing = field(default_factory=Gate5Timing)
+    gate6: Gate6Timing = field(default_factory=Gate6Timing)
+
+    def get(self, dotted: str):
+        """'gate3.settle_s' -> value"""
+        sec, key = dotted.split(".", 1)
+        return getattr(getattr(self, sec), key)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "validated": self.validated,
+                **{s: dataclasses.asdict(getattr(self, s)) for s in SECTIONS}}
+
+    def summary(self) -> str:
+        g2, g3, g4, g5, g6 = self.gate2, self.gate3, self.gate4, self.gate5, self.gate6
+        return (f"{self.name} ({self.source}): gate3 settle={g3.settle_s:g}s window={g3.window_s:g}s, "
+                f"gate4 iul_settle={g4.iul_settle_s:g}s x{g4.read_retries} reads, "
+                f"gate5 settle={g5.settle_delay_s:g}s, gate6 negotiate={g6.negotiate_settle_s:g}s "
+                f"ramp={g6.ramp_delay_s:g}s/step, gate2 holdoff={g2.start_holdoff_s:g}s"
+                + ("" if self.validated else
+                   " [UNVALIDATED: guessed, not characterized — see services.settle propose]"))
+
+
+# =========================================================
+# PRESETS (overrides on top of the dataclass defaults = "safe")
+# =========================================================
+PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "safe": {},
+    # UNVALIDATED guesses (e.g. Gate4 IUL settle 4.0 -> 0.5 s, read delay
+    # 4.0 -> 0.1 s, Gate6 PM reset settle 2.0 -> 0.5 s): no settle
+    # measurements behind them. Use a `services.settle propose` profile on
+    # the line.
+    "fast": {
+        "gate2": {"retry_delay_s": 0.2},
+        "gate3": {"cmd_quiet_s": 0.10, "settle_s": 0.60, "window_s": 1.50, "transient_discard_s": 0.30},
+        "gate4": {"iul_settle_s": 0.5, "read_retries": 2, "read_delay_s": 0.1},
+        "gate5": {"settle_delay_s": 0.15},
+        "gate6": {
+            "mux_settle_s": 1.0, "pm_reset_settle_s": 0.5, "power_60w_settle_s": 1.0,
+            "power_15w_settle_s": 1.0, "negotiate_settle_s": 1.0, "negotiate_poll_s": 1.0, "ramp_step_ma": 500,
+            "ramp_delay_s": 0.3, "pm_window_poll_s": 0.5,
+        },
+    },
+    "characterize": {
+        # Sampling starts right after the command; the judged part of the window
+        # starts at the same point as "safe" (0.2 + 0 + 1.7 = 0.2 + 1.2 + 0.5)
+        "gate2": {"start_holdoff_s": 1.0},
+        "gate3": {"settle_s": 0.0, "window_s": 4.20, "transient_discard_s": 1.70},
+        "gate4": {"iul_settle_s": 4.0, "read_retries": 1, "read_delay_s": 0.1},
+        "gate6": {"negotiate_settle_s": 3.0, "negotiate_poll_s": 0.1},
+    },
+}
+
+
+# =========================================================
+# BUILD / VALIDATE
+# =========================================================
+def _coerce(section: str, key: str, typ, value):
+    where = f"{section}.{key}"
+    if typ is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{where}: expected a number, got {value!r}")
+        return float(value)
+    if typ is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{where}: expected an integer, got {value!r}")
+        return value
+    if typ == Tuple[float, float]:
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise ValueError(f"{where}: expected [low, high], got {value!r}")
+        lo, hi = (_coerce(section, key, float, v) for v in value)
+        if lo > hi:
+            raise ValueError(f"{where}: low {lo} > high {hi}")
+        return (lo, hi)
+    raise ValueError(f"{where}: unsupported type {typ}")
+
+
+def _apply(prof: FixtureProfile, overrides: Dict[str, Any]) -> None:
+    for section, values in overrides.items():
+        cls = SECTIONS.get(section)
+        if cls is None:
+            raise ValueError(f"unknown section [{section}] (expected {', '.join(SECTIONS)})")
+        if not isinstance(values, dict):
+            raise ValueError(f"[{section}] must be a table")
+        types = {f.name: f.type for f in dataclasses.fields(cls)}
+        cur = getattr(prof, section)
+        for key, value in values.items():
+            if key not in types:
+                raise ValueError(f"unknown key {section}.{key}")
+            setattr(cur, key, _coerce(section, key, types[key], value))
+
+
+def validate(prof: FixtureProfile) -> None:
+    for section in SECTIONS:
+        for f in dataclasses.fields(SECTIONS[section]):
+            v = getattr(getattr(prof, section), f.name)
+            if isinstance(v, (int, float)) and v < 0:
+                raise ValueError(f"{section}.{f.name} must be >= 0 (got {v})")
+    g3 = prof.gate3
+    if g3.fs_hz <= 0:
+        raise ValueError("gate3.fs_hz must be > 0")
+    if g3.window_s <= g3.transient_discard_s:
+        raise ValueError("gate3.window_s must be longer than gate3.transient_discard_s")
+    if min(prof.gate2.max_attempts, prof.gate4.read_retries, prof.gate6.power_report_samples) < 1:
+        raise ValueError("gate2.max_attempts / gate4.read_retries / gate6.power_report_samples must be >= 1")
+    if prof.gate2.req_interval_s <= 0 or prof.gate6.negotiate_poll_s <= 0 \
+            or prof.gate6.power_report_period_s <= 0 or prof.gate6.ramp_step_ma <= 0:
+        raise ValueError("poll / repeat intervals and gate6.ramp_step_ma must be > 0")
+
+
+def build(preset: str = DEFAULT_PRESET, overrides: Optional[Dict[str, Any]] = None,
+          name: Optional[str] = None, source: str = "preset") -> FixtureProfile:
+    if preset not in PRESETS:
+        raise ValueError(f"unknown preset {preset!r} (expected {', '.join(PRESETS)})")
+    prof = FixtureProfile(name=name or preset, source=source, validated=preset not in UNVALIDATED_PRESETS)
+    _apply(prof, PRESETS[preset])
+    _apply(prof, overrides or {})
+    validate(prof)
+    return prof
+
+
+def _read_file(path: str) -> Dict[str, Any]:
+    if path.lower().endswith(".toml"):
+        try:
+            import tomllib                  # Python 3.11+
+        except ImportError:
+            try:
+                import tomli as tomllib     # pip install tomli
+            except ImportError:
+                raise ValueError("TOML profiles need Python 3.11+ or the tomli package (or use .json)")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def from_file(path: str) -> FixtureProfile:
+    data = dict(_read_file(path))
+    name = data.pop("name", None) or os.path.splitext(os.path.basename(path))[0]
+    base = data.pop("base", DEFAULT_PRESET)
+    data.pop("meta", None)   # free-form (e.g. tuner statistics)
+    return build(base, data, name=name, source=path)
+
+
+def resolve(spec: str) -> FixtureProfile:
+    """Preset name or path to a .toml / .json profile."""
+    spec = (spec or DEFAULT_PRESET).strip()
+    if spec in PRESETS:
+        return build(spec)
+    if not os.path.exists(spec):
+        raise ValueError(f"no preset or profile file named {spec!r} (presets: {', '.join(PRESETS)})")
+    return from_file(spec)
+
+
+# =========================================================
+# ACTIVE PROFILE
+# =========================================================
+FIXTURE = build(DEFAULT_PRESET)
+
+
+def activate(prof: FixtureProfile) -> FixtureProfile:
+    """Make prof the active profile (FIXTURE is updated in place)."""
+    FIXTURE.name = prof.name
+    FIXTURE.source = prof.source
+    FIXTURE.validated = prof.validated
+    for section in SECTIONS:
+        setattr(FIXTURE, section, getattr(prof, section))
+    return FIXTURE
+
+
+def load(spec: str, log: Callable[[str], None] = print) -> FixtureProfile:
+    prof = activate(resolve(spec))
+    log(f"[FIXTURE] Profile {prof.summary()}")
+    return prof
+
+
+def load_from_env(log: Callable[[str], None] = print) -> FixtureProfile:
+    """ATP_FIXTURE_PROFILE; on error keep the current profile and log it."""
+    spec = os.environ.get(PROFILE_ENV, "").strip()
+    if not spec:
+        return FIXTURE
+    try:
+        return load(spec, log)
+    except Exception as e:
+        log(f"[FIXTURE][ERROR] {spec}: {e} -> keeping {FIXTURE.name}")
+        return FIXTURE
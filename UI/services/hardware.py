@@ -2,6 +2,7 @@
 from typing import Callable
 
 from tests.power_PT.relay_1_4 import (
+    init_relays,
     relay_on_rup1, relay_off_rup1,
     relay_on_rup2, relay_off_rup2,
     relay_on_rup3, relay_off_rup3,
@@ -21,6 +22,8 @@ from tests.ID.id_pins_init import init_id_pins_full_config
 
 # ✅ CAN target selection (per-slot TX arbitration ID)
 from tests.CAN.can_commands import set_target_slot
+from tests.CAN import can_commands, can_utils
+from services import watchdog
 
 
 class HardwareController:
@@ -43,6 +46,18 @@ class HardwareController:
         # Track whether ID pins were configured successfully at startup
         self._id_config_ok = False
 
+        # A gate cancelled by the watchdog may be stuck in the shared CAN buses
+        watchdog.add_release(self.close_can_bus_cleanly)
+
+        # -------------------------------------------------
+        # 0) Claim relay outputs, all OFF (HAL backend: real or sim)
+        # -------------------------------------------------
+        try:
+            init_relays()
+            self.log("[HW] Relays initialized (all OFF)")
+        except Exception as e:
+            self.log(f"[HW][WARN] Relay init failed: {e}")
+
         # -------------------------------------------------
         # 1) Configure MCP23S17 outputs + apply all 4 ID configs ONCE
         # -------------------------------------------------
@@ -140,7 +155,16 @@ class HardwareController:
     # -------------------------
     # CLEANUP
     # -------------------------
+    def close_can_bus_cleanly(self) -> None:
+        """Shut down the shared CAN TX / RX buses (reopened on next use)."""
+        can_commands.close_bus()
+        can_utils.close_bus()
+
     def cleanup(self) -> None:
+        try:
+            self.close_can_bus_cleanly()
+        except Exception:
+            pass
         try:
             cleanup_gpio()
         except Exception:
@@ -0,0 +1,585 @@
+# services/history.py
+"""
+Cycle-time history: every ATP session in one SQLite file.
+
+    ATP_logs/atp_history.sqlite3
+      sessions      one row per session (cycle time, units, yield, station, backend)
+      units         one row per slot (RUP ID, PASS/FAIL)
+      gate_runs     one row per gate x slot (slot 0 = all-slot gate: Gate2 parallel, Gate3)
+                    start, duration, PASS/FAIL, retries
+      measurements  named values recorded by the gates (peak_mean_on, pm_w, ...)
+
+Recording (runners / gates / engine):
+
+    history.begin_session(name, slot_ids)
+    with history.gate_run(4, slot):        # runners, next to profiler.tag()
+        history.measure("pm_w", 44.8, "W") # gates
+        history.retry()                    # gates, once per extra attempt
+    history.end_session(gate_results, logs_dir)   # one transaction
+
+Continuous flow (runners/flow_runner.py): one open session for the whole
+run, and every finished unit is written as its own one-unit session:
+
+    history.end_unit(slot, rup_id, name, started, t0, results, logs_dir)
+    history.discard_session()                      # flow stopped
+
+Report:
+
+    python -m services.history report                  # all sessions
+    python -m services.history report --days 7 --trend day
+    python -m services.history report --station fixture-2 --backend real
+
+Durations use hal.clock (virtual clock -> fixture time). Everything is kept
+in memory during the session and written once at the end, so nothing here
+touches the disk while gates run. Errors never reach the ATP sequence.
+"""
+
+import argparse
+import datetime
+import math
+import os
+import socket
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from hal import clock
+
+DB_NAME = "atp_history.sqlite3"
+STATION_ENV = "ATP_STATION"
+
+ALL_SLOTS = 0   # gate_runs.slot for one-shot gates
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    station     TEXT NOT NULL,
+    backend     TEXT NOT NULL,
+    started     REAL NOT NULL,          -- epoch seconds
+    cycle_s     REAL NOT NULL,
+    n_units     INTEGER NOT NULL,
+    n_pass      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_sessions_started ON sessions (started);
+CREATE INDEX IF NOT EXISTS ix_sessions_station ON sessions (station, started);
+
+CREATE TABLE IF NOT EXISTS units (
+    session_id  INTEGER NOT NULL REFERENCES sessions (id),
+    slot        INTEGER NOT NULL,
+    rup_id      TEXT,
+    passed      INTEGER NOT NULL,
+    PRIMARY KEY (session_id, slot)
+);
+CREATE INDEX IF NOT EXISTS ix_units_rup ON units (rup_id);
+
+CREATE TABLE IF NOT EXISTS gate_runs (
+    id          INTEGER PRIMARY KEY,
+    session_id  INTEGER NOT NULL REFERENCES sessions (id),
+    gate        INTEGER NOT NULL,
+    slot        INTEGER NOT NULL,
+    started     REAL NOT NULL,
+    duration_s  REAL NOT NULL,
+    passed      INTEGER,                -- NULL for all-slot runs
+    retries     INTEGER NOT NULL DEFAULT 0
+);
+-- covering index for the per-gate percentile query (gate + time window)
+CREATE INDEX IF NOT EXISTS ix_gate_runs_gate ON gate_runs (gate, started, duration_s, retries, passed, session_id);
+-- percentile pick without a sort (ORDER BY duration_s LIMIT 1 OFFSET k)
+CREATE INDEX IF NOT EXISTS ix_gate_runs_duration ON gate_runs (gate, duration_s, started, session_id);
+CREATE INDEX IF NOT EXISTS ix_gate_runs_session ON gate_runs (session_id);
+
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id      INTEGER NOT NULL REFERENCES gate_runs (id),
+    slot        INTEGER NOT NULL,
+    name        TEXT NOT NULL,
+    value       REAL NOT NULL,
+    unit        TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS ix_measurements_run ON measurements (run_id);
+CREATE INDEX IF NOT EXISTS ix_measurements_name ON measurements (name, slot);
+"""
+
+
+# =========================================================
+# IN-MEMORY SESSION
+# =========================================================
+@dataclass
+class GateRun:
+    gate: int
+    slot: int
+    started: float
+    duration_s: float = 0.0
+    retries: int = 0
+    # (slot, name, value, unit)
+    measurements: List[Tuple[int, str, float, str]] = field(default_factory=list)
+
+
+@dataclass
+class _Session:
+    name: str
+    slot_ids: Dict[int, Optional[str]]
+    started: float
+    t0: float
+    thread: int
+    runs: List[GateRun] = field(default_factory=list)
+
+
+_session: Optional[_Session] = None
+_tls = threading.local()
+# fn(kind, obj): ("session", name) / ("gate_start", GateRun) / ("gate_end", GateRun)
+_listeners: List[Callable[[str, object], None]] = []
+
+
+def add_listener(fn: Callable[[str, object], None]) -> None:
+    """Live session / gate timing (e.g. services.status_api). Must not block."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[str, object], None]) -> None:
+    try:
+        _listeners.remove(fn)
+    except ValueError:
+        pass
+
+
+def _notify(kind: str, obj) -> None:
+    for fn in list(_listeners):
+        try:
+            fn(kind, obj)
+        except Exception:
+            pass
+
+
+def begin_session(name: str, slot_ids: Dict[int, Optional[str]]) -> None:
+    """New session; the calling thread is the session thread."""
+    global _session
+    _session = _Session(
+        name=name or "ATP",
+        slot_ids=dict(slot_ids),
+        started=clock.time(),
+        t0=clock.monotonic(),
+        thread=threading.get_ident(),
+    )
+    _tls.run = None
+    _notify("session", _session.name)
+
+
+@contextmanager
+def gate_run(gate: int, slot: Optional[int] = None):
+    """Time one gate run (slot=None: all slots at once). No-op outside a session."""
+    sess = _session
+    if sess is None:
+        yield None
+        return
+    run = GateRun(gate=int(gate), slot=ALL_SLOTS if slot is None else int(slot), started=clock.time())
+    prev = getattr(_tls, "run", None)
+    _tls.run = run
+    t0 = clock.monotonic()
+    _notify("gate_start", run)
+    try:
+        yield run
+    finally:
+        run.duration_s = clock.monotonic() - t0
+        _tls.run = prev
+        sess.runs.append(run)
+        _notify("gate_end", run)
+
+
+def measure(name: str, value, unit: str = "", slot: Optional[int] = None) -> None:
+    """Attach a measurement to the current gate run (slot defaults to the run's slot)."""
+    run = getattr(_tls, "run", None)
+    if run is None or value is None:
+        return
+    try:
+        run.measurements.append((run.slot if slot is None else int(slot), str(name), float(value), unit))
+    except (TypeError, ValueError):
+        pass
+
+
+def current_run() -> Optional[GateRun]:
+    """Gate run the calling thread is in (None outside gate_run())."""
+    return getattr(_tls, "run", None)
+
+
+def unit_measurements(slot: int, since: float = 0.0) -> Dict[int, List[Tuple[str, float, str]]]:
+    """{gate: [(name, value, unit)]} of one slot in the open session (runs started >= since)."""
+    sess = _session
+    out: Dict[int, List[Tuple[str, float, str]]] = {}
+    if sess is None:
+        return out
+    for run in sess.runs:
+        if run.started < since or run.slot not in (slot, ALL_SLOTS):
+            continue
+        for s, name, value, unit in run.measurements:
+            if s == slot:
+                out.setdefault(run.gate, []).append((name, value, unit))
+    return out
+
+
+def retry(n: int = 1) -> None:
+    """Count extra attempts in the current gate run."""
+    run = getattr(_tls, "run", None)
+    if run is not None:
+        run.retries += n
+
+
+# =========================================================
+# DATABASE
+# =========================================================
+def db_path(logs_dir: str) -> str:
+    return os.path.join(logs_dir, DB_NAME)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def station_name() -> str:
+    return os.environ.get(STATION_ENV) or socket.gethostname()
+
+
+def _backend_name() -> str:
+    """real / sim / vsim (same names as ATP_HAL)."""
+    try:
+        from hal import get_backend
+        name = get_backend().name
+    except Exception:
+        return "?"
+    return "vsim" if name == "sim" and clock.is_virtual() else name
+
+
+def _write(logs_dir: str, name: str, started: float, cycle_s: float,
+           slot_ids: Dict[int, Optional[str]], runs: List[GateRun],
+           gate_results: Dict[int, Dict[int, Optional[bool]]]) -> int:
+    """One session row + units + gate runs + measurements, one transaction."""
+    slots = sorted(slot_ids)
+    unit_pass = {
+        s: all(gate_results.get(g, {}).get(s) is not False for g in gate_results)
+        for s in slots
+    }
+
+    conn = connect(db_path(logs_dir))
+    try:
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO sessions (name, station, backend, started, cycle_s, n_units, n_pass) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, station_name(), _backend_name(), started, cycle_s,
+                 len(slots), sum(1 for s in slots if unit_pass[s])),
+            )
+            sid = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO units (session_id, slot, rup_id, passed) VALUES (?, ?, ?, ?)",
+                [(sid, s, slot_ids.get(s), int(unit_pass[s])) for s in slots],
+            )
+            for run in runs:
+                passed = None
+                if run.slot != ALL_SLOTS:
+                    v = gate_results.get(run.gate, {}).get(run.slot)
+                    passed = None if v is None else int(bool(v))
+                cur = conn.execute(
+                    "INSERT INTO gate_runs (session_id, gate, slot, started, duration_s, passed, retries) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (sid, run.gate, run.slot, run.started, run.duration_s, passed, run.retries),
+                )
+                if run.measurements:
+                    rid = cur.lastrowid
+                    conn.executemany(
+                        "INSERT INTO measurements (run_id, slot, name, value, unit) VALUES (?, ?, ?, ?, ?)",
+                        [(rid,) + m for m in run.measurements],
+                    )
+        return sid
+    finally:
+        conn.close()
+
+
+def end_session(gate_results: Dict[int, Dict[int, Optional[bool]]], logs_dir: str) -> Optional[int]:
+    """
+    Write the open session in one transaction and close it.
+    A unit passes when no gate it ran FAILED. Returns the session row id.
+    """
+    global _session
+    sess = _session
+    if sess is None:
+        return None
+    _session = None
+
+    return _write(logs_dir, sess.name, sess.started, clock.monotonic() - sess.t0,
+                  sess.slot_ids, sess.runs, gate_results)
+
+
+def end_unit(slot: int, rup_id: Optional[str], name: str, started: float, t0: float,
+             gate_results: Dict[int, Optional[bool]], logs_dir: str) -> Optional[int]:
+    """
+    Continuous flow: write ONE unit as its own one-unit session and take its
+    gate runs (this slot, started >= `started`) out of the open session.
+    started = clock.time() at load, t0 = clock.monotonic() at load.
+    """
+    if _session is None:
+        return None
+    return _write(logs_dir, name, started, clock.monotonic() - t0, {slot: rup_id},
+                  drop_unit(slot, started), {g: {slot: v} for g, v in gate_results.items()})
+
+
+def drop_unit(slot: int, started: float) -> List[GateRun]:
+    """Take one unit's gate runs out of the open session (aborted unit: nothing is written)."""
+    sess = _session
+    if sess is None:
+        return []
+    mine = [r for r in sess.runs if r.slot == slot and r.started >= started]
+    sess.runs = [r for r in sess.runs if not (r.slot == slot and r.started >= started)]
+    return mine
+
+
+def discard_session() -> None:
+    """Close the open session without writing it (flow mode: units are written by end_unit)."""
+    global _session
+    _session = None
+
+
+# =========================================================
+# EXPORT / IMPORT (services.outbox -> services.collector)
+# =========================================================
+SESSION_COLS = ("name", "station", "backend", "started", "cycle_s", "n_units", "n_pass")
+
+
+def export_session(conn: sqlite3.Connection, sid: int) -> Optional[dict]:
+    """One session with its units, gate runs and measurements as plain JSON types."""
+    row = conn.execute(f"SELECT {', '.join(SESSION_COLS)} FROM sessions WHERE id = ?", (sid,)).fetchone()
+    if row is None:
+        return None
+    rec = dict(zip(SESSION_COLS, row))
+    rec["units"] = [
+        {"slot": s, "rup_id": rid, "passed": bool(p)}
+        for s, rid, p in conn.execute(
+            "SELECT slot, rup_id, passed FROM units WHERE session_id = ? ORDER BY slot", (sid,))
+    ]
+    runs = []
+    for rid, gate, slot, started, dur, passed, retries in conn.execute(
+            "SELECT id, gate, slot, started, duration_s, passed, retries FROM gate_runs "
+            "WHERE session_id = ? ORDER BY id", (sid,)).fetchall():
+        runs.append({
+            "gate": gate, "slot": slot, "started": started, "duration_s": dur,
+            "passed": None if passed is None else bool(passed), "retries": retries,
+            "measurements": [list(m) for m in conn.execute(
+                "SELECT slot, name, value, unit FROM measurements WHERE run_id = ?", (rid,))],
+        })
+    rec["gate_runs"] = runs
+    return rec
+
+
+def import_session(conn: sqlite3.Connection, rec: dict) -> int:
+    """Insert an export_session() record (caller owns the transaction). Returns the new id."""
+    cur = conn.execute(
+        f"INSERT INTO sessions ({', '.join(SESSION_COLS)}) VALUES ({', '.join('?' * len(SESSION_COLS))})",
+        tuple(rec[c] for c in SESSION_COLS),
+    )
+    sid = cur.lastrowid
+    conn.executemany(
+        "INSERT INTO units (session_id, slot, rup_id, passed) VALUES (?, ?, ?, ?)",
+        [(sid, u["slot"], u.get("rup_id"), int(bool(u["passed"]))) for u in rec.get("units", [])],
+    )
+    for run in rec.get("gate_runs", []):
+        passed = run.get("passed")
+        cur = conn.execute(
+            "INSERT INTO gate_runs (session_id, gate, slot, started, duration_s, passed, retries) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sid, run["gate"], run["slot"], run["started"], run["duration_s"],
+             None if passed is None else int(bool(passed)), run.get("retries", 0)),
+        )
+        if run.get("measurements"):
+            rid = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO measurements (run_id, slot, name, value, unit) VALUES (?, ?, ?, ?, ?)",
+                [(rid, m[0], m[1], m[2], m[3] if len(m) > 3 else "") for m in run["measurements"]],
+            )
+    return sid
+
+
+# =========================================================
+# REPORT
+# =========================================================
+def _where(since: Optional[float], station: Optional[str], backend: Optional[str]) -> Tuple[str, list]:
+    conds, args = [], []
+    if since is not None:
+        conds.append("started >= ?")
+        args.append(since)
+    if station:
+        conds.append("station = ?")
+        args.append(station)
+    if backend:
+        conds.append("backend = ?")
+        args.append(backend)
+    return (" WHERE " + " AND ".join(conds)) if conds else "", args
+
+
+def summary(conn: sqlite3.Connection, since: Optional[float] = None,
+            station: Optional[str] = None, backend: Optional[str] = None) -> dict:
+    where, args = _where(since, station, backend)
+    row = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(n_units), 0), COALESCE(SUM(n_pass), 0), "
+        f"COALESCE(SUM(cycle_s), 0), MIN(started), MAX(started + cycle_s) FROM sessions{where}",
+        args,
+    ).fetchone()
+    n, units, passed, busy_s, first, last = row
+    span_s = (last - first) if (first is not None and last is not None) else 0.0
+    return {
+        "sessions": n,
+        "units": units,
+        "passed": passed,
+        "yield": (passed / units) if units else None,
+        "avg_cycle_s": (busy_s / n) if n else None,
+        # units/hour while testing vs. over the calendar span (includes loading / idle)
+        "uph_cycle": (units * 3600.0 / busy_s) if busy_s else None,
+        "uph_wall": (units * 3600.0 / span_s) if span_s > 0 else None,
+    }
+
+
+def gate_latency(conn: sqlite3.Connection, since: Optional[float] = None,
+                 station: Optional[str] = None, backend: Optional[str] = None) -> List[dict]:
+    """
+    Per gate: n, p50, p95, max duration, retries, fail count.
+    Percentiles are picked with ORDER BY ... LIMIT 1 OFFSET k inside SQLite
+    (nearest rank), so rows never cross into Python.
+    """
+    out = []
+    gates = [g for (g,) in conn.execute("SELECT DISTINCT gate FROM gate_runs ORDER BY gate")]
+    for gate in gates:
+        frm = " FROM gate_runs r"
+        args: list = [gate]
+        conds = ["r.gate = ?"]
+        if since is not None:
+            conds.append("r.started >= ?")
+            args.append(since)
+        if station or backend:
+            w, wa = _where(since, station, backend)
+            conds.append(f"r.session_id IN (SELECT id FROM sessions{w})")
+            args += wa
+        frm += " WHERE " + " AND ".join(conds)
+
+        n, max_s, retries, fails = conn.execute(
+            "SELECT COUNT(*), MAX(r.duration_s), COALESCE(SUM(r.retries), 0), "
+            "COALESCE(SUM(r.passed = 0), 0)" + frm, args
+        ).fetchone()
+        if not n:
+            continue
+
+        def pct(p: float) -> float:
+            k = max(0, min(n - 1, math.ceil(p / 100.0 * n) - 1))
+            return conn.execute(
+                "SELECT r.duration_s" + frm + " ORDER BY r.duration_s LIMIT 1 OFFSET ?", args + [k]
+            ).fetchone()[0]
+
+        out.append({
+            "gate": gate,
+            "n": n,
+            "p50_s": pct(50),
+            "p95_s": pct(95),
+            "max_s": max_s,
+            "retries": retries,
+            "fails": fails,
+        })
+    return out
+
+
+def trend(conn: sqlite3.Connection, period: str = "day", since: Optional[float] = None,
+          station: Optional[str] = None, backend: Optional[str] = None) -> List[dict]:
+    fmt = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m", "hour": "%Y-%m-%d %H:00"}[period]
+    where, args = _where(since, station, backend)
+    rows = conn.execute(
+        f"SELECT strftime('{fmt}', started, 'unixepoch', 'localtime') AS p, COUNT(*), SUM(n_units), "
+        f"SUM(n_pass), AVG(cycle_s), SUM(cycle_s) FROM sessions{where} GROUP BY p ORDER BY p",
+        args,
+    ).fetchall()
+    return [
+        {
+            "period": p, "sessions": n, "units": u, "passed": ok, "avg_cycle_s": avg,
+            "uph_cycle": (u * 3600.0 / busy) if busy else None,
+        }
+        for p, n, u, ok, avg, busy in rows
+    ]
+
+
+def _f(x, spec: str = "7.1f") -> str:
+    return "    ---" if x is None else format(x, spec)
+
+
+def report_lines(conn: sqlite3.Connection, since: Optional[float] = None, station: Optional[str] = None,
+                 backend: Optional[str] = None, period: Optional[str] = "day") -> List[str]:
+    s = summary(conn, since, station, backend)
+    lines = ["================ ATP CYCLE-TIME HISTORY ================"]
+    if not s["sessions"]:
+        return lines + ["(no sessions)"]
+
+    lines.append(
+        f"Sessions {s['sessions']}  units {s['units']}  pass {s['passed']} "
+        f"({100 * s['yield']:.1f}%)  avg cycle {s['avg_cycle_s']:.1f}s"
+    )
+    lines.append(f"Throughput: {_f(s['uph_cycle'], '.1f')} units/h while testing, "
+                 f"{_f(s['uph_wall'], '.1f')} units/h over the period")
+
+    lines.append("")
+    lines.append("Gate   slot-runs     p50 s     p95 s     max s  retries  fails")
+    for g in gate_latency(conn, since, station, backend):
+        lines.append(
+            f"Gate{g['gate']:<3} {g['n']:>9} {_f(g['p50_s'], '9.2f')} {_f(g['p95_s'], '9.2f')} "
+            f"{_f(g['max_s'], '9.2f')} {g['retries']:>8} {g['fails']:>6}"
+        )
+
+    if period:
+        lines.append("")
+        lines.append(f"{'Trend (' + period + ')':<18} sessions  units  yield  avg cycle s  units/h")
+        for t in trend(conn, period, since, station, backend):
+            yld = 100.0 * t["passed"] / t["units"] if t["units"] else 0.0
+            lines.append(
+                f"{t['period']:<18} {t['sessions']:>8} {t['units']:>6} {yld:5.1f}% "
+                f"{_f(t['avg_cycle_s'], '12.1f')} {_f(t['uph_cycle'], '8.1f')}"
+            )
+    return lines
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP cycle-time history report")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("report", help="throughput, per-gate p50/p95, trend")
+    rp.add_argument("--db", default=None, help=f"database (default <logs-dir>/{DB_NAME})")
+    rp.add_argument("--logs-dir", default="ATP_logs")
+    rp.add_argument("--days", type=float, default=None, help="only the last N days")
+    rp.add_argument("--station", default=None)
+    rp.add_argument("--backend", default=None, help="real / sim / vsim")
+    rp.add_argument("--trend", default="day", choices=("hour", "day", "week", "month", "none"))
+    args = ap.parse_args(argv)
+
+    path = args.db or db_path(args.logs_dir)
+    if not os.path.exists(path):
+        print(f"[HISTORY] No database at {path}")
+        return 1
+
+    since = None
+    if args.days is not None:
+        since = (datetime.datetime.now() - datetime.timedelta(days=args.days)).timestamp()
+
+    conn = connect(path)
+    try:
+        for line in report_lines(conn, since, args.station, args.backend,
+                                 None if args.trend == "none" else args.trend):
+            print(line)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
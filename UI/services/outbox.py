@@ -0,0 +1,419 @@
+# services/outbox.py
+"""
+Store-and-forward outbox: every finished session goes to the central
+collector (services/collector.py), even if the network is down for days.
+
+    ATP_logs/atp_outbox.sqlite3
+      outbox   one row per session: gzip'ed JSON record, attempts, next try, sent
+
+Record = services.history.export_session() + the session files
+(<name>.log, <name>.events.jsonl, <name>.xlsx; text as UTF-8, binary as
+base64, each up to ATTACH_MAX_BYTES). It is compressed ONCE at enqueue time.
+A POST body is the stored gzip members concatenated (still one valid gzip
+stream, one JSON record per line). Nothing is recompressed on retries.
+
+    outbox.start_from_env(log)          # ATP_COLLECTOR_URL=http://collector:8780
+    outbox.enqueue_session(logs_dir, history_sid, files)   # engine, end of session
+    outbox.kick()                       # try now instead of at the next backoff
+
+One forwarder thread per station. It sends up to BATCH_MAX records /
+BATCH_MAX_BYTES per POST. On error it backs off exponentially with jitter
+(BACKOFF_BASE_S .. BACKOFF_MAX_S) per row. Rows that were sent are kept
+KEEP_SENT_DAYS for audit and then pruned. The collector de-duplicates on
+(station, name), so a retry after a lost response is harmless.
+Timing is wall time (never the virtual fixture clock).
+
+CLI:
+    python -m services.outbox status [--logs-dir ATP_logs]
+    python -m services.outbox push   [--url http://collector:8780]   # one pass, now
+    python -m services.outbox enqueue --all                          # backfill from history
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, List, Optional, Tuple
+
+from services import history
+
+DB_NAME = "atp_outbox.sqlite3"
+URL_ENV = "ATP_COLLECTOR_URL"
+TOKEN_ENV = "ATP_COLLECTOR_TOKEN"
+INGEST_PATH = "/api/v1/sessions"
+
+BATCH_MAX = 20
+BATCH_MAX_BYTES = 16 * 1024 * 1024
+ATTACH_MAX_BYTES = 8 * 1024 * 1024
+HTTP_TIMEOUT_S = 30.0
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 900.0
+IDLE_POLL_S = 60.0
+KEEP_SENT_DAYS = 30
+
+TEXT_EXT = (".log", ".jsonl", ".json", ".txt", ".csv")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id          INTEGER PRIMARY KEY,
+    created     REAL NOT NULL,
+    station     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    payload     BLOB NOT NULL,          -- gzip(JSON record + "\\n")
+    raw_bytes   INTEGER NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    next_try    REAL NOT NULL,
+    sent        REAL,                   -- NULL = pending
+    last_error  TEXT,
+    UNIQUE (station, name)
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_pending ON outbox (sent, next_try);
+"""
+
+
+def db_path(logs_dir: str) -> str:
+    return os.path.join(logs_dir, DB_NAME)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")    # durable: a row is only "queued" once it is on disk
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# =========================================================
+# RECORDS
+# =========================================================
+def _attachment(path: str) -> Optional[dict]:
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    if size > ATTACH_MAX_BYTES:
+        return {"skipped": f"{size} bytes > {ATTACH_MAX_BYTES}"}
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(TEXT_EXT):
+        return {"encoding": "utf-8", "data": data.decode("utf-8", errors="replace")}
+    return {"encoding": "base64", "data": base64.b64encode(data).decode("ascii")}
+
+
+def build_record(rec: dict, files: Optional[List[str]] = None) -> dict:
+    rec = dict(rec)
+    rec["files"] = {}
+    for p in files or []:
+        if p:
+            a = _attachment(p)
+            if a is not None:
+                rec["files"][os.path.basename(p)] = a
+    return rec
+
+
+def session_files(logs_dir: str, name: str) -> List[str]:
+    base = os.path.join(logs_dir, name)
+    return [base + ext for ext in (".log", ".events.jsonl", ".xlsx") if os.path.exists(base + ext)]
+
+
+def _put(conn: sqlite3.Connection, rec: dict) -> bool:
+    raw = (json.dumps(rec, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO outbox (created, station, name, payload, raw_bytes, next_try) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (time.time(), rec["station"], rec["name"], gzip.compress(raw, 6), len(raw), 0.0),
+        )
+    return cur.rowcount == 1
+
+
+# =========================================================
+# FORWARDER
+# =========================================================
+class Outbox:
+    def __init__(self, logs_dir: str, url: str, token: Optional[str] = None,
+                 log: Callable[[str], None] = print):
+        self.logs_dir = logs_dir
+        self.url = url.rstrip("/") + INGEST_PATH
+        self.token = token
+        self.log = log
+        self.path = db_path(logs_dir)
+        self.lock = threading.Lock()           # one forwarding pass at a time
+        self.wake = threading.Event()
+        self.stop_flag = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        connect(self.path).close()
+
+    # ---------- producer ----------
+    def enqueue(self, rec: dict, files: Optional[List[str]] = None) -> bool:
+        conn = connect(self.path)
+        try:
+            added = _put(conn, build_record(rec, files))
+        finally:
+            conn.close()
+        self.wake.set()
+        return added
+
+    # ---------- one pass ----------
+    def _post(self, body: bytes) -> dict:
+        req = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+            "X-ATP-Station": history.station_name(),
+        })
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        with urllib.request.urlopen(req, timeout=HTTP_TIMEOUT_S) as r:
+            return json.loads(r.read() or b"{}")
+
+    def _due(self, conn: sqlite3.Connection, now: float) -> List[Tuple[int, str, bytes, int]]:
+        batch, size = [], 0
+        for row in conn.execute(
+                "SELECT id, name, payload, attempts FROM outbox WHERE sent IS NULL AND next_try <= ? "
+                "ORDER BY id LIMIT ?", (now, BATCH_MAX)):
+            if batch and size + len(row[2]) > BATCH_MAX_BYTES:
+                break
+            batch.append(row)
+            size += len(row[2])
+        return batch
+
+    def forward_once(self) -> Tuple[int, int]:
+        """Send everything that is due. Returns (sent, failed)."""
+        sent = failed = 0
+        with self.lock:
+            conn = connect(self.path)
+            try:
+                while True:
+                    now = time.time()
+                    batch = self._due(conn, now)
+                    if not batch:
+                        break
+                    try:
+                        resp = self._post(b"".join(r[2] for r in batch))
+                        err = None
+                    except urllib.error.HTTPError as e:
+                        err = f"HTTP {e.code}: {e.read()[:200].decode(errors='replace')}"
+                    except Exception as e:
+                        err = str(e)
+
+                    if err is None:
+                        ok = set(resp.get("accepted", [])) | set(resp.get("duplicate", []))
+                        sent_before = sent
+                        with conn:
+                            for rid, name, _, _ in batch:
+                                if name in ok:
+                                    conn.execute("UPDATE outbox SET sent = ?, last_error = NULL WHERE id = ?",
+                                                 (now, rid))
+                                    sent += 1
+                                else:
+                                    err = resp.get("errors", {}).get(name, "not accepted")
+                                    self._backoff(conn, rid, name, err, now)
+                                    failed += 1
+                        if sent == sent_before:
+                            break   # collector answers but takes nothing: wait for backoff
+                        continue
+
+                    with conn:
+                        for rid, name, _, _ in batch:
+                            self._backoff(conn, rid, name, err, now)
+                    failed += len(batch)
+                    break
+                with conn:
+                    conn.execute("DELETE FROM outbox WHERE sent IS NOT NULL AND sent < ?",
+                                 (time.time() - KEEP_SENT_DAYS * 86400,))
+            finally:
+                conn.close()
+        if sent:
+            self.log(f"[OUTBOX] {sent} session(s) delivered to {self.url}")
+        if failed:
+            self.log(f"[OUTBOX][WARN] {failed} session(s) not delivered, will retry")
+        return sent, failed
+
+    def _backoff(self, conn: sqlite3.Connection, rid: int, name: str, err: str, now: float) -> None:
+        attempts = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (rid,)).fetchone()[0] + 1
+        delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** min(attempts - 1, 16))
+        delay *= 0.5 + random.random()          # jitter: stations don't retry in lockstep
+        conn.execute("UPDATE outbox SET attempts = ?, next_try = ?, last_error = ? WHERE id = ?",
+                     (attempts, now + delay, err[:500], rid))
+
+    def next_due_in(self) -> float:
+        conn = connect(self.path)
+        try:
+            nt = conn.execute("SELECT MIN(next_try) FROM outbox WHERE sent IS NULL").fetchone()[0]
+        finally:
+            conn.close()
+        return IDLE_POLL_S if nt is None else max(0.0, min(IDLE_POLL_S, nt - time.time()))
+
+    # ---------- thread ----------
+    def run(self) -> None:
+        while True:
+            try:
+                self.forward_once()
+                wait = self.next_due_in()
+            except Exception as e:
+                self.log(f"[OUTBOX][ERROR] {e}")
+                wait = IDLE_POLL_S
+            if self.stop_flag.is_set():
+                return          # stop(): one last pass over what is due, then exit
+            self.wake.wait(wait)
+            self.wake.clear()
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="outbox-forwarder", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_flag.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=HTTP_TIMEOUT_S + 1.0)
+            self.thread = None
+
+
+def stats(logs_dir: str) -> dict:
+    conn = connect(db_path(logs_dir))
+    try:
+        pending, pbytes, oldest = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0), MIN(created) FROM outbox WHERE sent IS NULL"
+        ).fetchone()
+        sent, raw, comp = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(LENGTH(payload)), 0) "
+            "FROM outbox WHERE sent IS NOT NULL").fetchone()
+        last_error = conn.execute(
+            "SELECT name, attempts, last_error FROM outbox WHERE sent IS NULL AND last_error IS NOT NULL "
+            "ORDER BY id DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    return {"pending": pending, "pending_bytes": pbytes, "oldest_pending": oldest,
+            "sent": sent, "compression": round(raw / comp, 1) if comp else None,
+            "last_error": last_error}
+
+
+# =========================================================
+# MODULE API (engine / main_atp)
+# =========================================================
+_outbox: Optional[Outbox] = None
+
+
+def start(url: str, logs_dir: str = "ATP_logs", log: Callable[[str], None] = print,
+          token: Optional[str] = None) -> Outbox:
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(logs_dir, url, token or os.environ.get(TOKEN_ENV) or None, log)
+        _outbox.start()
+        log(f"[OUTBOX] Forwarding sessions to {url} (station {history.station_name()})")
+    return _outbox
+
+
+def start_from_env(logs_dir: str = "ATP_logs", log: Callable[[str], None] = print) -> Optional[Outbox]:
+    url = os.environ.get(URL_ENV, "").strip()
+    if not url:
+        return None
+    try:
+        return start(url, logs_dir, log)
+    except Exception as e:
+        log(f"[OUTBOX][ERROR] {e}")
+        return None
+
+
+def is_enabled() -> bool:
+    return _outbox is not None
+
+
+def enqueue_session(logs_dir: str, sid: Optional[int], files: Optional[List[str]] = None) -> bool:
+    """Queue history session `sid` + its files. No-op when the outbox is off. Errors are logged, never raised."""
+    ob = _outbox
+    if ob is None or sid is None:
+        return False
+    try:
+        conn = history.connect(history.db_path(logs_dir))
+        try:
+            rec = history.export_session(conn, sid)
+        finally:
+            conn.close()
+        if rec is None:
+            return False
+        added = ob.enqueue(rec, files)
+        ob.log(f"[OUTBOX] Session {rec['name']} queued")
+        return added
+    except Exception as e:
+        ob.log(f"[OUTBOX][ERROR] enqueue: {e}")
+        return False
+
+
+def kick() -> None:
+    if _outbox is not None:
+        _outbox.wake.set()
+
+
+def stop() -> None:
+    global _outbox
+    if _outbox is not None:
+        _outbox.stop()
+        _outbox = None
+
+
+# =========================================================
+# CLI
+# =========================================================
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP results outbox")
+    ap.add_argument("--logs-dir", default="ATP_logs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    pp = sub.add_parser("push", help="send everything pending now (ignores backoff)")
+    pp.add_argument("--url", default=os.environ.get(URL_ENV))
+    ep = sub.add_parser("enqueue", help="queue sessions from the history database")
+    ep.add_argument("--all", action="store_true", help="every session in the history database")
+    ep.add_argument("--last", type=int, default=1, help="the last N sessions (default 1)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "status":
+        for k, v in stats(args.logs_dir).items():
+            print(f"{k:<15} {v}")
+        return 0
+
+    if args.cmd == "push":
+        if not args.url:
+            ap.error(f"--url or {URL_ENV} required")
+        ob = Outbox(args.logs_dir, args.url, os.environ.get(TOKEN_ENV) or None)
+        conn = connect(ob.path)
+        with conn:
+            conn.execute("UPDATE outbox SET next_try = 0 WHERE sent IS NULL")
+        conn.close()
+        _, failed = ob.forward_once()
+        return 1 if failed else 0
+
+    hpath = history.db_path(args.logs_dir)
+    if not os.path.exists(hpath):
+        print(f"[OUTBOX] No history database at {hpath}")
+        return 1
+    hconn = history.connect(hpath)
+    conn = connect(db_path(args.logs_dir))
+    n = 0
+    try:
+        q = "SELECT id FROM sessions ORDER BY id" + ("" if args.all else " DESC LIMIT ?")
+        for (sid,) in hconn.execute(q, () if args.all else (args.last,)).fetchall():
+            rec = history.export_session(hconn, sid)
+            n += _put(conn, build_record(rec, session_files(args.logs_dir, rec["name"])))
+    finally:
+        hconn.close()
+        conn.close()
+    print(f"[OUTBOX] {n} session(s) queued")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# services/profiler.py
+"""
+Sleep / wait / I/O accounting for ATP sessions.
+
+Where does cycle time go? Every wait in the gates already goes through the
+HAL (hal.clock.sleep, CAN buses, SPI, serial, GPIO), so the profiler wraps
+those entry points once and attributes every call to:
+
+    (gate, slot)   set by the runners with profiler.tag(gate, slot)
+    category       sleep | can_wait | can_tx | spi | serial | gpio
+    call site      first frame outside hal/ + this module (file:line)
+
+compute = tagged wall time - (sleep + every I/O category).
+
+    from services import profiler
+    profiler.enable()          # before the first hardware access
+    profiler.reset()           # new session
+    ...
+    for line in profiler.report_lines():
+        log(line)
+
+Durations use hal.clock.monotonic(), so under the virtual clock (ATP_HAL=vsim)
+the report shows what a real fixture would have spent, in milliseconds of wall.
+Off by default (ATP_PROFILE=1 or enable()); tag() costs almost nothing when off.
+"""
+
+import os
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import hal
+from hal import clock as hal_clock
+from hal.base import Gpio, HalBackend, SpiDevice, UsbcMux
+
+PROFILE_ENV = "ATP_PROFILE"
+
+SLEEP = "sleep"
+CAN_WAIT = "can_wait"
+CAN_TX = "can_tx"
+SPI = "spi"
+SERIAL = "serial"
+GPIO = "gpio"
+IO_CATEGORIES = (CAN_WAIT, CAN_TX, SPI, SERIAL, GPIO)
+
+_HAL_DIR = os.path.dirname(os.path.abspath(hal.__file__)) + os.sep
+_THIS = os.path.abspath(__file__)
+_UI_ROOT = os.path.dirname(os.path.dirname(_THIS))
+
+_enabled = False
+_installed = False
+_sinks: List[Callable[[str, float, float], None]] = []   # fn(category, t0, dt)
+_tls = threading.local()
+
+
+# =========================================================
+# STATE
+# =========================================================
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session_thread: Optional[int] = None
+        # (gate, slot) -> category -> [seconds, count]
+        self.by_tag: Dict[Tuple, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+        # (gate, slot, category, site) -> [seconds, count]
+        self.by_site: Dict[Tuple, List[float]] = defaultdict(lambda: [0.0, 0])
+        # (gate, slot) -> wall seconds inside tag()
+        self.wall: Dict[Tuple, float] = defaultdict(float)
+        self.order: List[Tuple] = []
+
+
+_stats = _Stats()
+
+
+def _current_tag() -> Optional[Tuple]:
+    stack = getattr(_tls, "stack", None)
+    if stack:
+        return stack[-1]
+    if threading.get_ident() == _stats.session_thread:
+        return ("other", None)
+    return None   # background threads (CAN recorder, ...) are not cycle time
+
+
+def _call_site() -> str:
+    f = sys._getframe(2)
+    while f is not None:
+        fn = os.path.abspath(f.f_code.co_filename)
+        # first app frame: skip this module, hal/, stdlib / site-packages
+        if fn != _THIS and fn.startswith(_UI_ROOT) and not fn.startswith(_HAL_DIR):
+            return f"{os.path.relpath(fn, _UI_ROOT)}:{f.f_lineno}"
+        f = f.f_back
+    return "?"
+
+
+def _record(category: str, dt: float) -> None:
+    tag = _current_tag()
+    if tag is None:
+        return
+    site = _call_site()
+    with _stats.lock:
+        c = _stats.by_tag[tag][category]
+        c[0] += dt
+        c[1] += 1
+        s = _stats.by_site[tag + (category, site)]
+        s[0] += dt
+        s[1] += 1
+
+
+@contextmanager
+def _timed(category: str):
+    if not (_enabled or _sinks):
+        yield
+        return
+    t0 = hal_clock.monotonic()
+    try:
+        yield
+    finally:
+        dt = hal_clock.monotonic() - t0
+        if _enabled:
+            _record(category, dt)
+        for fn in _sinks:
+            fn(category, t0, dt)
+
+
+# =========================================================
+# TAGGING (runners)
+# =========================================================
+@contextmanager
+def tag(gate, slot=None):
+    """Attribute everything inside to (gate, slot). slot=None = all slots."""
+    if not _enabled:
+        yield
+        return
+    key = (f"Gate{gate}" if isinstance(gate, int) else str(gate), slot)
+    stack = getattr(_tls, "stack", None)
+    if stack is None:
+        stack = _tls.stack = []
+    stack.append(key)
+    t0 = hal_clock.monotonic()
+    try:
+        yield
+    finally:
+        dt = hal_clock.monotonic() - t0
+        stack.pop()
+        with _stats.lock:
+            if key not in _stats.wall:
+                _stats.order.append(key)
+            _stats.wall[key] += dt
+
+
+# =========================================================
+# HAL WRAPPERS
+# =========================================================
+class _ProfiledClock(hal_clock.RealClock):
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+
+    def time(self) -> float:
+        return self.inner.time()
+
+    def monotonic(self) -> float:
+        return self.inner.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            self.inner.sleep(seconds)
+            return
+        with _timed(SLEEP):
+            self.inner.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class _ProfiledGpio(Gpio):
+    def __init__(self, inner: Gpio):
+        self.inner = inner
+
+    def setup_input(self, pin):
+        self.inner.setup_input(pin)
+
+    def setup_output(self, pin, level=0):
+        self.inner.setup_output(pin, level)
+
+    def read(self, pin):
+        with _timed(GPIO):
+            return self.inner.read(pin)
+
+    def write(self, pin, level):
+        with _timed(GPIO):
+            self.inner.write(pin, level)
+
+    def free(self, pin):
+        self.inner.free(pin)
+
+    def close(self):
+        self.inner.close()
+
+
+class _ProfiledSpi(SpiDevice):
+    def __init__(self, inner: SpiDevice):
+        self.inner = inner
+        self.max_speed_hz = inner.max_speed_hz
+        self.mode = inner.mode
+        self.no_cs = inner.no_cs
+
+    def xfer2(self, data):
+        with _timed(SPI):
+            return self.inner.xfer2(data)
+
+    def close(self):
+        self.inner.close()
+
+
+class _ProfiledSerial:
+    def __init__(self, inner):
+        self.inner = inner
+
+    def read(self, size=1):
+        with _timed(SERIAL):
+            return self.inner.read(size)
+
+    def write(self, data):
+        with _timed(SERIAL):
+            return self.inner.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def __setattr__(self, name, value):
+        if name == "inner":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.inner, name, value)
+
+
+class _ProfiledCanBus:
+    def __init__(self, inner):
+        self.inner = inner
+
+    def recv(self, timeout=None):
+        with _timed(CAN_WAIT):
+            return self.inner.recv(timeout)
+
+    def send(self, msg, timeout=None):
+        with _timed(CAN_TX):
+            return self.inner.send(msg, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class ProfiledBackend(HalBackend):
+    def __init__(self, inner: HalBackend):
+        self.inner = inner
+        self.name = inner.name
+        self._gpio = None
+
+    def gpio(self) -> Gpio:
+        g = self.inner.gpio()
+        if self._gpio is None or self._gpio.inner is not g:
+            self._gpio = _ProfiledGpio(g)
+        return self._gpio
+
+    def spi_open(self, bus, dev, speed_hz, mode=0, no_cs=False) -> SpiDevice:
+        return _ProfiledSpi(self.inner.spi_open(bus, dev, speed_hz, mode=mode, no_cs=no_cs))
+
+    def open_can(self, channel, interface, can_filters=None):
+        return _ProfiledCanBus(self.inner.open_can(channel, interface, can_filters=can_filters))
+
+    def open_serial(self, port, baudrate=115200, timeout=1.0):
+        return _ProfiledSerial(self.inner.open_serial(port, baudrate=baudrate, timeout=timeout))
+
+    def usbc_mux(self) -> UsbcMux:
+        return self.inner.usbc_mux()
+
+    def close_gpio(self) -> None:
+        self._gpio = None
+        self.inner.close_gpio()
+
+    def shutdown(self) -> None:
+        self.inner.shutdown()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+def install() -> None:
+    """Wrap the active HAL backend + clock. Call before hardware is first opened."""
+    global _installed
+    if _installed:
+        return
+    b = hal.get_backend()
+    if not isinstance(b, ProfiledBackend):
+        hal.select_backend(ProfiledBackend(b), shutdown_previous=False)
+    c = hal_clock.get_clock()
+    if not isinstance(c, _ProfiledClock):
+        hal_clock.set_clock(_ProfiledClock(c))
+    _installed = True
+
+
+def add_sink(fn: Callable[[str, float, float], None]) -> None:
+    """
+    Also report every timed HAL op to fn(category, t0, dt) (e.g.
+    services.tracing). Works with accounting disabled; installs the wrappers.
+    """
+    install()
+    if fn not in _sinks:
+        _sinks.append(fn)
+
+
+def enable() -> None:
+    """Turn per-session accounting on (installs the HAL wrappers)."""
+    global _enabled
+    if _enabled:
+        return
+    install()
+    _enabled = True
+    reset()
+
+
+def enable_from_env() -> bool:
+    if os.environ.get(PROFILE_ENV, "").strip() not in ("", "0"):
+        enable()
+    return _enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Start a new session (the calling thread is the session thread)."""
+    global _stats
+    _stats = _Stats()
+    _stats.session_thread = threading.get_ident()
+
+
+def breakdown() -> List[dict]:
+    """One row per (gate, slot): wall, sleep, io (+ per category), compute."""
+    rows = []
+    with _stats.lock:
+        keys = list(_stats.order) + [k for k in _stats.by_tag if k not in _stats.wall]
+        for key in keys:
+            cats = {c: v[0] for c, v in _stats.by_tag.get(key, {}).items()}
+            sleep = cats.get(SLEEP, 0.0)
+            io = sum(cats.get(c, 0.0) for c in IO_CATEGORIES)
+            wall = _stats.wall.get(key)
+            rows.append({
+                "gate": key[0],
+                "slot": key[1],
+                "wall_s": wall,
+                "sleep_s": sleep,
+                "io_s": io,
+                "compute_s": None if wall is None else max(0.0, wall - sleep - io),
+                "categories": cats,
+            })
+    return rows
+
+
+def top_sites(n: int = 10, category: str = SLEEP) -> List[Tuple[str, str, float, int]]:
+    """[(label, site, seconds, count)] biggest first."""
+    out = []
+    with _stats.lock:
+        for (gate, slot, cat, site), (sec, cnt) in _stats.by_site.items():
+            if cat == category:
+                out.append((_label(gate, slot), site, sec, cnt))
+    out.sort(key=lambda x: -x[2])
+    return out[:n]
+
+
+def _label(gate, slot) -> str:
+    return f"{gate} slot{slot}" if slot is not None else f"{gate} all"
+
+
+def report_lines(top_n: int = 10) -> List[str]:
+    rows = breakdown()
+    if not rows:
+        return ["[PROFILE] No samples (profiler disabled or nothing ran)"]
+
+    lines = ["[PROFILE] ===== Cycle time breakdown ====="]
+    tot_wall = tot_sleep = tot_io = 0.0
+    for r in rows:
+        cats = r["categories"]
+        io_detail = ", ".join(f"{c} {cats[c]:.2f}" for c in IO_CATEGORIES if cats.get(c))
+        wall = "   n/a" if r["wall_s"] is None else f"{r['wall_s']:6.1f}"
+        comp = "" if r["compute_s"] is None else f", {r['compute_s']:.2f} s compute"
+        lines.append(
+            f"[PROFILE] {_label(r['gate'], r['slot']):<16} {wall} s: "
+            f"{r['sleep_s']:.1f} s sleep, {r['io_s']:.2f} s I/O"
+            + (f" ({io_detail})" if io_detail else "") + comp
+        )
+        tot_wall += r["wall_s"] or 0.0
+        tot_sleep += r["sleep_s"]
+        tot_io += r["io_s"]
+
+    if tot_wall > 0:
+        lines.append(
+            f"[PROFILE] TOTAL {tot_wall:.1f} s: sleep {tot_sleep:.1f} s ({100 * tot_sleep / tot_wall:.0f}%), "
+            f"I/O {tot_io:.1f} s ({100 * tot_io / tot_wall:.0f}%)"
+        )
+
+    sites = top_sites(top_n)
+    if sites:
+        lines.append(f"[PROFILE] Top {len(sites)} sleep call sites:")
+        for label, site, sec, cnt in sites:
+            lines.append(f"[PROFILE]   {sec:7.1f} s  x{cnt:<5} {label:<16} {site}")
+    return lines
@@ -1,11 +1,14 @@
 # services/reporting.py
 import os
 import datetime
-from typing import Callable, Dict
+from typing import Callable, Dict, Iterable, Optional
 
 from openpyxl import Workbook
 from openpyxl.styles import Font
 
+from hal import clock
+from services import eventlog
+
 
 class Reporter:
     def __init__(self, logs_dir: str, log_cb: Callable[[str], None]):
@@ -13,7 +16,6 @@ class Reporter:
         self.log_cb = log_cb
         os.makedirs(self.logs_dir, exist_ok=True)
 
-        self.log_file = None
         self.session_ts = None
         self.log_path = None
 
@@ -23,27 +25,44 @@ class Reporter:
         self.session_ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         ids_str = "_".join([(rup_ids[i] or "NA") for i in range(1, 5)])
         self.log_path = os.path.join(self.logs_dir, f"ATP_{ids_str}_{self.session_ts}.log")
-        self.log_file = open(self.log_path, "w")
+        # .log + .events.jsonl, written in batches by the eventlog thread
+        eventlog.begin_session(self.log_path)
 
         self.write_line("[INIT] Session opened")
         self.write_line(f"=== ATP START — IDs: {rup_ids} ===")
         self.write_line(f"[FILE] Log created: {self.log_path}")
 
+    def open_flow_session(self) -> None:
+        """Continuous flow: one log for the whole run (units get their own .xlsx)."""
+        self.close_session()
+
+        self.session_ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.log_path = os.path.join(self.logs_dir, f"ATP_FLOW_{self.session_ts}.log")
+        eventlog.begin_session(self.log_path)
+
+        self.write_line("[INIT] Flow session opened")
+        self.write_line(f"[FILE] Log created: {self.log_path}")
+
+    def session_basename(self) -> str:
+        """ATP_<ids>_<ts> of the open session (shared by .log / .xlsx / .atpcan)."""
+        if not self.log_path:
+            return ""
+        return os.path.splitext(os.path.basename(self.log_path))[0]
+
+    def link_can_capture(self, capture_path: str) -> None:
+        self.write_line(f"[FILE] CAN capture: {capture_path}")
+
     def write_line(self, line: str) -> None:
-        if self.log_file:
-            self.log_file.write(line + "\n")
-            self.log_file.flush()
+        eventlog.log(line)
 
     def close_session(self) -> None:
-        if self.log_file:
-            try:
-                self.log_file.close()
-            except Exception:
-                pass
-        self.log_file = None
+        if self.log_path:
+            eventlog.end_session()
         self.log_path = None
 
-    def write_excel_results(self, gate_results: Dict[int, Dict[int, bool]], rup_ids: Dict[int, str]) -> str:
+    def write_excel_results(self, gate_results: Dict[int, Dict[int, bool]], rup_ids: Dict[int, str],
+                            blocked: Optional[Dict[int, Iterable[int]]] = None,
+                            timeouts: Optional[Dict[int, Iterable[int]]] = None) -> str:
         ts = self.session_ts or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         ids_str = "_".join([(rup_ids[i] or "NA") for i in range(1, 5)])
         path = os.path.join(self.logs_dir, f"ATP_{ids_str}_{ts}.xlsx")
@@ -56,12 +75,47 @@ class Reporter:
         for cell in ws[1]:
             cell.font = Font(bold=True)
 
-        # ✅ gates 1..6 (no skip)
+        # ✅ gates 1..6 (no skip); BLOCKED = not run, a prerequisite failed; TIMEOUT = cancelled by the watchdog
+        blocked = blocked or {}
+        timeouts = timeouts or {}
         for g in range(1, 7):
             ws.append(
                 [f"Gate {g}"] +
-                ["PASS" if bool(gate_results[g][r]) else "FAIL" for r in range(1, 5)]
+                ["BLOCKED" if r in blocked.get(g, ()) else
+                 "TIMEOUT" if r in timeouts.get(g, ()) else
+                 ("PASS" if bool(gate_results[g][r]) else "FAIL")
+                 for r in range(1, 5)]
             )
 
         wb.save(path)
         return path
+
+    def unit_basename(self, slot: int, rup_id: Optional[str]) -> str:
+        """ATP_<id>_S<slot>_<ts>: one unit of a continuous-flow run."""
+        ts = datetime.datetime.fromtimestamp(clock.time()).strftime("%Y-%m-%d_%H-%M-%S")
+        return f"ATP_{rup_id or 'NA'}_S{slot}_{ts}"
+
+    def write_unit_excel(self, name: str, slot: int, rup_id: Optional[str],
+                         results: Dict[int, Optional[bool]], blocked: Iterable[int] = (),
+                         timeouts: Iterable[int] = ()) -> str:
+        path = os.path.join(self.logs_dir, f"{name}.xlsx")
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Gate Results"
+
+        ws.append(["Gate", f"RUP {rup_id or 'NA'} (Slot {slot})"])
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+
+        for g in range(1, 7):
+            v = results.get(g)
+            if g in blocked:
+                ws.append([f"Gate {g}", "BLOCKED"])
+            elif g in timeouts:
+                ws.append([f"Gate {g}", "TIMEOUT"])
+            else:
+                ws.append([f"Gate {g}", "--" if v is None else ("PASS" if v else "FAIL")])
+
+        wb.save(path)
+        return path
@@ -0,0 +1,206 @@
+# services/results_cache.py
+"""
+Per-serial results cache: the latest outcome of every gate for every RUP,
+so a reworked unit only re-runs what failed.
+
+    ATP_logs/atp_results_cache.sqlite3
+      gate_results   (rup_id, gate) -> passed, blocked, when, station, session,
+                     measurements (JSON [[name, value, unit], ...])
+
+Recording (engine / main_atp, before history.end_session / end_unit):
+
+    results_cache.record(logs_dir, rup_id, {gate: bool}, session, measurements, blocked, skipped)
+
+Only gates that actually ran are written (BLOCKED = not passed); a gate
+taken from the cache keeps its original time, so a PASS cannot stay valid
+forever by being carried from retest to retest.
+
+Retest ("retest failures" mode):
+
+    cached = results_cache.retest_plan(logs_dir, rup_id)   # {gate: True} to skip, None = full test
+
+A cached PASS counts for ATP_RETEST_VALID_H hours (default 8). Gates
+without a valid PASS are re-run, together with their setup prerequisites
+(runners/gate_graph.plan: power ON + Gate2 / START_ATP). A unit with no
+cache entry, or nothing failed, gets the full test.
+
+    python -m services.results_cache show RUP123 [--logs-dir ATP_logs]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from hal import clock
+from runners import gate_graph
+from services import history
+
+DB_NAME = "atp_results_cache.sqlite3"
+VALID_ENV = "ATP_RETEST_VALID_H"
+DEFAULT_VALID_H = 8.0
+
+GATES = (1, 2, 3, 4, 5, 6)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gate_results (
+    rup_id        TEXT NOT NULL,
+    gate          INTEGER NOT NULL,
+    passed        INTEGER NOT NULL,
+    blocked       INTEGER NOT NULL DEFAULT 0,
+    at            REAL NOT NULL,          -- epoch seconds (hal.clock)
+    station       TEXT NOT NULL,
+    session       TEXT NOT NULL,
+    measurements  TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (rup_id, gate)
+);
+"""
+
+Measurement = Tuple[str, float, str]
+
+
+@dataclass
+class CachedGate:
+    gate: int
+    passed: bool
+    blocked: bool
+    at: float
+    station: str
+    session: str
+    measurements: List[Measurement] = field(default_factory=list)
+
+
+def db_path(logs_dir: str) -> str:
+    return os.path.join(logs_dir, DB_NAME)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def valid_s() -> float:
+    try:
+        return float(os.environ.get(VALID_ENV, DEFAULT_VALID_H)) * 3600.0
+    except ValueError:
+        return DEFAULT_VALID_H * 3600.0
+
+
+# =========================================================
+# RECORD
+# =========================================================
+def record(logs_dir: str, rup_id: Optional[str], results: Dict[int, Optional[bool]], session: str,
+           measurements: Optional[Dict[int, List[Measurement]]] = None,
+           blocked: Iterable[int] = (), skipped: Iterable[int] = ()) -> int:
+    """Store the gates of one unit that ran (None = not run, skipped = taken from the cache)."""
+    if not rup_id:
+        return 0
+    blocked, skipped = set(blocked), set(skipped)
+    now = clock.time()
+    rows = [
+        (rup_id, g, int(bool(v)), int(g in blocked), now, history.station_name(), session,
+         json.dumps([list(m) for m in (measurements or {}).get(g, [])]))
+        for g, v in sorted(results.items())
+        if v is not None and g not in skipped
+    ]
+    conn = connect(db_path(logs_dir))
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO gate_results "
+                "(rup_id, gate, passed, blocked, at, station, session, measurements) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    finally:
+        conn.close()
+    return len(rows)
+
+
+# =========================================================
+# LOOKUP / PLAN
+# =========================================================
+def lookup(logs_dir: str, rup_id: str, max_age_s: Optional[float] = None) -> Dict[int, CachedGate]:
+    """Latest result per gate for one serial; older than max_age_s (default: validity window) left out."""
+    path = db_path(logs_dir)
+    if not rup_id or not os.path.exists(path):
+        return {}
+    since = clock.time() - (valid_s() if max_age_s is None else max_age_s)
+    conn = connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT gate, passed, blocked, at, station, session, measurements FROM gate_results "
+            "WHERE rup_id = ? AND at >= ? ORDER BY gate", (rup_id, since)).fetchall()
+    finally:
+        conn.close()
+    return {
+        g: CachedGate(g, bool(p), bool(b), at, st, sess, [tuple(m) for m in json.loads(ms or "[]")])
+        for g, p, b, at, st, sess, ms in rows
+    }
+
+
+def retest_plan(logs_dir: str, rup_id: Optional[str],
+                log: Optional[Callable[[str], None]] = None) -> Optional[Dict[int, bool]]:
+    """
+    {gate: True} for the gates a retest can skip (valid cached PASS and not a
+    setup prerequisite of a gate that is re-run). None = run the full test.
+    """
+    log = log or (lambda m: None)
+    try:
+        cached = lookup(logs_dir, rup_id or "")
+    except Exception as e:
+        log(f"[RETEST][WARN] {rup_id}: cache not readable ({e}), full test")
+        return None
+    if not cached:
+        log(f"[RETEST] {rup_id}: no valid results in the cache, full test")
+        return None
+
+    needed = [g for g in GATES if not (g in cached and cached[g].passed)]
+    if not needed:
+        log(f"[RETEST] {rup_id}: every gate PASS in the cache, full test")
+        return None
+    run = gate_graph.plan(needed)
+    skip = {g: True for g in GATES if g not in run}
+    if not skip:
+        return None
+    log(f"[RETEST] {rup_id}: run Gate{','.join(map(str, sorted(run)))}, "
+        f"cached PASS Gate{','.join(map(str, sorted(skip)))}")
+    return skip
+
+
+# =========================================================
+# CLI
+# =========================================================
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP per-serial results cache")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("show", help="cached gate results of one RUP")
+    sp.add_argument("rup_id")
+    sp.add_argument("--logs-dir", default="ATP_logs")
+    sp.add_argument("--all", action="store_true", help="include results older than the validity window")
+    args = ap.parse_args(argv)
+
+    cached = lookup(args.logs_dir, args.rup_id, max_age_s=float("inf") if args.all else None)
+    if not cached:
+        print(f"[RETEST] No cached results for {args.rup_id}")
+        return 1
+    for g, c in sorted(cached.items()):
+        verdict = "BLOCKED" if c.blocked else ("PASS" if c.passed else "FAIL")
+        when = datetime.datetime.fromtimestamp(c.at).strftime("%Y-%m-%d %H:%M:%S")
+        meas = " ".join(f"{n}={v:g}{u}" for n, v, u in c.measurements)
+        print(f"Gate{g} {verdict:<7} {when} {c.station} {c.session} {meas}".rstrip())
+    plan = retest_plan(args.logs_dir, args.rup_id)
+    print("Retest: full test" if plan is None else
+          f"Retest: skip Gate{','.join(map(str, sorted(plan)))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
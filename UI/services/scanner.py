@@ -0,0 +1,294 @@
+# services/scanner.py
+"""
+Serial number ingestion from barcode scanners (no modal dialogs).
+
+Sources (ATP_SCANNER / --scanner, comma separated):
+    stdin                         one scan per line (keyboard wedge in a terminal, pipe)
+    /dev/input/event3             Linux evdev HID scanner, decoded here (US layout)
+    grab:/dev/input/by-id/...     same, with EVIOCGRAB: scans do not also type into the UI
+    /dev/ttyACM0, FIFO, file      one scan per line (serial / CDC-ACM scanners)
+    (main_atp, atp_client)        keyboard wedge into the window: KeyWedge via an event filter
+
+Every source only pushes text into one queue. The consumer (main_atp tick,
+atp_headless loop) calls poll() and hands each scan to a ScanRouter on its
+own thread, so binding a slot and starting its tests never races the UI.
+
+What a scan means (ScanRouter):
+    ABC-1234          serial -> the indicated slot, else the first empty slot
+    SLOT2 / S2        slot label on the fixture: the next serial goes to slot 2
+    S2:ABC-1234       slot + serial in one code
+Serials must match SERIAL_RE (same rule as slotByslot). A serial that is
+already in a slot is refused, so a double scan does not start a second test.
+"""
+
+import fcntl
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+
+SCANNER_ENV = "ATP_SCANNER"
+
+SERIAL_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9\-_]{2,63}$")  # 3..64 chars, alnum + - _
+SLOT_RE = re.compile(r"^(?:SLOT|S)\s*([1-4])$", re.IGNORECASE)
+SLOT_SERIAL_RE = re.compile(r"^(?:SLOT|S)\s*([1-4])\s*[:=/]\s*(.+)$", re.IGNORECASE)
+
+QUEUE_MAX = 256
+
+
+def valid_serial(sn: str) -> bool:
+    return bool(SERIAL_RE.match(sn or ""))
+
+
+# =========================================================
+# KEYBOARD WEDGE (evdev / Qt key events -> scans)
+# =========================================================
+class KeyWedge:
+    """Characters in, one scan out per Enter."""
+    MAX_LEN = 128
+
+    def __init__(self):
+        self.buf: List[str] = []
+
+    def feed(self, ch: str) -> Optional[str]:
+        if ch in ("\r", "\n"):
+            text = "".join(self.buf).strip()
+            self.buf = []
+            return text or None
+        if ch and ch.isprintable() and len(self.buf) < self.MAX_LEN:
+            self.buf.append(ch)
+        return None
+
+
+# linux/input-event-codes.h, US layout: code -> (plain, shifted)
+_KEYS = {2: "1!", 3: "2@", 4: "3#", 5: "4$", 6: "5%", 7: "6^", 8: "7&", 9: "8*", 10: "9(", 11: "0)",
+         12: "-_", 13: "=+", 26: "[{", 27: "]}", 39: ";:", 40: "'\"", 41: "`~", 43: "\\|",
+         51: ",<", 52: ".>", 53: "/?", 57: "  "}
+for _code, _row in ((16, "qwertyuiop"), (30, "asdfghjkl"), (44, "zxcvbnm")):
+    for _i, _c in enumerate(_row):
+        _KEYS[_code + _i] = _c + _c.upper()
+_KP = {71: "7", 72: "8", 73: "9", 74: "-", 75: "4", 76: "5", 77: "6", 79: "1", 80: "2", 81: "3", 82: "0"}
+_ENTER = (28, 96)
+_SHIFT = (42, 54)
+_CAPS = 58
+
+EV_KEY = 1
+EVENT_FMT = "llHHi"                 # struct input_event (timeval, type, code, value)
+EVENT_SIZE = struct.calcsize(EVENT_FMT)
+EVIOCGRAB = 0x40044590              # _IOW('E', 0x90, int)
+
+
+def decode_key(code: int, shift: bool) -> Optional[str]:
+    if code in _ENTER:
+        return "\n"
+    if code in _KP:
+        return _KP[code]
+    row = _KEYS.get(code)
+    return None if row is None else row[1 if shift else 0]
+
+
+# =========================================================
+# SOURCES
+# =========================================================
+class _Source(threading.Thread):
+    def __init__(self, name: str, out: "queue.Queue", log: Callable[[str], None]):
+        super().__init__(name=f"scanner-{name}", daemon=True)
+        self.label = name
+        self.out = out
+        self.log = log
+        self.eof = threading.Event()
+
+    def push(self, text: str) -> None:
+        try:
+            self.out.put_nowait(text)
+        except queue.Full:
+            self.log(f"[SCAN][WARN] {self.label}: queue full, scan dropped")
+
+
+class StreamSource(_Source):
+    """One scan per line from a text stream (stdin, FIFO, serial scanner via a pty)."""
+
+    def __init__(self, stream, out, log, name: str = "stdin"):
+        super().__init__(name, out, log)
+        self.stream = stream
+
+    def push(self, text: str) -> None:
+        self.out.put(text)                   # a pipe / file waits for the consumer instead of dropping
+
+    def run(self) -> None:
+        try:
+            for line in self.stream:
+                text = line.strip()
+                if text:
+                    self.push(text)
+        except Exception as e:
+            self.log(f"[SCAN][ERROR] {self.label}: {e}")
+        finally:
+            self.eof.set()
+
+
+class EvdevSource(_Source):
+    """HID keyboard-wedge scanner read straight from /dev/input/eventN (no python-evdev)."""
+
+    def __init__(self, path: str, out, log, grab: bool = False):
+        super().__init__(os.path.basename(path), out, log)
+        self.path = path
+        self.grab = grab
+
+    def run(self) -> None:
+        wedge = KeyWedge()
+        shift = False
+        caps = False
+        try:
+            with open(self.path, "rb", buffering=0) as f:
+                if self.grab:
+                    fcntl.ioctl(f.fileno(), EVIOCGRAB, 1)
+                self.log(f"[SCAN] Reading {self.path}{' (grabbed)' if self.grab else ''}")
+                while True:
+                    data = f.read(EVENT_SIZE)
+                    if len(data) < EVENT_SIZE:
+                        break
+                    _, _, etype, code, value = struct.unpack(EVENT_FMT, data)
+                    if etype != EV_KEY:
+                        continue
+                    if code in _SHIFT:
+                        shift = value != 0
+                        continue
+                    if value != 1:                # press only (no release / autorepeat)
+                        continue
+                    if code == _CAPS:
+                        caps = not caps
+                        continue
+                    ch = decode_key(code, shift)
+                    if ch and ch.isalpha() and caps:
+                        ch = ch.swapcase()
+                    text = wedge.feed(ch) if ch else None
+                    if text:
+                        self.push(text)
+        except Exception as e:
+            self.log(f"[SCAN][ERROR] {self.path}: {e}")
+        finally:
+            self.eof.set()
+
+
+class ScanInput:
+    """All configured sources -> one bounded queue; poll() from the consumer thread."""
+
+    def __init__(self, log: Callable[[str], None] = print):
+        self.q: "queue.Queue" = queue.Queue(maxsize=QUEUE_MAX)
+        self.log = log
+        self.sources: List[_Source] = []
+
+    def open(self, spec: str) -> "ScanInput":
+        for item in (x.strip() for x in (spec or "").split(",")):
+            if not item:
+                continue
+            grab = item.startswith("grab:")
+            path = item[len("grab:"):] if grab else item
+            try:
+                if path == "stdin":
+                    src = StreamSource(sys.stdin, self.q, self.log)
+                elif grab or path.startswith("/dev/input/"):
+                    src = EvdevSource(path, self.q, self.log, grab=grab)
+                else:                                  # CDC-ACM scanner (/dev/ttyACM0), FIFO, file
+                    src = StreamSource(open(path, "r", errors="replace"), self.q, self.log,
+                                       name=os.path.basename(path))
+            except OSError as e:
+                self.log(f"[SCAN][ERROR] {item}: {e}")
+                continue
+            src.start()
+            self.sources.append(src)
+            self.log(f"[SCAN] Scanner source: {item}")
+        return self
+
+    def push(self, text: str) -> None:
+        """In-process sources (Qt key wedge)."""
+        try:
+            self.q.put_nowait(text)
+        except queue.Full:
+            pass
+
+    def poll(self, limit: Optional[int] = None) -> List[str]:
+        out = []
+        while limit is None or len(out) < limit:
+            try:
+                out.append(self.q.get_nowait())
+            except queue.Empty:
+                break
+        return out
+
+    def exhausted(self) -> bool:
+        """Every source hit EOF and nothing is queued (stdin pipe finished)."""
+        return bool(self.sources) and all(s.eof.is_set() for s in self.sources) and self.q.empty()
+
+
+def open_from_env(log: Callable[[str], None] = print) -> ScanInput:
+    return ScanInput(log).open(os.environ.get(SCANNER_ENV, ""))
+
+
+# =========================================================
+# ROUTER (scan -> slot)
+# =========================================================
+class ScanRouter:
+    def __init__(self, slots: Iterable[int], is_free: Callable[[int], bool],
+                 serial_in_use: Callable[[str], bool], on_serial: Callable[[int, str], None],
+                 log: Callable[[str], None] = print):
+        self.slots = list(slots)
+        self.is_free = is_free
+        self.serial_in_use = serial_in_use
+        self.on_serial = on_serial
+        self.log = log
+        self.indicated: Optional[int] = None
+
+    def indicate(self, slot: Optional[int]) -> None:
+        """Next serial goes to `slot` (slot label scan / Load button)."""
+        self.indicated = slot
+        if slot is not None:
+            self.log(f"[SCAN] Next serial -> Slot{slot}")
+
+    def feed(self, text: str) -> Optional[Tuple[int, str]]:
+        text = (text or "").strip()
+        m = SLOT_RE.match(text)
+        if m:
+            self.indicate(int(m.group(1)))
+            return None
+
+        m = SLOT_SERIAL_RE.match(text)
+        if m:
+            slot, sn = int(m.group(1)), m.group(2).strip()
+        else:
+            sn = text
+            slot = self.indicated
+            if slot is None:
+                slot = next((s for s in self.slots if self.is_free(s)), None)
+
+        if not valid_serial(sn):
+            self.log(f"[SCAN][WARN] Rejected '{text}': letters/numbers, '-' '_' (3..64 chars)")
+            return None
+        if slot is None:
+            self.log(f"[SCAN][WARN] {sn}: no empty slot (unload one first)")
+            return None
+        if not self.is_free(slot):
+            self.log(f"[SCAN][WARN] {sn}: Slot{slot} is not empty")
+            return None
+        if self.serial_in_use(sn):
+            self.log(f"[SCAN][WARN] {sn} is already in the fixture (double scan?)")
+            return None
+
+        self.indicated = None
+        self.log(f"[SCAN] Slot{slot} <- {sn}")
+        self.on_serial(slot, sn)
+        return slot, sn
+
+
+def flow_router(flow, log: Callable[[str], None] = print) -> ScanRouter:
+    """Continuous flow: a scan loads the slot, FlowRunner starts its tests on the next step()."""
+    from runners.flow_runner import EMPTY
+
+    def in_use(sn: str) -> bool:
+        return any(l.state != EMPTY and l.rup_id == sn for l in flow.lanes.values())
+
+    return ScanRouter(flow.slots, lambda s: flow.state(s) == EMPTY, in_use, flow.load, log)
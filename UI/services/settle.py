@@ -0,0 +1,296 @@
+# services/settle.py
+"""
+Settle-time observations + auto-tuner for the hand-picked gate waits.
+
+The gates keep waiting exactly as long as they do today, but while they
+wait they watch the signal and record WHEN it actually settled:
+
+    gate2.start_holdoff_s      START_ATP -> ack frame            (CAN response time)
+    gate3.settle_s             TR command -> ADC peak mean stable (ADC window)
+    gate4.iul_settle_s         IUL_ON/OFF -> GPIO at its final level (GPIO edge)
+    gate5.settle_delay_s       ID pins change -> RUP reports them (upper bound only)
+    gate6.negotiate_settle_s   PM125 set_voltage -> CONSTAT at the new voltage (PM125 telemetry)
+
+Each observation is a services.history measurement named "settle.<param>"
+(unit "s", or "s_max" when only an upper bound is known, e.g. the signal was
+already stable at the first sample), so they land in atp_history.sqlite3
+with gate, slot, station and timestamp.
+
+Tuner (per fixture = ATP station):
+
+    python -m services.settle propose                     # print the proposal
+    python -m services.settle propose --out ATP_logs/fixture_timing.json
+    python -m services.settle propose --quantile 99 --margin 0.25 --min-n 20
+
+proposed = quantile(observed) * (1 + margin) + MARGIN_ABS_S, rounded up to
+10 ms. Parameters with too few observations, or only upper bounds, keep
+their current value (read from the active fixture profile).
+
+--out writes a fixture profile (services/fixture_profile.py) on top of
+--base, selected at startup with ATP_FIXTURE_PROFILE=<file>.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from hal import clock
+from services import fixture_profile, history
+
+PREFIX = "settle."
+UNIT_EXACT = "s"
+UNIT_UPPER = "s_max"
+
+POLL_S = 0.01             # GPIO poll while waiting
+ADC_BLOCK_S = 0.10        # Gate3 window is judged in 100 ms blocks
+ADC_BAND_V = 0.05         # block peak-mean within +-50 mV of the final value = settled
+
+QUANTILE = 99.0
+MARGIN = 0.25
+MARGIN_ABS_S = 0.05
+MIN_N = 20
+
+
+@dataclass(frozen=True)
+class Param:
+    name: str     # FIXTURE field, "<section>.<field>"
+    help: str
+
+
+PARAMS: Dict[str, Param] = {p.name: p for p in (
+    Param("gate2.start_holdoff_s", "max wait for START_ATP ack"),
+    Param("gate3.settle_s", "TR command -> sampling"),
+    Param("gate4.iul_settle_s", "IUL command -> GPIO read"),
+    Param("gate5.settle_delay_s", "ID pin change -> READ_ID"),
+    Param("gate6.negotiate_settle_s", "PM125 set_voltage -> CONSTAT"),
+)}
+
+
+# =========================================================
+# RECORDING (gates)
+# =========================================================
+def observe(param: str, seconds: float, upper_bound: bool = False, slot: Optional[int] = None) -> None:
+    """Settled after `seconds` (upper_bound: settled at the latest after `seconds`)."""
+    history.measure(PREFIX + param, max(0.0, float(seconds)),
+                    UNIT_UPPER if upper_bound else UNIT_EXACT, slot=slot)
+
+
+def wait_gpio(param: str, gpio, pin: int, level: int, budget_s: float,
+              poll_s: float = POLL_S, slot: Optional[int] = None) -> Optional[float]:
+    """
+    Drop-in for clock.sleep(budget_s) after a command that moves `pin` to
+    `level`: waits the full budget, polling the pin, and records when it
+    reached `level` for good. Returns that time (None = never / read error).
+    """
+    return wait_until(param, lambda: gpio.read(pin) == level, budget_s, poll_s, slot=slot)
+
+
+def wait_until(param: str, predicate: Callable[[], bool], budget_s: float,
+               poll_s: float, slot: Optional[int] = None) -> Optional[float]:
+    """Polled condition version of wait_gpio() (e.g. PM125 CONSTAT)."""
+    # Fixed number of polls: the total wait is budget_s, whatever the clock resolution
+    n = max(1, int(math.ceil(budget_s / poll_s)))
+    step = budget_s / n
+    t0 = clock.monotonic()
+    settled_at = None
+    for i in range(n + 1):
+        try:
+            ok = bool(predicate())
+        except Exception:
+            ok = False
+        if ok and settled_at is None:
+            settled_at = clock.monotonic() - t0
+        elif not ok:
+            settled_at = None
+        if i < n:
+            clock.sleep(step)
+
+    if settled_at is not None:
+        observe(param, settled_at, slot=slot)
+    return settled_at
+
+
+def adc_settle_time(samples: List[float], fs_hz: float, thresh: float,
+                    block_s: float = ADC_BLOCK_S, band_v: float = ADC_BAND_V) -> Optional[float]:
+    """
+    Seconds into the window after which every block's peak mean stays within
+    band_v of the final value (last third of the window). 0.0 = stable from
+    the first block; None = no usable peaks.
+    """
+    per = max(1, int(block_s * fs_hz))
+    blocks = []
+    for i in range(0, len(samples) - per + 1, per):
+        peaks = [v for v in samples[i:i + per] if v >= thresh]
+        blocks.append(sum(peaks) / len(peaks) if peaks else None)
+    tail = [b for b in blocks[-max(1, len(blocks) // 3):] if b is not None]
+    if not tail:
+        return None
+    final = sum(tail) / len(tail)
+
+    k = len(blocks)
+    while k > 0 and blocks[k - 1] is not None and abs(blocks[k - 1] - final) <= band_v:
+        k -= 1
+    if k == len(blocks):
+        return None
+    return k * per / fs_hz
+
+
+# =========================================================
+# PROFILE
+# =========================================================
+def current_values() -> Dict[str, float]:
+    """Tuned parameters as the active fixture profile has them."""
+    return {name: float(fixture_profile.FIXTURE.get(name)) for name in PARAMS}
+
+
+def profile_dict(timing: Dict[str, float], basis: Dict[str, dict], name: str,
+                 base: str, meta: dict) -> dict:
+    """Fixture profile file content (only the tuned fields, on top of `base`)."""
+    prof: dict = {"name": name, "base": base, "meta": dict(meta, basis=basis)}
+    for dotted, value in timing.items():
+        section, key = dotted.split(".", 1)
+        prof.setdefault(section, {})[key] = value
+    fixture_profile.build(base, {k: v for k, v in prof.items() if k in fixture_profile.SECTIONS})
+    return prof
+
+
+# =========================================================
+# TUNER
+# =========================================================
+def load_observations(conn, station: Optional[str] = None, backend: Optional[str] = None,
+                      since: Optional[float] = None) -> Dict[str, List[Tuple[float, bool]]]:
+    """param -> [(seconds, upper_bound)]"""
+    sql = (
+        "SELECT m.name, m.value, m.unit FROM measurements m "
+        "JOIN gate_runs r ON r.id = m.run_id JOIN sessions s ON s.id = r.session_id "
+        "WHERE m.name >= ? AND m.name < ?"
+    )
+    args: list = [PREFIX, PREFIX[:-1] + chr(ord(PREFIX[-1]) + 1)]
+    if station:
+        sql += " AND s.station = ?"
+        args.append(station)
+    if backend:
+        sql += " AND s.backend = ?"
+        args.append(backend)
+    if since is not None:
+        sql += " AND s.started >= ?"
+        args.append(since)
+
+    out: Dict[str, List[Tuple[float, bool]]] = {}
+    for name, value, unit in conn.execute(sql, args):
+        out.setdefault(name[len(PREFIX):], []).append((value, unit == UNIT_UPPER))
+    return out
+
+
+def _quantile(sorted_vals: List[float], q: float) -> float:
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def propose(obs: Dict[str, List[Tuple[float, bool]]], current: Dict[str, float],
+            quantile: float = QUANTILE, margin: float = MARGIN, min_n: int = MIN_N) -> Tuple[Dict[str, float], Dict[str, dict]]:
+    """Returns (timing, basis). Upper bounds count at their bound (conservative)."""
+    timing, basis = {}, {}
+    for name in PARAMS:
+        cur = current.get(name)
+        rows = obs.get(name, [])
+        vals = sorted(v for v, _ in rows)
+        n_exact = sum(1 for _, ub in rows if not ub)
+        b = {"n": len(vals), "n_exact": n_exact, "current": cur}
+
+        if len(vals) < min_n:
+            b["note"] = f"kept: {len(vals)} < {min_n} observations"
+        elif n_exact == 0:
+            b["note"] = "kept: only upper bounds (shorten the wait on a test run to see below them)"
+        else:
+            q = _quantile(vals, quantile)
+            value = math.ceil((q * (1.0 + margin) + MARGIN_ABS_S) * 100.0) / 100.0
+            b.update(p50=_quantile(vals, 50), p95=_quantile(vals, 95), q=q, max=vals[-1])
+            if cur is not None and value > cur:
+                b["note"] = "RAISED: current wait is shorter than observed settle + margin"
+            timing[name] = value
+        if name not in timing and cur is not None:
+            timing[name] = cur
+        basis[name] = b
+    return timing, basis
+
+
+def proposal_lines(timing: Dict[str, float], basis: Dict[str, dict]) -> List[str]:
+    lines = ["================ SETTLE-TIME PROPOSAL ================",
+             f"{'parameter':<26} {'n':>5} {'p50':>7} {'p95':>7} {'max':>7} {'current':>8} {'proposed':>9}"]
+    for name, b in basis.items():
+        f = lambda k: f"{b[k]:7.3f}" if b.get(k) is not None else "    ---"
+        cur = f"{b['current']:8.2f}" if b.get("current") is not None else "     ---"
+        prop = f"{timing[name]:9.2f}" if name in timing else "      ---"
+        lines.append(f"{name:<26} {b['n']:>5} {f('p50')} {f('p95')} {f('max')} {cur} {prop}")
+        if b.get("note"):
+            lines.append(f"{'':<26} {b['note']}")
+    return lines
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Settle-time auto-tuner (per fixture timing profile)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    pp = sub.add_parser("propose", help="propose a timing profile from recorded settle times")
+    pp.add_argument("--logs-dir", default="ATP_logs")
+    pp.add_argument("--db", default=None)
+    pp.add_argument("--station", default=None, help="default: this host (ATP_STATION)")
+    pp.add_argument("--backend", default="real", help="real / sim / vsim ('' = any)")
+    pp.add_argument("--days", type=float, default=None, help="only the last N days")
+    pp.add_argument("--quantile", type=float, default=QUANTILE)
+    pp.add_argument("--margin", type=float, default=MARGIN, help="relative safety margin")
+    pp.add_argument("--min-n", type=int, default=MIN_N)
+    pp.add_argument("--out", default=None, help="write the fixture profile JSON here")
+    pp.add_argument("--base", default=fixture_profile.DEFAULT_PRESET,
+                    help="preset the profile starts from (and the 'current' values)")
+    args = ap.parse_args(argv)
+
+    path = args.db or history.db_path(args.logs_dir)
+    if not os.path.exists(path):
+        print(f"[SETTLE] No database at {path}")
+        return 1
+
+    station = args.station or history.station_name()
+    since = None
+    if args.days is not None:
+        since = (datetime.datetime.now() - datetime.timedelta(days=args.days)).timestamp()
+
+    conn = history.connect(path)
+    try:
+        obs = load_observations(conn, station, args.backend or None, since)
+    finally:
+        conn.close()
+
+    fixture_profile.activate(fixture_profile.build(args.base))
+    timing, basis = propose(obs, current_values(), args.quantile, args.margin, args.min_n)
+    for line in proposal_lines(timing, basis):
+        print(line)
+
+    if args.out:
+        prof = profile_dict(
+            timing, basis,
+            name=f"tuned-{station}-{datetime.date.today().isoformat()}",
+            base=args.base,
+            meta={
+                "station": station,
+                "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+                "quantile": args.quantile,
+                "margin": args.margin,
+            },
+        )
+        d = os.path.dirname(args.out)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(prof, f, indent=2)
+        print(f"[SETTLE] Profile written: {args.out} (use with {fixture_profile.PROFILE_ENV}={args.out})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
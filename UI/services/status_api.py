@@ -0,0 +1,514 @@
+# services/status_api.py
+"""
+Local status API for line monitoring: HTTP + WebSocket, standard library only.
+
+    GET /               live dashboard (one HTML page, no external assets)
+    GET /api/status     snapshot JSON (slots, running gates, last gate times, PM125)
+    GET /healthz        "ok"
+    GET /ws             WebSocket: {"type": "snapshot", ...} first, then live events
+
+Events (JSON text frames, every one has "type" and "ts"):
+    update    {slot, gate, status, led}                    SlotUpdate / FullUpdate
+    gate      {gate, slot, state: start|end, duration_s}    services.history gate runs
+    pm125     {slot, voltage_mv, current_ma, power_w, temperature_c}
+    session   {name}
+    snapshot  full state (first frame, and again after a client fell behind)
+
+Fan-out: publish() encodes the frame ONCE and appends it to every client's
+queue; a sender thread per client does the socket I/O. A client whose queue
+reaches CLIENT_QUEUE_MAX is not waited for: its queue is dropped and it gets
+a fresh snapshot instead (state events are idempotent). The test loop never
+blocks on a dashboard.
+
+Enable (off by default, publish() is a no-op then):
+    ATP_STATUS_HTTP=0.0.0.0:8765        main_atp / atp_headless / services.daemon
+    atp_headless.py --http :8765
+    python -m services.daemon --http 0.0.0.0:8765
+
+Local client (no browser needed):
+    python -m services.status_api status [--url http://127.0.0.1:8765]
+    python -m services.status_api watch  [--url ws://127.0.0.1:8765/ws]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from hal import clock
+from services import history
+
+HTTP_ENV = "ATP_STATUS_HTTP"
+DEFAULT_PORT = 8765
+CLIENT_QUEUE_MAX = 256
+MAX_CLIENT_FRAME = 64 * 1024
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+SLOTS = (1, 2, 3, 4)
+
+
+# =========================================================
+# WEBSOCKET FRAMES (RFC 6455, text + control frames only)
+# =========================================================
+def ws_frame(payload: bytes, opcode: int = OP_TEXT, mask: bool = False) -> bytes:
+    n = len(payload)
+    head = bytes([0x80 | opcode])
+    m = 0x80 if mask else 0
+    if n < 126:
+        head += bytes([m | n])
+    elif n < 1 << 16:
+        head += bytes([m | 126]) + struct.pack(">H", n)
+    else:
+        head += bytes([m | 127]) + struct.pack(">Q", n)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    return head + key + bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+
+def ws_read(rfile, max_len: int = MAX_CLIENT_FRAME):
+    """-> (opcode, payload) or None on EOF / oversized frame."""
+    h = rfile.read(2)
+    if len(h) < 2:
+        return None
+    op = h[0] & 0x0F
+    n = h[1] & 0x7F
+    if n == 126:
+        n = struct.unpack(">H", rfile.read(2))[0]
+    elif n == 127:
+        n = struct.unpack(">Q", rfile.read(8))[0]
+    if n > max_len:
+        return None
+    key = rfile.read(4) if h[1] & 0x80 else None
+    data = rfile.read(n)
+    if key:
+        data = bytes(b ^ key[i % 4] for i, b in enumerate(data))
+    return op, data
+
+
+def ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+# =========================================================
+# HUB (state + fan-out)
+# =========================================================
+class _WsClient:
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.q = deque()
+        self.cv = threading.Condition()
+        self.closed = False
+        self.resync = False
+        self.lagged = 0
+
+    def offer(self, frame: bytes, control: bool = False) -> None:
+        """Publisher side: O(1), never touches the socket."""
+        with self.cv:
+            if self.closed:
+                return
+            if control:
+                self.q.appendleft(frame)
+            elif len(self.q) >= CLIENT_QUEUE_MAX:
+                self.q.clear()
+                self.resync = True
+                self.lagged += 1
+            else:
+                self.q.append(frame)
+            self.cv.notify()
+
+    def send_loop(self, hub: "StatusHub") -> None:
+        while True:
+            with self.cv:
+                while not self.q and not self.resync and not self.closed:
+                    self.cv.wait()
+                if self.closed:
+                    return
+                resync, self.resync = self.resync, False
+                frames = list(self.q)
+                self.q.clear()
+            if resync:
+                frames.insert(0, hub.snapshot_frame())
+            try:
+                self.sock.sendall(b"".join(frames))
+            except OSError:
+                self.close()
+                return
+
+    def close(self) -> None:
+        with self.cv:
+            self.closed = True
+            self.cv.notify()
+
+
+class StatusHub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.session: Optional[str] = None
+        self.slots: Dict[int, Dict[str, Any]] = {s: {} for s in SLOTS}
+        self.running: Dict[str, Dict[str, Any]] = {}            # "g<gate>s<slot>" -> gate event
+        self.last: Dict[str, Dict[str, float]] = {}              # gate -> slot -> duration_s
+        self.pm125: Dict[int, Dict[str, Any]] = {}
+        self.published = 0
+
+    def _apply(self, ev: Dict[str, Any]) -> None:
+        t = ev["type"]
+        if t == "update" and ev.get("slot") in self.slots:
+            self.slots[ev["slot"]].update({k: v for k, v in ev.items() if k not in ("type", "slot")})
+        elif t == "gate":
+            key = f"g{ev['gate']}s{ev.get('slot') or 0}"
+            if ev["state"] == "start":
+                self.running[key] = ev
+            else:
+                self.running.pop(key, None)
+                self.last.setdefault(str(ev["gate"]), {})[str(ev.get("slot") or 0)] = ev.get("duration_s")
+        elif t == "pm125":
+            self.pm125[ev.get("slot") or 0] = ev
+        elif t == "session":
+            self.session = ev.get("name")
+            self.slots = {s: {} for s in SLOTS}
+            self.running.clear()
+            self.last.clear()
+            self.pm125.clear()
+
+    def publish(self, ev: Dict[str, Any]) -> None:
+        ev.setdefault("ts", clock.time())
+        frame = ws_frame(json.dumps(ev, default=str).encode("utf-8"))
+        with self.lock:
+            self._apply(ev)
+            self.published += 1
+            clients = list(self.clients)
+        for c in clients:
+            c.offer(frame)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = clock.time()
+        with self.lock:
+            return {
+                "type": "snapshot",
+                "ts": now,
+                "station": history.station_name(),
+                "session": self.session,
+                "slots": {str(s): dict(v) for s, v in self.slots.items()},
+                "running": [dict(r, elapsed_s=round(now - r.get("ts", now), 3)) for r in self.running.values()],
+                "last_gate_s": {g: dict(v) for g, v in self.last.items()},
+                "pm125": {str(s): dict(v) for s, v in self.pm125.items()},
+                "clients": len(self.clients),
+                "lagged": sum(c.lagged for c in self.clients),
+                "published": self.published,
+            }
+
+    def snapshot_frame(self) -> bytes:
+        return ws_frame(json.dumps(self.snapshot(), default=str).encode("utf-8"))
+
+    def attach(self, client: _WsClient) -> None:
+        client.offer(self.snapshot_frame())
+        with self.lock:
+            self.clients.add(client)
+
+    def detach(self, client: _WsClient) -> None:
+        with self.lock:
+            self.clients.discard(client)
+        client.close()
+
+
+# =========================================================
+# HTTP SERVER
+# =========================================================
+DASHBOARD_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>ATP status</title>
+<style>body{font-family:monospace;background:#111;color:#ddd;margin:16px}
+td,th{padding:4px 10px;border-bottom:1px solid #333;text-align:left}
+.green{color:#4c4}.red{color:#e44}.yellow{color:#dc3}.gray{color:#888}</style></head>
+<body><h2 id="h">ATP status</h2><table id="t"></table><h3>Running</h3><pre id="r"></pre>
+<h3>Last gate times (s)</h3><pre id="g"></pre>
+<script>
+let st = {slots: {}, running: [], last_gate_s: {}, pm125: {}};
+function render() {
+  document.getElementById("h").textContent = "ATP status - " + (st.station || "") + " - " + (st.session || "no session");
+  let rows = "<tr><th>Slot</th><th>RUP</th><th>Gate</th><th>Status</th><th>PM125</th></tr>";
+  for (const s of ["1", "2", "3", "4"]) {
+    const v = st.slots[s] || {}, p = st.pm125[s];
+    rows += `<tr><td>${s}</td><td>${v.rup_id || ""}</td><td>${v.gate || ""}</td>` +
+            `<td class="${v.led || "gray"}">${v.status || "Idle"}</td>` +
+            `<td>${p ? (p.voltage_mv / 1000).toFixed(2) + " V " + (p.current_ma / 1000).toFixed(3) + " A " + p.power_w.toFixed(1) + " W" : ""}</td></tr>`;
+  }
+  document.getElementById("t").innerHTML = rows;
+  document.getElementById("r").textContent = st.running.map(r => `Gate${r.gate} slot ${r.slot || "all"}`).join("\\n");
+  document.getElementById("g").textContent = JSON.stringify(st.last_gate_s);
+}
+function connect() {
+  const ws = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+  ws.onmessage = m => {
+    const ev = JSON.parse(m.data);
+    if (ev.type === "snapshot") st = ev;
+    else if (ev.type === "update") st.slots[ev.slot] = Object.assign(st.slots[ev.slot] || {}, ev);
+    else if (ev.type === "pm125") st.pm125[ev.slot || 0] = ev;
+    else if (ev.type === "gate" && ev.state === "start") st.running.push(ev);
+    else if (ev.type === "gate") {
+      st.running = st.running.filter(r => !(r.gate === ev.gate && r.slot === ev.slot));
+      (st.last_gate_s[ev.gate] = st.last_gate_s[ev.gate] || {})[ev.slot || 0] = ev.duration_s;
+    } else if (ev.type === "session") { st = {slots: {}, running: [], last_gate_s: {}, pm125: {}, session: ev.name, station: st.station}; }
+    render();
+  };
+  ws.onclose = () => setTimeout(connect, 2000);
+}
+connect();
+</script></body></html>
+"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ATPStatus/1"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass   # dashboards poll; keep the ATP console clean
+
+    def _send(self, code: int, body: bytes, ctype: str) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        hub: StatusHub = self.server.hub
+        path = self.path.split("?", 1)[0]
+        if path == "/ws":
+            return self._websocket(hub)
+        if path == "/api/status":
+            return self._send(200, json.dumps(hub.snapshot(), default=str).encode(), "application/json")
+        if path == "/healthz":
+            return self._send(200, b"ok\n", "text/plain")
+        if path in ("/", "/index.html"):
+            return self._send(200, DASHBOARD_HTML.encode(), "text/html; charset=utf-8")
+        return self._send(404, b"not found\n", "text/plain")
+
+    def _websocket(self, hub: StatusHub) -> None:
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key or "websocket" not in self.headers.get("Upgrade", "").lower():
+            return self._send(400, b"websocket upgrade expected\n", "text/plain")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", ws_accept(key))
+        self.end_headers()
+        self.wfile.flush()
+
+        client = _WsClient(self.connection, self.client_address)
+        sender = threading.Thread(target=client.send_loop, args=(hub,), name="status-ws-send", daemon=True)
+        hub.attach(client)
+        sender.start()
+        try:
+            while not client.closed:
+                fr = ws_read(self.rfile)
+                if fr is None:
+                    break
+                op, data = fr
+                if op == OP_CLOSE:
+                    client.offer(ws_frame(data[:2], OP_CLOSE), control=True)
+                    break
+                if op == OP_PING:
+                    client.offer(ws_frame(data, OP_PONG), control=True)
+        except OSError:
+            pass
+        finally:
+            hub.detach(client)
+            sender.join(timeout=1.0)
+            self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# =========================================================
+# MODULE API (engine / gates)
+# =========================================================
+_hub: Optional[StatusHub] = None
+_server: Optional[_Server] = None
+
+
+def _on_history(kind: str, obj) -> None:
+    if kind == "session":
+        publish("session", name=obj)
+    elif kind in ("gate_start", "gate_end"):
+        slot = obj.slot if obj.slot != history.ALL_SLOTS else None
+        ev = {"gate": obj.gate, "slot": slot, "state": "start" if kind == "gate_start" else "end"}
+        if kind == "gate_end":
+            ev["duration_s"] = round(obj.duration_s, 3)
+            ev["retries"] = obj.retries
+        publish("gate", **ev)
+
+
+def _parse_bind(bind: str):
+    host, _, port = (bind or "").strip().rpartition(":")
+    if not _:
+        host, port = bind.strip(), ""
+    return host or "0.0.0.0", int(port or DEFAULT_PORT)
+
+
+def start(bind: str = f":{DEFAULT_PORT}", log: Callable[[str], None] = print) -> str:
+    """Serve on HOST:PORT (":8765" = all interfaces). Returns the URL."""
+    global _hub, _server
+    if _server is not None:
+        return f"http://{_server.server_address[0]}:{_server.server_address[1]}/"
+    host, port = _parse_bind(bind)
+    hub = StatusHub()
+    srv = _Server((host, port), _Handler)
+    srv.hub = hub
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.5},
+                     name="status-http", daemon=True).start()
+    _hub, _server = hub, srv
+    history.add_listener(_on_history)
+    url = f"http://{host if host != '0.0.0.0' else socket.gethostname()}:{srv.server_address[1]}/"
+    log(f"[STATUS] Dashboard {url} (WebSocket /ws, JSON /api/status)")
+    return url
+
+
+def start_from_env(log: Callable[[str], None] = print) -> Optional[str]:
+    bind = os.environ.get(HTTP_ENV, "").strip()
+    if not bind:
+        return None
+    try:
+        return start(bind, log)
+    except Exception as e:
+        log(f"[STATUS][ERROR] {bind}: {e}")
+        return None
+
+
+def is_enabled() -> bool:
+    return _hub is not None
+
+
+def stop() -> None:
+    global _hub, _server
+    if _server is None:
+        return
+    history.remove_listener(_on_history)
+    _server.shutdown()
+    _server.server_close()
+    with _hub.lock:
+        clients = list(_hub.clients)
+    for c in clients:
+        c.close()
+    _hub, _server = None, None
+
+
+def publish(kind: str, slot: Optional[int] = None, **data) -> None:
+    """Live event for dashboards (no-op when the API is off). slot defaults to the current gate run."""
+    hub = _hub
+    if hub is None:
+        return
+    if slot is None:
+        run = history.current_run()
+        if run is not None and run.slot != history.ALL_SLOTS:
+            slot = run.slot
+    hub.publish(dict(data, type=kind, slot=slot))
+
+
+def publish_pm125(stat: Dict[str, Any]) -> None:
+    if _hub is None or not stat:
+        return
+    v = stat.get("voltage_mv", 0)
+    i = stat.get("current_ma", 0)
+    publish("pm125", voltage_mv=v, current_ma=i, power_w=round(v * i / 1e6, 3),
+            temperature_c=stat.get("temperature_c"))
+
+
+# =========================================================
+# LOCAL CLIENT (CLI)
+# =========================================================
+def _ws_connect(url: str):
+    u = urlparse(url)
+    sock = socket.create_connection((u.hostname or "127.0.0.1", u.port or DEFAULT_PORT), timeout=5.0)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((f"GET {u.path or '/ws'} HTTP/1.1\r\nHost: {u.netloc}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    rfile = sock.makefile("rb")
+    status = rfile.readline().decode(errors="replace")
+    headers = {}
+    while True:
+        line = rfile.readline().decode(errors="replace").strip()
+        if not line:
+            break
+        k, _, v = line.partition(":")
+        headers[k.strip().lower()] = v.strip()
+    if " 101 " not in status or headers.get("sec-websocket-accept") != ws_accept(key):
+        raise ConnectionError(f"WebSocket handshake failed: {status.strip()}")
+    sock.settimeout(None)
+    return sock, rfile
+
+
+def _fmt(ev: Dict[str, Any]) -> str:
+    t = ev.get("type")
+    if t == "snapshot":
+        return (f"snapshot session={ev.get('session')} clients={ev.get('clients')} "
+                f"slots={ {s: v.get('status') for s, v in ev.get('slots', {}).items()} }")
+    if t == "update":
+        return f"update   slot={ev.get('slot')} gate={ev.get('gate')} {ev.get('status')}"
+    if t == "gate":
+        dur = f" {ev.get('duration_s')}s" if ev.get("state") == "end" else ""
+        return f"gate     Gate{ev.get('gate')} slot={ev.get('slot') or 'all'} {ev.get('state')}{dur}"
+    if t == "pm125":
+        return f"pm125    slot={ev.get('slot')} {ev.get('power_w')} W ({ev.get('voltage_mv')} mV, {ev.get('current_ma')} mA)"
+    return json.dumps(ev)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="ATP status API client")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("status", help="GET /api/status")
+    sp.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    wp = sub.add_parser("watch", help="stream WebSocket events")
+    wp.add_argument("--url", default=f"ws://127.0.0.1:{DEFAULT_PORT}/ws")
+    wp.add_argument("--raw", action="store_true", help="print the JSON frames")
+    args = ap.parse_args(argv)
+
+    try:
+        if args.cmd == "status":
+            with urllib.request.urlopen(args.url.rstrip("/") + "/api/status", timeout=5.0) as r:
+                print(json.dumps(json.loads(r.read()), indent=2))
+            return 0
+
+        sock, rfile = _ws_connect(args.url)
+        try:
+            while True:
+                fr = ws_read(rfile, max_len=1 << 24)
+                if fr is None or fr[0] == OP_CLOSE:
+                    break
+                if fr[0] == OP_TEXT:
+                    ev = json.loads(fr[1])
+                    print(json.dumps(ev) if args.raw else _fmt(ev), flush=True)
+        except KeyboardInterrupt:
+            sock.sendall(ws_frame(b"\x03\xe8", OP_CLOSE, mask=True))
+        finally:
+            sock.close()
+        return 0
+    except (OSError, ConnectionError, ValueError) as e:
+        print(f"[STATUS][ERROR] {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
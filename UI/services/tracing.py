@@ -0,0 +1,219 @@
+# services/tracing.py
+"""
+Span tracing for ATP sessions, exported as Chrome trace JSON (Perfetto /
+chrome://tracing).
+
+    from services import tracing
+    tracing.enable()
+    tracing.begin_session("ATP_A_B_C_D_2026-01-01_10-00-00")
+    with tracing.span("Gate4", gate=4, slot=2):
+        with tracing.span("IUL_ON"):
+            ...
+    path = tracing.end_session("ATP_logs")   # -> ATP_logs/<session>.trace.json
+
+Nesting: session -> gate -> slot -> step -> hardware op. Hardware ops
+(sleep >= 5 ms, can_wait, can_tx, serial) come from the services.profiler HAL
+wrappers; SPI / GPIO are left out by default (Gate3 does ~50k of them).
+
+Tracks: one per slot ("Slot 1".."Slot 4") + "Fixture" for all-slot work,
+so idle slots and serialized gates are visible at a glance. A span goes to
+the track of its own slot= attribute, else to its parent's track.
+
+Timestamps are hal.clock.monotonic() (virtual clock -> fixture time).
+Off by default (ATP_TRACE=1 or enable()); span() is a no-op when off.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from hal import clock as hal_clock
+from services import profiler
+
+TRACE_ENV = "ATP_TRACE"
+
+# HAL op categories that become spans (see services.profiler)
+HW_SPAN_CATEGORIES = {profiler.SLEEP, profiler.CAN_WAIT, profiler.CAN_TX, profiler.SERIAL}
+# Shorter sleeps are sample pacing (Gate3 ADC loop), not settle time
+MIN_SLEEP_SPAN_S = 0.005
+
+FIXTURE_TRACK = 0
+PID = 1
+
+_enabled = False
+_tls = threading.local()
+_lock = threading.Lock()
+
+
+class _Session:
+    def __init__(self, name: str):
+        self.name = name
+        self.thread = threading.get_ident()
+        self.t0 = hal_clock.monotonic()
+        self.events: List[Dict[str, Any]] = []
+        self.tracks = {FIXTURE_TRACK}
+
+
+_session: Optional[_Session] = None
+
+
+def _stack() -> Optional[list]:
+    st = getattr(_tls, "stack", None)
+    if st is None:
+        if _session is None or threading.get_ident() != _session.thread:
+            return None   # background threads are not traced
+        st = _tls.stack = []
+    return st
+
+
+def _emit(name: str, cat: str, t0: float, dur: float, track: int, args: Dict[str, Any]) -> None:
+    sess = _session
+    if sess is None:
+        return
+    ev = {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": round((t0 - sess.t0) * 1e6, 3),
+        "dur": round(max(0.0, dur) * 1e6, 3),
+        "pid": PID,
+        "tid": track,
+    }
+    if args:
+        ev["args"] = {k: v for k, v in args.items() if v is not None}
+    with _lock:
+        sess.events.append(ev)
+        sess.tracks.add(track)
+
+
+# =========================================================
+# SPANS
+# =========================================================
+@contextmanager
+def span(name: str, cat: str = "step", **attrs):
+    if not _enabled or _session is None:
+        yield
+        return
+    st = _stack()
+    if st is None:
+        yield
+        return
+
+    slot = attrs.get("slot")
+    if slot is not None:
+        track = int(slot)
+    else:
+        track = st[-1] if st else FIXTURE_TRACK
+
+    st.append(track)
+    t0 = hal_clock.monotonic()
+    try:
+        yield
+    finally:
+        dt = hal_clock.monotonic() - t0
+        st.pop()
+        _emit(name, cat, t0, dt, track, attrs)
+
+
+def instant(name: str, **attrs) -> None:
+    """Zero-length marker on the current track (e.g. a FAIL verdict)."""
+    if not _enabled or _session is None:
+        return
+    st = _stack()
+    if st is None:
+        return
+    sess = _session
+    ev = {
+        "name": name, "cat": "mark", "ph": "i", "s": "t",
+        "ts": round((hal_clock.monotonic() - sess.t0) * 1e6, 3),
+        "pid": PID, "tid": st[-1] if st else FIXTURE_TRACK,
+    }
+    if attrs:
+        ev["args"] = attrs
+    with _lock:
+        sess.events.append(ev)
+
+
+def _on_hw_op(category: str, t0: float, dt: float) -> None:
+    if category not in HW_SPAN_CATEGORIES or _session is None:
+        return
+    if category == profiler.SLEEP and dt < MIN_SLEEP_SPAN_S:
+        return
+    st = _stack()
+    if st is None:
+        return
+    _emit(category, "hw", t0, dt, st[-1] if st else FIXTURE_TRACK, {})
+
+
+# =========================================================
+# SESSION / EXPORT
+# =========================================================
+def enable() -> None:
+    global _enabled
+    if _enabled:
+        return
+    profiler.add_sink(_on_hw_op)
+    _enabled = True
+
+
+def enable_from_env() -> bool:
+    if os.environ.get(TRACE_ENV, "").strip() not in ("", "0"):
+        enable()
+    return _enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def begin_session(name: str) -> None:
+    """New trace; the calling thread is the session thread."""
+    global _session
+    if not _enabled:
+        return
+    _session = _Session(name or "ATP")
+    _tls.stack = []
+
+
+def adopt_thread() -> None:
+    """The calling thread becomes the session thread (gates run on a worker)."""
+    sess = _session
+    if sess is None or sess.thread == threading.get_ident():
+        return
+    sess.thread = threading.get_ident()
+    _tls.stack = []
+
+
+def _track_name(track: int) -> str:
+    return "Fixture" if track == FIXTURE_TRACK else f"Slot {track}"
+
+
+def chrome_trace(sess: Optional[_Session] = None) -> Dict[str, Any]:
+    sess = sess or _session
+    if sess is None:
+        return {"traceEvents": []}
+    meta = [{"name": "process_name", "ph": "M", "pid": PID, "tid": 0, "args": {"name": sess.name}}]
+    for t in sorted(sess.tracks):
+        meta.append({"name": "thread_name", "ph": "M", "pid": PID, "tid": t, "args": {"name": _track_name(t)}})
+        meta.append({"name": "thread_sort_index", "ph": "M", "pid": PID, "tid": t, "args": {"sort_index": t}})
+    with _lock:
+        events = list(sess.events)
+    # Parents end after their children: sort by start so viewers nest them
+    events.sort(key=lambda e: (e["ts"], -e.get("dur", 0)))
+    return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+
+def end_session(out_dir: str) -> Optional[str]:
+    """Write <out_dir>/<session>.trace.json and close the session."""
+    global _session
+    sess = _session
+    if sess is None:
+        return None
+    _session = None
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{sess.name}.trace.json")
+    with open(path, "w") as f:
+        json.dump(chrome_trace(sess), f, separators=(",", ":"))
+    return path
@@ -0,0 +1,473 @@
+# services/watchdog.py
+"""
+Per-gate watchdog: every gate run gets a wall-clock budget, and a gate stuck
+in hardware (PM125 waiting for a frame, a CAN recv, Acroname
+discoverAndConnect) is cancelled instead of stalling the whole batch.
+
+    with watchdog.guard(4, slot, log):       # runners, next to profiler.tag()
+        ok = run_gate4_iul_check(slot, log)
+    # -> raises watchdog.GateTimeout if the budget ran out; the runner records
+    #    the gate as TIMEOUT (not passed) and moves on to the next slot / gate
+
+On overrun:
+  1) cooperative: the gate's cancel flag is set. hal.clock.sleep, CAN recv /
+     send, serial read / write and SPI transfers of that thread raise
+     GateTimeout from then on (CAN recv waits in RECV_SLICE_S slices, so a
+     recv(timeout=None) notices too); on_cancel() callbacks run (gate6 kills
+     its venv subprocess)
+  2) forced, GRACE_S later if the gate is still running: every HAL handle the
+     gate opened is closed (serial port, CAN socket) and the add_release()
+     hooks run (HardwareController: shared CAN buses, reopened on next use)
+  The first Acroname connect runs on a helper thread bounded by the budget;
+  a call that never returns is left behind on that (daemon) thread.
+
+Budgets (seconds, wall time; ~3x a healthy fixture):
+
+    DEFAULT_BUDGET_S[gate]        per slot
+    ALL_SLOTS_BUDGET_S[gate]      one run for all slots (Gate2 parallel
+                                  handshake, Gate3 one-shot)
+    ATP_GATE_BUDGETS="6=400,3all=240"   overrides
+
+Gate2 / Gate3 also derive a budget from the active fixture profile
+(services/fixture_profile.py): their worst case with every wait and retry
+used up (e.g. Gate2 all slots = attempts x (holdoff + 4 x timeout) + retry
+delays) x DERIVED_MARGIN + DERIVED_PAD_S. The larger of that and the table
+applies, so a profile with longer timeouts never turns a slow but healthy
+run into TIMEOUT. ATP_GATE_BUDGETS still wins over both.
+    ATP_WATCHDOG=0                      off (guard() is a no-op)
+
+    from services import watchdog
+    watchdog.enable_from_env()     # before the first hardware access (wraps the HAL)
+
+Under the virtual clock (ATP_HAL=vsim) gates take milliseconds of wall, so
+the budgets never fire there.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import hal
+from hal import clock as hal_clock
+from hal.base import Gpio, HalBackend, SpiDevice, UsbcMux
+from services.fixture_profile import FIXTURE
+
+WATCHDOG_ENV = "ATP_WATCHDOG"
+BUDGETS_ENV = "ATP_GATE_BUDGETS"
+
+TIMEOUT = "TIMEOUT"
+
+DEFAULT_BUDGET_S: Dict[int, float] = {
+    1: 15.0,
+    2: 30.0,
+    3: 60.0,
+    4: 120.0,
+    5: 30.0,
+    6: 400.0,
+}
+ALL_SLOTS_BUDGET_S: Dict[int, float] = {
+    2: 60.0,
+    3: 180.0,
+}
+
+DERIVED_MARGIN = 1.5   # profile-derived budgets: worst case x margin + pad
+DERIVED_PAD_S = 5.0
+FIXTURE_SLOTS = 4      # slots in an all-slots run
+
+GRACE_S = 3.0          # cooperative cancel -> forced close
+RECV_SLICE_S = 0.1     # CAN recv wait slice (cancel latency)
+
+_enabled = os.environ.get(WATCHDOG_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+_installed = False
+_tls = threading.local()
+_release: List[Callable[[], None]] = []
+_budgets: Dict[str, float] = {}
+
+
+class GateTimeout(Exception):
+    pass
+
+
+# =========================================================
+# BUDGETS
+# =========================================================
+def _parse_budgets(text: str) -> Dict[str, float]:
+    out = {}
+    for item in (x.strip() for x in (text or "").split(",")):
+        if "=" not in item:
+            continue
+        k, v = item.split("=", 1)
+        try:
+            out[k.strip().lower()] = float(v)
+        except ValueError:
+            pass
+    return out
+
+
+def set_budget(gate: int, seconds: float, all_slots: bool = False) -> None:
+    _budgets[f"{gate}all" if all_slots else str(gate)] = float(seconds)
+
+
+def worst_case_s(gate: int, slot: Optional[int] = None) -> Optional[float]:
+    """
+    Longest a healthy but slow run of `gate` may take with the active fixture
+    profile (every wait and retry used up); None = not derived for this gate.
+    """
+    if gate == 2:
+        g2 = FIXTURE.gate2
+        n = FIXTURE_SLOTS if slot is None else 1
+        return (g2.max_attempts * (g2.start_holdoff_s + n * g2.timeout_s)
+                + (g2.max_attempts - 1) * g2.retry_delay_s)
+    if gate == 3:
+        g3 = FIXTURE.gate3
+        q, st, w = g3.cmd_quiet_s, g3.settle_s, g3.window_s
+        if slot is None:
+            # Slot1..3: normalize (4 TR cmds) + settle + 2 x (cmd + settle + window);
+            # Slot4: + keeper2 cmd + settle; finish: 4 TR cmds
+            return 29 * q + 13 * st + 8 * w
+        # normalize (4 TR cmds) + settle + 2 x (cmd + settle + window) + final TR ON
+        return 7 * q + 3 * st + 2 * w
+    return None
+
+
+def budget_s(gate: int, slot: Optional[int] = None) -> Optional[float]:
+    """Budget of one gate run (slot=None: all slots at once); None = unlimited."""
+    if slot is None and f"{gate}all" in _budgets:
+        return _budgets[f"{gate}all"]
+    if str(gate) in _budgets:
+        return _budgets[str(gate)]
+    if slot is None and gate in ALL_SLOTS_BUDGET_S:
+        table = ALL_SLOTS_BUDGET_S[gate]
+    else:
+        table = DEFAULT_BUDGET_S.get(gate)
+    worst = worst_case_s(gate, slot)
+    if worst is None or table is None:
+        return table
+    return max(table, worst * DERIVED_MARGIN + DERIVED_PAD_S)
+
+
+# =========================================================
+# CANCEL TOKEN (one per guarded gate run)
+# =========================================================
+class _Token:
+    def __init__(self, gate, slot, budget: float, log: Callable[[str], None]):
+        self.gate = gate
+        self.slot = slot
+        self.budget = budget
+        self.log = log
+        self.deadline = time.monotonic() + budget
+        self.cancel = threading.Event()
+        self.done = False
+        self.forced = False
+        self.handles: List[object] = []
+        self.callbacks: List[Callable[[], None]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def label(self) -> str:
+        return f"Gate{self.gate}" + ("" if self.slot is None else f" slot={self.slot}")
+
+    def check(self) -> None:
+        if self.cancel.is_set():
+            raise GateTimeout(f"{self.label} cancelled (budget {self.budget:g}s)")
+
+    def track(self, handle) -> None:
+        with self.lock:
+            self.handles.append(handle)
+
+
+def _current() -> Optional[_Token]:
+    return getattr(_tls, "token", None)
+
+
+def check() -> None:
+    """Raise GateTimeout if the calling thread's gate was cancelled (long loops in gates)."""
+    tok = _current()
+    if tok is not None:
+        tok.check()
+
+
+def _safe(fn, log, what: str) -> None:
+    try:
+        fn()
+    except Exception as e:
+        log(f"[WATCHDOG][WARN] {what}: {e}")
+
+
+def _overrun(tok: _Token) -> None:
+    with tok.lock:
+        if tok.done:
+            return
+        callbacks = list(tok.callbacks)
+    tok.log(f"[WATCHDOG] {tok.label} over its {tok.budget:g}s budget: cancelling")
+    tok.cancel.set()
+    for fn in callbacks:
+        _safe(fn, tok.log, "on_cancel")
+    t = threading.Timer(GRACE_S, _force, args=(tok,))
+    t.daemon = True
+    t.start()
+
+
+def _force(tok: _Token) -> None:
+    with tok.lock:
+        if tok.done:
+            return
+        tok.forced = True
+        handles = list(tok.handles)
+    tok.log(f"[WATCHDOG] {tok.label} still running {GRACE_S:g}s after cancel: "
+            f"closing {len(handles)} hardware handle(s)")
+    for h in handles:
+        close = getattr(h, "close", None) or getattr(h, "shutdown", None)
+        if close is not None:
+            _safe(close, tok.log, f"close {type(h).__name__}")
+    for fn in list(_release):
+        _safe(fn, tok.log, "release")
+
+
+@contextmanager
+def guard(gate, slot: Optional[int] = None, log: Optional[Callable[[str], None]] = None):
+    """Run the body under the budget of (gate, slot); GateTimeout on exit if it overran."""
+    budget = budget_s(gate, slot) if _enabled else None
+    if budget is None or budget <= 0:
+        yield None
+        return
+    tok = _Token(gate, slot, budget, log or print)
+    prev = _current()
+    _tls.token = tok
+    timer = threading.Timer(budget, _overrun, args=(tok,))
+    timer.daemon = True
+    timer.start()
+    try:
+        yield tok
+    except GateTimeout:
+        raise
+    except Exception as e:
+        if tok.cancel.is_set():
+            raise GateTimeout(f"{tok.label} exceeded {budget:g}s ({e})") from e
+        raise
+    finally:
+        timer.cancel()
+        with tok.lock:
+            tok.done = True
+        _tls.token = prev
+    if tok.cancel.is_set():
+        raise GateTimeout(f"{tok.label} exceeded {budget:g}s"
+                          + (" (hardware handles closed)" if tok.forced else ""))
+
+
+@contextmanager
+def on_cancel(fn: Callable[[], None]):
+    """Call fn() if the current gate is cancelled while inside (kill a subprocess)."""
+    tok = _current()
+    if tok is None:
+        yield
+        return
+    with tok.lock:
+        tok.callbacks.append(fn)
+    try:
+        if tok.cancel.is_set():
+            fn()
+        yield
+    finally:
+        with tok.lock:
+            if fn in tok.callbacks:
+                tok.callbacks.remove(fn)
+
+
+def add_release(fn: Callable[[], None]) -> None:
+    """Forced-close hook for shared handles (run on the watchdog thread)."""
+    if fn not in _release:
+        _release.append(fn)
+
+
+# =========================================================
+# HAL WRAPPERS
+# =========================================================
+class _WatchdogClock(hal_clock.RealClock):
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+
+    def time(self) -> float:
+        return self.inner.time()
+
+    def monotonic(self) -> float:
+        return self.inner.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        tok = _current()
+        if tok is None:
+            self.inner.sleep(seconds)
+            return
+        tok.check()
+        if type(self.inner) is hal_clock.RealClock and seconds > 0:
+            if tok.cancel.wait(seconds):
+                tok.check()
+            return
+        self.inner.sleep(seconds)
+        tok.check()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class _WatchdogSpi(SpiDevice):
+    def __init__(self, inner: SpiDevice):
+        self.inner = inner
+        self.max_speed_hz = inner.max_speed_hz
+        self.mode = inner.mode
+        self.no_cs = inner.no_cs
+
+    def xfer2(self, data):
+        check()
+        return self.inner.xfer2(data)
+
+    def close(self):
+        self.inner.close()
+
+
+class _WatchdogSerial:
+    def __init__(self, inner):
+        self.inner = inner
+
+    def read(self, size=1):
+        check()
+        return self.inner.read(size)
+
+    def write(self, data):
+        check()
+        return self.inner.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def __setattr__(self, name, value):
+        if name == "inner":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.inner, name, value)
+
+
+class _WatchdogCanBus:
+    def __init__(self, inner):
+        self.inner = inner
+
+    def recv(self, timeout=None):
+        tok = _current()
+        if tok is None or hal_clock.is_virtual():
+            return self.inner.recv(timeout)
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            tok.check()
+            left = RECV_SLICE_S if end is None else min(RECV_SLICE_S, end - time.monotonic())
+            msg = self.inner.recv(max(0.0, left))
+            if msg is not None or (end is not None and time.monotonic() >= end):
+                return msg
+
+    def send(self, msg, timeout=None):
+        check()
+        return self.inner.send(msg, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class WatchdogBackend(HalBackend):
+    def __init__(self, inner: HalBackend):
+        self.inner = inner
+        self.name = inner.name
+        self._mux: Optional[UsbcMux] = None
+
+    def _track(self, handle):
+        tok = _current()
+        if tok is not None:
+            tok.track(handle)
+        return handle
+
+    def gpio(self) -> Gpio:
+        return self.inner.gpio()
+
+    def close_gpio(self) -> None:
+        self.inner.close_gpio()
+
+    def spi_open(self, bus, dev, speed_hz, mode=0, no_cs=False) -> SpiDevice:
+        return self._track(_WatchdogSpi(self.inner.spi_open(bus, dev, speed_hz, mode=mode, no_cs=no_cs)))
+
+    def open_can(self, channel, interface, can_filters=None):
+        return self._track(_WatchdogCanBus(self.inner.open_can(channel, interface, can_filters=can_filters)))
+
+    def open_serial(self, port, baudrate=115200, timeout=1.0):
+        return self._track(_WatchdogSerial(self.inner.open_serial(port, baudrate=baudrate, timeout=timeout)))
+
+    def usbc_mux(self) -> UsbcMux:
+        tok = _current()
+        if self._mux is not None or tok is None or hal_clock.is_virtual():
+            self._mux = self.inner.usbc_mux()
+            return self._mux
+        # first connect (discoverAndConnect can hang): bounded by the gate budget
+        box: Dict[str, object] = {}
+
+        def connect():
+            try:
+                box["mux"] = self.inner.usbc_mux()
+            except Exception as e:
+                box["err"] = e
+
+        t = threading.Thread(target=connect, name="watchdog-usbc-mux", daemon=True)
+        t.start()
+        while t.is_alive():
+            tok.check()
+            t.join(RECV_SLICE_S)
+        if "err" in box:
+            raise box["err"]
+        self._mux = box["mux"]
+        return self._mux
+
+    def shutdown(self) -> None:
+        self._mux = None
+        self.inner.shutdown()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+def install() -> None:
+    """Wrap the active HAL backend + clock. Call before hardware is first opened."""
+    global _installed
+    if _installed:
+        return
+    b = hal.get_backend()
+    if not isinstance(b, WatchdogBackend):
+        hal.select_backend(WatchdogBackend(b), shutdown_previous=False)
+    c = hal_clock.get_clock()
+    if not isinstance(c, _WatchdogClock):
+        hal_clock.set_clock(_WatchdogClock(c))
+    _installed = True
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+    install()
+
+
+def disable() -> None:
+    """guard() becomes a no-op (the HAL wrappers stay, they only act inside a guard)."""
+    global _enabled
+    _enabled = False
+
+
+def enable_from_env() -> bool:
+    _budgets.update(_parse_budgets(os.environ.get(BUDGETS_ENV, "")))
+    if _enabled:
+        install()
+    return _enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
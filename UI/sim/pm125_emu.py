@@ -0,0 +1,383 @@
+# sim/pm125_emu.py
+"""
+PassMark PM125 emulator over a pseudo-terminal.
+
+Opens a pty and speaks the protocol from tests/switch/pm125.py:
+    0x02 | LEN | CMD | PAYLOAD | CHK | 0x03     (CHK = XOR of all bytes ^ 0x03)
+
+Implemented commands:
+    GET_DEV_INFO, GET_CONSTAT, GET_PORT_CAPABILITIES, GET_STAT,
+    SET_PORT_VOLTAGE, SET_CURRENT, SET_CURRENT_FAST
+
+Electrical model (PM125Model):
+- PDO table advertised by the RUP (voltage_mv, max_current_ma)
+- SET_PORT_VOLTAGE(idx, mv) -> contract = PDO[idx] after negotiate_s
+- bus voltage / load current settle exponentially (tau_v_s / tau_i_s)
+- gaussian noise on the reported voltage / current
+- on_load(watts) callback, e.g. to feed sim.rup_sim.SimRUP.load_w
+
+Usage (same process):
+    with PM125Emulator() as emu:
+        pm = PM125(emu.port)
+
+No pty at all (virtual-clock sim): PM125SerialLoopback(PM125Link(model)).
+
+Usage (standalone):
+    python -m sim.pm125_emu --tau-v-ms 200 --noise-ma 10
+    ATP_PM125_PORT=/dev/pts/N python3 main_atp.py
+"""
+
+import argparse
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+STX = 0x02
+ETX = 0x03
+
+GET_DEV_INFO = 0x01
+GET_CONSTAT = 0x0A
+GET_PORT_CAPABILITIES = 0x0B
+GET_STAT = 0x0C
+SET_PORT_VOLTAGE = 0x0D
+SET_CURRENT = 0x10
+SET_CURRENT_FAST = 0x11
+
+# 60 W RUP: 5 / 9 / 12 / 15 / 20 V @ 3 A
+DEFAULT_PDOS = [
+    (5000, 3000),
+    (9000, 3000),
+    (12000, 3000),
+    (15000, 3000),
+    (20000, 3000),
+]
+
+
+def _u16(v: int) -> List[int]:
+    v = max(0, min(0xFFFF, int(v)))
+    return [v & 0xFF, (v >> 8) & 0xFF]
+
+
+def _u32(v: int) -> List[int]:
+    v = max(0, min(0xFFFFFFFF, int(v)))
+    return [v & 0xFF, (v >> 8) & 0xFF, (v >> 16) & 0xFF, (v >> 24) & 0xFF]
+
+
+def checksum(data) -> int:
+    chk = 0
+    for b in data:
+        chk ^= b
+    return (chk ^ ETX) & 0xFF
+
+
+def build_frame(cmd: int, payload: List[int]) -> bytes:
+    content = [STX, 1 + len(payload), cmd] + list(payload)
+    return bytes(content + [checksum(content), ETX])
+
+
+# =========================================================
+# ELECTRICAL MODEL
+# =========================================================
+@dataclass
+class PM125Model:
+    pdos: List[Tuple[int, int]] = field(default_factory=lambda: list(DEFAULT_PDOS))
+
+    negotiate_s: float = 0.15    # PD contract switch time
+    tau_v_s: float = 0.05        # bus voltage settle time constant
+    tau_i_s: float = 0.05        # load current settle time constant
+    noise_mv: float = 0.0        # gaussian sigma on reported voltage
+    noise_ma: float = 0.0        # gaussian sigma on reported current
+    temperature_c: int = 35
+    seed: int = 0
+
+    hw_ver: int = 1
+    fw_ver: int = 17
+
+    clock: Callable[[], float] = time.monotonic
+    on_load: Optional[Callable[[float], None]] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        now = self.clock()
+        self.profile_index = 0
+        self._contract_mv = self.pdos[0][0]
+        self._pending: Optional[Tuple[float, int]] = None   # (effective_at, profile_index)
+        self._v = (self._contract_mv, self._contract_mv, now)   # (from, to, t0)
+        self._i = (0.0, 0.0, now)
+        self.set_current_ma = 0
+
+    # -------------------------
+    # helpers
+    # -------------------------
+    @staticmethod
+    def _settle(state, tau: float, now: float) -> float:
+        v_from, v_to, t0 = state
+        if tau <= 0:
+            return v_to
+        return v_to + (v_from - v_to) * math.exp(-(now - t0) / tau)
+
+    def _apply_pending(self, now: float) -> None:
+        if self._pending and now >= self._pending[0]:
+            t_eff, idx = self._pending
+            self._pending = None
+            self.profile_index = idx
+            mv = self.pdos[idx][0]
+            self._v = (self._settle(self._v, self.tau_v_s, t_eff), mv, t_eff)
+            self._contract_mv = mv
+            self._clamp_current(t_eff)
+
+    def _max_current_ma(self) -> int:
+        return self.pdos[self.profile_index][1]
+
+    def _clamp_current(self, now: float) -> None:
+        target = min(self.set_current_ma, self._max_current_ma())
+        self._i = (self._settle(self._i, self.tau_i_s, now), float(target), now)
+        if self.on_load:
+            self.on_load(self._contract_mv * target / 1_000_000.0)
+
+    # -------------------------
+    # commands
+    # -------------------------
+    def set_voltage(self, profile_index: int, voltage_mv: int) -> None:
+        now = self.clock()
+        self._apply_pending(now)
+        if 0 <= profile_index < len(self.pdos):
+            self._pending = (now + self.negotiate_s, profile_index)
+
+    def set_current(self, ma: int) -> None:
+        now = self.clock()
+        self._apply_pending(now)
+        self.set_current_ma = int(ma)
+        self._clamp_current(now)
+
+    def measure(self) -> Tuple[int, int]:
+        """(voltage_mv, current_ma) right now, with settle + noise."""
+        now = self.clock()
+        self._apply_pending(now)
+        v = self._settle(self._v, self.tau_v_s, now)
+        i = self._settle(self._i, self.tau_i_s, now)
+        if self.noise_mv:
+            v += self._rng.gauss(0.0, self.noise_mv)
+        if self.noise_ma and i > 0:
+            i += self._rng.gauss(0.0, self.noise_ma)
+        return max(0, int(round(v))), max(0, int(round(i)))
+
+    def constat(self) -> Tuple[int, int, int]:
+        """(profile_index, contract_mv, max_current_ma)."""
+        self._apply_pending(self.clock())
+        return self.profile_index, self._contract_mv, self._max_current_ma()
+
+    # -------------------------
+    # payloads (match tests/switch/pm125.py parsing)
+    # -------------------------
+    def payload(self, cmd: int, req: List[int]) -> Optional[List[int]]:
+        if cmd == GET_DEV_INFO:
+            return [self.hw_ver, self.fw_ver]
+
+        if cmd == GET_STAT:
+            v, i = self.measure()
+            return [0x00, self.temperature_c] + _u16(v) + _u16(self.set_current_ma) + _u16(i) + _u16(0)
+
+        if cmd == GET_CONSTAT:
+            idx, mv, max_ma = self.constat()
+            return [0x01, idx, 0x01, 0x00] + _u16(mv) + _u16(max_ma) + _u32(mv * max_ma // 1000)
+
+        if cmd == GET_PORT_CAPABILITIES:
+            out = [len(self.pdos)]
+            for mv, ma in self.pdos:
+                out += _u16(mv) + _u16(ma) + _u32(mv * ma // 1000)
+            return out
+
+        if cmd == SET_PORT_VOLTAGE and len(req) >= 3:
+            self.set_voltage(req[0], req[1] | (req[2] << 8))
+            return [0x00]
+
+        if cmd in (SET_CURRENT, SET_CURRENT_FAST) and len(req) >= 2:
+            self.set_current(req[0] | (req[1] << 8))
+            return [0x00]
+
+        return None
+
+
+# =========================================================
+# FRAME LINK (bytes in -> reply bytes out)
+# =========================================================
+class PM125Link:
+    """Protocol side of the emulator, independent of the transport."""
+
+    def __init__(self, model: Optional[PM125Model] = None):
+        self.model = model or PM125Model()
+        self._buf = bytearray()
+        self.frames_served = 0
+
+    def feed(self, data: bytes) -> bytes:
+        """Consume host bytes, return every reply frame they complete."""
+        self._buf += data
+        out = bytearray()
+        for cmd, payload in self._parse():
+            reply = self.model.payload(cmd, payload)
+            if reply is None:
+                continue
+            out += build_frame(cmd, reply)
+            self.frames_served += 1
+        return bytes(out)
+
+    def _parse(self):
+        """Yield complete, checksum-valid frames from the RX buffer."""
+        buf = self._buf
+        while True:
+            start = buf.find(bytes([STX]))
+            if start < 0:
+                buf.clear()
+                return
+            del buf[:start]
+            if len(buf) < 2:
+                return
+            n = buf[1]
+            total = 2 + n + 2
+            if len(buf) < total:
+                return
+            frame = bytes(buf[:total])
+            if frame[-1] != ETX or checksum(frame[:2 + n]) != frame[2 + n]:
+                del buf[:1]          # resync on next 0x02
+                continue
+            del buf[:total]
+            yield frame[2], list(frame[3:2 + n])
+
+
+# =========================================================
+# IN-PROCESS SERIAL (no pty, no thread)
+# =========================================================
+class PM125SerialLoopback:
+    """
+    pyserial-like port wired straight to a PM125Link: write() computes the
+    reply synchronously, read() hands it back. For the virtual-clock sim,
+    where no background thread may answer "later".
+    """
+
+    def __init__(self, link: PM125Link, timeout: float = 1.0, on_timeout: Optional[Callable[[float], None]] = None):
+        self.link = link
+        self.timeout = timeout
+        self.is_open = True
+        self._rx = bytearray()
+        self._on_timeout = on_timeout   # e.g. VirtualClock.sleep
+
+    def write(self, data) -> int:
+        self._rx += self.link.feed(bytes(data))
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        if len(self._rx) < size and self._on_timeout:
+            self._on_timeout(self.timeout)
+        out = bytes(self._rx[:size])
+        del self._rx[:size]
+        return out
+
+    def reset_input_buffer(self) -> None:
+        self._rx.clear()
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+# =========================================================
+# PTY SERVER
+# =========================================================
+class PM125Emulator:
+    """Serves PM125Model on a pty. `port` is the path to give PM125(...)."""
+
+    def __init__(self, model: Optional[PM125Model] = None, reply_delay_s: float = 0.0):
+        self.link = PM125Link(model)
+        self.model = self.link.model
+        self.reply_delay_s = reply_delay_s
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def frames_served(self) -> int:
+        return self.link.frames_served
+
+    def start(self) -> "PM125Emulator":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="pm125-emu", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            r, _, _ = select.select([self._master], [], [], 0.05)
+            if not r:
+                continue
+            try:
+                chunk = os.read(self._master, 256)
+            except OSError:
+                return
+            out = self.link.feed(chunk)
+            if out:
+                if self.reply_delay_s:
+                    time.sleep(self.reply_delay_s)
+                os.write(self._master, out)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="PM125 emulator on a pseudo-terminal")
+    ap.add_argument("--negotiate-ms", type=float, default=150.0)
+    ap.add_argument("--tau-v-ms", type=float, default=50.0)
+    ap.add_argument("--tau-i-ms", type=float, default=50.0)
+    ap.add_argument("--noise-mv", type=float, default=0.0)
+    ap.add_argument("--noise-ma", type=float, default=0.0)
+    ap.add_argument("--reply-ms", type=float, default=0.0, help="serial reply latency")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    model = PM125Model(
+        negotiate_s=args.negotiate_ms / 1000.0,
+        tau_v_s=args.tau_v_ms / 1000.0,
+        tau_i_s=args.tau_i_ms / 1000.0,
+        noise_mv=args.noise_mv,
+        noise_ma=args.noise_ma,
+        seed=args.seed,
+    )
+    emu = PM125Emulator(model, reply_delay_s=args.reply_ms / 1000.0).start()
+    print(f"[PM125EMU] Serving on {emu.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emu.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+# sim/rup_sim.py
+"""
+Simulated RUP firmware on a python-can bus (virtual, or vcan0 via socketcan).
+
+Speaks the same framing as tests/CAN/can_commands.py:
+    request : ID = slot TX id (SLOT_TO_CAN_ID), DATA = [0x07, cmd]
+    replies :
+      START_ATP            -> 0x063 [START_ACK]            (optional ack)
+      READ_ID_PINS_REQ     -> 0x063 [0x40 + idconfig]
+      POWER_REPORT_REQUEST -> 0x065 [0xA0 + W/2]
+    other commands (POWER_xxW, TERMINATION, IUL, GUIDELIGHT, END_ATP) only
+    change the simulated state, like the real firmware.
+
+Every RUP answers after latency + jitter (seeded RNG -> deterministic runs).
+Replies are scheduled, not slept, so one slow RUP never delays the others.
+
+Usage (same process, e.g. bench / CI):
+    sim = RupSimulator.default_fixture(interface="virtual", channel="atp_sim").start()
+    ...
+    sim.stop()
+
+Usage (virtual time, no thread; see hal/sim.py):
+    sim = RupSimulator(rups, bus=node_bus, clock=vclock.monotonic, call_at=vclock.call_at)
+    network delivers frames -> sim.on_frame(msg)
+
+Usage (standalone on vcan0):
+    python -m sim.rup_sim --interface socketcan --channel vcan0 --latency-ms 5 --jitter-ms 2
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import can
+
+ATP_COMMANDS = 0x07
+
+RUP_RESPONSE_ID = 0x063
+RUP_POWER_REPORT_ID = 0x065
+
+START_ATP = 0x02
+END_ATP = 0xC2
+GUIDELIGHT_ON = 0x61
+GUIDELIGHT_OFF = 0x60
+TERMINATION_ON = 0x81
+TERMINATION_OFF = 0x80
+READ_ID_PINS_REQ = 0x42
+POWER_REPORT_REQUEST = 0xA2
+IUL_ON = 0xE1
+IUL_OFF = 0xE0
+
+POWER_MODES = {0x21: 60.0, 0x22: 45.0, 0x23: 30.0, 0x24: 22.5, 0x25: 15.0}
+
+ID_READ_REPORT_BASE = 0x40
+POWER_REPORT_BASE = 0xA0
+
+# Does not decode as an ID-pins value (0x00..0x07 / 0x40..0x47)
+START_ACK = 0x82
+
+# Slot -> (TX arbitration id, idconfig the fixture straps). Mirrors
+# can_commands.SLOT_TO_CAN_ID and gate2_CAN_check.EXPECTED_PER_SLOT.
+DEFAULT_SLOTS = {
+    1: (0x001, 0x06),
+    2: (0x002, 0x05),
+    3: (0x000, 0x03),
+    4: (0x003, 0x04),
+}
+
+
+@dataclass
+class SimRUP:
+    """State of one simulated RUP (addressed by its TX arbitration id)."""
+    slot: int
+    tx_id: int
+    idconfig: int
+
+    latency_s: float = 0.002
+    jitter_s: float = 0.0
+    ack_start: bool = True
+    require_start: bool = True   # READ_ID / POWER_REPORT only answered in ATP mode
+    alive: bool = True           # False = dead unit, never answers
+
+    atp_mode: bool = False
+    power_mode_w: float = 60.0
+    termination: bool = False
+    iul: bool = False
+    guidelight: bool = False
+
+    # Load currently drawn from the USB-C port (set by the PM125 emulator / tests)
+    load_w: float = 0.0
+    # Optional override: lambda rup -> reported W
+    report_fn: Optional[Callable[["SimRUP"], float]] = None
+
+    rx_count: Dict[int, int] = field(default_factory=dict)
+
+    def reported_power_w(self) -> float:
+        if self.report_fn is not None:
+            return float(self.report_fn(self))
+        return min(self.load_w, self.power_mode_w)
+
+    def handle(self, cmd: int) -> Optional[Tuple[int, List[int]]]:
+        """Apply cmd to the state. Returns (reply_id, data) or None."""
+        self.rx_count[cmd] = self.rx_count.get(cmd, 0) + 1
+        if not self.alive:
+            return None
+
+        if cmd == START_ATP:
+            self.atp_mode = True
+            return (RUP_RESPONSE_ID, [START_ACK]) if self.ack_start else None
+        if cmd == END_ATP:
+            self.atp_mode = False
+            return None
+        if cmd in POWER_MODES:
+            self.power_mode_w = POWER_MODES[cmd]
+            return None
+        if cmd in (TERMINATION_ON, TERMINATION_OFF):
+            self.termination = (cmd == TERMINATION_ON)
+            return None
+        if cmd in (IUL_ON, IUL_OFF):
+            self.iul = (cmd == IUL_ON)
+            return None
+        if cmd in (GUIDELIGHT_ON, GUIDELIGHT_OFF):
+            self.guidelight = (cmd == GUIDELIGHT_ON)
+            return None
+
+        if self.require_start and not self.atp_mode:
+            return None
+
+        if cmd == READ_ID_PINS_REQ:
+            return RUP_RESPONSE_ID, [ID_READ_REPORT_BASE + (self.idconfig & 0x07)]
+        if cmd == POWER_REPORT_REQUEST:
+            w = max(0.0, self.reported_power_w())
+            return RUP_POWER_REPORT_ID, [min(0xFF, POWER_REPORT_BASE + int(round(w / 2.0)))]
+        return None
+
+
+class RupSimulator:
+    """
+    One thread, one bus, N simulated RUPs.
+    Replies are kept in a heap ordered by due time.
+    """
+
+    def __init__(self, rups: List[SimRUP], interface: str = "virtual", channel: str = "atp_sim",
+                 seed: int = 0, bus=None, clock: Callable[[], float] = time.time,
+                 call_at: Optional[Callable[[float, Callable[[], None]], object]] = None):
+        self.rups: Dict[int, SimRUP] = {r.tx_id: r for r in rups}
+        self.interface = interface
+        self.channel = channel
+        self._rng = random.Random(seed)
+
+        # Event mode (hal.clock.VirtualClock): no thread; the caller feeds
+        # on_frame() and replies are scheduled with call_at(due, fn) on `clock`.
+        self._clock = clock
+        self._call_at = call_at
+
+        self._bus = bus
+        self._own_bus = bus is None
+        self._pending: List[Tuple[float, int, int, List[int]]] = []  # (due, seq, id, data)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def default_fixture(cls, latency_s: float = 0.002, jitter_s: float = 0.0, **kw) -> "RupSimulator":
+        rups = [
+            SimRUP(slot=s, tx_id=tx, idconfig=idc, latency_s=latency_s, jitter_s=jitter_s)
+            for s, (tx, idc) in DEFAULT_SLOTS.items()
+        ]
+        return cls(rups, **kw)
+
+    def rup(self, slot: int) -> SimRUP:
+        for r in self.rups.values():
+            if r.slot == slot:
+                return r
+        raise ValueError(f"No simulated RUP for slot {slot}")
+
+    # -------------------------
+    # LIFECYCLE
+    # -------------------------
+    def start(self) -> "RupSimulator":
+        if self._bus is None:
+            self._bus = can.interface.Bus(channel=self.channel, interface=self.interface)
+        if self._call_at is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="rup-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        if self._own_bus and self._bus is not None:
+            try:
+                self._bus.shutdown()
+            except Exception:
+                pass
+            self._bus = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # -------------------------
+    # CORE
+    # -------------------------
+    def _delay(self, rup: SimRUP) -> float:
+        d = rup.latency_s
+        if rup.jitter_s:
+            d += self._rng.uniform(-rup.jitter_s, rup.jitter_s)
+        return max(0.0, d)
+
+    def on_frame(self, msg: can.Message, now: float = None) -> None:
+        """Handle one received frame (public so tests can inject frames)."""
+        rup = self.rups.get(msg.arbitration_id)
+        data = msg.data or b""
+        if rup is None or len(data) < 2 or data[0] != ATP_COMMANDS:
+            return
+
+        reply = rup.handle(data[1])
+        if reply is None:
+            return
+
+        now = self._clock() if now is None else now
+        due = now + self._delay(rup)
+        if self._call_at is not None:
+            arb_id, data = reply
+            self._call_at(due, lambda: self._send(arb_id, data))
+            return
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._pending, (due, self._seq, reply[0], reply[1]))
+
+    def _send(self, arb_id: int, data: List[int]) -> None:
+        try:
+            self._bus.send(can.Message(arbitration_id=arb_id, data=data, is_extended_id=False))
+        except can.CanError as e:
+            print(f"[RUPSIM][WARN] send failed: {e}")
+
+    def _flush_due(self) -> Optional[float]:
+        """Send every reply that is due. Returns seconds until the next one (or None)."""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return None
+                due, _, arb_id, data = self._pending[0]
+                wait = due - self._clock()
+                if wait > 0:
+                    return wait
+                heapq.heappop(self._pending)
+            self._send(arb_id, data)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            wait = self._flush_due()
+            timeout = 0.05 if wait is None else min(0.05, wait)
+            msg = self._bus.recv(timeout=timeout)
+            if msg is not None:
+                self.on_frame(msg)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Simulated RUP firmware (4 slots)")
+    ap.add_argument("--interface", default="socketcan")
+    ap.add_argument("--channel", default="vcan0")
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-start-ack", action="store_true")
+    args = ap.parse_args(argv)
+
+    sim = RupSimulator.default_fixture(
+        latency_s=args.latency_ms / 1000.0,
+        jitter_s=args.jitter_ms / 1000.0,
+        interface=args.interface,
+        channel=args.channel,
+        seed=args.seed,
+    )
+    for r in sim.rups.values():
+        r.ack_start = not args.no_start_ack
+
+    print(f"[RUPSIM] {len(sim.rups)} RUPs on {args.interface}:{args.channel} "
+          f"latency={args.latency_ms}ms jitter={args.jitter_ms}ms (Ctrl+C to stop)")
+    sim.start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
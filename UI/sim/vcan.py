@@ -0,0 +1,139 @@
+# sim/vcan.py
+"""
+In-process CAN network driven by a virtual clock (hal.clock.VirtualClock).
+
+python-can's "virtual" interface is thread based: recv() blocks in real time
+and send_periodic() runs a sleeping thread. Under a virtual clock nothing may
+block for real, so this network:
+
+- delivers a sent frame synchronously to every other bus (software filters,
+  is_rx=True, timestamp = clock.time()) and to plain listener callbacks
+  (e.g. RupSimulator.on_frame)
+- recv(timeout) advances the virtual clock event by event until a frame is
+  queued or the timeout is spent
+- send_periodic() sends the first frame at once and schedules the repeats on
+  the clock (BCM equivalent)
+"""
+
+from collections import deque
+from typing import Callable, List, Optional
+
+import can
+
+
+class VirtualCanNetwork:
+    def __init__(self, clock):
+        self.clock = clock
+        self._buses: List["VirtualTimeBus"] = []
+        self._listeners: List[Callable[[can.Message], None]] = []
+        self.frames = 0
+
+    def bus(self, can_filters=None) -> "VirtualTimeBus":
+        return VirtualTimeBus(self, can_filters=can_filters)
+
+    def add_listener(self, fn: Callable[[can.Message], None]) -> None:
+        self._listeners.append(fn)
+
+    def _attach(self, bus: "VirtualTimeBus") -> None:
+        self._buses.append(bus)
+
+    def _detach(self, bus: "VirtualTimeBus") -> None:
+        if bus in self._buses:
+            self._buses.remove(bus)
+
+    def transmit(self, sender: Optional["VirtualTimeBus"], msg: can.Message) -> None:
+        self.frames += 1
+        ts = self.clock.time()
+        for b in list(self._buses):
+            if b is not sender:
+                b._deliver(msg, ts)
+        for fn in list(self._listeners):
+            fn(msg)
+
+
+class _PeriodicTask:
+    """Minimal CyclicSendTask: send msg now, then every period on the virtual clock (like BCM)."""
+
+    def __init__(self, bus: "VirtualTimeBus", msg: can.Message, period: float, duration: Optional[float]):
+        self._bus = bus
+        self.msg = msg
+        self.period = float(period)
+        clock = bus.network.clock
+        self._end = None if duration is None else clock.monotonic() + duration
+        bus.send(msg)
+        self._timer = clock.call_later(self.period, self._fire)
+
+    def _fire(self) -> None:
+        clock = self._bus.network.clock
+        if self._end is not None and clock.monotonic() > self._end:
+            self._timer = None
+            return
+        self._bus.send(self.msg)
+        self._timer = clock.call_later(self.period, self._fire)
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class VirtualTimeBus(can.BusABC):
+    def __init__(self, network: VirtualCanNetwork, can_filters=None, **kwargs):
+        self.network = network
+        self._queue = deque()
+        self.channel_info = "virtual-time"
+        # [] = empty kernel filter list (TX-only bus); python-can itself reads [] as accept-all
+        self._rx_off = can_filters is not None and not can_filters
+        super().__init__(channel="virtual-time", can_filters=can_filters, **kwargs)
+        network._attach(self)
+
+    def _match(self, msg: can.Message) -> bool:
+        filters = self._filters
+        if not filters:
+            return True
+        for f in filters:
+            mask = f.get("can_mask", 0x7FF)
+            if (msg.arbitration_id & mask) == (f["can_id"] & mask):
+                if "extended" in f and bool(f["extended"]) != bool(msg.is_extended_id):
+                    continue
+                return True
+        return False
+
+    def _deliver(self, msg: can.Message, ts: float) -> None:
+        if self._rx_off or not self._match(msg):
+            return
+        self._queue.append(can.Message(
+            timestamp=ts,
+            arbitration_id=msg.arbitration_id,
+            is_extended_id=msg.is_extended_id,
+            is_remote_frame=msg.is_remote_frame,
+            is_error_frame=msg.is_error_frame,
+            dlc=msg.dlc,
+            data=bytes(msg.data or b""),
+            is_rx=True,
+            channel=self.channel_info,
+        ))
+
+    # python-can API ------------------------------------------------
+    def send(self, msg: can.Message, timeout: Optional[float] = None) -> None:
+        self.network.transmit(self, msg)
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[can.Message]:
+        if not self._queue:
+            self.network.clock.wait_until(lambda: bool(self._queue), timeout)
+        return self._queue.popleft() if self._queue else None
+
+    def _recv_internal(self, timeout):
+        return (self._queue.popleft() if self._queue else None), False
+
+    def send_periodic(self, msgs, period: float, duration: Optional[float] = None, store_task: bool = True, **kwargs):
+        msg = msgs[0] if isinstance(msgs, (list, tuple)) else msgs
+        return _PeriodicTask(self, msg, period, duration)
+
+    def shutdown(self) -> None:
+        self.network._detach(self)
+        self._queue.clear()
+        try:
+            super().shutdown()
+        except Exception:
+            pass
@@ -0,0 +1,239 @@
+# tests/CAN/can_bench.py
+"""
+RUP command latency benchmark (request -> response), built on can_commands.
+
+For every slot and every command (START_ATP, READ_ID_PINS_REQ,
+POWER_REPORT_REQUEST) fire N requests through can_commands and measure the
+time between the request frame and the first RUP reply.
+
+Timing uses the frame timestamps seen by a separate, unfiltered listener
+socket. On SocketCAN these are kernel timestamps for both sides: the TX frame
+comes back through loopback (is_rx=False), the reply is a normal RX frame.
+
+Real fixture:
+    python -m tests.CAN.can_bench --n 100
+
+CI / no hardware (python-can virtual bus + sim.rup_sim responder):
+    python -m tests.CAN.can_bench --virtual --n 200 --latency-ms 5 --jitter-ms 2
+"""
+
+import argparse
+import math
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import can_bus
+
+ATP_COMMANDS = 0x07
+RESP_ID = can_bus.RUP_RESPONSE_ID
+POWER_RESP_ID = can_bus.RUP_POWER_REPORT_ID
+
+# command name -> (can_commands function name, cmd byte, response arbitration id)
+COMMANDS = {
+    "START_ATP": ("start_atp", 0x02, RESP_ID),
+    "READ_ID_PINS_REQ": ("read_id_pins_request", 0x42, RESP_ID),
+    "POWER_REPORT_REQUEST": ("power_report_request", 0xA2, POWER_RESP_ID),
+}
+
+TIMEOUT_S = 1.0
+GAP_S = 0.01
+VIRTUAL_CHANNEL = "atp_bench"
+
+
+# =========================================================
+# MEASUREMENT
+# =========================================================
+def _drain(bus) -> None:
+    while bus.recv(timeout=0.0) is not None:
+        pass
+
+
+def _measure_one(listener, send_fn, tx_id: int, cmd: int, resp_id: int) -> Optional[float]:
+    """Returns latency in seconds (reply.timestamp - request.timestamp) or None on timeout."""
+    _drain(listener)
+    t_local = time.time()
+    send_fn()
+
+    tx_ts = None
+    deadline = time.time() + TIMEOUT_S
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        msg = listener.recv(timeout=remaining)
+        if msg is None:
+            return None
+
+        data = msg.data or b""
+        if tx_ts is None and msg.arbitration_id == tx_id and len(data) >= 2 \
+                and data[0] == ATP_COMMANDS and data[1] == cmd:
+            tx_ts = msg.timestamp
+            continue
+
+        if msg.arbitration_id == resp_id:
+            # Request frame not seen (no loopback): fall back to local send time
+            return msg.timestamp - (tx_ts if tx_ts is not None else t_local)
+
+
+def run_bench(n: int, slots: List[int], commands: List[str], log=print) -> Dict[Tuple[str, int], dict]:
+    # Imported late: can_bus.configure_can() must run before the first bus opens
+    from . import can_commands
+
+    listener = can_bus.get_can_bus(rx_ids=None)
+    out: Dict[Tuple[str, int], dict] = {}
+
+    # Firmware answers READ_ID / POWER_REPORT only in ATP mode
+    for slot in slots:
+        can_commands.set_target_slot(slot)
+        can_commands.start_atp()
+    time.sleep(0.1)
+
+    try:
+        for name in commands:
+            fn_name, cmd, resp_id = COMMANDS[name]
+            send_fn = getattr(can_commands, fn_name)
+
+            for slot in slots:
+                can_commands.set_target_slot(slot)
+                tx_id = can_commands.SLOT_TO_CAN_ID[slot]
+
+                lat: List[float] = []
+                timeouts = 0
+                for _ in range(n):
+                    dt = _measure_one(listener, send_fn, tx_id, cmd, resp_id)
+                    if dt is None:
+                        timeouts += 1
+                    else:
+                        lat.append(dt)
+                    time.sleep(GAP_S)
+
+                out[(name, slot)] = summarize(lat, timeouts)
+                log(format_row(name, slot, out[(name, slot)]))
+    finally:
+        listener.shutdown()
+
+    return out
+
+
+# =========================================================
+# STATS / REPORT
+# =========================================================
+def percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def summarize(latencies_s: List[float], timeouts: int = 0) -> dict:
+    ms = sorted(x * 1000.0 for x in latencies_s)
+    return {
+        "n": len(ms),
+        "timeouts": timeouts,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": ms[-1] if ms else None,
+        "samples_ms": ms,
+    }
+
+
+def _fmt(x) -> str:
+    return "   ---" if x is None else f"{x:6.2f}"
+
+
+def format_row(name: str, slot: int, st: dict) -> str:
+    return (
+        f"[BENCH] {name:<21} slot={slot} n={st['n']:<4} timeouts={st['timeouts']:<3} "
+        f"p50={_fmt(st['p50_ms'])} p95={_fmt(st['p95_ms'])} "
+        f"p99={_fmt(st['p99_ms'])} max={_fmt(st['max_ms'])} ms"
+    )
+
+
+def histogram(samples_ms: List[float], width: int = 40) -> List[str]:
+    """Log2 buckets: <0.5, 0.5-1, 1-2, 2-4 ... ms."""
+    if not samples_ms:
+        return ["    (no samples)"]
+
+    edges = [0.5 * (2 ** i) for i in range(14)]  # 0.5 ms .. ~4 s
+    counts = [0] * (len(edges) + 1)
+    for v in samples_ms:
+        i = 0
+        while i < len(edges) and v >= edges[i]:
+            i += 1
+        counts[i] += 1
+
+    peak = max(counts)
+    lines = []
+    lo = 0.0
+    for i, c in enumerate(counts):
+        hi = edges[i] if i < len(edges) else float("inf")
+        if c:
+            bar = "#" * max(1, int(c * width / peak))
+            lines.append(f"    {lo:8.1f} - {hi:8.1f} ms | {bar} {c}")
+        lo = hi
+    return lines
+
+
+def print_report(results: Dict[Tuple[str, int], dict]) -> None:
+    print("\n================ RUP COMMAND LATENCY ================")
+    for (name, slot), st in results.items():
+        print(format_row(name, slot, st))
+        for line in histogram(st["samples_ms"]):
+            print(line)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="RUP request->response latency benchmark")
+    ap.add_argument("--n", type=int, default=50, help="requests per command per slot")
+    ap.add_argument("--slots", default="1,2,3,4")
+    ap.add_argument("--commands", default=",".join(COMMANDS))
+    ap.add_argument("--virtual", action="store_true", help="python-can virtual bus + simulated RUPs")
+    ap.add_argument("--latency-ms", type=float, default=2.0, help="simulated RUP latency (--virtual)")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="simulated RUP jitter (--virtual)")
+    ap.add_argument("--seed", type=int, default=0, help="simulated RUP RNG seed (--virtual)")
+    ap.add_argument("--interface", default=None, help="override python-can interface (e.g. socketcan)")
+    ap.add_argument("--channel", default=None, help="override channel (e.g. vcan0)")
+    args = ap.parse_args(argv)
+
+    slots = [int(s) for s in args.slots.split(",") if s]
+    commands = [c for c in args.commands.split(",") if c]
+    for c in commands:
+        if c not in COMMANDS:
+            ap.error(f"unknown command {c} (choose from {', '.join(COMMANDS)})")
+
+    responder = None
+    if args.virtual:
+        from sim.rup_sim import RupSimulator
+
+        channel = args.channel or VIRTUAL_CHANNEL
+        can_bus.configure_can("virtual", channel)
+        responder = RupSimulator.default_fixture(
+            latency_s=args.latency_ms / 1000.0,
+            jitter_s=args.jitter_ms / 1000.0,
+            interface="virtual",
+            channel=channel,
+            seed=args.seed,
+        ).start()
+    else:
+        can_bus.configure_can(args.interface, args.channel)
+
+    try:
+        results = run_bench(args.n, slots, commands)
+    finally:
+        # shared buses opened through can_commands / can_utils (sockets, BCM tasks)
+        from . import can_commands, can_utils
+
+        can_commands.close_bus()
+        can_utils.close_bus()
+        if responder:
+            responder.stop()
+
+    print_report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,72 @@
-import can
+# tests/CAN/can_bus.py
+import os
 
-def get_can_bus():
+from hal import get_backend
+
+# Interface / channel can be switched for bench + CI runs, e.g.
+#   ATP_CAN_INTERFACE=virtual ATP_CAN_CHANNEL=atp_sim
+# (must happen before tests.CAN.can_commands / can_utils are imported)
+CAN_INTERFACE = os.environ.get("ATP_CAN_INTERFACE", "socketcan")
+CAN_CHANNEL = os.environ.get("ATP_CAN_CHANNEL", "can0")
+
+# ==============================
+# RX IDs the fixture cares about
+# ==============================
+RUP_RESPONSE_ID = 0x063      # START_ATP ack / ID-pins report (send_can(..., 99))
+RUP_POWER_REPORT_ID = 0x065  # POWER_REPORT (Gate6)
+
+DEFAULT_RX_IDS = (RUP_RESPONSE_ID, RUP_POWER_REPORT_ID)
+
+# Extra IDs to let through on every filtered bus (debug / new firmware frames).
+# Can also be given as env: ATP_CAN_EXTRA_RX_IDS="0x070,0x071"
+EXTRA_RX_IDS = [
+    int(x, 0) for x in os.environ.get("ATP_CAN_EXTRA_RX_IDS", "").replace(" ", "").split(",") if x
+]
+
+
+def make_can_filters(rx_ids):
     """
-    Returns a SocketCAN bus instance.
-    UI and tests all use the SAME bus.
+    Exact-match 11-bit kernel filters for the given arbitration IDs.
+    rx_ids=None -> None (no filtering, every frame reaches Python).
     """
-    return can.interface.Bus(
-        channel="can0",
-        bustype="socketcan"
-    )
+    if rx_ids is None:
+        return None
+    ids = sorted({int(i) & 0x7FF for i in list(rx_ids) + list(EXTRA_RX_IDS)})
+    return [{"can_id": i, "can_mask": 0x7FF, "extended": False} for i in ids]
+
+
+def get_can_bus(rx_ids=DEFAULT_RX_IDS):
+    """
+    Returns a SocketCAN bus instance (CAN_INTERFACE / CAN_CHANNEL).
+    UI and tests all use the SAME bus (can0).
+
+    rx_ids: arbitration IDs this consumer wants to receive. They are installed
+    as SocketCAN kernel filters, so RUP chatter on other IDs never gets copied
+    into Python. Pass None to receive everything.
+
+    The bus comes from the HAL backend (ATP_HAL=sim -> in-process virtual bus).
+    """
+    return get_backend().open_can(CAN_CHANNEL, CAN_INTERFACE, can_filters=make_can_filters(rx_ids))
+
+
+def get_can_tx_bus():
+    """
+    TX-only bus: an empty kernel filter list (can_filters=[]), so no received
+    frame is ever queued on it. make_can_filters(()) cannot express this: it
+    always adds EXTRA_RX_IDS.
+    """
+    return get_backend().open_can(CAN_CHANNEL, CAN_INTERFACE, can_filters=[])
+
+
+def configure_can(interface: str = None, channel: str = None) -> None:
+    """Override interface/channel for every bus opened AFTER this call."""
+    global CAN_INTERFACE, CAN_CHANNEL
+    if interface:
+        CAN_INTERFACE = interface
+    if channel:
+        CAN_CHANNEL = channel
+
 
+def set_rx_ids(bus, rx_ids) -> None:
+    """Change the kernel filter set of an open bus at runtime (None = accept all)."""
+    bus.set_filters(make_can_filters(rx_ids))
@@ -1,8 +1,30 @@
 # tests/CAN/can_commands.py
+from contextlib import contextmanager
+
 import can
-from .can_bus import get_can_bus
+from .can_bus import get_can_tx_bus
+
+bus = None  # opened on first send (see get_bus)
+
+
+def get_bus():
+    """Shared TX bus, opened lazily so importing this module needs no CAN."""
+    global bus
+    if bus is None:
+        bus = get_can_tx_bus()   # RX goes through can_utils' filtered bus
+    return bus
+
+
+def close_bus() -> None:
+    """Shut the shared bus down (reopened on next use)."""
+    global bus
+    b, bus = bus, None
+    if b is not None:
+        try:
+            b.shutdown()
+        except Exception:
+            pass
 
-bus = get_can_bus()
 
 # ==============================
 # NEW FW: ATP COMMAND FRAMING
@@ -69,7 +91,7 @@ def _send(cmd_byte: int, description: str):
     )
 
     try:
-        bus.send(msg)
+        get_bus().send(msg)
         print(
             f"📤 CAN TX | {description} | "
             f"ID=0x{_CURRENT_TX_ID:03X} | "
@@ -78,6 +100,63 @@ def _send(cmd_byte: int, description: str):
     except can.CanError as e:
         print(f"❌ CAN TX FAILED | {description} | {e}")
 
+# ==============================
+# PERIODIC SEND (SocketCAN BCM)
+# ==============================
+def start_periodic(cmd_byte: int, description: str, period_s: float, duration_s: float = None):
+    """
+    Let the kernel broadcast manager (BCM) repeat [0x07, cmd] to the CURRENT
+    target every period_s seconds (until stop_periodic / duration_s).
+    Caller only consumes replies; no Python loop around bus.send.
+    Returns the python-can CyclicSendTask (or None if it could not start).
+    """
+    payload = [ATP_COMMANDS, cmd_byte]
+
+    msg = can.Message(
+        arbitration_id=_CURRENT_TX_ID,
+        data=payload,
+        is_extended_id=False
+    )
+
+    try:
+        task = get_bus().send_periodic(msg, period_s, duration=duration_s)
+        print(
+            f"🔁 CAN TX PERIODIC | {description} | "
+            f"ID=0x{_CURRENT_TX_ID:03X} | every {period_s * 1000:.0f} ms"
+        )
+        return task
+    except (can.CanError, NotImplementedError, OSError) as e:
+        print(f"❌ CAN TX PERIODIC FAILED | {description} | {e}")
+        return None
+
+
+def stop_periodic(task) -> None:
+    if task is None:
+        return
+    try:
+        task.stop()
+    except Exception:
+        pass
+
+
+@contextmanager
+def periodic(cmd_byte: int, description: str, period_s: float):
+    """
+    with periodic(READ_ID_PINS_REQ, "READ_ID_PINS_REQUEST", 0.25):
+        val = wait_for_idpins(...)
+
+    The periodic task sends the first frame immediately (SocketCAN BCM
+    STARTTIMER = TX_ANNOUNCE, python-can thread tasks too), then repeats it.
+    If the task cannot be created, a single _send() is all you get.
+    """
+    task = start_periodic(cmd_byte, description, period_s)
+    if task is None:
+        _send(cmd_byte, description)
+    try:
+        yield task
+    finally:
+        stop_periodic(task)
+
 # ==============================
 # Commands
 # ==============================
@@ -101,3 +180,10 @@ def power_report_request(): _send(POWER_REPORT_REQUEST, "POWER_REPORT_REQUEST")
 
 def iul_on(): _send(IUL_ON, "IUL_ON")
 def iul_off(): _send(IUL_OFF, "IUL_OFF")
+
+# Periodic polling (kernel BCM)
+def read_id_pins_periodic(period_s: float = 0.25):
+    return periodic(READ_ID_PINS_REQ, "READ_ID_PINS_REQUEST", period_s)
+
+def power_report_periodic(period_s: float = 0.2):
+    return periodic(POWER_REPORT_REQUEST, "POWER_REPORT_REQUEST", period_s)
@@ -0,0 +1,285 @@
+# tests/CAN/can_recorder.py
+"""
+Always-on CAN traffic recorder (TX + RX) for ATP sessions.
+
+- Own SocketCAN socket, NO kernel filter: sees every frame on can0, including
+  frames sent by can_commands (SocketCAN loops local TX back to other sockets)
+- Kernel timestamps (msg.timestamp), direction from msg.is_rx
+- Frames are packed into a PREALLOCATED ring buffer (fixed 24-byte records,
+  struct.pack_into, no per-frame objects kept)
+- A spill thread writes finished ring slices to disk straight from a memoryview
+- Capture files (.atpcan) export to BLF / ASC / CSV via python-can writers
+
+Capture file layout:
+    HEADER  = b"ATPCAN1\\0" + u16 record_size
+    RECORD  = <d ts> <u32 arb_id> <u8 flags> <u8 dlc> <8s data> <2x pad>
+
+CLI:
+    python -m tests.CAN.can_recorder export ATP_logs/x.atpcan out.blf
+"""
+
+import os
+import sys
+import struct
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import can
+
+from .can_bus import get_can_bus
+
+MAGIC = b"ATPCAN1\0"
+RECORD = struct.Struct("<dIBB8s2x")   # 24 bytes
+HEADER = struct.Struct("<8sH")
+
+FLAG_EXTENDED = 0x01
+FLAG_TX = 0x02
+FLAG_ERROR = 0x04
+FLAG_REMOTE = 0x08
+
+RING_RECORDS = 16384      # ~390 KB, several minutes of fixture traffic
+SPILL_INTERVAL_S = 0.5
+RECV_TIMEOUT_S = 0.2
+
+
+class CanRecorder:
+    """
+    recorder = CanRecorder("ATP_logs", log_cb=print)
+    recorder.start()
+    path = recorder.new_capture("ATP_A_B_C_D_2026-01-01_10-00-00")
+    ...
+    recorder.stop()
+    """
+
+    def __init__(self, capture_dir: str, log_cb: Optional[Callable[[str], None]] = None,
+                 ring_records: int = RING_RECORDS, bus=None):
+        self.capture_dir = capture_dir
+        self.log = log_cb or print
+        os.makedirs(self.capture_dir, exist_ok=True)
+
+        self._n = int(ring_records)
+        self._ring = bytearray(self._n * RECORD.size)
+        self._view = memoryview(self._ring)
+
+        # Monotonic record counters (single producer / single consumer)
+        self._written = 0
+        self._spilled = 0
+        self.dropped = 0
+
+        self._bus = bus
+        self._own_bus = bus is None
+        self._file = None
+        self._file_lock = threading.Lock()
+        self.capture_path: Optional[str] = None
+
+        self._stop = threading.Event()
+        self._rx_thread: Optional[threading.Thread] = None
+        self._spill_thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # LIFECYCLE
+    # -------------------------
+    def start(self) -> None:
+        if self._rx_thread is not None:
+            return
+        if self._bus is None:
+            self._bus = get_can_bus(rx_ids=None)
+
+        self._stop.clear()
+        self._rx_thread = threading.Thread(target=self._rx_loop, name="can-recorder-rx", daemon=True)
+        self._spill_thread = threading.Thread(target=self._spill_loop, name="can-recorder-spill", daemon=True)
+        self._rx_thread.start()
+        self._spill_thread.start()
+        self.log("[CANREC] Recorder started (all IDs, kernel timestamps)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in (self._rx_thread, self._spill_thread):
+            if t is not None:
+                t.join(timeout=2.0)
+        self._rx_thread = None
+        self._spill_thread = None
+
+        self._spill()
+        self._close_file()
+
+        if self._own_bus and self._bus is not None:
+            try:
+                self._bus.shutdown()
+            except Exception:
+                pass
+            self._bus = None
+
+        if self.dropped:
+            self.log(f"[CANREC][WARN] {self.dropped} frames dropped (ring overrun)")
+        self.log("[CANREC] Recorder stopped")
+
+    def new_capture(self, name: str) -> str:
+        """Flush the current capture and start spilling into <capture_dir>/<name>.atpcan."""
+        self._spill()
+        path = os.path.join(self.capture_dir, f"{name}.atpcan")
+        f = open(path, "wb")
+        f.write(HEADER.pack(MAGIC, RECORD.size))
+
+        with self._file_lock:
+            old = self._file
+            self._file = f
+            self.capture_path = path
+        if old:
+            try:
+                old.close()
+            except Exception:
+                pass
+
+        self.log(f"[CANREC] Capture file: {path}")
+        return path
+
+    # -------------------------
+    # THREADS
+    # -------------------------
+    def _rx_loop(self) -> None:
+        bus = self._bus
+        while not self._stop.is_set():
+            try:
+                msg = bus.recv(timeout=RECV_TIMEOUT_S)
+            except Exception as e:
+                print(f"[CANREC][ERROR] recv: {e}")  # RX thread: never touch the UI
+                time.sleep(RECV_TIMEOUT_S)
+                continue
+            if msg is None:
+                continue
+            self.push(msg)
+
+    def _spill_loop(self) -> None:
+        while not self._stop.wait(SPILL_INTERVAL_S):
+            self._spill()
+
+    # -------------------------
+    # RING BUFFER
+    # -------------------------
+    def push(self, msg: can.Message) -> None:
+        """Pack one frame into the ring (called from the RX thread)."""
+        if self._written - self._spilled >= self._n:
+            self.dropped += 1
+            return
+
+        flags = 0
+        if msg.is_extended_id:
+            flags |= FLAG_EXTENDED
+        if not getattr(msg, "is_rx", True):
+            flags |= FLAG_TX
+        if msg.is_error_frame:
+            flags |= FLAG_ERROR
+        if msg.is_remote_frame:
+            flags |= FLAG_REMOTE
+
+        data = bytes(msg.data or b"")[:8]
+        idx = self._written % self._n
+        RECORD.pack_into(self._ring, idx * RECORD.size,
+                         float(msg.timestamp or time.time()), msg.arbitration_id,
+                         flags, len(data), data)
+        self._written += 1
+
+    def _spill(self) -> None:
+        """Write every finished record [spilled, written) to the capture file."""
+        with self._file_lock:
+            end = self._written
+            start = self._spilled
+            if end == start:
+                return
+            if self._file is None:
+                # No session file yet: keep the ring as a rolling window
+                if end - start > self._n // 2:
+                    self._spilled = end - self._n // 2
+                return
+
+            sz = RECORD.size
+            a = start % self._n
+            b = end % self._n
+            if a < b:
+                self._file.write(self._view[a * sz:b * sz])
+            else:
+                self._file.write(self._view[a * sz:])
+                self._file.write(self._view[:b * sz])
+            self._file.flush()
+            self._spilled = end
+
+    def _close_file(self) -> None:
+        with self._file_lock:
+            if self._file:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "captured": self._written,
+            "spilled": self._spilled,
+            "dropped": self.dropped,
+            "capture_path": self.capture_path,
+        }
+
+
+# =========================================================
+# READ / EXPORT
+# =========================================================
+def read_capture(path: str) -> Iterator[can.Message]:
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+        magic, rec_size = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise ValueError(f"Not an ATP CAN capture: {path}")
+        if rec_size != RECORD.size:
+            raise ValueError(f"Unsupported record size {rec_size} in {path}")
+
+        while True:
+            chunk = f.read(rec_size * 1024)
+            if not chunk:
+                break
+            for ts, arb_id, flags, dlc, data in RECORD.iter_unpack(chunk[: len(chunk) - len(chunk) % rec_size]):
+                yield can.Message(
+                    timestamp=ts,
+                    arbitration_id=arb_id,
+                    is_extended_id=bool(flags & FLAG_EXTENDED),
+                    is_rx=not (flags & FLAG_TX),
+                    is_error_frame=bool(flags & FLAG_ERROR),
+                    is_remote_frame=bool(flags & FLAG_REMOTE),
+                    dlc=dlc,
+                    data=data[:dlc],
+                    channel="can0",
+                )
+
+
+def export_capture(capture_path: str, out_path: str) -> int:
+    """
+    Export a .atpcan capture with python-can writers.
+    Format follows the out_path suffix (.blf, .asc, .csv, .log ...).
+    Returns number of frames written.
+    """
+    n = 0
+    writer = can.Logger(out_path)
+    try:
+        for msg in read_capture(capture_path):
+            writer.on_message_received(msg)
+            n += 1
+    finally:
+        writer.stop()
+    return n
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if len(argv) != 3 or argv[0] != "export":
+        print("usage: python -m tests.CAN.can_recorder export <capture.atpcan> <out.blf|out.asc>")
+        return 2
+
+    n = export_capture(argv[1], argv[2])
+    print(f"[CANREC] Exported {n} frames -> {argv[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,29 @@
 # tests/CAN/can_utils.py
-import time
-from .can_bus import get_can_bus
-
-bus = get_can_bus()
+from hal import clock
+from .can_bus import get_can_bus, set_rx_ids, RUP_RESPONSE_ID
 
 # Firmware replies with: send_can(..., 99) → 99 dec = 0x63
-RUP_RESPONSE_ID = 0x63
+# Kernel filter: only RUP responses reach this socket
+bus = None  # opened on first use (see get_bus)
+
+
+def get_bus():
+    global bus
+    if bus is None:
+        bus = get_can_bus(rx_ids=(RUP_RESPONSE_ID,))
+    return bus
+
+
+def close_bus() -> None:
+    """Shut the shared bus down (reopened on next use)."""
+    global bus
+    b, bus = bus, None
+    if b is not None:
+        try:
+            b.shutdown()
+        except Exception:
+            pass
+
 
 ID_READ_REPORT_BASE = 0x40  # 0x40..0x47 encodes idconfig 0..7
 
@@ -22,13 +40,43 @@ IDPINS_MAP = {
 }
 
 
+def set_rx_filter(rx_ids=(RUP_RESPONSE_ID,)) -> None:
+    """Adjust which IDs reach wait_for_* at runtime (None = everything)."""
+    set_rx_ids(get_bus(), rx_ids)
+
+
 def flush_rx(max_drain: int = 200):
     """Clear pending CAN frames."""
+    bus = get_bus()
     for _ in range(max_drain):
         if bus.recv(timeout=0.0) is None:
             break
 
 
+def wait_for_response(timeout_s: float, arbitration_id: int = RUP_RESPONSE_ID):
+    """
+    Wait for the next frame from the RUP (any payload).
+    Returns the can.Message or None on timeout.
+
+    Used as a handshake ack: returns the moment a frame arrives instead of
+    sleeping a fixed delay.
+    """
+    bus = get_bus()
+    deadline = clock.time() + timeout_s
+    while True:
+        remaining = deadline - clock.time()
+        if remaining <= 0:
+            return None
+        msg = bus.recv(timeout=min(0.1, remaining))
+        if msg is None:
+            continue
+        if msg.arbitration_id != arbitration_id:
+            continue
+        data = msg.data or []
+        print(f"📥 RX | ID=0x{msg.arbitration_id:03X} | DATA={[f'0x{b:02X}' for b in data]}")
+        return msg
+
+
 def normalize_idpins(byte_val: int):
     """
     Accept:
@@ -85,11 +133,15 @@ def wait_for_idpins(timeout_s: float, expected: int = None, accept_float: bool =
     - accidentally accepting a wrong value from a weird/early frame
     - accepting a padding-derived "fake" value
     """
-    deadline = time.time() + timeout_s
+    bus = get_bus()
+    deadline = clock.time() + timeout_s
     best_raw_candidate = None
 
-    while time.time() < deadline:
-        msg = bus.recv(timeout=0.1)
+    while True:
+        remaining = deadline - clock.time()
+        if remaining <= 0:
+            break
+        msg = bus.recv(timeout=min(0.1, remaining))
         if msg is None:
             continue
 
@@ -1,8 +1,8 @@
 # tests/ID/id_pins_init.py
-import time
-import spidev
 from typing import Dict
 
+from hal import clock, get_backend
+
 # =========================================================
 # MCP23S17 REGISTERS (BANK=0)
 # =========================================================
@@ -28,8 +28,7 @@ SPI_DEV = 0
 # ✅ Match your working script (safer/slower)
 SPI_SPEED_HZ = 500_000
 
-spi = spidev.SpiDev()
-_initialized = False
+spi = None  # HAL SpiDevice, opened on first use
 
 
 # =========================================================
@@ -48,11 +47,9 @@ SLOTS = {
 # LOW-LEVEL SPI HELPERS
 # =========================================================
 def _ensure_spi_open() -> None:
-    global _initialized
-    if not _initialized:
-        spi.open(SPI_BUS, SPI_DEV)
-        spi.max_speed_hz = SPI_SPEED_HZ
-        _initialized = True
+    global spi
+    if spi is None:
+        spi = get_backend().spi_open(SPI_BUS, SPI_DEV, SPI_SPEED_HZ)
 
 
 def write_reg(reg: int, val: int) -> None:
@@ -105,7 +102,7 @@ def float_all_ids(settle_s: float = 0.02) -> bool:
 
         write_reg(OLATA, (a | ID_MASK_A) & 0xFF)
         write_reg(OLATB, (b | ID_MASK_B) & 0xFF)
-        time.sleep(settle_s)
+        clock.sleep(settle_s)
         return True
     except Exception as e:
         print(f"[ID_FLOAT][ERROR] {e}")
@@ -171,7 +168,7 @@ def set_slot_bits(slot: int, mask3: int, settle_s: float = 0.02, verify: bool =
         new_val &= 0xFF
 
         write_reg(_olat_reg(port), new_val)
-        time.sleep(settle_s)
+        clock.sleep(settle_s)
 
         if verify:
             rb_olat = read_reg(_olat_reg(port)) & slot_bits
@@ -1,4 +1,4 @@
-import time
+from hal import clock
 
 from tests.power_PT.power_1_4 import (
     read_power_state_rup1,
@@ -19,7 +19,7 @@ def run_gate1_power_test(slot: int = 1) -> bool:
     print(f"[GATE1] Starting power detect test for RUP{slot}")
 
     # Small settle time after relay ON (runner already waited too, but safe)
-    time.sleep(0.2)
+    clock.sleep(0.2)
 
     if slot == 1:
         power_ok = read_power_state_rup1()
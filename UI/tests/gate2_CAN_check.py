@@ -1,13 +1,35 @@
 # tests/gate2_CAN_check.py
-import time
-from tests.CAN.can_commands import start_atp, read_id_pins_request
-from tests.CAN.can_utils import flush_rx, wait_for_idpins, IDPINS_MAP
+"""
+GATE 2 — START_ATP / ID-pins handshake (response-driven)
 
-TIMEOUT_S = 2.0
-POST_START_DELAY_S = 1
-POST_READ_DELAY_S = 1
-RETRY_DELAY_S = 0.5
-MAX_ATTEMPTS = 3
+Per slot:
+- flush RX
+- START_ATP
+- wait for the firmware ack frame (any 0x063 frame) OR the start_holdoff_s cap,
+  whichever comes first
+- READ_ID_PINS_REQ, repeated every req_interval_s by SocketCAN BCM while we wait
+- return the moment the expected 0x40..0x47 report arrives
+
+No fixed POST_START / POST_READ sleeps: a healthy RUP passes in one round-trip,
+a dead one fails after timeout_s.
+
+Timing: FIXTURE.gate2 (services/fixture_profile.py).
+
+gate2_can_check_all() handshakes all four slots at once:
+- START_ATP goes to every slot back-to-back and they share ONE holdoff
+- ID reads stay one slot at a time, because every RUP answers on the same
+  response ID (0x063) and the payload alone cannot tell slots apart; RX is
+  flushed before each slot's read
+"""
+
+from typing import Dict, Iterable, Optional
+
+from hal import clock
+from services import history, settle, tracing
+from services.fixture_profile import FIXTURE
+
+from tests.CAN.can_commands import set_target_slot, start_atp, read_id_pins_periodic
+from tests.CAN.can_utils import flush_rx, wait_for_response, wait_for_idpins, IDPINS_MAP
 
 # What you care about now (your table)
 EXPECTED_PER_SLOT = {
@@ -18,50 +40,155 @@ EXPECTED_PER_SLOT = {
 }
 
 #new fw sends id10 if there is an issue with the wiring of id pins
-PASS_WEAK_FLOAT = 0x10  # optional: accept floating as warning-pass 
+PASS_WEAK_FLOAT = 0x10  # optional: accept floating as warning-pass
 
-def gate2_can_check(slot: int) -> bool:
+
+def _expected_for(slot: int) -> int:
     expected = EXPECTED_PER_SLOT.get(slot)
     if expected is None:
         raise ValueError(f"No expected ID config for slot {slot}")
+    return expected
+
+
+def _wait_start_ack(n_acks: int = 1) -> int:
+    """
+    Wait for up to n_acks START_ATP ack frames, capped by start_holdoff_s.
+    Returns how many acks were seen (0 = firmware did not ack, holdoff elapsed).
+    """
+    t0 = clock.time()
+    deadline = t0 + FIXTURE.gate2.start_holdoff_s
+    seen = 0
+    while seen < n_acks:
+        remaining = deadline - clock.time()
+        if remaining <= 0:
+            break
+        if wait_for_response(remaining) is None:
+            break
+        seen += 1
+    if seen == n_acks:
+        settle.observe("gate2.start_holdoff_s", clock.time() - t0)
+    return seen
+
+
+def _read_idpins(slot: int, expected: int):
+    """
+    READ_ID_PINS_REQ repeated every req_interval_s by the kernel (BCM) until
+    the expected value (or floating) arrives or timeout_s runs out.
+    RX is flushed first: a late 0x063 answer to the previous slot's repeated
+    request must not be credited to this slot.
+    """
+    set_target_slot(slot)
+    flush_rx()
+    cfg = FIXTURE.gate2
+    with read_id_pins_periodic(cfg.req_interval_s):
+        # ✅ only accept the expected value (or float if allowed)
+        return wait_for_idpins(cfg.timeout_s, expected=expected, accept_float=True)
+
+
+def _judge(val, expected: int) -> bool:
+    desc = IDPINS_MAP.get(val, "UNKNOWN")
+    print(f"🔎 ID-pins = 0x{val:02X} ({desc})")
+
+    if val == expected:
+        print("✅ GATE 2 PASS")
+        return True
+
+    if val == PASS_WEAK_FLOAT:
+        print("⚠️ GATE 2 PASS (WARNING): floating (0x07)")
+        return True
+
+    print("❌ GATE 2 FAIL: wrong ID-pins")
+    return False
+
+
+def gate2_can_check(slot: int) -> bool:
+    expected = _expected_for(slot)
+    cfg = FIXTURE.gate2
 
     print("\n========== GATE 2 ==========")
     print(f"[GATE2] Slot={slot} expected=0x{expected:02X} ({IDPINS_MAP.get(expected)})")
 
-    for attempt in range(1, MAX_ATTEMPTS + 1):
-        print(f"[GATE2] Attempt {attempt}/{MAX_ATTEMPTS}")
+    for attempt in range(1, cfg.max_attempts + 1):
+        print(f"[GATE2] Attempt {attempt}/{cfg.max_attempts}")
+        if attempt > 1:
+            history.retry()
 
         flush_rx()
 
+        set_target_slot(slot)
+        t0 = clock.time()
         start_atp()
-        time.sleep(POST_START_DELAY_S)
-
-        read_id_pins_request()
-        time.sleep(POST_READ_DELAY_S)
+        acked = _wait_start_ack()
+        print(f"[GATE2] START_ATP {'ack' if acked else 'holdoff'} after {clock.time() - t0:.3f}s")
 
-        # ✅ Improved: only accept the expected value (or float if allowed)
-        val = wait_for_idpins(TIMEOUT_S, expected=expected, accept_float=True)
+        val = _read_idpins(slot, expected)
 
         if val is None:
             print("[GATE2][WARN] No valid ID-pins response")
-            if attempt < MAX_ATTEMPTS:
-                time.sleep(RETRY_DELAY_S)
+            if attempt < cfg.max_attempts:
+                clock.sleep(cfg.retry_delay_s)
                 continue
             print("❌ GATE 2 FAIL: no ID-pins response")
             return False
 
-        desc = IDPINS_MAP.get(val, "UNKNOWN")
-        print(f"🔎 ID-pins = 0x{val:02X} ({desc})")
+        print(f"[GATE2] ID-pins answered {clock.time() - t0:.3f}s after START_ATP")
+        history.measure("idpins_after_start_s", clock.time() - t0, "s")
+        return _judge(val, expected)
 
-        if val == expected:
-            print("✅ GATE 2 PASS")
-            return True
+    return False
 
-        if val == PASS_WEAK_FLOAT:
-            print("⚠️ GATE 2 PASS (WARNING): floating (0x07)")
-            return True
 
-        print("❌ GATE 2 FAIL: wrong ID-pins")
-        return False
+def gate2_can_check_all(slots: Iterable[int] = (1, 2, 3, 4),
+                        results: Optional[Dict[int, bool]] = None) -> Dict[int, bool]:
+    """
+    Parallel handshake: START_ATP to all slots with a single shared holdoff,
+    then ID-pins read per slot (serialized, see module doc).
+    Returns {slot: bool}. `results`, if given, is filled as each slot gets
+    its verdict (the caller keeps them if the watchdog cancels the run).
+    """
+    slots = list(slots)
+    results = {} if results is None else results
+    expected = {s: _expected_for(s) for s in slots}
+    cfg = FIXTURE.gate2
+
+    print("\n========== GATE 2 (ALL SLOTS) ==========")
+    pending = list(slots)
+
+    for attempt in range(1, cfg.max_attempts + 1):
+        if not pending:
+            break
+        print(f"[GATE2] Attempt {attempt}/{cfg.max_attempts} slots={pending}")
+        if attempt > 1:
+            history.retry()
 
-    return False
+        flush_rx()
+
+        t0 = clock.time()
+        for s in pending:
+            set_target_slot(s)
+            start_atp()
+        with tracing.span("start_ack", n=len(pending)):
+            acked = _wait_start_ack(n_acks=len(pending))
+        print(f"[GATE2] START_ATP acks={acked}/{len(pending)} after {clock.time() - t0:.3f}s")
+
+        still_pending = []
+        for s in pending:
+            print(f"[GATE2] Slot={s} expected=0x{expected[s]:02X} ({IDPINS_MAP.get(expected[s])})")
+            with tracing.span("read_idpins", slot=s):
+                val = _read_idpins(s, expected[s])
+            if val is None:
+                print(f"[GATE2][WARN] Slot={s}: no valid ID-pins response")
+                still_pending.append(s)
+                continue
+            history.measure("idpins_after_start_s", clock.time() - t0, "s", slot=s)
+            results[s] = _judge(val, expected[s])
+
+        pending = still_pending
+        if pending and attempt < cfg.max_attempts:
+            clock.sleep(cfg.retry_delay_s)
+
+    for s in pending:
+        print(f"❌ GATE 2 FAIL: Slot={s} no ID-pins response")
+        results[s] = False
+
+    return results
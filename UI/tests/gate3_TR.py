@@ -4,11 +4,11 @@
 GATE3 — TR test in ONE global sequence (ordered, timing-stable)
 
 What changed vs your version (timing fixes):
-- Adds TRANSIENT_DISCARD_S: we sample a window but IGNORE the first part (switching transient)
-- Separates timing into:
-    CMD_QUIET_S   : small pause right after CAN command (firmware/apply jitter)
-    SETTLE_S      : stabilize time BEFORE sampling
-    WINDOW_S      : total sampling window
+- Adds transient_discard_s: we sample a window but IGNORE the first part (switching transient)
+- Separates timing into (FIXTURE.gate3, services/fixture_profile.py):
+    cmd_quiet_s   : small pause right after CAN command (firmware/apply jitter)
+    settle_s      : stabilize time BEFORE sampling
+    window_s      : total sampling window
 - Uses a single "measure_state" helper that always does: set TR -> quiet -> settle -> sample -> discard -> metric
 - Keeps keeper logic:
     - Slots 1..3 tested with Slot4 as keeper ON
@@ -18,11 +18,11 @@ Returns dict {1: bool, 2: bool, 3: bool, 4: bool}
 Does NOT abort if one slot fails.
 """
 
-import time
 import statistics
-import spidev
-import lgpio
 
+from hal import clock, get_backend
+from services import history, settle, tracing
+from services.fixture_profile import FIXTURE
 from tests.CAN.can_commands import set_target_slot, termination_on, termination_off
 
 # ==============================
@@ -33,28 +33,16 @@ SPI_DEV = 0
 SPI_SPEED = 1_000_000
 
 CS_GPIO = 5
-GPIO_CHIP = 0
 
 VREF = 5.0
 ADC_MAX = 1023
 ADC_CH = 0
 
 # ==============================
-# TIMING (tuned for stability)
+# TIMING / LIMITS: FIXTURE.gate3
 # ==============================
-CMD_QUIET_S = 0.20          # let RUP apply TR command / reduce immediate transient
-SETTLE_S = 1.20             # settle BEFORE sampling (shorter than your 2.5s)
-WINDOW_S = 3.00             # total sampling window
-FS_HZ = 500
-
-TRANSIENT_DISCARD_S = 0.50  # ignore first 0.5s of WINDOW (switching transient)
-
-# Metric: mean of samples above threshold (same as you, but on stable samples)
-PEAK_THRESH_V = 3.0
-
-# expected ranges (adjust if needed)
-LOW_EXPECT  = (2.45, 3.75)   # ~3.6V
-HIGH_EXPECT = (3.75, 4.05)   # ~3.8-3.9V
+# Metric: mean of samples above peak_thresh_v, on the stable part of the window
+# low_expect ~3.6V (TR ON), high_expect ~3.8-3.9V (TR OFF)
 
 KEEPER_SLOT = 4
 KEEPER2_SLOT = 2
@@ -65,12 +53,13 @@ def log_default(msg: str):
 
 
 def _read_mcp3008(spi, h, channel: int) -> float:
+    # h = HAL Gpio (manual CS)
     channel &= 0x07
     tx = [1, (8 + channel) << 4, 0]
 
-    lgpio.gpio_write(h, CS_GPIO, 0)
+    h.write(CS_GPIO, 0)
     rx = spi.xfer2(tx)
-    lgpio.gpio_write(h, CS_GPIO, 1)
+    h.write(CS_GPIO, 1)
 
     raw = ((rx[1] & 0x03) << 8) | rx[2]
     return raw * VREF / ADC_MAX
@@ -80,13 +69,13 @@ def _sample_window(spi, h, channel: int, window_s: float, fs_hz: int):
     n = max(1, int(window_s * fs_hz))
     period = 1.0 / fs_hz
     out = []
-    t_next = time.perf_counter()
+    t_next = clock.monotonic()
     for _ in range(n):
         out.append(_read_mcp3008(spi, h, channel))
         t_next += period
-        dt = t_next - time.perf_counter()
+        dt = t_next - clock.monotonic()
         if dt > 0:
-            time.sleep(dt)
+            clock.sleep(dt)
     return out
 
 
@@ -107,13 +96,13 @@ def _in_range(x, lo, hi):
 def _tr_on(slot: int):
     set_target_slot(slot)
     termination_on()
-    time.sleep(CMD_QUIET_S)
+    clock.sleep(FIXTURE.gate3.cmd_quiet_s)
 
 
 def _tr_off(slot: int):
     set_target_slot(slot)
     termination_off()
-    time.sleep(CMD_QUIET_S)
+    clock.sleep(FIXTURE.gate3.cmd_quiet_s)
 
 
 def _normalize_keeper_only(log):
@@ -125,16 +114,27 @@ def _normalize_keeper_only(log):
     _tr_off(3)
 
 
-def _measure_stable(spi, h, name: str, log):
-    samples = _sample_window(spi, h, ADC_CH, WINDOW_S, FS_HZ)
+def _measure_stable(spi, h, name: str, log, slot: int = None):
+    cfg = FIXTURE.gate3
+    with tracing.span("sample", label=name):
+        samples = _sample_window(spi, h, ADC_CH, cfg.window_s, cfg.fs_hz)
+
+    # Settle observation: sampling starts cmd_quiet_s + settle_s after the TR
+    # command and the metric ignores transient_discard_s, so the settle_s this
+    # window needed is (stable point) - cmd_quiet_s - transient_discard_s.
+    if slot is not None:
+        t = settle.adc_settle_time(samples, cfg.fs_hz, cfg.peak_thresh_v)
+        if t is not None:
+            settle.observe("gate3.settle_s", cfg.settle_s + t - cfg.transient_discard_s,
+                           upper_bound=(t == 0.0), slot=slot)
 
-    discard_n = int(TRANSIENT_DISCARD_S * FS_HZ)
+    discard_n = int(cfg.transient_discard_s * cfg.fs_hz)
     stable = samples[discard_n:] if len(samples) > discard_n else samples
 
-    pm, n, vmax = _peak_mean(stable, PEAK_THRESH_V)
+    pm, n, vmax = _peak_mean(stable, cfg.peak_thresh_v)
     log(
         f"[GATE3] {name}: peak_mean={pm}, peaks={n}, vmax={vmax:.3f}V "
-        f"(stable={WINDOW_S-TRANSIENT_DISCARD_S:.2f}s, discard={TRANSIENT_DISCARD_S:.2f}s)"
+        f"(stable={cfg.window_s-cfg.transient_discard_s:.2f}s, discard={cfg.transient_discard_s:.2f}s)"
     )
     return pm, n, vmax
 
@@ -149,10 +149,11 @@ def _set_tr_and_measure(spi, h, slot: int, tr_on: bool, label: str, log):
     else:
         _tr_off(slot)
 
-    log(f"[GATE3] Waiting settle {SETTLE_S:.2f}s before sampling...")
-    time.sleep(SETTLE_S)
+    settle_s = FIXTURE.gate3.settle_s
+    log(f"[GATE3] Waiting settle {settle_s:.2f}s before sampling...")
+    clock.sleep(settle_s)
 
-    return _measure_stable(spi, h, label, log)
+    return _measure_stable(spi, h, label, log, slot=slot)
 
 
 def _test_slot_1to3(slot: int, spi, h, log):
@@ -161,8 +162,9 @@ def _test_slot_1to3(slot: int, spi, h, log):
     """
     # Ensure keeper-only before starting this slot test
     _normalize_keeper_only(log)
-    log(f"[GATE3] Waiting settle {SETTLE_S:.2f}s (post-normalize)...")
-    time.sleep(SETTLE_S)
+    settle_s = FIXTURE.gate3.settle_s
+    log(f"[GATE3] Waiting settle {settle_s:.2f}s (post-normalize)...")
+    clock.sleep(settle_s)
 
     log(f"[GATE3] → Slot{slot}: TR ON (expect LOW)")
     pm_on, n_on, vmax_on = _set_tr_and_measure(
@@ -174,8 +176,11 @@ def _test_slot_1to3(slot: int, spi, h, log):
         spi, h, slot, False, f"Slot{slot} OFF", log
     )
 
-    ok_low = _in_range(pm_on, *LOW_EXPECT)
-    ok_high = _in_range(pm_off, *HIGH_EXPECT)
+    history.measure("peak_mean_on_v", pm_on, "V", slot=slot)
+    history.measure("peak_mean_off_v", pm_off, "V", slot=slot)
+
+    ok_low = _in_range(pm_on, *FIXTURE.gate3.low_expect)
+    ok_high = _in_range(pm_off, *FIXTURE.gate3.high_expect)
 
     if ok_low and ok_high:
         log(f"[GATE3] Slot{slot} PASS ✅")
@@ -195,13 +200,14 @@ def _test_slot4(spi, h, log):
     """
     # Start from keeper-only
     _normalize_keeper_only(log)
-    log(f"[GATE3] Waiting settle {SETTLE_S:.2f}s (post-normalize)...")
-    time.sleep(SETTLE_S)
+    settle_s = FIXTURE.gate3.settle_s
+    log(f"[GATE3] Waiting settle {settle_s:.2f}s (post-normalize)...")
+    clock.sleep(settle_s)
 
     log("[GATE3] → Slot4 test: ensure Slot2 TR ON (keeper2)")
     _tr_on(KEEPER2_SLOT)
-    log(f"[GATE3] Waiting settle {SETTLE_S:.2f}s (keeper2)...")
-    time.sleep(SETTLE_S)
+    log(f"[GATE3] Waiting settle {settle_s:.2f}s (keeper2)...")
+    clock.sleep(settle_s)
 
     log("[GATE3] → Slot4: TR OFF (expect HIGH)")
     pm_high, n_high, vmax_high = _set_tr_and_measure(
@@ -213,8 +219,11 @@ def _test_slot4(spi, h, log):
         spi, h, 4, True, "Slot4 ON", log
     )
 
-    ok_high = _in_range(pm_high, *HIGH_EXPECT)
-    ok_low = _in_range(pm_low, *LOW_EXPECT)
+    history.measure("peak_mean_off_v", pm_high, "V", slot=4)
+    history.measure("peak_mean_on_v", pm_low, "V", slot=4)
+
+    ok_high = _in_range(pm_high, *FIXTURE.gate3.high_expect)
+    ok_low = _in_range(pm_low, *FIXTURE.gate3.low_expect)
 
     if ok_high and ok_low:
         log("[GATE3] Slot4 PASS ✅")
@@ -226,40 +235,45 @@ def _test_slot4(spi, h, log):
     return False
 
 
-def run_gate3_all_ordered(log_cb=None):
+def run_gate3_all_ordered(log_cb=None, results=None):
+    """
+    Returns {1:bool,2:bool,3:bool,4:bool}. `results`, if given, is filled as
+    each slot gets its verdict (the caller keeps them if the watchdog
+    cancels the run).
+    """
     log = log_cb or log_default
+    cfg = FIXTURE.gate3
 
-    results = {1: False, 2: False, 3: False, 4: False}
+    results = {} if results is None else results
     h = None
     spi = None
 
     log("============================================================")
     log("[GATE3] ONE-SHOT ordered run across Slot1..Slot4")
     log(
-        f"[GATE3] cmd_quiet={CMD_QUIET_S}s settle={SETTLE_S}s "
-        f"window={WINDOW_S}s discard={TRANSIENT_DISCARD_S}s fs={FS_HZ}Hz "
-        f"peak_thresh={PEAK_THRESH_V}V"
+        f"[GATE3] profile={FIXTURE.name} cmd_quiet={cfg.cmd_quiet_s}s settle={cfg.settle_s}s "
+        f"window={cfg.window_s}s discard={cfg.transient_discard_s}s fs={cfg.fs_hz}Hz "
+        f"peak_thresh={cfg.peak_thresh_v}V"
     )
-    log(f"[GATE3] LOW={LOW_EXPECT}, HIGH={HIGH_EXPECT}")
+    log(f"[GATE3] LOW={cfg.low_expect}, HIGH={cfg.high_expect}")
 
     try:
-        h = lgpio.gpiochip_open(GPIO_CHIP)
-        lgpio.gpio_claim_output(h, CS_GPIO, 1)
+        hal = get_backend()
+        h = hal.gpio()
+        h.setup_output(CS_GPIO, 1)
 
-        spi = spidev.SpiDev()
-        spi.open(SPI_BUS, SPI_DEV)
-        spi.max_speed_hz = SPI_SPEED
-        spi.mode = 0
-        spi.no_cs = True
+        spi = hal.spi_open(SPI_BUS, SPI_DEV, SPI_SPEED, mode=0, no_cs=True)
 
         log("[GATE3] SPI + GPIO initialized")
 
         # Slots 1..3
         for s in (1, 2, 3):
-            results[s] = _test_slot_1to3(s, spi, h, log)
+            with tracing.span(f"TR Slot{s}", slot=s):
+                results[s] = _test_slot_1to3(s, spi, h, log)
 
         # Slot 4 special
-        results[4] = _test_slot4(spi, h, log)
+        with tracing.span("TR Slot4", slot=4):
+            results[4] = _test_slot4(spi, h, log)
 
         return results
 
@@ -281,13 +295,79 @@ def run_gate3_all_ordered(log_cb=None):
             pass
         try:
             if h is not None:
-                lgpio.gpiochip_close(h)
+                h.free(CS_GPIO)
         except Exception:
             pass
 
         log("[GATE3] SPI + GPIO released")
 
 
+def run_gate3_slot(slot: int, keeper: int, log_cb=None) -> bool:
+    """
+    Continuous flow (runners/flow_runner.py): ONE slot against ONE keeper.
+
+    keeper = any other powered RUP in ATP mode; it provides the second
+    termination. Only keeper TR ON, then SlotX ON => LOW, SlotX OFF => HIGH.
+    End state: keeper + slot TR ON (2 terminations).
+    """
+    log = log_cb or log_default
+    cfg = FIXTURE.gate3
+    if keeper == slot:
+        raise ValueError(f"keeper must be another slot (slot={slot})")
+
+    h = None
+    spi = None
+    log(f"[GATE3] Slot{slot} with keeper Slot{keeper} profile={FIXTURE.name} "
+        f"settle={cfg.settle_s}s window={cfg.window_s}s")
+    try:
+        hal = get_backend()
+        h = hal.gpio()
+        h.setup_output(CS_GPIO, 1)
+        spi = hal.spi_open(SPI_BUS, SPI_DEV, SPI_SPEED, mode=0, no_cs=True)
+
+        log(f"[GATE3] Normalize: TR ON Slot{keeper}, TR OFF others")
+        _tr_on(keeper)
+        for s in (1, 2, 3, 4):
+            if s != keeper:
+                _tr_off(s)
+        log(f"[GATE3] Waiting settle {cfg.settle_s:.2f}s (post-normalize)...")
+        clock.sleep(cfg.settle_s)
+
+        with tracing.span(f"TR Slot{slot}", slot=slot):
+            pm_on, n_on, vmax_on = _set_tr_and_measure(spi, h, slot, True, f"Slot{slot} ON", log)
+            pm_off, n_off, vmax_off = _set_tr_and_measure(spi, h, slot, False, f"Slot{slot} OFF", log)
+
+        history.measure("peak_mean_on_v", pm_on, "V", slot=slot)
+        history.measure("peak_mean_off_v", pm_off, "V", slot=slot)
+
+        ok_low = _in_range(pm_on, *cfg.low_expect)
+        ok_high = _in_range(pm_off, *cfg.high_expect)
+        if ok_low and ok_high:
+            log(f"[GATE3] Slot{slot} PASS ✅")
+            return True
+
+        log(f"[GATE3][FAIL] Slot{slot}: ok_low={ok_low}, ok_high={ok_high}")
+        log(f"[GATE3][DBG] Slot{slot} ON:  pm={pm_on} peaks={n_on} vmax={vmax_on:.3f}V")
+        log(f"[GATE3][DBG] Slot{slot} OFF: pm={pm_off} peaks={n_off} vmax={vmax_off:.3f}V")
+        return False
+
+    finally:
+        try:
+            _tr_on(slot)
+        except Exception:
+            pass
+        try:
+            if spi:
+                spi.close()
+        except Exception:
+            pass
+        try:
+            if h is not None:
+                h.free(CS_GPIO)
+        except Exception:
+            pass
+
+
 # Compatibility per-slot API (still runs the global ordered test)
 def run_gate3_termination_check(slot: int, log_cb=None) -> bool:
     res = run_gate3_all_ordered(log_cb=log_cb)
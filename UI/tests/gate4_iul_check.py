@@ -16,13 +16,11 @@ Returns:
 - False → FAIL (for this slot)
 """
 
-import time
-import lgpio
-
+from hal import clock, get_backend
+from services import settle
+from services.fixture_profile import FIXTURE
 from tests.CAN.can_commands import set_target_slot, iul_on, iul_off
 
-GPIO_CHIP = 0
-
 # Slot -> GPIO input pin mapping (your wiring)
 SLOT_TO_GPIO_IUL = {
     1: 18,
@@ -31,10 +29,7 @@ SLOT_TO_GPIO_IUL = {
     4: 25,
 }
 
-# Timing
-IUL_SETTLE_TIME = 4   # seconds
-READ_RETRIES = 4
-READ_DELAY = 4        # seconds
+# Timing: FIXTURE.gate4 (iul_settle_s, read_retries, read_delay_s)
 
 
 def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
@@ -48,6 +43,7 @@ def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
         raise ValueError(f"[GATE4] Invalid slot={slot} (expected 1..4)")
 
     gpio_iul = SLOT_TO_GPIO_IUL[slot]
+    cfg = FIXTURE.gate4
 
     log("=" * 50)
     log(f"[GATE4] Slot={slot} — IUL test using GPIO{gpio_iul}")
@@ -61,8 +57,8 @@ def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
         set_target_slot(slot)
 
         # Init GPIO input for this slot
-        h = lgpio.gpiochip_open(GPIO_CHIP)
-        lgpio.gpio_claim_input(h, gpio_iul)
+        h = get_backend().gpio()
+        h.setup_input(gpio_iul)
         log(f"[GATE4] GPIO{gpio_iul} configured as INPUT")
 
         # ------------------------------
@@ -72,15 +68,15 @@ def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
         set_target_slot(slot)  # extra safety
         iul_on()
 
-        log(f"[GATE4] Waiting {IUL_SETTLE_TIME}s for LED to settle")
-        time.sleep(IUL_SETTLE_TIME)
+        log(f"[GATE4] Waiting {cfg.iul_settle_s}s for LED to settle")
+        settle.wait_gpio("gate4.iul_settle_s", h, gpio_iul, 0, cfg.iul_settle_s)
 
         reads = []
-        for i in range(READ_RETRIES):
-            val = lgpio.gpio_read(h, gpio_iul)
+        for i in range(cfg.read_retries):
+            val = h.read(gpio_iul)
             reads.append(val)
             log(f"[GATE4] GPIO read {i+1}: {val}")
-            time.sleep(READ_DELAY)
+            clock.sleep(cfg.read_delay_s)
 
         if reads[-1] != 0:
             log("[GATE4][FAIL] IUL_ON but GPIO is not LOW")
@@ -95,15 +91,15 @@ def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
         set_target_slot(slot)  # extra safety
         iul_off()
 
-        log(f"[GATE4] Waiting {IUL_SETTLE_TIME}s for LED to settle")
-        time.sleep(IUL_SETTLE_TIME)
+        log(f"[GATE4] Waiting {cfg.iul_settle_s}s for LED to settle")
+        settle.wait_gpio("gate4.iul_settle_s", h, gpio_iul, 1, cfg.iul_settle_s)
 
         reads = []
-        for i in range(READ_RETRIES):
-            val = lgpio.gpio_read(h, gpio_iul)
+        for i in range(cfg.read_retries):
+            val = h.read(gpio_iul)
             reads.append(val)
             log(f"[GATE4] GPIO read {i+1}: {val}")
-            time.sleep(READ_DELAY)
+            clock.sleep(cfg.read_delay_s)
 
         if reads[-1] != 1:
             log("[GATE4][FAIL] IUL_OFF but GPIO is not HIGH")
@@ -121,7 +117,7 @@ def run_gate4_iul_check(slot: int, log_cb=None) -> bool:
         log("[GATE4] Cleaning up GPIO")
         try:
             if h is not None:
-                lgpio.gpiochip_close(h)
+                h.free(gpio_iul)
         except Exception:
             pass
         log("=" * 50)
@@ -14,8 +14,8 @@ Returns:
 - False → FAIL (for this slot)
 """
 
-import time
-
+from services import settle
+from services.fixture_profile import FIXTURE
 from tests.CAN.can_commands import set_target_slot, read_id_pins_request
 from tests.CAN.can_utils import flush_rx, wait_for_idpins
 
@@ -27,8 +27,7 @@ from tests.ID.id_pins_init import (
 # =========================================================
 # CONFIG
 # =========================================================
-TIMEOUT_S = 2.0
-SETTLE_DELAY_S = 0.5
+# Timing: FIXTURE.gate5 (timeout_s, settle_delay_s)
 
 # Convention: bits string is "ID3ID2ID1"
 BASELINE_BITS = {
@@ -45,6 +44,7 @@ def gate5_id_check(slot: int, log_cb=None) -> bool:
 
     if slot not in (1, 2, 3, 4):
         raise ValueError(f"[GATE5] Invalid slot={slot}")
+    cfg = FIXTURE.gate5
 
     log(f"\n========== GATE 5 — ID PINS (Slot {slot}) ==========")
 
@@ -62,7 +62,7 @@ def gate5_id_check(slot: int, log_cb=None) -> bool:
     # 2) Start from baseline pattern for this slot
     # -------------------------------------------------
     baseline = BASELINE_BITS[slot]
-    if not set_slot_bits(slot, baseline, settle_s=SETTLE_DELAY_S, verify=True):
+    if not set_slot_bits(slot, baseline, settle_s=cfg.settle_delay_s, verify=True):
         log(f"❌ [GATE5] Failed to set baseline bits for slot {slot}: {baseline}")
         return False
 
@@ -79,7 +79,7 @@ def gate5_id_check(slot: int, log_cb=None) -> bool:
         test_bits = "".join(test_bits)
 
         log(f"[GATE5] Forcing {name} LOW -> Slot{slot} bits = {test_bits}")
-        if not set_slot_bits(slot, test_bits, settle_s=SETTLE_DELAY_S, verify=True):
+        if not set_slot_bits(slot, test_bits, settle_s=cfg.settle_delay_s, verify=True):
             log(f"❌ [GATE5] Failed to apply test bits {test_bits} for {name}")
             return False
 
@@ -87,17 +87,19 @@ def gate5_id_check(slot: int, log_cb=None) -> bool:
         set_target_slot(slot)
         read_id_pins_request()
 
-        val = wait_for_idpins(TIMEOUT_S)
+        val = wait_for_idpins(cfg.timeout_s)
         if val is None:
             log(f"❌ [GATE5] No CAN response after forcing {name} LOW")
             # Restore baseline before exit
-            set_slot_bits(slot, baseline, settle_s=SETTLE_DELAY_S, verify=False)
+            set_slot_bits(slot, baseline, settle_s=cfg.settle_delay_s, verify=False)
             return False
 
         log(f"🔎 [GATE5] CAN ID response = 0x{val:02X} after {name} LOW")
+        # RUP answered with the pins applied settle_delay_s ago (no finer view from here)
+        settle.observe("gate5.settle_delay_s", cfg.settle_delay_s, upper_bound=True)
 
         # Restore baseline for next step
-        if not set_slot_bits(slot, baseline, settle_s=SETTLE_DELAY_S, verify=True):
+        if not set_slot_bits(slot, baseline, settle_s=cfg.settle_delay_s, verify=True):
             log(f"❌ [GATE5] Failed to restore baseline after testing {name}")
             return False
 
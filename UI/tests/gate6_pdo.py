@@ -15,16 +15,19 @@ Automation:
   automatically run Gate6 in the PM venv via subprocess (no manual activate).
 """
 
-import time
+import os
 import json
 import subprocess
 import can
 from typing import Dict, Any, List, Tuple
 
+from hal import clock
+from services import history, settle, status_api, tracing, watchdog
+from services.fixture_profile import FIXTURE
 from tests.switch.pm125 import PM125
 from tests.CAN.can_bus import get_can_bus
 from tests.CAN.can_commands import (
-    set_target_slot, power_60w, power_15w, power_report_request
+    set_target_slot, power_60w, power_15w, power_report_periodic
 )
 
 # ==============================
@@ -37,10 +40,12 @@ MARKER = "=== JSON_RESULT ==="
 # ==============================
 # CONFIG
 # ==============================
-POWER_TOL_PM = 0.3
-POWER_TOL_RUP = 0.3
+# Timing / tolerances: FIXTURE.gate6 (services/fixture_profile.py)
 RUP_RESPONSE_ID = 0x065
 
+# Override to point Gate6 at sim/pm125_emu.py (prints its /dev/pts/N)
+PM125_PORT = os.environ.get("ATP_PM125_PORT", "/dev/ttyUSB0")
+
 SLOT_TO_ACRONAME_PORT = {1: 0, 2: 1, 3: 2, 4: 3}
 
 POWER_STEPS_60_MODE = [
@@ -66,44 +71,58 @@ def _window(meas: float, target: float, tol: float):
     return (low <= meas <= high), low, high
 
 def _negotiate_voltage(pm: PM125, desired_mv: int, log,
-                      try_indexes=(4, 3, 2, 1, 0), settle_s: float = 2.0):
+                      try_indexes=(4, 3, 2, 1, 0), settle_s: float = None):
+    # PM125 set_voltage -> CONSTAT check. Only when characterizing (poll < settle)
+    # is CONSTAT polled during the wait (settle stats); else one read after it
+    cfg = FIXTURE.gate6
+    settle_s = cfg.negotiate_settle_s if settle_s is None else settle_s
+    tol_mv = int(desired_mv * 0.05)
     for idx in try_indexes:
         pm.set_voltage(idx, desired_mv)
-        time.sleep(settle_s)
+        if cfg.negotiate_poll_s < settle_s:
+            settle.wait_until(
+                "gate6.negotiate_settle_s",
+                lambda: abs(pm.get_connection_status().get("voltage_mv", -1) - desired_mv) <= tol_mv,
+                settle_s, cfg.negotiate_poll_s,
+            )
+        else:
+            clock.sleep(settle_s)
 
         constat = pm.get_connection_status()
         actual_mv = constat.get("voltage_mv", -1)
         log(f"   try idx={idx} -> CONSTAT voltage={actual_mv} mV")
 
-        if actual_mv > 0 and abs(actual_mv - desired_mv) <= int(desired_mv * 0.05):
+        if actual_mv > 0 and abs(actual_mv - desired_mv) <= tol_mv:
             return True, idx, constat
 
     return False, None, pm.get_connection_status()
 
-def _ramp_current(pm: PM125, target_ma: int, log, step_ma: int = 250, delay_s: float = 1.0):
+def _ramp_current(pm: PM125, target_ma: int, log, step_ma: int, delay_s: float):
     pm.set_current(0)
-    time.sleep(0.5)
+    clock.sleep(0.5)
 
     current_ma = 0
     while current_ma < target_ma:
         current_ma = min(current_ma + step_ma, target_ma)
         pm.set_current(current_ma)
-        time.sleep(delay_s)
+        clock.sleep(delay_s)
 
         stat = pm.get_statistics()
+        status_api.publish_pm125(stat)
         log(f"   ↳ set_current({current_ma} mA) | STAT: {stat}")
 
 def _wait_until_pm_window(pm: PM125, target_w: float, log,
-                          timeout_s: float = 20.0, poll_s: float = 1.0):
-    t0 = time.time()
+                          timeout_s: float, poll_s: float):
+    t0 = clock.time()
     last_stat = None
     last_w = 0.0
     low = high = 0.0
 
-    while time.time() - t0 < timeout_s:
+    while clock.time() - t0 < timeout_s:
         last_stat = pm.get_statistics()
+        status_api.publish_pm125(last_stat)
         last_w = _measured_power_w(last_stat)
-        ok, low, high = _window(last_w, target_w, POWER_TOL_PM)
+        ok, low, high = _window(last_w, target_w, FIXTURE.gate6.power_tol_pm)
 
         v = last_stat.get("voltage_mv", 0) / 1000.0
         i = last_stat.get("current_ma", 0) / 1000.0
@@ -112,7 +131,7 @@ def _wait_until_pm_window(pm: PM125, target_w: float, log,
         if ok:
             return True, last_w, low, high, last_stat
 
-        time.sleep(poll_s)
+        clock.sleep(poll_s)
 
     return False, last_w, low, high, last_stat
 
@@ -122,13 +141,15 @@ def _decode_rup_power(byte0: int):
     return (byte0 - 0xA0) * 2  # W
 
 def _flush_can(bus: can.BusABC, duration_s: float = 0.25):
-    t0 = time.time()
-    while time.time() - t0 < duration_s:
-        _ = bus.recv(timeout=0.01)
+    # Bus is kernel-filtered to RUP_RESPONSE_ID: stop as soon as it is drained
+    t0 = clock.time()
+    while clock.time() - t0 < duration_s:
+        if bus.recv(timeout=0.0) is None:
+            break
 
 def _wait_for_power_report(bus: can.BusABC, timeout_s: float = 2.0):
-    deadline = time.time() + timeout_s
-    while time.time() < deadline:
+    deadline = clock.time() + timeout_s
+    while clock.time() < deadline:
         msg = bus.recv(timeout=0.1)
         if not msg:
             continue
@@ -143,10 +164,44 @@ def _wait_for_power_report(bus: can.BusABC, timeout_s: float = 2.0):
 
     return None, None, None
 
+def _collect_power_reports(bus: can.BusABC, log, samples: int = None,
+                           timeout_s: float = None):
+    """
+    Poll POWER_REPORT via BCM and collect up to `samples` valid reports
+    (defaults: FIXTURE.gate6.power_report_samples / power_report_timeout_s).
+    Returns (median_w, raw0, raw_data) of the median sample, or (None, None, None).
+    """
+    cfg = FIXTURE.gate6
+    samples = cfg.power_report_samples if samples is None else samples
+    timeout_s = cfg.power_report_timeout_s if timeout_s is None else timeout_s
+    got = []  # (rup_w, raw0, raw_data)
+    deadline = clock.time() + timeout_s
+
+    # POWER_REPORT_REQUEST is repeated by the kernel (BCM) while we collect reports
+    with power_report_periodic(cfg.power_report_period_s):
+        while len(got) < samples:
+            remaining = deadline - clock.time()
+            if remaining <= 0:
+                break
+            rup_w, raw0, raw_data = _wait_for_power_report(bus, timeout_s=remaining)
+            if raw0 is None:
+                break
+            if rup_w is None:
+                continue
+            got.append((rup_w, raw0, raw_data))
+
+    if not got:
+        return None, None, None
+
+    log(f"[GATE6] RUP power samples: {[w for w, _, _ in got]} W")
+    got.sort(key=lambda x: x[0])
+    return got[len(got) // 2]
+
 def _run_single_pm_step(pm: PM125, can_bus: can.BusABC, step: dict, log, fail_fn):
     desired_mv = step["desired_mv"]
     target_w = step["target_power_w"]
     name = step["name"]
+    cfg = FIXTURE.gate6
 
     step_res = {
         "name": name,
@@ -166,7 +221,8 @@ def _run_single_pm_step(pm: PM125, can_bus: can.BusABC, step: dict, log, fail_fn
     log(f"[GATE6] STEP {name} | desired {desired_mv/1000:.1f}V | target {target_w}W")
 
     log("[GATE6] PM125: negotiating voltage...")
-    ok_v, _, constat = _negotiate_voltage(pm, desired_mv, log)
+    with tracing.span("negotiate", mv=desired_mv):
+        ok_v, _, constat = _negotiate_voltage(pm, desired_mv, log)
     log(f"[GATE6] FINAL CONSTAT: {constat}")
 
     if not ok_v:
@@ -183,10 +239,14 @@ def _run_single_pm_step(pm: PM125, can_bus: can.BusABC, step: dict, log, fail_fn
         target_i_ma = max_i_ma
 
     log(f"[GATE6] PM125: ramp current to {target_i_ma} mA")
-    _ramp_current(pm, target_i_ma, log, step_ma=250, delay_s=1.0)
+    with tracing.span("ramp_current", ma=target_i_ma):
+        _ramp_current(pm, target_i_ma, log, step_ma=cfg.ramp_step_ma, delay_s=cfg.ramp_delay_s)
 
-    ok_pm, pm_w, low, high, _ = _wait_until_pm_window(pm, target_w, log, timeout_s=20, poll_s=1.0)
+    with tracing.span("pm_window", w=target_w):
+        ok_pm, pm_w, low, high, _ = _wait_until_pm_window(
+            pm, target_w, log, timeout_s=cfg.pm_window_timeout_s, poll_s=cfg.pm_window_poll_s)
     step_res["pm_w"] = pm_w
+    history.measure(f"pm_w_{name}", pm_w, "W")
 
     if not ok_pm:
         return fail_fn(name, step_res, f"PM power {pm_w:.2f}W not in [{low:.2f},{high:.2f}]")
@@ -194,19 +254,20 @@ def _run_single_pm_step(pm: PM125, can_bus: can.BusABC, step: dict, log, fail_fn
     step_res["pm_ok"] = True
     log(f"[GATE6] PM PASS — {pm_w:.2f}W in [{low:.2f},{high:.2f}]")
 
-    log("[GATE6] RUP: POWER_REPORT_REQUEST")
+    log(f"[GATE6] RUP: POWER_REPORT_REQUEST (BCM every {cfg.power_report_period_s * 1000:.0f} ms)")
     _flush_can(can_bus, 0.25)
-    power_report_request()
 
-    rup_w, raw0, raw_data = _wait_for_power_report(can_bus, timeout_s=2.0)
+    with tracing.span("power_report"):
+        rup_w, raw0, raw_data = _collect_power_reports(can_bus, log)
     if rup_w is None:
         return fail_fn(name, step_res, "No / invalid POWER_REPORT from RUP")
 
     step_res["rup_w"] = rup_w
+    history.measure(f"rup_w_{name}", rup_w, "W")
     step_res["rup_ok"] = True
     log(f"[GATE6] RUP reports {rup_w}W (raw0=0x{raw0:02X}, data={[f'0x{b:02X}' for b in raw_data]})")
 
-    rup_ok, rlow, rhigh = _window(float(rup_w), float(target_w), POWER_TOL_RUP)
+    rup_ok, rlow, rhigh = _window(float(rup_w), float(target_w), cfg.power_tol_rup)
     step_res["rup_vs_target_low"] = rlow
     step_res["rup_vs_target_high"] = rhigh
 
@@ -217,7 +278,7 @@ def _run_single_pm_step(pm: PM125, can_bus: can.BusABC, step: dict, log, fail_fn
 
     log("[GATE6] Reset PM125 current to 0 mA")
     pm.set_current(0)
-    time.sleep(2)
+    clock.sleep(cfg.pm_reset_settle_s)
 
     return step_res
 
@@ -240,12 +301,13 @@ def _run_gate6_in_venv(slot: int, log) -> Tuple[Dict[str, Any], List[str]]:
 
     full_lines: List[str] = []
     assert proc.stdout is not None
-    for line in proc.stdout:
-        line = line.rstrip("\n")
-        full_lines.append(line)
-        log(line)
+    with watchdog.on_cancel(proc.kill):      # gate over budget: stop the venv run
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            full_lines.append(line)
+            log(line)
 
-    proc.wait()
+        proc.wait()
 
     if proc.returncode != 0:
         log(f"[GATE6][FAIL] venv subprocess returncode={proc.returncode}")
@@ -294,15 +356,10 @@ def run_gate6(slot: int, log_cb=None):
         log(f"[GATE6][FAIL] {reason}")
         return results, logs
 
-    # Try importing Acroname/brainstem path. If not available, use venv subprocess.
-    try:
-        from tests.switch.acroname_switch import select_rup
-        has_acroname = True
-    except Exception:
-        has_acroname = False
-        select_rup = None  # type: ignore
+    # Try opening the Acroname/brainstem path. If not available, use venv subprocess.
+    from tests.switch.acroname_switch import ensure_connected, select_rup
 
-    if not has_acroname:
+    if not ensure_connected():
         return _run_gate6_in_venv(slot, log)
 
     can_bus = None
@@ -313,34 +370,36 @@ def run_gate6(slot: int, log_cb=None):
             raise ValueError(f"[GATE6] Invalid slot={slot} (expected 1..4)")
 
         port = SLOT_TO_ACRONAME_PORT[slot]
+        cfg = FIXTURE.gate6
         log(f"[GATE6] Starting Gate 6 power check for Slot {slot} (Acroname port {port})")
 
         set_target_slot(slot)
 
         log(f"[GATE6] Acroname: select_rup(port={port})")
-        select_rup(port)  # type: ignore
-        time.sleep(2.0)
+        select_rup(port)
+        clock.sleep(cfg.mux_settle_s)
 
-        can_bus = get_can_bus()
-        pm = PM125("/dev/ttyUSB0")
+        can_bus = get_can_bus(rx_ids=(RUP_RESPONSE_ID,))
+        pm = PM125(PM125_PORT)
         log("[GATE6] PM125 connected")
 
         try:
             log("[GATE6] PM125 clean start: set 5V and 0mA")
             pm.set_current(0)
-            time.sleep(0.3)
+            clock.sleep(0.3)
             pm.set_voltage(0, 5000)
-            time.sleep(2.0)
+            clock.sleep(cfg.pm_reset_settle_s)
         except Exception as e:
             log(f"[GATE6][WARN] PM125 clean start failed: {e}")
 
         log("[GATE6] RUP: sending POWER_TO_60W (once at start)")
         set_target_slot(slot)
         power_60w()
-        time.sleep(2.0)
+        clock.sleep(cfg.power_60w_settle_s)
 
         for step in POWER_STEPS_60_MODE:
-            out = _run_single_pm_step(pm, can_bus, step, log, fail)
+            with tracing.span(step["name"]):
+                out = _run_single_pm_step(pm, can_bus, step, log, fail)
             if isinstance(out, tuple):
                 return out
             results["steps"].append(out)
@@ -352,9 +411,10 @@ def run_gate6(slot: int, log_cb=None):
         log("[GATE6] RUP: sending POWER_TO_15W")
         set_target_slot(slot)
         power_15w()
-        time.sleep(1.5)
+        clock.sleep(cfg.power_15w_settle_s)
 
-        out = _run_single_pm_step(pm, can_bus, FINAL_15_MODE_STEP, log, fail)
+        with tracing.span(FINAL_15_MODE_STEP["name"]):
+            out = _run_single_pm_step(pm, can_bus, FINAL_15_MODE_STEP, log, fail)
         if isinstance(out, tuple):
             return out
         results["steps"].append(out)
@@ -1,4 +1,4 @@
-# tests/power_PT/power.py
+# tests/power_PT/power_1_4.py
 """
 Power detect reader for ATP (RUP1..RUP4).
 
@@ -7,8 +7,7 @@ Power detect is ACTIVE-HIGH:
     GPIO LOW  -> Power missing  -> return False
 """
 
-import time
-import RPi.GPIO as GPIO
+from hal import clock, get_backend
 
 POWER_GPIO_RUP1 = 21
 POWER_GPIO_RUP2 = 20
@@ -18,24 +17,17 @@ POWER_GPIO_RUP4 = 12
 STARTUP_DELAY = 1  # seconds
 
 
-def _gpio_init_once() -> None:
-    """Initialize BCM mode once."""
-    if GPIO.getmode() is None:
-        GPIO.setmode(GPIO.BCM)
-
-
 def _read_power_gpio(power_gpio: int, label: str) -> bool:
-    _gpio_init_once()
-
-    GPIO.setup(power_gpio, GPIO.IN)
+    gpio = get_backend().gpio()
+    gpio.setup_input(power_gpio)
 
     print(f"[HW] ({label}) Waiting {STARTUP_DELAY}s for power to stabilize...")
-    time.sleep(STARTUP_DELAY)
+    clock.sleep(STARTUP_DELAY)
 
-    raw = GPIO.input(power_gpio)
+    raw = gpio.read(power_gpio)
     print(f"[HW] ({label}) Power GPIO raw state (GPIO {power_gpio}) = {raw}")
 
-    power_present = (raw == GPIO.HIGH)  # ACTIVE-HIGH
+    power_present = (raw == 1)  # ACTIVE-HIGH
     print(f"[HW] ({label}) Power detected = {power_present}")
 
     return power_present
@@ -58,5 +50,5 @@ def read_power_state_rup4() -> bool:
 
 
 def cleanup_gpio() -> None:
-    """Call once when your whole app exits."""
-    GPIO.cleanup()
+    """Call once when your whole app exits (releases every HAL GPIO line)."""
+    get_backend().close_gpio()   # drops the cached handle too: gpio() reopens the chip
@@ -10,7 +10,7 @@ We ensure MCP23S17 ID pins are initialized + fully configured ONCE
 before powering any RUP.
 """
 
-from gpiozero import LED
+from hal import get_backend
 
 # ---------------------------------------------------------
 # ID PINS INIT + FULL CONFIG (MCP23S17)
@@ -61,13 +61,34 @@ RELAY_GPIO_RUP2 = 27
 RELAY_GPIO_RUP3 = 6
 RELAY_GPIO_RUP4 = 13
 
-# active_high=False => active-low behavior
-# initial_value=False => logical OFF at start
-_relay_rup1 = LED(RELAY_GPIO_RUP1, active_high=False, initial_value=False)
-_relay_rup2 = LED(RELAY_GPIO_RUP2, active_high=False, initial_value=False)
-_relay_rup3 = LED(RELAY_GPIO_RUP3, active_high=False, initial_value=False)
-_relay_rup4 = LED(RELAY_GPIO_RUP4, active_high=False, initial_value=False)
-                                                    
+RELAY_GPIOS = (RELAY_GPIO_RUP1, RELAY_GPIO_RUP2, RELAY_GPIO_RUP3, RELAY_GPIO_RUP4)
+
+# ACTIVE-LOW
+RELAY_ON_LEVEL = 0
+RELAY_OFF_LEVEL = 1
+
+_relays_gpio = None   # GPIO handle the relay lines were claimed on
+
+
+def init_relays() -> None:
+    """
+    Claim the 4 relay lines as outputs, all OFF (HIGH).
+    Done on first use (not at import) so this module loads off the Pi, and
+    again on every new handle (cleanup_gpio() / close_gpio() release the lines).
+    """
+    global _relays_gpio
+    gpio = get_backend().gpio()
+    if gpio is _relays_gpio:
+        return
+    for pin in RELAY_GPIOS:
+        gpio.setup_output(pin, RELAY_OFF_LEVEL)
+    _relays_gpio = gpio
+
+
+def _relay_write(pin: int, on: bool) -> None:
+    init_relays()
+    get_backend().gpio().write(pin, RELAY_ON_LEVEL if on else RELAY_OFF_LEVEL)
+
 
 # -------------------------
 # RUP1 relay functions
@@ -76,12 +97,12 @@ def relay_on_rup1() -> None:
     if not ensure_id_pins_initialized():
         print("[HW][FAIL] Refusing to power RUP1 because ID pins init failed.")
         return
-    _relay_rup1.on()
+    _relay_write(RELAY_GPIO_RUP1, True)
     print(f"[HW] Relay ON  - RUP1 (GPIO {RELAY_GPIO_RUP1}, ACTIVE-LOW)")
 
 
 def relay_off_rup1() -> None:
-    _relay_rup1.off()
+    _relay_write(RELAY_GPIO_RUP1, False)
     print(f"[HW] Relay OFF - RUP1 (GPIO {RELAY_GPIO_RUP1}, ACTIVE-LOW)")
 
 
@@ -92,12 +113,12 @@ def relay_on_rup2() -> None:
     if not ensure_id_pins_initialized():
         print("[HW][FAIL] Refusing to power RUP2 because ID pins init failed.")
         return
-    _relay_rup2.on()
+    _relay_write(RELAY_GPIO_RUP2, True)
     print(f"[HW] Relay ON  - RUP2 (GPIO {RELAY_GPIO_RUP2}, ACTIVE-LOW)")
 
 
 def relay_off_rup2() -> None:
-    _relay_rup2.off()
+    _relay_write(RELAY_GPIO_RUP2, False)
     print(f"[HW] Relay OFF - RUP2 (GPIO {RELAY_GPIO_RUP2}, ACTIVE-LOW)")
 
 
@@ -108,12 +129,12 @@ def relay_on_rup3() -> None:
     if not ensure_id_pins_initialized():
         print("[HW][FAIL] Refusing to power RUP3 because ID pins init failed.")
         return
-    _relay_rup3.on()
+    _relay_write(RELAY_GPIO_RUP3, True)
     print(f"[HW] Relay ON  - RUP3 (GPIO {RELAY_GPIO_RUP3}, ACTIVE-LOW)")
 
 
 def relay_off_rup3() -> None:
-    _relay_rup3.off()
+    _relay_write(RELAY_GPIO_RUP3, False)
     print(f"[HW] Relay OFF - RUP3 (GPIO {RELAY_GPIO_RUP3}, ACTIVE-LOW)")
 
 
@@ -124,10 +145,10 @@ def relay_on_rup4() -> None:
     if not ensure_id_pins_initialized():
         print("[HW][FAIL] Refusing to power RUP4 because ID pins init failed.")
         return
-    _relay_rup4.on()
+    _relay_write(RELAY_GPIO_RUP4, True)
     print(f"[HW] Relay ON  - RUP4 (GPIO {RELAY_GPIO_RUP4}, ACTIVE-LOW)")
 
 
 def relay_off_rup4() -> None:
-    _relay_rup4.off()
+    _relay_write(RELAY_GPIO_RUP4, False)
     print(f"[HW] Relay OFF - RUP4 (GPIO {RELAY_GPIO_RUP4}, ACTIVE-LOW)")
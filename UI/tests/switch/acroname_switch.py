@@ -1,13 +1,23 @@
 # acroname_switch.py
-import time
-import brainstem
-from brainstem.stem import USBCSwitch
+"""
+Acroname USB-C switch (COMMON -> RUP port 0..3), through the HAL.
 
-# Initialize Acroname switch
-sw = USBCSwitch()
-sw.discoverAndConnect(brainstem.link.Spec.USB)
+No longer connects at import: the switch is opened on the first
+select_rup() / ensure_connected() by the active HAL backend
+(hal/real.py: AcronameMux via brainstem, hal/sim.py: SimMux).
+"""
 
-COMMON = 0  # common side index
+from hal import get_backend
+
+
+def ensure_connected() -> bool:
+    """Open the mux now. False if brainstem / the switch is not available."""
+    try:
+        get_backend().usbc_mux()
+        return True
+    except Exception as e:
+        print(f"[ACRONAME][WARN] USB-C switch not available: {e}")
+        return False
 
 
 def select_rup(port):
@@ -16,34 +26,5 @@ def select_rup(port):
     and enable CC routing for PD.
     """
     print(f"\n--- Switching to RUP PORT {port} ---")
-
-    # 1. Disable VBUS + port on COMMON before switching
-    sw.usb.setPowerDisable(COMMON)
-    sw.usb.setPortDisable(COMMON)
-    time.sleep(0.05)
-
-    # 2. Disable mux before selecting channel
-    sw.mux.setEnable(False)
-    time.sleep(0.05)
-
-    # 3. Select the channel (0,1,2,3)
-    sw.mux.setChannel(port)
-    time.sleep(0.05)
-
-    # 4. Re-enable mux
-    sw.mux.setEnable(True)
-    time.sleep(0.05)
-
-    # 5. Enable CC routing + passive mode for selected RUP port
-    sw.usb.setPortMode(port, sw.usb.PORT_MODE_PASSIVE)
-    sw.usb.setPortMode(port, sw.usb.PORT_MODE_CC1_ENABLE)
-    sw.usb.setPortMode(port, sw.usb.PORT_MODE_CC2_ENABLE)
-    time.sleep(0.05)
-
-    # 6. Re-enable VBUS on COMMON
-    sw.usb.setPortEnable(COMMON)
-    sw.usb.setPowerEnable(COMMON)
-    time.sleep(0.1)
-
+    get_backend().usbc_mux().select(port)
     print(f"✓ COMMON → PORT {port} ACTIVE\n")
-
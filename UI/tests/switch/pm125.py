@@ -16,8 +16,7 @@ Usage example:
 
 """
 
-import serial
-import time
+from hal import clock, get_backend
 
 
 # ===============================
@@ -66,18 +65,16 @@ class PM125:
 
     def __init__(self, port="/dev/ttyUSB0", baudrate=115200, timeout=1.0):
 
-        self.ser = serial.Serial(
-            port=port,
-            baudrate=baudrate,
-            timeout=timeout,
-            bytesize=8,
-            parity=serial.PARITY_NONE,
-            stopbits=1
-        )
+        # 8N1 serial port from the HAL (real tty or the simulated PM125)
+        self.ser = get_backend().open_serial(port, baudrate=baudrate, timeout=timeout)
 
         # Prevent FTDI auto-reset
-        self.ser.dtr = False
-        self.ser.rts = False
+        # (a pty, e.g. sim/pm125_emu.py, has no modem lines -> ignore)
+        try:
+            self.ser.dtr = False
+            self.ser.rts = False
+        except OSError:
+            pass
 
         self.timeout = timeout
 
@@ -289,7 +286,7 @@ class PM125:
 
     def request_5v_3a(self):
         self.set_voltage(0, 5000)
-        time.sleep(0.2)
+        clock.sleep(0.2)
         self.set_current(3000)
 
 
@@ -307,17 +304,17 @@ if __name__ == "__main__":
 
         print("Requesting 5V...")
         pm.set_voltage(0, 5000)
-        time.sleep(0.5)
+        clock.sleep(0.5)
 
         print("Setting 3A...")
         pm.set_current(3000)
-        time.sleep(1)
+        clock.sleep(1)
 
         print("Stats @3A:", pm.get_statistics())
 
         print("Resetting load...")
         pm.set_current(0)
-        time.sleep(0.5)
+        clock.sleep(0.5)
 
         print("Stats @0A:", pm.get_statistics())
 
@@ -0,0 +1,15 @@
+# tests_unit/conftest.py
+"""
+Unit / sim tests (no fixture needed):
+
+    python3 -m pytest -q UI/tests_unit
+
+UI/tests holds the gate modules (hardware scripts), not pytest tests.
+"""
+
+import os
+import sys
+
+UI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if UI_DIR not in sys.path:
+    sys.path.insert(0, UI_DIR)
@@ -0,0 +1,27 @@
+# tests_unit/test_atp_headless.py
+import os
+import re
+import subprocess
+import sys
+
+from conftest import UI_DIR
+
+GATE_LINE = re.compile(r"^Gate(\d): (.*)$", re.MULTILINE)
+
+
+def test_sim_virtual_time_all_gates_pass(tmp_path):
+    # ATP_* from the caller's shell (profile, watchdog, collector, ...) would change the run
+    env = {k: v for k, v in os.environ.items() if not k.startswith("ATP_")}
+    proc = subprocess.run(
+        [sys.executable, os.path.join(UI_DIR, "atp_headless.py"), "--sim", "--virtual-time"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    out = proc.stdout + proc.stderr
+    assert proc.returncode == 0, out[-4000:]
+
+    gates = dict(GATE_LINE.findall(proc.stdout))
+    assert sorted(gates) == ["1", "2", "3", "4", "5", "6"], out[-4000:]
+    for gate, verdicts in gates.items():
+        assert verdicts.split() == [f"S{s}=PASS" for s in (1, 2, 3, 4)], f"Gate{gate}: {verdicts}"
+
+    assert list(tmp_path.joinpath("ATP_logs").glob("ATP_*.xlsx"))
@@ -0,0 +1,44 @@
+# tests_unit/test_fixture_profile.py
+import pytest
+
+from services import fixture_profile
+
+
+@pytest.mark.parametrize("preset", sorted(fixture_profile.PRESETS))
+def test_presets_build(preset):
+    prof = fixture_profile.build(preset)
+    assert prof.name == preset
+    assert prof.validated == (preset not in fixture_profile.UNVALIDATED_PRESETS)
+
+
+def test_overrides_on_top_of_preset():
+    prof = fixture_profile.build("fast", {"gate4": {"read_retries": 3}, "gate3": {"low_expect": [2, 3.5]}})
+    assert prof.gate4.read_retries == 3
+    assert prof.gate4.iul_settle_s == fixture_profile.PRESETS["fast"]["gate4"]["iul_settle_s"]
+    assert prof.gate3.low_expect == (2.0, 3.5)
+    assert not prof.validated
+
+
+@pytest.mark.parametrize("overrides, match", [
+    ({"gate9": {"x": 1}}, "unknown section"),
+    ({"gate3": {"nope_s": 1.0}}, "unknown key gate3.nope_s"),
+    ({"gate3": 1.0}, "must be a table"),
+    ({"gate3": {"settle_s": "1"}}, "expected a number"),
+    ({"gate4": {"read_retries": 2.5}}, "expected an integer"),
+    ({"gate4": {"read_retries": True}}, "expected an integer"),
+    ({"gate3": {"low_expect": [3.0, 2.0]}}, "low 3.0 > high 2.0"),
+    ({"gate3": {"high_expect": [3.8]}}, "expected \\[low, high\\]"),
+    ({"gate5": {"timeout_s": -0.1}}, "gate5.timeout_s must be >= 0"),
+    ({"gate3": {"window_s": 0.5, "transient_discard_s": 0.5}}, "window_s must be longer"),
+    ({"gate3": {"fs_hz": 0}}, "fs_hz must be > 0"),
+    ({"gate2": {"max_attempts": 0}}, "must be >= 1"),
+    ({"gate6": {"ramp_step_ma": 0}}, "must be > 0"),
+])
+def test_build_rejects_bad_overrides(overrides, match):
+    with pytest.raises(ValueError, match=match):
+        fixture_profile.build("safe", overrides)
+
+
+def test_unknown_preset():
+    with pytest.raises(ValueError, match="unknown preset"):
+        fixture_profile.build("turbo")
@@ -0,0 +1,48 @@
+# tests_unit/test_gate_graph.py
+import pytest
+
+from runners import gate_graph
+from runners.gate_graph import POWER
+
+
+@pytest.fixture(autouse=True)
+def fail_fast():
+    was = gate_graph.is_fail_fast()
+    gate_graph.set_fail_fast(True)
+    yield
+    gate_graph.set_fail_fast(was)
+
+
+def test_blocker_none_when_prerequisites_pass_or_not_run():
+    assert gate_graph.blocker(1, {POWER: True}) is None
+    assert gate_graph.blocker(3, {POWER: True, 1: True, 2: True}) is None
+    assert gate_graph.blocker(2, {}) is None
+
+
+def test_blocker_direct_and_transitive():
+    assert gate_graph.blocker(2, {POWER: True, 1: False}) == 1
+    assert gate_graph.blocker(4, {POWER: True, 1: True, 2: False}) == 2
+    # Gate1 failed: Gate6 is blocked by it through Gate2 (not run)
+    assert gate_graph.blocker(6, {POWER: True, 1: False}) == 1
+    assert gate_graph.blocker(5, {POWER: False}) == POWER
+
+
+def test_blocker_off_without_fail_fast():
+    gate_graph.set_fail_fast(False)
+    assert gate_graph.blocker(4, {POWER: False, 1: False, 2: False}) is None
+
+
+def test_plan_adds_setup_gates_only():
+    assert gate_graph.plan([4]) == {2, 4}
+    assert gate_graph.plan([3, 6]) == {2, 3, 6}
+    # Gate1 is a prerequisite but not a setup gate: only re-run when it failed
+    assert gate_graph.plan([2]) == {2}
+    assert gate_graph.plan([1, 5]) == {1, 2, 5}
+    assert gate_graph.plan([]) == set()
+    assert gate_graph.plan([POWER]) == set()
+
+
+def test_pick_keeper_preference():
+    assert gate_graph.pick_keeper(1, [1, 2, 3, 4]) == 4
+    assert gate_graph.pick_keeper(4, [1, 2, 3, 4]) == 2
+    assert gate_graph.pick_keeper(2, [2]) is None
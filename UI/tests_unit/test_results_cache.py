@@ -0,0 +1,41 @@
+# tests_unit/test_results_cache.py
+from services import results_cache
+
+ALL_PASS = {1: True, 2: True, 3: True, 4: True, 5: True, 6: True}
+
+
+def test_retest_plan_unknown_serial_runs_everything(tmp_path):
+    assert results_cache.retest_plan(str(tmp_path), "RUP001") is None
+    assert results_cache.retest_plan(str(tmp_path), None) is None
+
+
+def test_retest_plan_skips_cached_passes(tmp_path):
+    logs = str(tmp_path)
+    results_cache.record(logs, "RUP001", {**ALL_PASS, 4: False}, "S1")
+    # Gate4 again + Gate2 (START_ATP puts the RUP in ATP mode); the rest is cached
+    assert results_cache.retest_plan(logs, "RUP001") == {1: True, 3: True, 5: True, 6: True}
+
+
+def test_retest_plan_all_pass_or_all_needed_is_full_test(tmp_path):
+    logs = str(tmp_path)
+    results_cache.record(logs, "RUP001", ALL_PASS, "S1")
+    assert results_cache.retest_plan(logs, "RUP001") is None
+
+    results_cache.record(logs, "RUP002", {1: False}, "S1", blocked=(2, 3, 4, 5, 6))
+    assert results_cache.retest_plan(logs, "RUP002") is None
+
+
+def test_retest_plan_latest_result_wins_and_skipped_gates_keep_theirs(tmp_path):
+    logs = str(tmp_path)
+    results_cache.record(logs, "RUP001", {**ALL_PASS, 3: False, 6: False}, "S1")
+    # retest: Gate3 now passes, Gate6 still fails; cached gates are not rewritten
+    results_cache.record(logs, "RUP001", {2: True, 3: True, 6: False}, "S2", skipped=(1, 4, 5))
+    assert results_cache.retest_plan(logs, "RUP001") == {1: True, 3: True, 4: True, 5: True}
+    assert results_cache.lookup(logs, "RUP001")[1].session == "S1"
+
+
+def test_retest_plan_ignores_expired_results(tmp_path, monkeypatch):
+    logs = str(tmp_path)
+    results_cache.record(logs, "RUP001", {**ALL_PASS, 4: False}, "S1")
+    monkeypatch.setenv(results_cache.VALID_ENV, "-1")
+    assert results_cache.retest_plan(logs, "RUP001") is None
@@ -0,0 +1,68 @@
+# tests_unit/test_scanner.py
+from services import scanner
+
+SLOTS = (1, 2, 3, 4)
+
+
+def _router():
+    ids = {s: None for s in SLOTS}
+    logs = []
+
+    def on_serial(s, sn):
+        ids[s] = sn
+
+    router = scanner.ScanRouter(SLOTS, is_free=lambda s: ids[s] is None,
+                                serial_in_use=lambda sn: sn in ids.values(),
+                                on_serial=on_serial, log=logs.append)
+    return router, ids, logs
+
+
+def test_serial_goes_to_first_free_slot():
+    router, ids, _ = _router()
+    assert router.feed("RUP001") == (1, "RUP001")
+    assert router.feed("  RUP002\n") == (2, "RUP002")
+    assert ids == {1: "RUP001", 2: "RUP002", 3: None, 4: None}
+
+
+def test_slot_label_picks_the_next_slot():
+    router, ids, _ = _router()
+    assert router.feed("SLOT3") is None
+    assert router.indicated == 3
+    assert router.feed("RUP001") == (3, "RUP001")
+    assert router.indicated is None
+    assert router.feed("s4") is None
+    assert router.feed("RUP002") == (4, "RUP002")
+
+
+def test_slot_and_serial_in_one_code():
+    router, ids, _ = _router()
+    assert router.feed("S2:RUP-42") == (2, "RUP-42")
+    assert router.feed("slot 4 = RUP_43") == (4, "RUP_43")
+    assert ids[2] == "RUP-42" and ids[4] == "RUP_43"
+
+
+def test_rejections():
+    router, ids, logs = _router()
+    assert router.feed("A1") is None                     # too short
+    assert router.feed("RUP 001") is None                # space
+    assert router.feed("RUP001") == (1, "RUP001")
+    assert router.feed("RUP001") is None                 # double scan
+    assert router.feed("S1:RUP002") is None              # slot taken
+    assert ids == {1: "RUP001", 2: None, 3: None, 4: None}
+    assert any("already in the fixture" in m for m in logs)
+    assert any("Slot1 is not empty" in m for m in logs)
+
+
+def test_no_free_slot():
+    router, ids, logs = _router()
+    for i in range(4):
+        assert router.feed(f"RUP00{i}") is not None
+    assert router.feed("RUP999") is None
+    assert "no empty slot" in logs[-1]
+
+
+def test_key_wedge():
+    wedge = scanner.KeyWedge()
+    assert [wedge.feed(c) for c in "RUP1"] == [None] * 4
+    assert wedge.feed("\r") == "RUP1"
+    assert wedge.feed("\n") is None                      # empty line
@@ -1,10 +1,26 @@
 # ui_atp.py
-from PyQt5.QtCore import Qt
+import threading
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (
-    QWidget, QLabel, QTextEdit, QPushButton, QVBoxLayout, QHBoxLayout,
-    QGridLayout, QFrame, QProgressBar
+    QWidget, QLabel, QPlainTextEdit, QPushButton, QVBoxLayout, QHBoxLayout,
+    QGridLayout, QFrame, QProgressBar, QComboBox
 )
 
+# ======================================================================
+# SLOT STATE (what a SlotWidget should show)
+# ======================================================================
+@dataclass(frozen=True)
+class SlotState:
+    rup_id: Optional[str] = None
+    status: str = "Idle"
+    gate: int = 0
+    led: str = "gray"
+
+
 # ======================================================================
 # SLOT WIDGET (UI ONLY)
 # ======================================================================
@@ -33,15 +49,22 @@ class SlotWidget(QWidget):
 
         self.led = QFrame()
         self.led.setFixedSize(16, 16)
+        self._led_color = None
         self.set_led("gray")
+        self.shown = SlotState()
 
         self.progress = QProgressBar()
         self.progress.setRange(0, 6)  # last gate is 6
         self.progress.setValue(0)
 
+        # Continuous flow only: Load / Abort / Unload this slot
+        self.btn_load = QPushButton("Load")
+        self.btn_load.setVisible(False)
+
         header = QHBoxLayout()
         header.addWidget(self.title)
         header.addStretch()
+        header.addWidget(self.btn_load)
         header.addWidget(self.led)
 
         layout = QVBoxLayout(self)
@@ -60,6 +83,9 @@ class SlotWidget(QWidget):
         self.title.setText(self._make_title())
 
     def set_led(self, color):
+        if color == self._led_color:
+            return   # setStyleSheet re-polishes the widget: skip no-op changes
+        self._led_color = color
         self.led.setStyleSheet(f"background:{color}; border:1px solid black")
 
     def set_status(self, txt):
@@ -80,6 +106,196 @@ class SlotWidget(QWidget):
         self.gate.setText(f"Gate {g}: {name}")
         self.progress.setValue(g)
 
+    def apply(self, state: SlotState):
+        """Show `state`, touching only what differs from what is on screen."""
+        old = self.shown
+        if state.rup_id != old.rup_id:
+            self.set_rup_id(state.rup_id)
+        if state.status != old.status:
+            self.set_status(state.status)
+        if state.gate != old.gate:
+            self.set_gate(state.gate)
+        if state.led != old.led:
+            self.set_led(state.led)
+        self.shown = state
+
+
+# ======================================================================
+# SLOT STATE STORE (coalesced widget updates)
+# ======================================================================
+class SlotStateStore:
+    """
+    Runner callbacks post() slot changes (any thread, any rate); a FRAME_MS
+    timer applies only the LATEST state of each changed slot, once per frame.
+    A burst of N updates costs at most one label / stylesheet change per
+    widget per frame.
+    """
+
+    FRAME_MS = 50
+
+    def __init__(self, widgets, parent=None):
+        self.widgets = {i + 1: w for i, w in enumerate(widgets)}
+        self._lock = threading.Lock()
+        self._state: Dict[int, SlotState] = {s: w.shown for s, w in self.widgets.items()}
+        self._dirty = set()
+
+        self.timer = QTimer(parent)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.apply)
+        self.timer.start()
+
+    def post(self, slot: int, **changes):
+        """changes: rup_id / status / gate / led (None = keep)."""
+        if slot not in self.widgets:
+            return
+        changes = {k: v for k, v in changes.items() if v is not None}
+        with self._lock:
+            new = replace(self._state[slot], **changes)
+            if new != self._state[slot]:
+                self._state[slot] = new
+                self._dirty.add(slot)
+
+    def state(self, slot: int) -> SlotState:
+        with self._lock:
+            return self._state[slot]
+
+    def apply(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            todo = [(s, self._state[s]) for s in sorted(self._dirty)]
+            self._dirty.clear()
+        for s, st in todo:
+            self.widgets[s].apply(st)
+
+
+# ======================================================================
+# LOG VIEW (bounded, batched, filterable)
+# ======================================================================
+class LogView(QWidget):
+    """
+    Session log pane.
+
+    - post(items) is safe from any thread: items (text, slot, level) only go
+      into a pending deque, itself bounded to MAX_LINES: if the GUI thread
+      does not flush for a while, the oldest pending lines are dropped
+      (counted, one "[LOG] N lines not shown" marker at the next flush)
+    - a FLUSH_MS timer appends everything pending in ONE appendPlainText()
+    - the document keeps MAX_LINES blocks, the model (ring buffer) the same,
+      so memory and append cost stay flat over a whole shift
+    - slot / level filters re-render only that ring buffer (the full history
+      is in the session .log / .events.jsonl)
+    """
+
+    MAX_LINES = 5000
+    FLUSH_MS = 80
+    LEVELS = ("debug", "info", "warn", "error")
+
+    def __init__(self):
+        super().__init__()
+        self._ring = deque(maxlen=self.MAX_LINES)   # (text, slot, level_rank)
+        self._pending = deque(maxlen=self.MAX_LINES)
+        self._pending_lock = threading.Lock()
+        self._dropped = 0                           # pending lines evicted before a flush
+        self._slot = None                           # None = all, 0 = fixture (no slot)
+        self._min_level = 0
+
+        self.slot_filter = QComboBox()
+        self.slot_filter.addItem("All slots", None)
+        for s in range(1, 5):
+            self.slot_filter.addItem(f"Slot {s}", s)
+        self.slot_filter.addItem("Fixture", 0)
+        self.slot_filter.currentIndexChanged.connect(self._on_filter)
+
+        self.level_filter = QComboBox()
+        for i, lv in enumerate(self.LEVELS):
+            self.level_filter.addItem(lv.upper() + ("+" if i < len(self.LEVELS) - 1 else ""), i)
+        self.level_filter.setCurrentIndex(1)    # INFO+ (before connect: no text widget yet)
+        self.level_filter.currentIndexChanged.connect(self._on_filter)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setUndoRedoEnabled(False)
+        self.text.setMaximumBlockCount(self.MAX_LINES)
+        self.text.setStyleSheet("font-family: monospace")
+
+        bar = QHBoxLayout()
+        bar.addWidget(QLabel("Log:"))
+        bar.addWidget(self.slot_filter)
+        bar.addWidget(self.level_filter)
+        bar.addStretch()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(bar)
+        layout.addWidget(self.text)
+
+        self._min_level = self.level_filter.currentData()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.FLUSH_MS)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def _rank(self, level) -> int:
+        try:
+            return self.LEVELS.index(level)
+        except ValueError:
+            return 1
+
+    def post(self, items):
+        """items: iterable of (text, slot, level). Any thread."""
+        items = list(items)
+        with self._pending_lock:
+            self._dropped += max(0, len(self._pending) + len(items) - self.MAX_LINES)
+            self._pending.extend(items)
+
+    def append(self, text: str):
+        """QTextEdit-compatible single line (GUI thread)."""
+        self.post([(text, None, "info")])
+
+    def _visible(self, slot, rank) -> bool:
+        if rank < self._min_level:
+            return False
+        if self._slot is None:
+            return True
+        return (slot or 0) == self._slot
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._pending_lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            if len(batch) >= self.MAX_LINES:          # keep room for the marker
+                dropped += len(batch) - self.MAX_LINES + 1
+                batch = batch[len(batch) - self.MAX_LINES + 1:]
+            batch.insert(0, (f"[LOG] {dropped} lines not shown (view fell behind, "
+                             f"see the session .log)", None, "warn"))
+        shown = []
+        for text, slot, level in batch:
+            rank = self._rank(level)
+            self._ring.append((text, slot, rank))
+            if self._visible(slot, rank):
+                shown.append(text)
+        if shown:
+            self._append_lines(shown)
+
+    def _append_lines(self, lines):
+        sb = self.text.verticalScrollBar()
+        at_bottom = sb.value() >= sb.maximum() - 4
+        self.text.appendPlainText("\n".join(lines))
+        if at_bottom:
+            sb.setValue(sb.maximum())
+
+    def _on_filter(self, _=None):
+        self._slot = self.slot_filter.currentData()
+        self._min_level = self.level_filter.currentData()
+        self.flush()
+        self.text.setPlainText("\n".join(t for t, s, r in self._ring if self._visible(s, r)))
+        self.text.verticalScrollBar().setValue(self.text.verticalScrollBar().maximum())
+
 
 # ======================================================================
 # UI BUILDER (ALL LAYOUT / UX HERE)
@@ -119,22 +335,27 @@ class Ui_MainWindow:
             self.slots.append(slot)
             grid.addWidget(slot, i // 2, i % 2)
         layout.addLayout(grid)
+        self.slot_store = SlotStateStore(self.slots, parent=main_window)
 
         btns = QHBoxLayout()
         self.btn_start = QPushButton("Start ATP")
         self.btn_quick = QPushButton("Quick Test")
         self.btn_full = QPushButton("Full ATP")
         self.btn_replace = QPushButton("Replace Failed RUP(s)")
+        self.btn_flow = QPushButton("Continuous Flow")
+        self.btn_flow.setCheckable(True)
+        self.btn_retest = QPushButton("Retest Failures Only")
+        self.btn_retest.setCheckable(True)
         self.btn_stop = QPushButton("Stop")
 
         btns.addWidget(self.btn_start)
         btns.addWidget(self.btn_quick)
         btns.addWidget(self.btn_full)
         btns.addWidget(self.btn_replace)
+        btns.addWidget(self.btn_flow)
+        btns.addWidget(self.btn_retest)
         btns.addWidget(self.btn_stop)
         layout.addLayout(btns)
 
-        self.log_box = QTextEdit()
-        self.log_box.setReadOnly(True)
-        self.log_box.setStyleSheet("font-family: monospace")
+        self.log_box = LogView()
         layout.addWidget(self.log_box)
@@ -3,4 +3,16 @@ set -e
 
 cd /home/raspberry/ATP/UI
 
-/usr/bin/python3 /home/raspberry/ATP/UI/test.py
+case "$1" in
+    daemon)
+        # Long-lived engine: owns relays / CAN / MCP23S17 (no display needed)
+        exec /usr/bin/python3 -m services.daemon "${@:2}"
+        ;;
+    client)
+        # Thin Qt window attached to the daemon (restart freely)
+        exec /usr/bin/python3 /home/raspberry/ATP/UI/atp_client.py "${@:2}"
+        ;;
+    *)
+        /usr/bin/python3 /home/raspberry/ATP/UI/test.py
+        ;;
+esac